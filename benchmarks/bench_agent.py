@@ -0,0 +1,35 @@
+"""
+Agent loop overhead.
+
+Measures AgentEnhanced.run with a scripted backend, so the numbers are pure
+orchestration cost (prompt building, memory, tool dispatch) with no
+inference time.
+"""
+
+from __future__ import annotations
+
+from agent.agent_core_enhanced import AgentConfig
+from agent.tools.registry import Tool
+
+from .fakes import BenchAgent, ScriptedBackend, tool_call
+from .harness import BenchSuite
+
+
+def run(suite: BenchSuite) -> None:
+    # One iteration: the model answers directly
+    agent = BenchAgent(ScriptedBackend(["done"]), AgentConfig(max_iterations=1))
+    suite.run("agent.run/single_iteration", lambda: agent.run("hello"))
+
+    # N iterations: the model calls a no-op tool until the budget runs out
+    iterations = 10
+    agent = BenchAgent(
+        ScriptedBackend([tool_call("noop")]),
+        AgentConfig(max_iterations=iterations),
+    )
+    agent.tools.register(Tool("noop", lambda: {"success": True}, "Do nothing"))
+    result = suite.run(
+        f"agent.run/{iterations}_tool_iterations",
+        lambda: agent.run("loop"),
+        iterations_per_run=iterations,
+    )
+    result.extra["per_iteration_ms"] = result.median / iterations * 1e3
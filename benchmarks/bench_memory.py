@@ -0,0 +1,35 @@
+"""
+MemoryManager scaling.
+
+Times add, search and get_context_window at increasing store sizes.
+"""
+
+from __future__ import annotations
+
+import time
+
+from agent.memory.manager import MemoryManager
+
+from .harness import BenchSuite
+
+
+WORDS = ["file", "screen", "process", "window", "resume", "config", "network", "log"]
+
+
+def _fill(memory: MemoryManager, count: int) -> float:
+    start = time.perf_counter()
+    for i in range(count):
+        memory.add(f"User: entry {i} about {WORDS[i % len(WORDS)]}")
+    return time.perf_counter() - start
+
+
+def run(suite: BenchSuite, sizes=(10**3, 10**4, 10**5)) -> None:
+    for size in sizes:
+        memory = MemoryManager()
+        elapsed = _fill(memory, size)
+        suite.add(f"memory.add/n={size}", [elapsed / size], total_seconds=elapsed)
+        # Rare term: forces a scan of the whole store
+        memory.add("User: find my resume")
+        suite.run(f"memory.search_hit/n={size}", lambda: memory.search("resume", limit=5))
+        suite.run(f"memory.search_miss/n={size}", lambda: memory.search("zzz", limit=5))
+        suite.run(f"memory.get_context_window/n={size}", lambda: memory.get_context_window(2000))
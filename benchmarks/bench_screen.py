@@ -0,0 +1,95 @@
+"""
+Screen capture encoding and OCR throughput on recorded frames.
+
+Frames are loaded from a directory of images (``--frames``) or synthesized,
+so the benchmark runs without an X display. A live capture is added when a
+display is available.
+"""
+
+from __future__ import annotations
+
+import base64
+import io
+import os
+from pathlib import Path
+from typing import List, Optional
+
+from .harness import BenchSuite
+
+try:
+    from PIL import Image, ImageDraw
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+try:
+    import pytesseract
+    HAS_OCR = True
+except ImportError:
+    HAS_OCR = False
+
+
+def _synthetic_frames(count: int = 3) -> List["Image.Image"]:
+    frames = []
+    for i in range(count):
+        img = Image.new("RGB", (1280, 800), (240, 240, 240))
+        draw = ImageDraw.Draw(img)
+        draw.rectangle((0, 0, 1280, 32), fill=(40, 40, 60))
+        for row in range(30):
+            draw.text((20, 50 + row * 24), f"Frame {i} line {row}: lorem ipsum dolor sit amet", fill=(0, 0, 0))
+        frames.append(img)
+    return frames
+
+
+def _load_frames(frames_dir: Optional[str]) -> List["Image.Image"]:
+    if not frames_dir:
+        return _synthetic_frames()
+    paths = sorted(p for p in Path(frames_dir).iterdir() if p.suffix.lower() in (".png", ".jpg", ".jpeg"))
+    return [Image.open(p).convert("RGB") for p in paths]
+
+
+def _encode(img: "Image.Image", format: str) -> str:
+    buf = io.BytesIO()
+    img.save(buf, format=format)
+    return base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def run(suite: BenchSuite, frames_dir: Optional[str] = None) -> None:
+    if not HAS_PIL:
+        suite.skip("screen.*", "Pillow not installed")
+        return
+
+    frames = _load_frames(frames_dir)
+    if not frames:
+        suite.skip("screen.*", f"no frames in {frames_dir}")
+        return
+
+    index = {"i": 0}
+
+    def next_frame():
+        frame = frames[index["i"] % len(frames)]
+        index["i"] += 1
+        return frame
+
+    suite.run("screen.encode/png_base64", lambda: _encode(next_frame(), "PNG"), frames=len(frames))
+    suite.run("screen.encode/jpeg_base64", lambda: _encode(next_frame(), "JPEG"), frames=len(frames))
+
+    if HAS_OCR:
+        try:
+            pytesseract.get_tesseract_version()
+            suite.run("screen.ocr/image_to_string", lambda: pytesseract.image_to_string(next_frame()))
+        except Exception as e:
+            suite.skip("screen.ocr/image_to_string", f"tesseract unavailable: {e}")
+    else:
+        suite.skip("screen.ocr/image_to_string", "pytesseract not installed")
+
+    if os.environ.get("DISPLAY"):
+        from agent.screen_tools_enhanced import ScreenToolsEnhanced
+
+        tools = ScreenToolsEnhanced()
+        if "error" in tools.capture_screen():
+            suite.skip("screen.capture/live", "capture failed")
+        else:
+            suite.run("screen.capture/live", tools.capture_screen)
+    else:
+        suite.skip("screen.capture/live", "no X display")
@@ -0,0 +1,38 @@
+"""
+Startup time.
+
+Spawns fresh interpreters that import the agent and construct AgentEnhanced
+with the echo backend (no model load), the same path main.py takes.
+"""
+
+from __future__ import annotations
+
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from .harness import BenchSuite
+
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+STARTUP_SNIPPET = f"""
+import sys
+sys.path.insert(0, {str(SRC)!r})
+from agent.agent_core_enhanced import AgentEnhanced
+from agent.llm_interface import EchoBackend
+AgentEnhanced(EchoBackend())
+"""
+
+
+def _spawn(code: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True)
+    return time.perf_counter() - start
+
+
+def run(suite: BenchSuite) -> None:
+    runs = 3 if suite.quick else 10
+    suite.add("startup/python_baseline", [_spawn("pass") for _ in range(runs)])
+    suite.add("startup/agent_enhanced", [_spawn(STARTUP_SNIPPET) for _ in range(runs)])
@@ -0,0 +1,54 @@
+"""
+Tool dispatch latency.
+
+Each tool is invoked through AgentEnhanced._execute_tool so the measurement
+includes registry lookup, argument passing and result serialization.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from agent.agent_core_enhanced import AgentConfig
+from agent.file_tools import FileTools
+from agent.tools.registry import Tool
+from agent.types import ToolCall
+
+from .fakes import BenchAgent, ScriptedBackend
+from .harness import BenchSuite
+
+
+def _dispatch(agent: BenchAgent, name: str, **arguments):
+    call = ToolCall(id="bench", name=name, arguments=arguments)
+    return lambda: agent._execute_tool(call)
+
+
+def run(suite: BenchSuite) -> None:
+    agent = BenchAgent(ScriptedBackend(["done"]), AgentConfig())
+    agent.tools.register(Tool("noop", lambda: {"success": True}, "Do nothing"))
+    suite.run("tools.dispatch/noop", _dispatch(agent, "noop"))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # FileTools restricted to the scratch directory
+        file_tools = FileTools(allowed_paths=[tmpdir], home_dir=tmpdir)
+        agent.tools.register(Tool("read_file", file_tools.read_file, "Read a file"))
+        agent.tools.register(Tool("list_directory", file_tools.list_directory, "List a directory"))
+        sample = Path(tmpdir) / "sample.txt"
+        sample.write_text("line of text\n" * 1000)
+        for i in range(200):
+            (Path(tmpdir) / f"file_{i:03d}.txt").write_text("x")
+
+        suite.run("tools.file/read_file_13KB", _dispatch(agent, "read_file", path=str(sample)))
+        suite.run("tools.file/list_directory_200", _dispatch(agent, "list_directory", path=tmpdir))
+
+    suite.run("tools.system/list_processes", _dispatch(agent, "list_processes", limit=20))
+    suite.run("tools.system/run_command_true", _dispatch(agent, "run_command", command="true"))
+    suite.run("tools.system/get_system_info", _dispatch(agent, "get_system_info"))
+
+    if os.environ.get("DISPLAY") and shutil.which("xdotool"):
+        suite.run("tools.automation/press_key_noop", _dispatch(agent, "press_key", key="shift"))
+    else:
+        suite.skip("tools.automation/press_key_noop", "no X display or xdotool")
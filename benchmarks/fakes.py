@@ -0,0 +1,46 @@
+"""
+Fake model and agent used by the benchmarks.
+
+The scripted backend replays a fixed sequence of responses so the agent loop
+can be exercised without loading a model. Responses that are JSON objects of
+the form {"tool": name, "arguments": {...}} are turned into tool calls by
+``BenchAgent`` so tool dispatch is part of the measured loop.
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+from typing import List, Sequence
+
+from agent.agent_core_enhanced import AgentEnhanced
+from agent.llm_interface import LLMBackend
+from agent.types import Message, ToolCall
+
+
+class ScriptedBackend(LLMBackend):
+    """Backend that cycles through canned responses."""
+
+    def __init__(self, responses: Sequence[str]) -> None:
+        self._responses = itertools.cycle(responses)
+
+    def generate(self, messages: List[Message], max_tokens: int = 256) -> Message:
+        return Message(role="assistant", content=next(self._responses))
+
+
+class BenchAgent(AgentEnhanced):
+    """AgentEnhanced that understands the scripted tool-call format."""
+
+    def _parse_tool_calls(self, message: Message) -> List[ToolCall]:
+        try:
+            data = json.loads(message.content)
+        except ValueError:
+            return []
+        if not isinstance(data, dict) or "tool" not in data:
+            return []
+        return [ToolCall(id="bench", name=data["tool"], arguments=data.get("arguments", {}))]
+
+
+def tool_call(name: str, **arguments) -> str:
+    """Encode a scripted tool call response."""
+    return json.dumps({"tool": name, "arguments": arguments})
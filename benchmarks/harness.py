@@ -0,0 +1,162 @@
+"""
+Minimal benchmark harness.
+
+Times callables, collects summary statistics, writes JSON results and
+compares a run against a saved baseline.
+"""
+
+from __future__ import annotations
+
+import json
+import platform
+import statistics
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List
+
+
+@dataclass
+class BenchResult:
+    """Summary statistics for one benchmark (times in seconds)."""
+
+    name: str
+    iterations: int
+    mean: float
+    median: float
+    p95: float
+    min: float
+    max: float
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_samples(cls, name: str, samples: List[float], **extra: Any) -> "BenchResult":
+        ordered = sorted(samples)
+        p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+        return cls(
+            name=name,
+            iterations=len(ordered),
+            mean=statistics.fmean(ordered),
+            median=statistics.median(ordered),
+            p95=ordered[p95_index],
+            min=ordered[0],
+            max=ordered[-1],
+            extra=extra,
+        )
+
+
+def measure(
+    func: Callable[[], Any],
+    min_time: float = 0.2,
+    min_iterations: int = 5,
+    max_iterations: int = 10_000,
+    warmup: int = 1,
+) -> List[float]:
+    """
+    Time repeated calls of ``func``.
+
+    Args:
+        func: Zero-argument callable to time
+        min_time: Keep sampling until this many seconds have elapsed
+        min_iterations: Minimum number of samples
+        max_iterations: Maximum number of samples
+        warmup: Untimed calls made first
+
+    Returns:
+        Per-call durations in seconds
+    """
+    for _ in range(warmup):
+        func()
+
+    samples: List[float] = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < max_iterations and (
+        len(samples) < min_iterations or time.perf_counter() < deadline
+    ):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+class BenchSuite:
+    """Collects results from the individual benchmark modules."""
+
+    def __init__(self, quick: bool = False) -> None:
+        """
+        Initialize suite.
+
+        Args:
+            quick: Use fewer samples and smaller sizes (for smoke runs)
+        """
+        self.quick = quick
+        self.results: List[BenchResult] = []
+
+    @property
+    def min_time(self) -> float:
+        return 0.05 if self.quick else 0.5
+
+    def run(self, name: str, func: Callable[[], Any], **extra: Any) -> BenchResult:
+        """Time ``func`` and record the result."""
+        samples = measure(func, min_time=self.min_time, min_iterations=3 if self.quick else 5)
+        return self.add(name, samples, **extra)
+
+    def add(self, name: str, samples: List[float], **extra: Any) -> BenchResult:
+        """Record externally collected samples."""
+        result = BenchResult.from_samples(name, samples, **extra)
+        self.results.append(result)
+        print(
+            f"{name:<48} median {result.median * 1e3:10.3f} ms  "
+            f"p95 {result.p95 * 1e3:10.3f} ms  (n={result.iterations})"
+        )
+        return result
+
+    def skip(self, name: str, reason: str) -> None:
+        """Note a benchmark that could not run here."""
+        print(f"{name:<48} skipped: {reason}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "created": time.time(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "results": {r.name: asdict(r) for r in self.results},
+        }
+
+    def write_json(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+def compare(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    threshold: float = 0.10,
+    metric: str = "median",
+) -> List[Dict[str, Any]]:
+    """
+    Find benchmarks that got slower than the baseline.
+
+    Args:
+        baseline: Result document from a previous run
+        current: Result document from this run
+        threshold: Allowed relative slowdown (0.10 = 10%)
+        metric: Statistic to compare
+
+    Returns:
+        One dict per benchmark present in both runs, with 'regressed' flag
+    """
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base[metric]:
+            continue
+        change = result[metric] / base[metric] - 1.0
+        rows.append({
+            "name": name,
+            "baseline": base[metric],
+            "current": result[metric],
+            "change": change,
+            "regressed": change > threshold,
+        })
+    return rows
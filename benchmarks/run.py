@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+AgentOS benchmark runner.
+
+Usage:
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --compare results.json --threshold 0.15
+
+With --compare, the run exits non-zero when any benchmark's median is
+slower than the baseline by more than the threshold.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from benchmarks import bench_agent, bench_memory, bench_screen, bench_startup, bench_tools
+from benchmarks.harness import BenchSuite, compare
+
+
+GROUPS = ["agent", "tools", "memory", "screen", "startup"]
+
+
+def main() -> int:
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="AgentOS benchmarks")
+    parser.add_argument("--output", "-o", type=str, help="Write JSON results to this file")
+    parser.add_argument("--compare", type=str, help="Baseline JSON results to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="Allowed relative slowdown before a benchmark counts as a regression",
+    )
+    parser.add_argument(
+        "--only",
+        type=str,
+        help=f"Comma-separated groups to run ({', '.join(GROUPS)})",
+    )
+    parser.add_argument("--quick", action="store_true", help="Fewer samples and sizes (smoke run)")
+    parser.add_argument("--full", action="store_true", help="Include 10^6-entry memory benchmarks")
+    parser.add_argument("--frames", type=str, help="Directory of recorded screen frames")
+
+    args = parser.parse_args()
+    groups = args.only.split(",") if args.only else GROUPS
+    suite = BenchSuite(quick=args.quick)
+
+    if args.quick:
+        sizes = (10**3, 10**4)
+    elif args.full:
+        sizes = (10**3, 10**4, 10**5, 10**6)
+    else:
+        sizes = (10**3, 10**4, 10**5)
+
+    if "agent" in groups:
+        bench_agent.run(suite)
+    if "tools" in groups:
+        bench_tools.run(suite)
+    if "memory" in groups:
+        bench_memory.run(suite, sizes=sizes)
+    if "screen" in groups:
+        bench_screen.run(suite, frames_dir=args.frames)
+    if "startup" in groups:
+        bench_startup.run(suite)
+
+    if args.output:
+        suite.write_json(args.output)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(baseline, suite.to_dict(), threshold=args.threshold)
+        print(f"\n{'benchmark':<48} {'baseline ms':>12} {'current ms':>12} {'change':>8}")
+        for row in rows:
+            flag = "  REGRESSION" if row["regressed"] else ""
+            print(
+                f"{row['name']:<48} {row['baseline'] * 1e3:>12.3f} "
+                f"{row['current'] * 1e3:>12.3f} {row['change']:>+8.1%}{flag}"
+            )
+        regressions = [row for row in rows if row["regressed"]]
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,7 +14,18 @@ sys.path.insert(0, str(Path(__file__).parent / "src"))
 from agent.agent_core_enhanced import AgentEnhanced, AgentConfig
 from agent.llm_interface import LLMBackend
 from agent.llama_cpp_backend import LlamaCppBackend
+from agent.llm_router import Route, RouterBackend
 from agent.config import settings
+from agent.metrics import MetricsServer, metrics
+from agent.replay import (
+    RecordingBackend,
+    ReplayBackend,
+    SessionLog,
+    SessionRecorder,
+    record_tools,
+    replay_tools,
+)
+from agent.tracing import Tracer, set_tracer
 
 
 def create_backend() -> LLMBackend:
@@ -23,7 +34,21 @@ def create_backend() -> LLMBackend:
     model_path = settings.model_path
     if Path(model_path).exists():
         try:
-            return LlamaCppBackend(model_path=model_path)
+            routes = [
+                Route(f"main-{i}", LlamaCppBackend(model_path=model_path))
+                for i in range(max(1, settings.model_instances))
+            ]
+            # A small model takes tool-selection steps and summaries
+            if settings.fast_model_path and Path(settings.fast_model_path).exists():
+                routes.insert(0, Route(
+                    "fast",
+                    LlamaCppBackend(model_path=settings.fast_model_path),
+                    tasks=frozenset({"tool", "summarize"}),
+                    max_prompt_tokens=settings.fast_model_max_prompt_tokens,
+                ))
+            if len(routes) == 1:
+                return routes[0].backend
+            return RouterBackend(routes)
         except Exception as e:
             print(f"Warning: Could not load llama.cpp backend: {e}")
             print("Falling back to EchoBackend for testing.")
@@ -33,6 +58,14 @@ def create_backend() -> LLMBackend:
     return EchoBackend()
 
 
+def report_trace(tracer: Tracer, prefix: str) -> None:
+    """Print the latency breakdown of the last request and export all spans."""
+    print(tracer.format_summary(tracer.trace_id))
+    tracer.export_jsonl(f"{prefix}.jsonl")
+    tracer.export_chrome(f"{prefix}.chrome.json")
+    print(f"📈 Trace written to {prefix}.jsonl and {prefix}.chrome.json\n")
+
+
 def main():
     """Main entry point."""
     parser = argparse.ArgumentParser(description="AgentOS - AI-First Operating System")
@@ -59,23 +92,79 @@ def main():
         type=str,
         help="Path to config file",
     )
+    parser.add_argument(
+        "--trace",
+        nargs="?",
+        const="traces/agent-trace",
+        metavar="PREFIX",
+        help="Record per-step latency spans to PREFIX.jsonl and PREFIX.chrome.json",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=settings.metrics_port,
+        help="Serve Prometheus metrics on localhost at this port",
+    )
+    parser.add_argument(
+        "--record",
+        type=str,
+        metavar="SESSION",
+        help="Record all LLM and tool I/O to SESSION (gzip JSONL)",
+    )
+    parser.add_argument(
+        "--replay",
+        type=str,
+        metavar="SESSION",
+        help="Replay LLM and tool I/O from SESSION instead of running them",
+    )
+    parser.add_argument(
+        "--replay-latency",
+        choices=["original", "zero"],
+        default="zero",
+        help="Reproduce recorded latencies during --replay (default: zero)",
+    )
     
     args = parser.parse_args()
     
+    # Enable span tracing if requested
+    tracer = None
+    if args.trace:
+        tracer = Tracer(enabled=True)
+        set_tracer(tracer)
+    
+    # Expose metrics endpoint if requested
+    if args.metrics_port:
+        port = MetricsServer(metrics, port=args.metrics_port).start()
+        print(f"📊 Metrics at http://127.0.0.1:{port}/metrics")
+    
     # Update model path if provided
     if args.model:
         settings.model_path = args.model
     
     # Create backend
     print("🤖 Initializing AgentOS...")
-    backend = create_backend()
+    session_log = None
+    recorder = None
+    if args.replay:
+        session_log = SessionLog(args.replay)
+        backend = ReplayBackend(session_log, latency=args.replay_latency)
+    else:
+        backend = create_backend()
+    if args.record:
+        recorder = SessionRecorder(args.record)
+        backend = RecordingBackend(backend, recorder)
     
     # Create agent
     config = AgentConfig(
         max_response_tokens=1024,
         max_iterations=10,
+        index_files=True,
     )
     agent = AgentEnhanced(backend=backend, config=config)
+    if session_log:
+        replay_tools(agent.tools, session_log, latency=args.replay_latency)
+    if recorder:
+        record_tools(agent.tools, recorder)
     
     print("✅ AgentOS ready!")
     print("Type 'exit' or 'quit' to exit.\n")
@@ -85,6 +174,8 @@ def main():
         # Single command mode
         result = agent.run(args.command)
         print(f"\n{result.final_answer}")
+        if tracer:
+            report_trace(tracer, args.trace)
     else:
         # Interactive mode
         while True:
@@ -101,6 +192,8 @@ def main():
                 print("🤔 Thinking...")
                 result = agent.run(user_input)
                 print(f"\nAgent: {result.final_answer}\n")
+                if tracer:
+                    report_trace(tracer, args.trace)
                 
             except KeyboardInterrupt:
                 print("\n👋 Goodbye!")
@@ -109,6 +202,10 @@ def main():
                 print(f"❌ Error: {e}")
                 import traceback
                 traceback.print_exc()
+    
+    agent.close()
+    if recorder:
+        recorder.close()
 
 
 if __name__ == "__main__":
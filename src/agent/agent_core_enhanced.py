@@ -6,6 +6,7 @@ Based on research from LangGraph/LangChain patterns.
 from __future__ import annotations
 
 import json
+import time
 import uuid
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional
@@ -15,7 +16,17 @@ from .types import AgentResult, AgentStep, Message, ToolCall, ToolResult
 from .memory.manager import MemoryManager
 from .planning.planner import Planner
 from .tools.registry import ToolRegistry, Tool
+from .tools.frames import HANDLE_RE
+from .tools.output import default_output_store, fit_to_budget
+from .tools.workers import ToolWorkerPool, WorkerError
 from .config import settings
+from .logging_config import get_logger
+from .metrics import TOOL_CALLS
+from .recorder import ScreenRecorder, worker_grab
+from .tracing import get_tracer
+
+
+logger = get_logger("agent")
 
 
 @dataclass
@@ -34,6 +45,14 @@ You have full control over the system and can:
 Always think step by step. Use tools when needed. Be helpful, efficient, and safe."""
     temperature: float = 0.7
     enable_tool_calling: bool = True
+    max_tool_output_tokens: int = 2000  # Budget for each tool message
+    summarize_tool_output: bool = False  # Summarize over-budget output with the LLM
+    index_files: bool = False  # Start the find_files index at startup instead of on first use
+    index_file_contents: bool = False  # Let find_files match contents of small text files
+    isolate_tools: bool = True  # Run screen and input tools in supervised worker processes
+    tool_workers: int = 2  # Size of the worker pool for isolated tools
+    tool_timeout: float = 60.0  # Hard timeout for an isolated tool call (s)
+    record_screen: bool = False  # Keep a low-rate screen recording for screen_changes/export_recording
 
 
 class AgentEnhanced:
@@ -55,6 +74,20 @@ class AgentEnhanced:
         self.memory = MemoryManager()
         self.planner = Planner()
         self.tools = ToolRegistry()
+        self.output_store = default_output_store
+        self.tool_workers: Optional[ToolWorkerPool] = None
+        self.recorder_workers: Optional[ToolWorkerPool] = None
+        self.recorder: Optional[ScreenRecorder] = None
+        if self._config.isolate_tools:
+            self.tool_workers = ToolWorkerPool(
+                workers=self._config.tool_workers,
+                timeout=self._config.tool_timeout,
+                preload=["agent.screen_tools_enhanced", "agent.automation_tools"],
+            )
+            if self._config.record_screen:
+                # A worker of its own: grabs neither wait for tool calls nor delay them
+                self.recorder_workers = ToolWorkerPool(workers=1, timeout=10.0,
+                                                       preload=["agent.screen_tools_enhanced"])
         
         # Register all available tools
         self._register_tools()
@@ -69,25 +102,58 @@ class AgentEnhanced:
         from .automation_tools import AutomationTools
         from .system_tools import SystemTools
         from .screen_tools_enhanced import ScreenToolsEnhanced
+        from .grounding import render as render_marks
         
         # Initialize tool instances
-        file_tools = FileTools()
+        file_tools = FileTools(index_contents=self._config.index_file_contents)
+        if self._config.index_files:
+            file_tools.file_index.start()
         automation_tools = AutomationTools()
         system_tools = SystemTools()
         screen_tools = ScreenToolsEnhanced()
+        workers = self.tool_workers
+        
+        def isolated(instance: Any, method: str, pool: Optional[ToolWorkerPool] = workers):
+            """Call instance.method in a worker of pool (in-process if isolation is off)."""
+            # Workers build their own default-constructed instance of the class
+            target = f"{type(instance).__module__}:{type(instance).__name__}.{method}"
+            
+            def call(**kwargs):
+                if pool is None:
+                    return getattr(instance, method)(**kwargs)
+                try:
+                    return pool.call(target, kwargs)
+                except WorkerError as e:
+                    return {"error": str(e)}
+            return call
         
         # Register file tools
-        def read_file_tool(path: str):
-            return file_tools.read_file(path)
-        self.tools.register(Tool("read_file", read_file_tool, "Read the contents of a file"))
+        def read_file_tool(path: str, offset: int = None, length: int = None,
+                           start_line: int = None, end_line: int = None):
+            return file_tools.read_file(path, offset, length, start_line, end_line)
+        self.tools.register(Tool("read_file", read_file_tool, "Read a file, optionally only a byte range (offset/length) or line range (start_line/end_line)"))
+        
+        def grep_file_tool(path: str, pattern: str, max_matches: int = 100, ignore_case: bool = False):
+            return file_tools.grep_file(path, pattern, max_matches, ignore_case)
+        self.tools.register(Tool("grep_file", grep_file_tool, "Find lines matching a regex in a file"))
+        
+        def search_files_tool(path: str, pattern: str, glob: str = "*", max_matches: int = 100,
+                              ignore_case: bool = False):
+            return file_tools.search_files(path, pattern, glob, max_matches, ignore_case)
+        self.tools.register(Tool("search_files", search_files_tool, "Find lines matching a regex in all files under a directory"))
         
-        def write_file_tool(path: str, content: str):
-            return file_tools.write_file(path, content)
-        self.tools.register(Tool("write_file", write_file_tool, "Write content to a file"))
+        def find_files_tool(query: str, limit: int = 20):
+            return file_tools.find_files(query, limit)
+        self.tools.register(Tool("find_files", find_files_tool, "Find files anywhere in the allowed directories by name or path words (indexed, instant)"))
         
-        def list_directory_tool(path: str):
-            return file_tools.list_directory(path)
-        self.tools.register(Tool("list_directory", list_directory_tool, "List files in a directory"))
+        def write_file_tool(path: str, content: str, mode: str = "overwrite"):
+            return file_tools.write_file(path, content, mode)
+        self.tools.register(Tool("write_file", write_file_tool, "Write content to a file atomically; mode 'append' appends, mode 'patch' applies content as a unified diff (cheap edits to large files)"))
+        
+        def list_directory_tool(path: str, depth: int = 0, pattern: str = None, offset: int = 0,
+                                limit: int = 1000):
+            return file_tools.list_directory(path, depth, pattern, offset, limit)
+        self.tools.register(Tool("list_directory", list_directory_tool, "List files in a directory, optionally recursive (depth), filtered by glob (pattern) and paged (offset/limit)"))
         
         def move_file_tool(src: str, dst: str):
             return file_tools.move_file(src, dst)
@@ -97,40 +163,215 @@ class AgentEnhanced:
             return file_tools.delete_file(path)
         self.tools.register(Tool("delete_file", delete_file_tool, "Delete a file or directory"))
         
-        # Register automation tools
+        def batch_file_ops_tool(operations: list, dry_run: bool = False, rollback: bool = False):
+            return file_tools.batch_file_ops(operations, dry_run, rollback)
+        self.tools.register(Tool("batch_file_ops", batch_file_ops_tool, 'Run many file operations in one call: operations is a list of {"op": "move"|"copy", "src", "dst"} or {"op": "delete"|"mkdir", "path"}; validated up front, optional dry_run and rollback on failure'))
+        
+        # Register automation tools (xdotool helpers run in tool workers)
+        click = isolated(automation_tools, "click")
+        # type_text runs here: after a paste the user's old clipboard is served
+        # by the selections it owns, which must outlive worker restarts. Only
+        # its xdotool input goes to a worker
+        if workers is not None:
+            automation_tools.runner = isolated(automation_tools, "run_xdotool")
+        press_key = isolated(automation_tools, "press_key")
+        last_input = {"time": 0.0}  # When the agent last sent input
+        
         def click_tool(x: int, y: int, button: int = 1):
-            return automation_tools.click(x, y, button)
+            last_input["time"] = time.time()
+            return click(x=x, y=y, button=button)
         self.tools.register(Tool("click", click_tool, "Click at screen coordinates"))
         
         def type_text_tool(text: str):
+            last_input["time"] = time.time()
             return automation_tools.type_text(text)
-        self.tools.register(Tool("type_text", type_text_tool, "Type text at current focus"))
+        self.tools.register(Tool("type_text", type_text_tool, "Type text at current focus (long text is pasted, so it is near-instant)"))
         
         def press_key_tool(key: str):
-            return automation_tools.press_key(key)
+            last_input["time"] = time.time()
+            return press_key(key=key)
         self.tools.register(Tool("press_key", press_key_tool, "Press a key or key combination"))
         
+        # Waits block on X11 events in this process (no native code involved)
+        def wait_for_window_tool(name: str, timeout: float = 10.0):
+            return automation_tools.wait_for_window(name, timeout)
+        self.tools.register(Tool("wait_for_window", wait_for_window_tool, "Wait until a window whose title matches a pattern is open (returns at once if it already is)"))
+        
+        def wait_for_focus_change_tool(timeout: float = 5.0):
+            # Count changes caused by the last input action, even if they
+            # happened before this call
+            return automation_tools.wait_for_focus_change(timeout, since=last_input["time"] or None)
+        self.tools.register(Tool("wait_for_focus_change", wait_for_focus_change_tool, "Wait until keyboard focus moves to another window after the last click or key press"))
+        
+        # UI trees are cached in this process and retaken after input
+        def get_ui_tree_tool(window_id: str = None, diff: bool = False):
+            return automation_tools.get_ui_tree(window_id, diff, newer_than=last_input["time"])
+        self.tools.register(Tool("get_ui_tree", get_ui_tree_tool, "List windows and their controls (role, name, bounds, states), one line each; diff returns only changes since the last call. Much cheaper than OCR"))
+        
+        def find_ui_element_tool(name: str, role: str = None, window_id: str = None):
+            return automation_tools.find_ui_element(name, role, window_id, newer_than=last_input["time"])
+        self.tools.register(Tool("find_ui_element", find_ui_element_tool, "Find windows or controls by name (regex) and optional role; returns bounds and a center point to click"))
+        
         # Register system tools
         def get_system_info_tool():
             return system_tools.get_system_info()
         self.tools.register(Tool("get_system_info", get_system_info_tool, "Get system information"))
         
-        def list_processes_tool(limit: int = 20):
-            return system_tools.list_processes(limit)
-        self.tools.register(Tool("list_processes", list_processes_tool, "List running processes"))
+        def list_processes_tool(limit: int = 20, sort_by: str = "cpu", name: str = None, user: str = None):
+            return system_tools.list_processes(limit, sort_by, name, user)
+        self.tools.register(Tool("list_processes", list_processes_tool, "List top running processes by cpu, memory or pid, optionally filtered by name or user"))
+        
+        def run_command_tool(command: str, timeout: int = 30, session: str = None):
+            return system_tools.run_command(command, timeout, session=session)
+        self.tools.register(Tool("run_command", run_command_tool, "Run a system command; pass a session name to keep working directory and environment between calls"))
+        
+        def close_shell_session_tool(session: str):
+            return system_tools.close_shell_session(session)
+        self.tools.register(Tool("close_shell_session", close_shell_session_tool, "Close a persistent shell session"))
+        
+        # Register screen tools (PIL grabs, OCR and diffs run in tool workers;
+        # frames are kept in this process's frame store and passed by handle)
+        capture_frame = isolated(screen_tools, "capture_frame")
+        extract_text = isolated(screen_tools, "extract_text_from_screen")
+        diff_frames = isolated(screen_tools, "diff_frames")
+        frames = screen_tools.frames
+        
+        def capture_screen_tool(format: str = "auto", grayscale: bool = False, active_window: bool = False,
+                                monitor: str = None):
+            region = None
+            if monitor is not None and not active_window:
+                # Resolved here: the display info cache lives in this process
+                geometry = screen_tools.monitor_region(monitor)
+                if "error" in geometry:
+                    return geometry
+                region = geometry["bounds"]
+            captured = capture_frame(format=format, grayscale=grayscale, active_window=active_window, region=region)
+            return screen_tools.store_frame(captured)
+        self.tools.register(Tool("capture_screen", capture_screen_tool, "Capture the screen, one monitor (by name, index or \"primary\") or only the focused window, downscaled and compressed for vision; returns a frame handle for OCR, diffs and vision"))
+        
+        def read_frame_tool(handle: str, include_data: bool = False):
+            frame = frames.get(handle) if HANDLE_RE.match(handle) else None
+            path = frames.path(handle) if frame is not None else None
+            if path is None:
+                return {"error": f"Unknown or expired frame handle: {handle}"}
+            # Vision backends take image paths; base64 is paged like any large output
+            result = {"success": True, **frame.info(), "path": path}
+            if include_data:
+                result["data"] = frames.read(handle).get("data")
+            return result
+        self.tools.register(Tool("read_frame", read_frame_tool, "Get a captured frame by handle as an image file path (for vision), optionally with base64 data"))
+        
+        # Served from memory; refreshed when RandR reports a layout change
+        def get_display_info_tool():
+            return screen_tools.get_screen_resolution()
+        self.tools.register(Tool("get_display_info", get_display_info_tool, "Get the screen size, DPI and monitor layout (name, bounds, primary)"))
+        
+        def extract_text_tool(x: int = None, y: int = None, width: int = None, height: int = None,
+                              frame: str = None):
+            if frame is None:
+                return extract_text(x=x, y=y, width=width, height=height)
+            try:
+                with frames.use(frame) as (info, data):
+                    return extract_text(x=x, y=y, width=width, height=height,
+                                        frame=data, origin=info.origin, scale=info.scale)
+            except KeyError as e:
+                return {"error": e.args[0]}
+        self.tools.register(Tool("extract_text_from_screen", extract_text_tool, "Extract text from the screen, or from a captured frame by handle, using OCR"))
+        
+        def diff_frames_tool(before: str, after: str = None):
+            try:
+                if after is None:
+                    # Recapture the same area at the same scale
+                    info = frames.get(before)
+                    if info is None:
+                        raise KeyError(f"Unknown or expired frame handle: {before}")
+                    region = [*info.origin, round(info.width / info.scale), round(info.height / info.scale)]
+                    captured = screen_tools.store_frame(capture_frame(
+                        format=info.format, region=region, max_width=info.width, max_height=info.height))
+                    if "error" in captured:
+                        return captured
+                    after = captured["handle"]
+                with frames.use(before) as (first, first_data), frames.use(after) as (_, second_data):
+                    result = diff_frames(before=first_data, after=second_data,
+                                         origin=first.origin, scale=first.scale)
+            except KeyError as e:
+                return {"error": e.args[0]}
+            return {**result, "after": after} if "error" not in result else result
+        self.tools.register(Tool("diff_frames", diff_frames_tool, "List the screen regions that changed between two frames; without after, compares against a new capture of the same area"))
+        
+        # Set-of-marks grounding: numbered elements the model clicks by id
+        ground_screen = isolated(screen_tools, "ground_screen")
+        marks: Dict[int, Dict[str, Any]] = {}
+        
+        def ground_screen_tool(annotate: bool = True):
+            # Covered windows' elements still report "showing"; only the
+            # focused window's are known to be on top
+            accessible = automation_tools.get_ui_elements(
+                newer_than=last_input["time"], active_only=True).get("elements", [])
+            result = ground_screen(accessible=accessible, annotate=annotate)
+            if "error" in result:
+                return result
+            annotated = result.pop("annotated", None)
+            if annotated is not None:
+                handle = frames.put(annotated["frame"], annotated["format"], annotated["width"],
+                                    annotated["height"], annotated["origin"], annotated["scale"])
+                result["image"] = frames.get(handle).info()
+            marks.clear()
+            marks.update((element["id"], element) for element in result["elements"])
+            # The model gets one line per element; the agent keeps the boxes
+            return {**result, "elements": render_marks(result["elements"])}
+        self.tools.register(Tool("ground_screen", ground_screen_tool, "Number the clickable elements on screen (accessibility tree of the focused window, OCR text and detected controls), optionally with an annotated screenshot stored as a frame (see read_frame); use click_element with a number instead of guessing coordinates"))
+        
+        def click_element_tool(id: int, button: int = 1):
+            mark = marks.get(id)
+            if mark is None:
+                return {"error": f"Unknown element {id}; call ground_screen first"}
+            x, y = mark["center"]
+            result = click_tool(x, y, button)
+            if "error" not in result:
+                result = {**result, "clicked": {"id": id, "label": mark["label"], "x": x, "y": y}}
+            return result
+        self.tools.register(Tool("click_element", click_element_tool, "Click the center of an element numbered by ground_screen"))
         
-        def run_command_tool(command: str, timeout: int = 30):
-            return system_tools.run_command(command, timeout)
-        self.tools.register(Tool("run_command", run_command_tool, "Run a system command"))
+        # Screen history from the background recorder (no new captures)
+        if self._config.record_screen:
+            # Grabs run in the recorder's worker; only downscaled pixels come back
+            grab = None
+            if self.recorder_workers is not None:
+                grab = worker_grab(isolated(screen_tools, "grab_scaled", self.recorder_workers))
+            self.recorder = ScreenRecorder(
+                fps=settings.record_fps,
+                max_bytes=settings.record_max_mb * 1024 * 1024,
+                cpu_percent=settings.record_cpu_percent,
+                grab=grab,
+            ).start()
+        recorder = self.recorder
         
-        # Register screen tools
-        def capture_screen_tool(format: str = "png"):
-            return screen_tools.capture_screen(format)
-        self.tools.register(Tool("capture_screen", capture_screen_tool, "Capture the entire screen"))
+        def screen_changes_tool(seconds: float = 10.0):
+            if recorder is None:
+                return {"error": "Screen recording is off (AgentConfig.record_screen)"}
+            return recorder.changes(seconds)
+        self.tools.register(Tool("screen_changes", screen_changes_tool, "Report what changed on screen in the last N seconds from the background recording, without a new capture"))
         
-        def extract_text_tool(x: int = None, y: int = None, width: int = None, height: int = None):
-            return screen_tools.extract_text_from_screen(x, y, width, height)
-        self.tools.register(Tool("extract_text_from_screen", extract_text_tool, "Extract text from screen using OCR"))
+        def export_recording_tool(seconds: float = 60.0, format: str = "webp"):
+            if recorder is None:
+                return {"error": "Screen recording is off (AgentConfig.record_screen)"}
+            return recorder.export(start=time.time() - seconds, format=format)
+        self.tools.register(Tool("export_recording", export_recording_tool, "Save the last N seconds of the background screen recording as an animated clip and return its path"))
+        
+        # Register output paging for truncated tool results
+        def read_tool_output_tool(handle: str, offset: int = 0, length: int = 16384):
+            return self.output_store.read(handle, offset, length)
+        self.tools.register(Tool("read_tool_output", read_tool_output_tool, "Page through a truncated tool output by handle and byte offset"))
+
+    def close(self) -> None:
+        """Stop the tool worker processes and the screen recorder."""
+        if self.recorder is not None:
+            self.recorder.stop()
+        if self.tool_workers is not None:
+            self.tool_workers.close()
+        if self.recorder_workers is not None:
+            self.recorder_workers.close()
 
     def run(self, user_input: str | List[Message]) -> AgentResult:
         """
@@ -161,56 +402,83 @@ class AgentEnhanced:
         # Main agent loop
         steps: List[AgentStep] = []
         self.current_iteration = 0
+        tracer = get_tracer()
+        tracer.start_trace()
         
-        while self.current_iteration < self._config.max_iterations:
-            self.current_iteration += 1
-            
-            # Get context from memory
-            context = self.memory.get_context_window(max_tokens=2000)
-            
-            # Prepare messages for LLM (with tool definitions if enabled)
-            llm_messages = self._prepare_messages_for_llm()
-            
-            # Generate response
-            response = self._backend.generate(
-                llm_messages,
-                max_tokens=self._config.max_response_tokens,
-            )
-            
-            # Parse tool calls from response (simplified - real implementation would parse JSON)
-            tool_calls = self._parse_tool_calls(response)
-            tool_results: List[ToolResult] = []
-            
-            # Execute tools if any
-            if tool_calls:
-                for tool_call in tool_calls:
-                    result = self._execute_tool(tool_call)
-                    tool_results.append(result)
+        with tracer.span("agent.run", max_iterations=self._config.max_iterations) as run_span:
+            while self.current_iteration < self._config.max_iterations:
+                self.current_iteration += 1
+                step_number = self.current_iteration
+                
+                with tracer.span("agent.step", step=step_number):
+                    # Get context from memory
+                    with tracer.span("memory.context"):
+                        context = self.memory.get_context_window(max_tokens=2000)
                     
-                    # Add tool result to conversation
-                    tool_result_msg = Message(
-                        role="tool",
-                        content=json.dumps(result.output) if isinstance(result.output, dict) else str(result.output),
-                        name=tool_call.name,
-                    )
-                    self.conversation_history.append(tool_result_msg)
-            
-            # Create step
-            step = AgentStep(
-                input_messages=llm_messages,
-                tool_calls=tool_calls,
-                tool_results=tool_results,
-                output_message=response,
-            )
-            steps.append(step)
-            
-            # Add response to conversation
-            self.conversation_history.append(response)
-            self.memory.add(f"Assistant: {response.content}")
+                    # Prepare messages for LLM (with tool definitions if enabled)
+                    with tracer.span("prompt.build") as span:
+                        llm_messages = self._prepare_messages_for_llm()
+                        span.set(
+                            messages=len(llm_messages),
+                            prompt_bytes=sum(len(m.content.encode("utf-8")) for m in llm_messages),
+                        )
+                    
+                    # Generate response
+                    logger.debug("Generating response", extra={"agent_step": step_number})
+                    with tracer.span("llm.generate") as span:
+                        response = self._backend.generate(
+                            llm_messages,
+                            max_tokens=self._config.max_response_tokens,
+                        )
+                        span.set(output_bytes=len(response.content))
+                    
+                    # Parse tool calls from response (simplified - real implementation would parse JSON)
+                    with tracer.span("tool.parse") as span:
+                        tool_calls = self._parse_tool_calls(response)
+                        span.set(tool_calls=len(tool_calls))
+                    tool_results: List[ToolResult] = []
+                    
+                    # Execute tools if any
+                    queued_at = time.perf_counter()
+                    for tool_call in tool_calls:
+                        queue_ms = (time.perf_counter() - queued_at) * 1000.0
+                        with tracer.span("tool.execute", tool_name=tool_call.name, queue_ms=queue_ms) as span:
+                            result = self._execute_tool(tool_call)
+                            span.set(output_bytes=len(result.output), error=result.error is not None)
+                        tool_results.append(result)
+                        logger.info(
+                            "Executed tool %s%s",
+                            tool_call.name,
+                            f" (error: {result.error})" if result.error else "",
+                            extra={"agent_step": step_number, "tool_name": tool_call.name},
+                        )
+                        
+                        # Add tool result to conversation
+                        tool_result_msg = Message(
+                            role="tool",
+                            content=json.dumps(result.output) if isinstance(result.output, dict) else str(result.output),
+                            name=tool_call.name,
+                        )
+                        self.conversation_history.append(tool_result_msg)
+                
+                # Create step
+                step = AgentStep(
+                    input_messages=llm_messages,
+                    tool_calls=tool_calls,
+                    tool_results=tool_results,
+                    output_message=response,
+                )
+                steps.append(step)
+                
+                # Add response to conversation
+                self.conversation_history.append(response)
+                self.memory.add(f"Assistant: {response.content}")
+                
+                # If no tool calls, we're done
+                if not tool_calls:
+                    break
             
-            # If no tool calls, we're done
-            if not tool_calls:
-                break
+            run_span.set(iterations=len(steps))
         
         # Extract final answer
         final_answer = steps[-1].output_message.content if steps else "No response generated"
@@ -262,6 +530,7 @@ class AgentEnhanced:
         tool = self.tools.get_tool(tool_call.name)
         
         if not tool:
+            TOOL_CALLS.inc(tool=tool_call.name, status="not_found")
             return ToolResult(
                 call_id=tool_call.id,
                 output="",
@@ -275,25 +544,68 @@ class AgentEnhanced:
             # Format result
             if isinstance(result, dict):
                 if "error" in result:
+                    TOOL_CALLS.inc(tool=tool_call.name, status="error")
                     return ToolResult(
                         call_id=tool_call.id,
                         output="",
                         error=result["error"],
                     )
                 else:
+                    TOOL_CALLS.inc(tool=tool_call.name, status="ok")
                     return ToolResult(
                         call_id=tool_call.id,
-                        output=json.dumps(result),
+                        output=self._bound_tool_output(tool_call.name, json.dumps(result)),
                     )
             else:
+                TOOL_CALLS.inc(tool=tool_call.name, status="ok")
                 return ToolResult(
                     call_id=tool_call.id,
-                    output=str(result),
+                    output=self._bound_tool_output(tool_call.name, str(result)),
                 )
         except Exception as e:
+            TOOL_CALLS.inc(tool=tool_call.name, status="error")
             return ToolResult(
                 call_id=tool_call.id,
                 output="",
                 error=f"Error executing tool: {e}",
             )
 
+    def _bound_tool_output(self, tool_name: str, output: str) -> str:
+        """Keep a tool message within the configured token budget."""
+        budget = self._config.max_tool_output_tokens
+        count_tokens = getattr(self._backend, "count_tokens", None)
+        text, truncated = fit_to_budget(output, budget, count_tokens)
+        if not truncated:
+            return output
+        
+        # Keep the full output available for paging
+        handle = self.output_store.put_text(output)
+        if self._config.summarize_tool_output:
+            summary = self._summarize_tool_output(tool_name, output, budget, count_tokens)
+            if summary:
+                return (
+                    f"[Summary of {len(output)}-character output; "
+                    f"full text via read_tool_output(handle='{handle}')]\n{summary}"
+                )
+        text, _ = fit_to_budget(output, budget, count_tokens, handle=handle)
+        return text
+
+    def _summarize_tool_output(self, tool_name: str, output: str, budget: int, count_tokens) -> str:
+        """Ask the backend for a summary of an over-budget tool output."""
+        # The summarizer sees a bounded window of the output, never all of it
+        window, _ = fit_to_budget(output, budget * 4, count_tokens)
+        messages = [
+            Message(
+                role="system",
+                content=(
+                    f"Summarize the output of the '{tool_name}' tool. Keep errors, "
+                    "numbers, paths and names that a later step may need."
+                ),
+            ),
+            Message(role="user", content=window),
+        ]
+        try:
+            return self._backend.generate(messages, max_tokens=budget).content.strip()
+        except Exception as e:
+            logger.warning("Tool output summarization failed: %s", e, extra={"tool_name": tool_name})
+            return ""
@@ -1,15 +1,35 @@
 """
 UI automation tools for mouse and keyboard control.
 
-Provides xdotool-based automation for clicking, typing, and key combinations.
+Provides xdotool-based automation for clicking, typing, and key combinations,
+plus waits on X11 window events (see agent.x11.events) so UI flows wait for
+windows and focus changes instead of sleeping, and window/accessibility tree
+snapshots (see agent.x11.tree) for finding controls without OCR.
 """
 
 from __future__ import annotations
 
 import os
+import re
+import shutil
 import subprocess
 import time
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from .x11.clipboard import SelectionOwner
+from .x11.events import WindowEventMonitor, get_monitor
+from .x11.tree import UISnapshot, UITree
+
+
+T = TypeVar("T")
+
+# Polling period when window events are unavailable (no python-xlib)
+POLL_INTERVAL = 0.05
+
+# type_text pastes text of at least this many characters
+PASTE_MIN_CHARS = 32
+# Seconds to wait for the focused window to fetch pasted text
+PASTE_CONFIRM_TIMEOUT = 1.0
 
 
 class AutomationTools:
@@ -17,21 +37,50 @@ class AutomationTools:
     UI automation using xdotool for mouse and keyboard control.
     """
 
-    def __init__(self, display: Optional[str] = None) -> None:
+    def __init__(
+        self,
+        display: Optional[str] = None,
+        events: Optional[WindowEventMonitor] = None,
+        runner: Optional[Callable[..., Dict[str, Any]]] = None,
+    ) -> None:
         """
         Initialize automation tools.
 
         Args:
             display: X11 display (e.g., ":0"). Auto-detects if None.
+            events: Window event monitor (the display's shared one, started on
+                first wait, if None)
+            runner: Runs xdotool elsewhere, called as runner(args=..., timeout=...)
+                like run_xdotool, e.g. in a tool worker (in this process if None)
         """
         self.display = display or os.environ.get("DISPLAY", ":0")
-
-    def _run_xdotool(self, args: List[str]) -> Dict[str, Any]:
+        self._events = events
+        self.runner = runner
+        self._clipboard: Optional[SelectionOwner] = None
+        self._tree: Optional[UITree] = None
+        self._tree_seen: Dict[Optional[int], UISnapshot] = {}  # Last tree returned, for diffs
+
+    def _monitor(self) -> Optional[WindowEventMonitor]:
+        """Window event monitor, or None if events are unavailable."""
+        if self._events is None:
+            try:
+                self._events = get_monitor(self.display)
+            except RuntimeError:
+                return None
+        return self._events
+
+    def _run_xdotool(self, args: List[str], timeout: float = 10) -> Dict[str, Any]:
+        if self.runner is not None:
+            return self.runner(args=args, timeout=timeout)
+        return self.run_xdotool(args, timeout)
+
+    def run_xdotool(self, args: List[str], timeout: float = 10) -> Dict[str, Any]:
         """
-        Run xdotool command.
+        Run xdotool command in this process.
 
         Args:
             args: Command arguments
+            timeout: Seconds before the command is abandoned
 
         Returns:
             Dict with 'success' and optionally 'output', or 'error'
@@ -41,7 +90,7 @@ class AutomationTools:
                 ["xdotool"] + args,
                 capture_output=True,
                 text=True,
-                timeout=10,
+                timeout=timeout,
                 env={**os.environ, "DISPLAY": self.display},
             )
 
@@ -105,18 +154,71 @@ class AutomationTools:
         """
         return self._run_xdotool(["mousemove", str(x), str(y)])
 
-    def type_text(self, text: str, delay: int = 12) -> Dict[str, Any]:
+    def type_text(self, text: str, delay: int = 12, method: str = "auto") -> Dict[str, Any]:
         """
-        Type text at current focus.
+        Enter text at current focus.
 
         Args:
-            text: Text to type
-            delay: Delay between keystrokes in milliseconds
+            text: Text to enter
+            delay: Delay between keystrokes in milliseconds when typing
+            method: "paste" (through a clipboard owned by this process),
+                "type" (one key event per character), or "auto": paste text
+                of PASTE_MIN_CHARS or more and type it, without delay, if the
+                focused window does not fetch the clipboard
 
         Returns:
-            Dict with 'success' or 'error'
+            Dict with 'success' and 'method' ("paste" or "type"), or 'error'
         """
-        return self._run_xdotool(["type", "--delay", str(delay), text])
+        if method not in ("auto", "paste", "type"):
+            return {"error": "method must be 'auto', 'paste' or 'type'"}
+        if method == "paste" or (method == "auto" and len(text) >= PASTE_MIN_CHARS):
+            result = self._paste(text)
+            if result is not None:
+                return result
+            if method == "paste":
+                self._restore_clipboard()
+                return {"error": "Focused window did not accept paste (or no clipboard is available)"}
+            delay = 0  # Bulk XTest input
+
+        result = self._run_xdotool(
+            ["type", "--delay", str(delay), "--", text],
+            timeout=10 + len(text) * (delay + 2) / 1000,
+        )
+        # Only now: a late paste of the old contents would land in the target
+        self._restore_clipboard()
+        if "error" in result:
+            return result
+        return {"success": True, "method": "type"}
+
+    def _paste(self, text: str) -> Optional[Dict[str, Any]]:
+        """Paste text; None if it was not pasted and may be typed instead."""
+        if self._clipboard is None:
+            try:
+                self._clipboard = SelectionOwner(self.display)
+            except RuntimeError:
+                return None
+        clipboard = self._clipboard
+        if not clipboard.offer(text):
+            return None
+        # Terminals paste with shift+Insert (PRIMARY or CLIPBOARD, both hold the text)
+        keys = "shift+Insert" if clipboard.active_is_terminal() else "ctrl+v"
+        clipboard.arm()
+        result = self._run_xdotool(["key", "--clearmodifiers", keys])
+        if "error" in result:
+            clipboard.release()
+            clipboard.restore()
+            return result
+        if clipboard.wait_for_paste(PASTE_CONFIRM_TIMEOUT):
+            # The target has the text; give the user's clipboard back
+            clipboard.restore()
+            return {"success": True, "method": "paste"}
+        # Nobody fetched the text; drop it so a late paste cannot duplicate it
+        clipboard.release()
+        return None
+
+    def _restore_clipboard(self) -> None:
+        if self._clipboard is not None:
+            self._clipboard.restore()
 
     def press_key(self, key: str) -> Dict[str, Any]:
         """
@@ -134,6 +236,8 @@ class AutomationTools:
         """
         Press multiple keys in sequence.
 
+        The keys go to one xdotool invocation, which paces them itself.
+
         Args:
             keys: List of key names
             delay: Delay between key presses in milliseconds
@@ -141,13 +245,11 @@ class AutomationTools:
         Returns:
             Dict with 'success' or 'error'
         """
-        for key in keys:
-            result = self.press_key(key)
-            if "error" in result:
-                return result
-            if delay > 0:
-                time.sleep(delay / 1000.0)
-
+        if not keys:
+            return {"success": True}
+        result = self._run_xdotool(["key", "--delay", str(delay)] + list(keys))
+        if "error" in result:
+            return result
         return {"success": True}
 
     def get_mouse_location(self) -> Dict[str, Any]:
@@ -198,3 +300,220 @@ class AutomationTools:
 
         window_ids = result["output"].split("\n") if result["output"] else []
         return {"window_ids": [wid for wid in window_ids if wid]}
+
+    def _ui_tree(self) -> UITree:
+        if self._tree is None:
+            monitor = self._monitor()
+            self._tree = UITree(self.display, monitor.log if monitor is not None else None)
+        return self._tree
+
+    @staticmethod
+    def _window_arg(window_id: Optional[str]) -> Optional[int]:
+        # search_window returns decimal ids, the tree hex ones
+        return int(window_id, 0) if window_id else None
+
+    def get_ui_tree(
+        self,
+        window_id: Optional[str] = None,
+        diff: bool = False,
+        max_depth: int = 12,
+        newer_than: float = 0.0,
+    ) -> Dict[str, Any]:
+        """
+        Snapshot the window and accessibility trees.
+
+        Args:
+            window_id: Only this top-level window (all windows if None)
+            diff: Return only the changes since the last tree returned for
+                the same window
+            max_depth: Accessibility levels below each window
+            newer_than: Epoch time a cached snapshot must be newer than
+                (e.g. of the last input action)
+
+        Returns:
+            Dict with 'tree' (one line per element) and 'elements', or with
+            'added', 'removed' and 'changed' if diff is set, or 'error'
+        """
+        try:
+            window = self._window_arg(window_id)
+        except ValueError:
+            return {"error": f"Invalid window id: {window_id}"}
+        try:
+            snapshot = self._ui_tree().snapshot(window, max_depth, newer_than)
+        except RuntimeError as e:
+            return {"error": str(e)}
+        if window is not None and not snapshot.nodes:
+            return {"error": f"Window not found: {window_id}"}
+
+        previous = self._tree_seen.get(window)
+        self._tree_seen[window] = snapshot
+        if diff and previous is not None:
+            return {"success": True, **snapshot.diff(previous), "truncated": snapshot.truncated}
+        return {
+            "success": True,
+            "tree": snapshot.render(),
+            "elements": len(snapshot.nodes),
+            "truncated": snapshot.truncated,
+        }
+
+    def get_ui_elements(self, window_id: Optional[str] = None, newer_than: float = 0.0,
+                        active_only: bool = False) -> Dict[str, Any]:
+        """
+        List the elements of the (cached) UI tree as dicts.
+
+        Args:
+            window_id: Only this top-level window (all windows if None)
+            newer_than: As for get_ui_tree
+            active_only: Only the focused window (none if it is unknown).
+                Elements of covered windows still report "showing", so
+                this is what is actually visible to click.
+
+        Returns:
+            Dict with 'elements' (id, role, name, bounds, center, states), or 'error'
+        """
+        try:
+            snapshot = self._ui_tree().snapshot(self._window_arg(window_id), newer_than=newer_than)
+        except ValueError:
+            return {"error": f"Invalid window id: {window_id}"}
+        except RuntimeError as e:
+            return {"error": str(e)}
+        nodes = list(snapshot.nodes.values())
+        if active_only:
+            active = next((n.id for n in nodes if n.role == "window" and "focused" in n.states), None)
+            nodes = [n for n in nodes if active is not None and (n.id == active or n.id.startswith(active + "."))]
+        return {"success": True, "elements": [node.to_dict() for node in nodes]}
+
+    def find_ui_element(
+        self,
+        name: str,
+        role: Optional[str] = None,
+        window_id: Optional[str] = None,
+        limit: int = 10,
+        newer_than: float = 0.0,
+    ) -> Dict[str, Any]:
+        """
+        Find windows and controls by name in the (cached) UI tree.
+
+        Args:
+            name: Name pattern (case-insensitive regex)
+            role: Exact role, e.g. "push button" or "window"
+            window_id: Only search this top-level window
+            limit: Maximum number of matches
+            newer_than: As for get_ui_tree
+
+        Returns:
+            Dict with 'elements' (id, role, name, bounds, center, states), or 'error'
+        """
+        try:
+            pattern = re.compile(name, re.IGNORECASE)
+            window = self._window_arg(window_id)
+        except re.error as e:
+            return {"error": f"Invalid name pattern: {e}"}
+        except ValueError:
+            return {"error": f"Invalid window id: {window_id}"}
+        try:
+            snapshot = self._ui_tree().snapshot(window, newer_than=newer_than)
+        except RuntimeError as e:
+            return {"error": str(e)}
+        matches = snapshot.find(pattern, role or None)
+        if not matches:
+            return {"error": f"No element matching '{name}'" + (f" with role '{role}'" if role else "")}
+        return {
+            "success": True,
+            "elements": [node.to_dict() for node in matches[:limit]],
+            "total": len(matches),
+        }
+
+    @staticmethod
+    def _poll(check: Callable[[], Optional[T]], timeout: float) -> Optional[T]:
+        deadline = time.monotonic() + timeout
+        while True:
+            result = check()
+            if result is not None or time.monotonic() >= deadline:
+                return result
+            time.sleep(POLL_INTERVAL)
+
+    def wait_for_window(self, name: str, timeout: float = 10.0) -> Dict[str, Any]:
+        """
+        Wait until a window whose title matches a pattern exists.
+
+        Returns at once if such a window is already open.
+
+        Args:
+            name: Window title pattern (case-insensitive regex, as search_window)
+            timeout: Seconds to wait
+
+        Returns:
+            Dict with 'window_id', 'title' and 'waited' (seconds), or 'error'
+        """
+        try:
+            pattern = re.compile(name, re.IGNORECASE)
+        except re.error as e:
+            return {"error": f"Invalid window name pattern: {e}"}
+
+        started = time.monotonic()
+        monitor = self._monitor()
+        if monitor is not None:
+            found = monitor.log.wait_for_window(pattern, timeout)
+        elif shutil.which("xdotool") is None:
+            return {"error": "Window events unavailable and xdotool not found"}
+        else:
+            def check():
+                result = self.search_window(name)
+                ids = result.get("window_ids")
+                if not ids:
+                    return None
+                title = self._run_xdotool(["getwindowname", ids[0]]).get("output")
+                return int(ids[0]), title
+            found = self._poll(check, timeout)
+
+        if found is None:
+            return {"error": f"No window matching '{name}' appeared within {timeout} seconds"}
+        window, title = found
+        return {
+            "success": True,
+            "window_id": str(window),
+            "title": title,
+            "waited": round(time.monotonic() - started, 3),
+        }
+
+    def wait_for_focus_change(self, timeout: float = 5.0, since: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Wait until keyboard focus moves to another window.
+
+        Args:
+            timeout: Seconds to wait
+            since: Epoch time after which a change counts (now if None), so
+                a change caused by an earlier action is not missed
+
+        Returns:
+            Dict with 'window_id', 'title' and 'waited' (seconds), or 'error'
+        """
+        started = time.monotonic()
+        since = time.time() if since is None else since
+        monitor = self._monitor()
+        if monitor is not None:
+            event = monitor.log.wait_for_focus(since, timeout)
+            found = (event.window, event.title) if event is not None else None
+        elif shutil.which("xdotool") is None:
+            return {"error": "Window events unavailable and xdotool not found"}
+        else:
+            # Polling cannot see changes from before the call
+            initial = self._run_xdotool(["getactivewindow"]).get("output")
+
+            def check():
+                current = self._run_xdotool(["getactivewindow"]).get("output")
+                if not current or current == initial:
+                    return None
+                return int(current), self._run_xdotool(["getwindowname", current]).get("output")
+            found = self._poll(check, timeout)
+
+        if found is None:
+            return {"error": f"Focus did not change within {timeout} seconds"}
+        window, title = found
+        return {
+            "success": True,
+            "window_id": str(window),
+            "title": title,
+            "waited": round(time.monotonic() - started, 3),
+        }
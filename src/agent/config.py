@@ -3,12 +3,22 @@ Global Configuration for AgentOS.
 """
 
 from dataclasses import dataclass
+from typing import Optional
 import os
 
+
+def _optional_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
 @dataclass
 class Config:
     # LLM Settings
     model_path: str = os.getenv("AGENT_MODEL_PATH", "models/mistral-7b-instruct-v0.2.Q4_K_M.gguf")
+    fast_model_path: str = os.getenv("AGENT_FAST_MODEL_PATH", "")  # Small model for tool steps (routed)
+    fast_model_max_prompt_tokens: int = int(os.getenv("AGENT_FAST_MODEL_MAX_PROMPT", "3072"))
+    model_instances: int = int(os.getenv("AGENT_MODEL_INSTANCES", "1"))  # llama.cpp instances of model_path
     context_window: int = 4096
     max_tokens: int = 1024
     temperature: float = 0.7
@@ -23,6 +33,33 @@ class Config:
     
     # Debug
     debug_mode: bool = True
+    
+    # Observability (0 disables the Prometheus endpoint)
+    metrics_port: int = int(os.getenv("AGENT_METRICS_PORT", "0"))
+    sample_interval: float = float(os.getenv("AGENT_SAMPLE_INTERVAL", "1.0"))  # System sampler period (s)
+    
+    # Limits for commands the agent runs (0 disables a limit)
+    job_cpu_quota: float = float(os.getenv("AGENT_JOB_CPU_QUOTA", "0"))  # CPUs, cgroup only
+    job_memory_mb: Optional[int] = _optional_int("AGENT_JOB_MEMORY_MB")  # Unset: half of RAM
+    job_max_processes: int = int(os.getenv("AGENT_JOB_MAX_PROCS", "512"))
+    job_cpu_seconds: int = int(os.getenv("AGENT_JOB_CPU_SECONDS", "0"))
+    job_nice: int = int(os.getenv("AGENT_JOB_NICE", "10"))
+    job_io_class: str = os.getenv("AGENT_JOB_IO_CLASS", "idle")  # idle, best-effort or empty
+    job_sched_idle: bool = os.getenv("AGENT_JOB_SCHED_IDLE", "0") == "1"
+    cgroup_root: str = os.getenv("AGENT_CGROUP_ROOT", "")  # Delegated cgroup v2 directory
+
+    # Screenshots returned to the model
+    vision_max_width: int = int(os.getenv("AGENT_VISION_MAX_WIDTH", "1280"))  # Vision model input size
+    vision_max_height: int = int(os.getenv("AGENT_VISION_MAX_HEIGHT", "1280"))
+    screenshot_max_kb: int = int(os.getenv("AGENT_SCREENSHOT_MAX_KB", "200"))  # Encoding size target
+    screenshot_inline_kb: int = int(os.getenv("AGENT_SCREENSHOT_INLINE_KB", "16"))  # Larger: frame store handle
+    frame_store_mb: int = int(os.getenv("AGENT_FRAME_STORE_MB", "64"))  # Frames kept in memory
+    frame_spill_mb: int = int(os.getenv("AGENT_FRAME_SPILL_MB", "256"))  # Evicted frames on tmpfs (0: drop)
+
+    # Background screen recording (off unless AgentConfig.record_screen)
+    record_fps: float = float(os.getenv("AGENT_RECORD_FPS", "1.0"))
+    record_max_mb: int = int(os.getenv("AGENT_RECORD_MAX_MB", "32"))  # Ring buffer of encoded frames
+    record_cpu_percent: float = float(os.getenv("AGENT_RECORD_CPU_PERCENT", "5"))  # Of one core
 
 # Global instance
 settings = Config()
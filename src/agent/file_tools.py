@@ -6,10 +6,27 @@ These tools allow the AI to read, write, and manage files with proper safety che
 
 from __future__ import annotations
 
+import fnmatch
+import mmap
 import os
+import re
 import shutil
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
+
+from .fs.allowlist import AllowList
+from .fs.atomic import Content, PatchError, append_file, atomic_write, patch_file
+from .fs.batch import parse_operations, run_batch, validate
+from .fs.grep import compile_pattern, grep_mapped, looks_binary
+from .fs.index import FileIndex
+from .fs.line_index import get_line_index
+from .fs.scanner import DirectoryScanner, get_default_scanner
+from .tools.output import (
+    OutputLimits,
+    OutputStore,
+    omission_marker,
+    default_output_store,
+)
 
 
 class FileTools:
@@ -20,30 +37,80 @@ class FileTools:
     with explicit allowlists for system paths if needed.
     """
 
-    def __init__(self, allowed_paths: List[str] | None = None, home_dir: str | None = None) -> None:
+    def __init__(
+        self,
+        allowed_paths: List[str] | None = None,
+        home_dir: str | None = None,
+        output_limits: Optional[OutputLimits] = None,
+        output_store: Optional[OutputStore] = None,
+        mmap_threshold: int = 1024 * 1024,
+        scanner: Optional[DirectoryScanner] = None,
+        file_index: Optional[FileIndex] = None,
+        index_contents: bool = False,
+    ) -> None:
         """
         Initialize file tools.
 
         Args:
             allowed_paths: List of allowed absolute paths (defaults to home directory)
             home_dir: Home directory path (defaults to $HOME)
+            output_limits: Caps on how much of a file read_file returns inline
+            output_store: Store used to page through truncated reads
+            mmap_threshold: Files at least this large are read through mmap
+            scanner: Cached directory scanner (shared default if None)
+            file_index: Index used by find_files (built over allowed_paths on first use if None)
+            index_contents: Let the built index match contents of small text files
         """
         self.home_dir = Path(home_dir or os.path.expanduser("~"))
         self.allowed_paths = [Path(p) for p in (allowed_paths or [str(self.home_dir)])]
+        self._allow = AllowList(str(p) for p in self.allowed_paths)
+        self.output_limits = output_limits or OutputLimits()
+        self.output_store = output_store or default_output_store
+        self.mmap_threshold = mmap_threshold
+        self.scanner = scanner or get_default_scanner()
+        self.index_contents = index_contents
+        self._file_index = file_index
+
+    @property
+    def file_index(self) -> FileIndex:
+        """Index over the allowed paths (created, not started, on first access)."""
+        if self._file_index is None:
+            self._file_index = FileIndex(
+                [str(p) for p in self.allowed_paths], index_contents=self.index_contents
+            )
+        return self._file_index
 
     def _check_path_allowed(self, path: Path) -> bool:
-        """Check if a path is within allowed directories."""
-        path = path.resolve()
-        return any(path.is_relative_to(allowed) for allowed in self.allowed_paths)
+        """Check if a path (with symlinks resolved) is within allowed directories."""
+        return self._allow.allows(str(path))
 
     def _ensure_path_allowed(self, path: Path) -> None:
         """Raise ValueError if path is not allowed."""
         if not self._check_path_allowed(path):
             raise ValueError(f"Path {path} is not in allowed directories")
 
-    def read_file(self, path: str) -> Dict[str, Any]:
+    def _invalidate_parents(self, *paths: Path) -> None:
+        """Drop cached listings our own changes made stale (inotify is asynchronous)."""
+        for path in paths:
+            self.scanner.invalidate(os.path.dirname(os.path.abspath(path)))
+
+    def read_file(
+        self,
+        path: str,
+        offset: Optional[int] = None,
+        length: Optional[int] = None,
+        start_line: Optional[int] = None,
+        end_line: Optional[int] = None,
+    ) -> Dict[str, Any]:
         """
-        Read file contents.
+        Read file contents, optionally only a byte or line range.
+
+        Args:
+            path: File path
+            offset: Byte offset to start reading at
+            length: Maximum number of bytes to read
+            start_line: First line to read (1-based)
+            end_line: Last line to read (1-based, inclusive)
 
         Returns:
             Dict with 'content' (str) or 'error' (str)
@@ -61,6 +128,13 @@ class FileTools:
             if not file_path.is_file():
                 return {"error": f"Path is not a file: {file_path}"}
 
+            if any(v is not None for v in (offset, length, start_line, end_line)):
+                return self._read_range(file_path, offset, length, start_line, end_line)
+
+            size = file_path.stat().st_size
+            if size > self.output_limits.max_bytes:
+                return self._read_truncated(file_path, size)
+
             with open(file_path, "r", encoding="utf-8") as f:
                 content = f.read()
 
@@ -73,12 +147,238 @@ class FileTools:
         except Exception as e:
             return {"error": f"Error reading file: {e}"}
 
-    def write_file(self, path: str, content: str) -> Dict[str, Any]:
+    def _read_range(
+        self,
+        file_path: Path,
+        offset: Optional[int],
+        length: Optional[int],
+        start_line: Optional[int],
+        end_line: Optional[int],
+    ) -> Dict[str, Any]:
+        """Read a byte or line range, capped at the inline output limit."""
+        max_bytes = self.output_limits.max_bytes
+        result: Dict[str, Any] = {"path": str(file_path)}
+
+        with open(file_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            use_mmap = size >= self.mmap_threshold
+            view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if use_mmap else None
+            try:
+                if start_line is not None or end_line is not None:
+                    index = get_line_index(str(file_path))
+                    if view is None:
+                        view = f.read()
+                    start, end = index.byte_range(start_line or 1, end_line, view)
+                    result.update(
+                        start_line=start_line or 1,
+                        end_line=min(end_line, index.total_lines) if end_line else index.total_lines,
+                        total_lines=index.total_lines,
+                    )
+                else:
+                    start = min(max(offset or 0, 0), size)
+                    end = size if length is None else min(size, start + max(length, 0))
+
+                stop = min(end, start + max_bytes)
+                if view is not None:
+                    data = view[start:stop]
+                else:
+                    f.seek(start)
+                    data = f.read(stop - start)
+            finally:
+                if isinstance(view, mmap.mmap):
+                    view.close()
+
+        result.update(
+            content=data.decode("utf-8", errors="replace"),
+            offset=start,
+            next_offset=stop,
+            size=size,
+            eof=stop >= size,
+        )
+        if stop < end:
+            # Range was larger than the inline limit; continue from next_offset
+            result["truncated"] = True
+        return result
+
+    def grep_file(
+        self, path: str, pattern: str, max_matches: int = 100, ignore_case: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Search a file for lines matching a regular expression.
+
+        Args:
+            path: File path
+            pattern: Regular expression
+            max_matches: Maximum number of matching lines to return
+            ignore_case: Case-insensitive matching
+
+        Returns:
+            Dict with 'matches' (list of line/offset/text dicts) or 'error' (str)
+        """
+        try:
+            file_path = Path(path)
+            if not file_path.is_absolute():
+                file_path = self.home_dir / file_path
+
+            self._ensure_path_allowed(file_path)
+
+            if not file_path.is_file():
+                return {"error": f"File not found: {file_path}"}
+
+            regex = compile_pattern(pattern, ignore_case)
+            matches = grep_mapped(str(file_path), regex, max_matches)
+            return {
+                "matches": matches,
+                "path": str(file_path),
+                "truncated": len(matches) >= max_matches,
+            }
+
+        except re.error as e:
+            return {"error": f"Invalid pattern: {e}"}
+        except ValueError as e:
+            return {"error": str(e)}
+        except PermissionError:
+            return {"error": f"Permission denied: {file_path}"}
+        except Exception as e:
+            return {"error": f"Error searching file: {e}"}
+
+    def search_files(
+        self,
+        path: str,
+        pattern: str,
+        glob: str = "*",
+        max_matches: int = 100,
+        ignore_case: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Search all text files under a directory for a regular expression.
+
+        Args:
+            path: Directory to search recursively
+            pattern: Regular expression
+            glob: Only search files whose name matches this glob
+            max_matches: Maximum number of matching lines to return overall
+            ignore_case: Case-insensitive matching
+
+        Returns:
+            Dict with 'matches' (list of path/line/offset/text dicts) or 'error' (str)
+        """
+        try:
+            root = Path(path)
+            if not root.is_absolute():
+                root = self.home_dir / root
+
+            self._ensure_path_allowed(root)
+
+            if not root.is_dir():
+                return {"error": f"Directory not found: {root}"}
+
+            regex = compile_pattern(pattern, ignore_case)
+            matches: List[Dict[str, Any]] = []
+            files_searched = 0
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+                names = [name for name in sorted(filenames) if fnmatch.fnmatch(name, glob)]
+                paths = [os.path.join(dirpath, name) for name in names]
+                # Symlinked files may point outside the allowed roots
+                for file_path, allowed in zip(paths, self._allow.allows_many(paths)):
+                    if not allowed:
+                        continue
+                    try:
+                        if not os.path.isfile(file_path) or looks_binary(file_path):
+                            continue
+                        found = grep_mapped(file_path, regex, max_matches - len(matches))
+                    except OSError:
+                        continue
+                    files_searched += 1
+                    matches.extend({"path": file_path, **m} for m in found)
+                    if len(matches) >= max_matches:
+                        return {
+                            "matches": matches,
+                            "files_searched": files_searched,
+                            "truncated": True,
+                        }
+
+            return {"matches": matches, "files_searched": files_searched, "truncated": False}
+
+        except re.error as e:
+            return {"error": f"Invalid pattern: {e}"}
+        except ValueError as e:
+            return {"error": str(e)}
+        except PermissionError:
+            return {"error": f"Permission denied: {root}"}
+        except Exception as e:
+            return {"error": f"Error searching files: {e}"}
+
+    def find_files(self, query: str, limit: int = 20, wait: float = 2.0) -> Dict[str, Any]:
+        """
+        Look up files by name, path or (if indexed) content words.
+
+        Args:
+            query: Words to match, e.g. "resume pdf"
+            limit: Maximum number of results
+            wait: Seconds to wait for the initial index crawl to finish
+
+        Returns:
+            Dict with 'results' (list of name/path/type/size/mtime dicts) and
+            'indexing' (True while results may be incomplete), or 'error' (str)
+        """
+        try:
+            index = self.file_index.start()
+            index.wait_ready(wait)
+            found = index.search(query, limit)
+            allowed = self._allow.allows_many(r["path"] for r in found)
+            results = [r for r, ok in zip(found, allowed) if ok]
+            return {"results": results, "indexing": not index.ready}
+        except Exception as e:
+            return {"error": f"Error searching file index: {e}"}
+
+    def _read_truncated(self, file_path: Path, size: int) -> Dict[str, Any]:
+        """Return head and tail windows of a file larger than the inline limit."""
+        head_bytes = int(self.output_limits.max_bytes * self.output_limits.head_fraction)
+        tail_bytes = self.output_limits.max_bytes - head_bytes
+
+        with open(file_path, "rb") as f:
+            head = f.read(head_bytes)
+            f.seek(size - tail_bytes)
+            tail = f.read(tail_bytes)
+
+        handle = self.output_store.register_file(str(file_path))
+        omitted = size - len(head) - len(tail)
+        content = (
+            head.decode("utf-8", errors="replace")
+            + omission_marker(omitted, handle, len(head))
+            + tail.decode("utf-8", errors="replace")
+        )
+        return {
+            "content": content,
+            "path": str(file_path),
+            "truncated": True,
+            "size": size,
+            "handle": handle,
+        }
+
+    def write_file(
+        self,
+        path: str,
+        content: Content,
+        mode: str = "overwrite",
+        durable: bool = True,
+    ) -> Dict[str, Any]:
         """
         Write content to file.
 
+        Overwrites are atomic: content goes to a temporary file that is
+        fsynced and renamed into place.
+
+        Args:
+            path: File path
+            content: Text, bytes or an iterable of chunks (streamed)
+            mode: "overwrite", "append", or "patch" (content is a unified diff)
+            durable: fsync before returning
+
         Returns:
-            Dict with 'success' (bool) and 'path' (str) or 'error' (str)
+            Dict with 'success' (bool), 'path' (str) and 'bytes_written' or 'error' (str)
         """
         try:
             file_path = Path(path)
@@ -87,14 +387,31 @@ class FileTools:
 
             self._ensure_path_allowed(file_path)
 
+            if mode == "patch":
+                if not file_path.is_file():
+                    return {"error": f"File not found: {file_path}"}
+                if not isinstance(content, str):
+                    content = "".join(c.decode("utf-8") if isinstance(c, bytes) else c for c in content)
+                stats = patch_file(str(file_path), content, durable=durable)
+                self._invalidate_parents(file_path)
+                return {"success": True, "path": str(file_path), **stats}
+
+            if mode not in ("overwrite", "append"):
+                return {"error": f"Unknown write mode: {mode} (expected overwrite, append or patch)"}
+
             # Create parent directories if needed
             file_path.parent.mkdir(parents=True, exist_ok=True)
 
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(content)
+            if mode == "append":
+                written = append_file(str(file_path), content, durable=durable)
+            else:
+                written = atomic_write(str(file_path), content, durable=durable)
+            self._invalidate_parents(file_path)
 
-            return {"success": True, "path": str(file_path)}
+            return {"success": True, "path": str(file_path), "bytes_written": written}
 
+        except PatchError as e:
+            return {"error": f"Patch failed: {e}"}
         except ValueError as e:
             return {"error": str(e)}
         except PermissionError:
@@ -102,10 +419,24 @@ class FileTools:
         except Exception as e:
             return {"error": f"Error writing file: {e}"}
 
-    def list_directory(self, path: str) -> Dict[str, Any]:
+    def list_directory(
+        self,
+        path: str,
+        depth: int = 0,
+        pattern: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = 1000,
+    ) -> Dict[str, Any]:
         """
         List directory contents.
 
+        Args:
+            path: Directory path
+            depth: Levels of subdirectories to include (0 = this directory only)
+            pattern: Only return entries whose name matches this glob
+            offset: Number of entries to skip (for paging)
+            limit: Maximum number of entries to return
+
         Returns:
             Dict with 'entries' (list of dicts) or 'error' (str)
         """
@@ -122,18 +453,13 @@ class FileTools:
             if not dir_path.is_dir():
                 return {"error": f"Path is not a directory: {dir_path}"}
 
-            entries = []
-            for item in sorted(dir_path.iterdir()):
-                entries.append(
-                    {
-                        "name": item.name,
-                        "path": str(item),
-                        "type": "directory" if item.is_dir() else "file",
-                        "size": item.stat().st_size if item.is_file() else None,
-                    }
-                )
-
-            return {"entries": entries, "path": str(dir_path)}
+            listing = self.scanner.scan(
+                os.path.abspath(dir_path), depth=depth, pattern=pattern, offset=offset, limit=limit
+            )
+            result = {"entries": listing["entries"], "path": str(dir_path), "total": listing["total"]}
+            if listing["next_offset"] is not None:
+                result["next_offset"] = listing["next_offset"]
+            return result
 
         except ValueError as e:
             return {"error": str(e)}
@@ -165,6 +491,7 @@ class FileTools:
                 return {"error": f"Source file not found: {src_path}"}
 
             shutil.move(str(src_path), str(dst_path))
+            self._invalidate_parents(src_path, dst_path)
 
             return {"success": True, "src": str(src_path), "dst": str(dst_path)}
 
@@ -175,6 +502,53 @@ class FileTools:
         except Exception as e:
             return {"error": f"Error moving file: {e}"}
 
+    def batch_file_ops(
+        self,
+        operations: List[Dict[str, Any]],
+        dry_run: bool = False,
+        rollback: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Run many move/copy/delete/mkdir operations in one call.
+
+        All paths are validated before anything runs; if any operation is
+        invalid, nothing is done.
+
+        Args:
+            operations: Dicts like {"op": "move", "src": ..., "dst": ...},
+                {"op": "copy", "src": ..., "dst": ..., "overwrite": true},
+                {"op": "delete", "path": ...} or {"op": "mkdir", "path": ...}
+            dry_run: Only validate and return the plan
+            rollback: Undo completed operations if any operation fails
+
+        Returns:
+            Dict with 'success' and 'results' (per operation), or 'error' and 'errors'
+        """
+        try:
+            def resolve(path: str) -> str:
+                full = Path(path)
+                if not full.is_absolute():
+                    full = self.home_dir / full
+                return str(full)
+
+            ops, errors = parse_operations(operations, resolve)
+            errors += validate(ops, self._allow)
+            if errors:
+                errors.sort(key=lambda e: e["index"])
+                return {"error": f"{len(errors)} invalid operation(s); nothing was changed", "errors": errors}
+
+            if dry_run:
+                for op in ops:
+                    op.status = "planned"
+                return {"success": True, "dry_run": True, "results": [op.describe() for op in ops]}
+
+            result = run_batch(ops, rollback=rollback)
+            self.scanner.invalidate()
+            return result
+
+        except Exception as e:
+            return {"error": f"Error running batch: {e}"}
+
     def delete_file(self, path: str) -> Dict[str, Any]:
         """
         Delete a file or directory.
@@ -194,8 +568,10 @@ class FileTools:
 
             if file_path.is_dir():
                 shutil.rmtree(file_path)
+                self.scanner.invalidate()
             else:
                 file_path.unlink()
+                self._invalidate_parents(file_path)
 
             return {"success": True, "path": str(file_path)}
 
@@ -0,0 +1,159 @@
+"""
+Allow-list matching for file tool paths.
+
+``Path.resolve()`` costs an ``lstat`` (and possibly a ``readlink``) per path
+component, and the old check then compared the result against every allowed
+root. Here the allowed roots are resolved once into a component trie, and the
+resolved form of each parent directory is cached, so checking a path costs one
+``stat`` of its parent (to validate the cache entry) plus one ``lstat`` of the
+leaf (to follow a symlinked leaf).
+
+Cache entries are keyed by the parent path string and validated against the
+parent's (st_dev, st_ino): if the string now leads to a different directory
+(a component was replaced by a symlink, or the tree was moved), the entry is
+resolved again. Entries also expire after ``ttl`` seconds, which bounds the
+window for swaps the inode check cannot see (a directory moved out of the
+tree and symlinked back under its old name).
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ..metrics import CACHE_REQUESTS
+
+
+_END = object()  # Trie node marker: an allowed root ends here
+
+
+def _components(path: str) -> List[str]:
+    return [c for c in path.split(os.sep) if c]
+
+
+def _absolute(path: str) -> str:
+    # Unlike os.path.abspath this keeps ".." components for resolve() to see
+    return path if os.path.isabs(path) else os.path.join(os.getcwd(), path)
+
+
+class AllowList:
+    """
+    Decides whether paths fall under a set of allowed roots.
+
+    Args:
+        roots: Allowed directories
+        max_cached_dirs: Maximum number of resolved parent directories kept
+        ttl: Seconds a resolved parent directory may be reused
+    """
+
+    def __init__(self, roots: Iterable[str], max_cached_dirs: int = 4096, ttl: float = 1.0) -> None:
+        self.max_cached_dirs = max_cached_dirs
+        self.ttl = ttl
+        self._trie: Dict[object, object] = {}
+        for root in roots:
+            absolute = os.path.abspath(root)
+            # The literal root and its resolved form are both allowed, like
+            # the old is_relative_to check against the configured path
+            for form in {absolute, os.path.realpath(absolute)}:
+                self._insert(form)
+        self._cache: "OrderedDict[str, Tuple[str, Tuple[int, int], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _insert(self, path: str) -> None:
+        node = self._trie
+        for part in _components(path):
+            node = node.setdefault(part, {})
+        node[_END] = True
+
+    def contains(self, resolved: str) -> bool:
+        """Check an already resolved absolute path against the trie."""
+        node = self._trie
+        if _END in node:
+            return True
+        for part in _components(resolved):
+            node = node.get(part)
+            if node is None:
+                return False
+            if _END in node:
+                return True
+        return False
+
+    def _resolve_parent(self, parent: str) -> str:
+        try:
+            st = os.stat(parent)
+        except OSError:
+            # Missing parent: nothing to cache, resolve() semantics apply
+            return os.path.realpath(parent)
+        identity = (st.st_dev, st.st_ino)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(parent)
+            if cached is not None and cached[1] == identity and now - cached[2] < self.ttl:
+                self._cache.move_to_end(parent)
+                CACHE_REQUESTS.inc(cache="path_allowlist", result="hit")
+                return cached[0]
+        CACHE_REQUESTS.inc(cache="path_allowlist", result="miss")
+        resolved = os.path.realpath(parent)
+        with self._lock:
+            self._cache[parent] = (resolved, identity, now)
+            self._cache.move_to_end(parent)
+            while len(self._cache) > self.max_cached_dirs:
+                self._cache.popitem(last=False)
+        return resolved
+
+    def resolve(self, path: str, parent_resolved: Optional[str] = None) -> str:
+        """
+        Resolve a path like ``os.path.realpath``, reusing cached parents.
+
+        Args:
+            path: Absolute path
+            parent_resolved: Resolved parent directory, if already known
+        """
+        parts = path.split(os.sep)
+        if ".." in parts:
+            # ".." after a symlink must be applied to the link target, so
+            # lexical shortcuts are unsafe here
+            return os.path.realpath(path)
+        path = os.path.normpath(path)
+        parent, name = os.path.split(path)
+        if not name:
+            return os.path.realpath(path)
+        if parent_resolved is None:
+            parent_resolved = self._resolve_parent(parent)
+        candidate = os.path.join(parent_resolved, name)
+        if os.path.islink(candidate):
+            return os.path.realpath(candidate)
+        return candidate
+
+    def allows(self, path: str) -> bool:
+        """Check whether a path (resolved through any symlinks) is allowed."""
+        return self.contains(self.resolve(_absolute(path)))
+
+    def allows_many(self, paths: Iterable[str]) -> List[bool]:
+        """
+        Check many paths, resolving each distinct parent directory once.
+
+        Returns:
+            One bool per input path, in order
+        """
+        paths = [_absolute(p) for p in paths]
+        by_parent: Dict[str, List[int]] = defaultdict(list)
+        results = [False] * len(paths)
+        for i, path in enumerate(paths):
+            if ".." in path.split(os.sep):
+                results[i] = self.contains(os.path.realpath(path))
+            else:
+                by_parent[os.path.dirname(os.path.normpath(path))].append(i)
+        for parent, indexes in by_parent.items():
+            parent_resolved = self._resolve_parent(parent)
+            for i in indexes:
+                results[i] = self.contains(self.resolve(paths[i], parent_resolved))
+        return results
+
+    def clear(self) -> None:
+        """Drop all cached parent resolutions."""
+        with self._lock:
+            self._cache.clear()
@@ -0,0 +1,327 @@
+"""
+Crash-safe file writes.
+
+Whole-file writes go to a temporary file in the target's directory, are
+fsynced and then renamed over the target, so readers see either the old or
+the new content and a crash never leaves a half-written file. Content may be
+a string, bytes or an iterable of chunks, so large payloads never have to
+exist as one Python string.
+
+Patches (unified diffs) are applied the same way, but the unchanged byte
+ranges between hunks are copied with ``os.copy_file_range``: on filesystems
+with reflinks (btrfs, XFS) those ranges share extents with the old file
+instead of being rewritten, and elsewhere the copy stays in the kernel.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import re
+import stat
+import tempfile
+from dataclasses import dataclass, field
+from typing import IO, Any, Dict, Iterable, List, Tuple, Union
+
+from .line_index import get_line_index
+
+
+Content = Union[str, bytes, Iterable[Union[str, bytes]]]
+
+
+def _current_umask() -> int:
+    # /proc avoids briefly setting a process-wide umask of 0 while other
+    # threads may be creating files
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError):
+        pass
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return umask
+
+
+# Mode for new files, as open() would create them
+NEW_FILE_MODE = 0o666 & ~_current_umask()
+
+
+class PatchError(ValueError):
+    """A diff is malformed or does not match the file."""
+
+
+def _chunks(content: Content, encoding: str) -> Iterable[bytes]:
+    if isinstance(content, bytes):
+        yield content
+    elif isinstance(content, str):
+        yield content.encode(encoding)
+    else:
+        for chunk in content:
+            yield chunk if isinstance(chunk, bytes) else chunk.encode(encoding)
+
+
+def _fsync_dir(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class AtomicWriter:
+    """
+    Writes a replacement for a file and swaps it in on commit.
+
+    Use as a context manager: the file is replaced when the block exits
+    normally and the temporary file is removed if it raises.
+
+    Args:
+        path: File to replace (a symlink is followed, not replaced)
+        durable: fsync the data and the directory entry
+    """
+
+    def __init__(self, path: str, durable: bool = True) -> None:
+        self.path = os.path.realpath(path)
+        self.durable = durable
+        self.bytes_written = 0
+        self.bytes_copied = 0
+        directory, name = os.path.split(self.path)
+        fd, self._tmp = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+        self._file: IO[bytes] = os.fdopen(fd, "wb")
+
+    def write(self, data: bytes) -> None:
+        self._file.write(data)
+        self.bytes_written += len(data)
+
+    def copy_range(self, src_fd: int, offset: int, length: int) -> None:
+        """Append length bytes of src_fd starting at offset, without a userspace copy."""
+        if length <= 0:
+            return
+        self._file.flush()
+        dst_fd = self._file.fileno()
+        end = offset + length
+        copy = getattr(os, "copy_file_range", None)
+        while offset < end:
+            if copy is not None:
+                try:
+                    n = copy(src_fd, dst_fd, end - offset, offset)
+                except OSError:
+                    copy = None  # e.g. EXDEV or unsupported: fall back below
+                    continue
+            else:
+                data = os.pread(src_fd, min(end - offset, 1024 * 1024), offset)
+                n = os.write(dst_fd, data) if data else 0
+            if n == 0:
+                raise OSError(f"Unexpected end of file copying {length} bytes at offset {offset}")
+            offset += n
+        self.bytes_copied += length
+
+    def commit(self) -> None:
+        self._file.flush()
+        try:
+            st = os.stat(self.path)
+            os.chmod(self._tmp, stat.S_IMODE(st.st_mode))
+            if hasattr(os, "chown"):
+                try:
+                    os.chown(self._tmp, st.st_uid, st.st_gid)
+                except PermissionError:
+                    pass
+        except FileNotFoundError:
+            os.chmod(self._tmp, NEW_FILE_MODE)
+        if self.durable:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp, self.path)
+        if self.durable:
+            _fsync_dir(os.path.dirname(self.path))
+
+    def abort(self) -> None:
+        self._file.close()
+        try:
+            os.unlink(self._tmp)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "AtomicWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+def atomic_write(path: str, content: Content, durable: bool = True, encoding: str = "utf-8") -> int:
+    """
+    Replace a file's content atomically.
+
+    Returns:
+        Number of bytes written
+    """
+    with AtomicWriter(path, durable) as writer:
+        for chunk in _chunks(content, encoding):
+            writer.write(chunk)
+    return writer.bytes_written
+
+
+def append_file(path: str, content: Content, durable: bool = True, encoding: str = "utf-8") -> int:
+    """
+    Append to a file (created if missing).
+
+    Existing bytes are never rewritten; a crash can at worst lose part of
+    the appended tail.
+
+    Returns:
+        Number of bytes written
+    """
+    written = 0
+    with open(path, "ab") as f:
+        for chunk in _chunks(content, encoding):
+            f.write(chunk)
+            written += len(chunk)
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+    return written
+
+
+_HUNK = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+@dataclass
+class Hunk:
+    """One hunk of a unified diff."""
+
+    old_start: int
+    old_count: int
+    new_start: int
+    new_count: int
+    lines: List[Tuple[str, str]] = field(default_factory=list)  # (" "|"-"|"+", text)
+    new_eof_without_newline: bool = False
+
+
+def parse_unified_diff(diff: str) -> List[Hunk]:
+    """
+    Parse the hunks of a single-file unified diff.
+
+    File headers (---/+++, diff, index) are ignored.
+
+    Raises:
+        PatchError: If a hunk is malformed or the diff has no hunks
+    """
+    hunks: List[Hunk] = []
+    lines = diff.split("\n")
+    if lines and lines[-1] == "":
+        lines.pop()
+    i = 0
+    while i < len(lines):
+        m = _HUNK.match(lines[i])
+        i += 1
+        if not m:
+            continue
+        hunk = Hunk(
+            int(m.group(1)),
+            1 if m.group(2) is None else int(m.group(2)),
+            int(m.group(3)),
+            1 if m.group(4) is None else int(m.group(4)),
+        )
+        old_seen = new_seen = 0
+        while i < len(lines) and (old_seen < hunk.old_count or new_seen < hunk.new_count):
+            line = lines[i].rstrip("\r")
+            i += 1
+            tag, text = (line[0], line[1:]) if line else (" ", "")
+            if tag == "\\":
+                continue
+            if tag not in " -+":
+                raise PatchError(f"Unexpected line in hunk at line {hunk.old_start}: {line!r}")
+            hunk.lines.append((tag, text))
+            if tag != "+":
+                old_seen += 1
+            if tag != "-":
+                new_seen += 1
+        if old_seen != hunk.old_count or new_seen != hunk.new_count:
+            raise PatchError(f"Hunk at line {hunk.old_start} is truncated")
+        if i < len(lines) and lines[i].startswith("\\") and hunk.lines and hunk.lines[-1][0] == "+":
+            hunk.new_eof_without_newline = True
+        hunks.append(hunk)
+    if not hunks:
+        raise PatchError("No hunks found in diff")
+    return hunks
+
+
+def _split_lines(data: bytes) -> List[bytes]:
+    """Split on b"\\n" only, keeping line endings (a lone b"\\r" is content)."""
+    lines = [line + b"\n" for line in data.split(b"\n")]
+    lines[-1] = lines[-1][:-1]
+    return lines if lines[-1] else lines[:-1]
+
+
+def patch_file(path: str, diff: str, durable: bool = True, encoding: str = "utf-8") -> Dict[str, Any]:
+    """
+    Apply a unified diff to a file atomically.
+
+    Hunks must match the file exactly at their stated lines (no fuzz).
+
+    Returns:
+        Dict with 'hunks', 'lines_added', 'lines_removed', 'bytes_written'
+        (new hunk bytes) and 'bytes_copied' (unchanged bytes carried over)
+
+    Raises:
+        PatchError: If the diff does not apply; the file is left untouched
+    """
+    hunks = parse_unified_diff(diff)
+    index = get_line_index(path)
+    added = removed = 0
+
+    with open(path, "rb") as src, AtomicWriter(path, durable) as writer:
+        mm: Any = mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) if index.size else b""
+        try:
+            first = mm[:index.line_offset(1, mm)]
+            eol = b"\r\n" if first.endswith(b"\r\n") else b"\n"
+            fd = src.fileno()
+            pos = 0
+            next_line = 0  # 0-based line after the previous hunk
+            for number, hunk in enumerate(hunks, 1):
+                # "-N,0" means "insert after line N"
+                start = hunk.old_start - 1 if hunk.old_count else hunk.old_start
+                if start < next_line:
+                    raise PatchError(f"Hunk {number} overlaps the previous hunk")
+                if start + hunk.old_count > index.total_lines:
+                    raise PatchError(f"Hunk {number} extends past the end of the file")
+
+                begin = index.line_offset(start, mm)
+                end = index.line_offset(start + hunk.old_count, mm)
+                old = _split_lines(mm[begin:end])
+                expected = [text for tag, text in hunk.lines if tag != "+"]
+                if [line.rstrip(b"\r\n").decode(encoding, errors="replace") for line in old] != expected:
+                    raise PatchError(f"Hunk {number} does not match the file at line {start + 1}")
+
+                writer.copy_range(fd, pos, begin - pos)
+                old_iter = iter(old)
+                for i, (tag, text) in enumerate(hunk.lines):
+                    if tag == " ":
+                        writer.write(next(old_iter))
+                    elif tag == "-":
+                        next(old_iter)
+                        removed += 1
+                    else:
+                        last = i == len(hunk.lines) - 1
+                        writer.write(text.encode(encoding) + (b"" if last and hunk.new_eof_without_newline else eol))
+                        added += 1
+                pos = end
+                next_line = start + hunk.old_count
+            writer.copy_range(fd, pos, index.size - pos)
+        finally:
+            if isinstance(mm, mmap.mmap):
+                mm.close()
+
+    return {
+        "hunks": len(hunks),
+        "lines_added": added,
+        "lines_removed": removed,
+        "bytes_written": writer.bytes_written,
+        "bytes_copied": writer.bytes_copied,
+    }
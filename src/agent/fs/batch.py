@@ -0,0 +1,306 @@
+"""
+Batched file operations.
+
+A batch is validated as a whole before anything touches the disk: every path
+must pass the allow-list, sources must exist (or be created earlier in the
+batch) and destinations must be free. Operations are then grouped by the
+device they act on; each device's operations run in order on one worker,
+and different devices run in parallel.
+
+With ``rollback`` enabled, every step records how to undo itself. Deleted
+and overwritten paths are renamed aside within their own directory (same
+device, so the rename is atomic) and only removed once the whole batch has
+succeeded; on the first failure the remaining operations are skipped and the
+completed ones are undone in reverse order.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .allowlist import AllowList
+
+
+OPERATIONS = ("move", "copy", "delete", "mkdir")
+
+
+@dataclass
+class BatchOp:
+    """One validated operation of a batch."""
+
+    index: int
+    op: str
+    src: Optional[str] = None  # move/copy source
+    dst: Optional[str] = None  # move/copy destination
+    path: Optional[str] = None  # delete/mkdir target
+    overwrite: bool = False
+    device: Optional[int] = None
+    status: str = "pending"
+    error: Optional[str] = None
+    undo: List[Callable[[], None]] = field(default_factory=list)
+    cleanup: List[Callable[[], None]] = field(default_factory=list)
+
+    def describe(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"index": self.index, "op": self.op, "status": self.status}
+        if self.path is not None:
+            result["path"] = self.path
+        else:
+            result["src"], result["dst"] = self.src, self.dst
+        if self.error:
+            result["error"] = self.error
+        return result
+
+
+def _device_of(path: str) -> Optional[int]:
+    """Device of a path, or of its nearest existing ancestor."""
+    while True:
+        try:
+            return os.lstat(path).st_dev
+        except OSError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+
+def parse_operations(
+    operations: List[Dict[str, Any]],
+    resolve: Callable[[str], str],
+) -> Tuple[List[BatchOp], List[Dict[str, Any]]]:
+    """
+    Turn raw operation dicts into BatchOps.
+
+    Args:
+        operations: Dicts with 'op' and 'src'/'dst' (move, copy) or 'path'
+            (delete, mkdir), plus optional 'overwrite'
+        resolve: Maps a user-supplied path to an absolute path
+
+    Returns:
+        (ops, errors) where errors lists per-item problems
+    """
+    ops: List[BatchOp] = []
+    errors: List[Dict[str, Any]] = []
+    for i, raw in enumerate(operations):
+        if not isinstance(raw, dict):
+            errors.append({"index": i, "error": "Operation must be an object"})
+            continue
+        kind = raw.get("op")
+        if kind not in OPERATIONS:
+            errors.append({"index": i, "error": f"Unknown op {kind!r}; expected one of {', '.join(OPERATIONS)}"})
+            continue
+        if kind in ("move", "copy"):
+            if not raw.get("src") or not raw.get("dst"):
+                errors.append({"index": i, "error": f"{kind} needs 'src' and 'dst'"})
+                continue
+            ops.append(BatchOp(i, kind, src=resolve(raw["src"]), dst=resolve(raw["dst"]),
+                               overwrite=bool(raw.get("overwrite", False))))
+        else:
+            if not raw.get("path"):
+                errors.append({"index": i, "error": f"{kind} needs 'path'"})
+                continue
+            ops.append(BatchOp(i, kind, path=resolve(raw["path"])))
+    return ops, errors
+
+
+def validate(ops: List[BatchOp], allow: AllowList) -> List[Dict[str, Any]]:
+    """
+    Check a whole batch before running it.
+
+    Existence is simulated in order, so later operations may rely on paths
+    that earlier ones create or free up. Paths below a created or moved-in
+    directory are checked against the disk as it is now.
+
+    Returns:
+        List of per-item errors (empty if the batch can run)
+    """
+    errors: List[Dict[str, Any]] = []
+    paths = [p for op in ops for p in (op.src, op.dst, op.path) if p is not None]
+    allowed = dict(zip(paths, allow.allows_many(paths)))
+
+    created: Dict[str, bool] = {}  # path -> exists after the ops so far
+
+    def exists(path: str) -> bool:
+        probe = path
+        while True:
+            if probe in created:
+                # A later state of the path or of one of its ancestors wins
+                return created[probe] if probe == path else (created[probe] and os.path.lexists(path))
+            parent = os.path.dirname(probe)
+            if parent == probe:
+                return os.path.lexists(path)
+            probe = parent
+
+    for op in ops:
+        targets = [p for p in (op.src, op.dst, op.path) if p is not None]
+        denied = [p for p in targets if not allowed[p]]
+        if denied:
+            errors.append({"index": op.index, "error": f"Path {denied[0]} is not in allowed directories"})
+            continue
+
+        if op.op in ("move", "copy"):
+            if not exists(op.src):
+                errors.append({"index": op.index, "error": f"Source not found: {op.src}"})
+                continue
+            if op.dst == op.src or op.dst.startswith(op.src.rstrip(os.sep) + os.sep):
+                errors.append({"index": op.index, "error": f"Cannot {op.op} {op.src} into itself"})
+                continue
+            if exists(op.dst) and not op.overwrite:
+                errors.append({"index": op.index, "error": f"Destination exists: {op.dst} (set overwrite)"})
+                continue
+            if not exists(os.path.dirname(op.dst)):
+                errors.append({"index": op.index, "error": f"Destination directory not found: {os.path.dirname(op.dst)}"})
+                continue
+            created[op.dst] = True
+            if op.op == "move":
+                created[op.src] = False
+            op.device = _device_of(op.src)
+            if _device_of(op.dst) != op.device:
+                op.device = None  # Spans devices
+        elif op.op == "delete":
+            if not exists(op.path):
+                errors.append({"index": op.index, "error": f"File not found: {op.path}"})
+                continue
+            created[op.path] = False
+            op.device = _device_of(op.path)
+        else:  # mkdir (with parents)
+            probe = op.path
+            while not exists(probe):
+                created[probe] = True
+                probe = os.path.dirname(probe)
+            op.device = _device_of(op.path)
+    return errors
+
+
+def _aside(path: str, tag: str) -> str:
+    """Rename a path out of the way within its own directory."""
+    parent, name = os.path.split(path)
+    hidden = os.path.join(parent, f".{name}.batch-{tag}")
+    os.rename(path, hidden)
+    return hidden
+
+
+def _remove(path: str) -> None:
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.unlink(path)
+
+
+def _execute(op: BatchOp, rollback: bool, tag: str) -> None:
+    tag = f"{tag}-{op.index}"  # A path may be set aside more than once per batch
+    if op.op == "mkdir":
+        missing = []
+        probe = op.path
+        while not os.path.lexists(probe):
+            missing.append(probe)
+            probe = os.path.dirname(probe)
+        os.makedirs(op.path, exist_ok=True)
+        # Undo runs in reverse, so the deepest directory must come last here
+        op.undo.extend(lambda p=p: os.rmdir(p) for p in reversed(missing))
+        return
+
+    if op.op == "delete":
+        if rollback:
+            hidden = _aside(op.path, tag)
+            op.undo.append(lambda: os.rename(hidden, op.path))
+            op.cleanup.append(lambda: _remove(hidden))
+        else:
+            _remove(op.path)
+        return
+
+    # move / copy
+    if os.path.lexists(op.dst):
+        if rollback:
+            hidden = _aside(op.dst, tag)
+            op.undo.append(lambda: os.rename(hidden, op.dst))
+            op.cleanup.append(lambda: _remove(hidden))
+        else:
+            _remove(op.dst)
+    if op.op == "move":
+        shutil.move(op.src, op.dst)
+        op.undo.append(lambda: shutil.move(op.dst, op.src))
+    else:
+        if os.path.isdir(op.src) and not os.path.islink(op.src):
+            shutil.copytree(op.src, op.dst, symlinks=True)
+        else:
+            shutil.copy2(op.src, op.dst, follow_symlinks=False)
+        op.undo.append(lambda: _remove(op.dst))
+
+
+def run_batch(ops: List[BatchOp], rollback: bool = False, max_workers: int = 4) -> Dict[str, Any]:
+    """
+    Run validated operations.
+
+    Args:
+        ops: Operations accepted by validate()
+        rollback: Undo completed operations if any operation fails
+        max_workers: Maximum number of devices processed in parallel
+
+    Returns:
+        Dict with 'success', 'results' (per item) and 'rolled_back'
+    """
+    # One lane per device, in batch order. If any operation spans devices or
+    # its device is unknown, ordering across lanes matters, so run serially.
+    lanes: Dict[Optional[int], List[BatchOp]] = {}
+    if any(op.device is None for op in ops):
+        lanes[None] = list(ops)
+    else:
+        for op in ops:
+            lanes.setdefault(op.device, []).append(op)
+
+    tag = uuid.uuid4().hex[:8]
+    failed = threading.Event()
+    done: List[BatchOp] = []
+    done_lock = threading.Lock()
+
+    def run_lane(lane: List[BatchOp]) -> None:
+        for op in lane:
+            if failed.is_set() and rollback:
+                op.status = "skipped"
+                continue
+            try:
+                _execute(op, rollback, tag)
+                op.status = "ok"
+                with done_lock:
+                    done.append(op)
+            except Exception as e:
+                op.status = "error"
+                op.error = f"{type(e).__name__}: {e}"
+                failed.set()
+
+    if len(lanes) == 1:
+        run_lane(next(iter(lanes.values())))
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(lanes))) as pool:
+            list(pool.map(run_lane, lanes.values()))
+
+    rolled_back = False
+    if failed.is_set() and rollback:
+        for op in reversed(done):
+            try:
+                for undo in reversed(op.undo):
+                    undo()
+                op.status = "rolled_back"
+            except Exception as e:
+                op.status = "rollback_failed"
+                op.error = f"{type(e).__name__}: {e}"
+        rolled_back = True
+    else:
+        for op in done:
+            for cleanup in op.cleanup:
+                try:
+                    cleanup()
+                except OSError:
+                    pass
+
+    return {
+        "success": not failed.is_set(),
+        "results": [op.describe() for op in sorted(ops, key=lambda o: o.index)],
+        "rolled_back": rolled_back,
+    }
@@ -0,0 +1,75 @@
+"""
+Regex search over memory-mapped files.
+
+The compiled pattern runs directly on the mmap (no copy of the file into a
+Python string), and line numbers come from the cached line index.
+"""
+
+from __future__ import annotations
+
+import mmap
+import re
+from typing import Any, Dict, List, Optional
+
+from .line_index import get_line_index
+
+
+BINARY_SNIFF_BYTES = 8192
+MAX_LINE_CHARS = 500
+
+
+def compile_pattern(pattern: str, ignore_case: bool = False) -> "re.Pattern[bytes]":
+    """Compile a text regex for searching raw file bytes (^ and $ match at lines)."""
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    return re.compile(pattern.encode("utf-8"), flags)
+
+
+def looks_binary(path: str) -> bool:
+    """Heuristic: a NUL byte near the start means binary."""
+    with open(path, "rb") as f:
+        return b"\0" in f.read(BINARY_SNIFF_BYTES)
+
+
+def grep_mapped(
+    path: str,
+    regex: "re.Pattern[bytes]",
+    max_matches: int = 100,
+) -> List[Dict[str, Any]]:
+    """
+    Find matching lines in a file.
+
+    Args:
+        path: File to search
+        regex: Compiled bytes pattern
+        max_matches: Stop after this many matching lines
+
+    Returns:
+        List of dicts with 'line' (1-based), 'offset' and 'text'
+    """
+    matches: List[Dict[str, Any]] = []
+    with open(path, "rb") as f:
+        size = f.seek(0, 2)
+        if size == 0 or max_matches <= 0:
+            return matches
+        index: Optional[Any] = None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = 0
+            while pos < size and len(matches) < max_matches:
+                m = regex.search(mm, pos)
+                if m is None:
+                    break
+                line_start = mm.rfind(b"\n", 0, m.start()) + 1
+                line_end = mm.find(b"\n", m.start())
+                if line_end == -1:
+                    line_end = size
+                if index is None:
+                    index = get_line_index(path)
+                text = mm[line_start:min(line_end, line_start + MAX_LINE_CHARS * 4)]
+                matches.append({
+                    "line": index.line_at(line_start, mm) + 1,
+                    "offset": line_start,
+                    "text": text.decode("utf-8", errors="replace")[:MAX_LINE_CHARS],
+                })
+                # One result per line: continue after this line
+                pos = line_end + 1
+    return matches
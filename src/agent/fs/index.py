@@ -0,0 +1,355 @@
+"""
+Background filesystem index backed by SQLite FTS5.
+
+The indexer crawls a set of root directories once, then keeps the index
+current from inotify events (or periodic rescans where inotify is not
+available). Queries match path components and basenames, and optionally the
+contents of small text files, in a single indexed lookup.
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..logging_config import get_logger
+from .grep import looks_binary
+from .inotify import (
+    IN_CLOSE_WRITE,
+    IN_CREATE,
+    IN_DELETE,
+    IN_DELETE_SELF,
+    IN_ISDIR,
+    IN_MOVE_SELF,
+    IN_MOVED_FROM,
+    IN_MOVED_TO,
+    IN_ONLYDIR,
+    InotifyWatcher,
+)
+
+
+logger = get_logger("fs.index")
+
+# Structural changes only; IN_MODIFY would fire on every write() call
+INDEX_EVENTS = (
+    IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_CLOSE_WRITE
+    | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+
+DEFAULT_EXCLUDES = frozenset({"node_modules", "__pycache__", "venv"})
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    is_dir INTEGER NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    gen INTEGER NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(name, path, content);
+"""
+
+_BATCH = 500
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+class FileIndex:
+    """
+    Incrementally maintained index of files under a set of roots.
+
+    Args:
+        roots: Directories to index
+        db_path: SQLite database path (in memory by default)
+        index_contents: Also index the text of small files
+        max_content_bytes: Largest file whose contents are indexed
+        use_inotify: Follow changes through inotify when available
+        rescan_interval: Seconds between full rescans; defaults to 300 when
+            inotify cannot cover the tree, otherwise rescans are off
+        excludes: Names skipped entirely, files and directories alike
+            (dot-files and dot-directories are always skipped)
+    """
+
+    def __init__(
+        self,
+        roots: Iterable[str],
+        db_path: str = ":memory:",
+        index_contents: bool = False,
+        max_content_bytes: int = 64 * 1024,
+        use_inotify: bool = True,
+        rescan_interval: Optional[float] = None,
+        excludes: Iterable[str] = DEFAULT_EXCLUDES,
+    ) -> None:
+        self.roots = [os.path.abspath(r) for r in roots]
+        self.index_contents = index_contents
+        self.max_content_bytes = max_content_bytes
+        self.rescan_interval = rescan_interval
+        self.excludes = frozenset(excludes)
+
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._events: "queue.Queue[Optional[Tuple[str, str, int]]]" = queue.Queue()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._gen = 0
+        self._watch_failed = False
+
+        self._watcher: Optional[InotifyWatcher] = None
+        if use_inotify:
+            watcher = InotifyWatcher(self._on_event, mask=INDEX_EVENTS)
+            if watcher.available:
+                self._watcher = watcher
+
+    @property
+    def ready(self) -> bool:
+        """True once the initial crawl has finished."""
+        return self._ready.is_set()
+
+    def start(self) -> "FileIndex":
+        """Start the background indexer (no-op if already running)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="file-index", daemon=True)
+            self._thread.start()
+        return self
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until the initial crawl finishes; returns False on timeout."""
+        return self._ready.wait(timeout)
+
+    def _on_event(self, directory: str, name: str, mask: int) -> None:
+        self._events.put((directory, name, mask))
+
+    # -- crawling -----------------------------------------------------------
+
+    def _skip(self, name: str) -> bool:
+        return name.startswith(".") or name in self.excludes
+
+    def _run(self) -> None:
+        started = time.perf_counter()
+        self._full_scan()
+        self._ready.set()
+        logger.info(
+            "Indexed %d paths in %.2fs", self.count(), time.perf_counter() - started,
+        )
+
+        interval = self.rescan_interval
+        if interval is None and (self._watcher is None or self._watch_failed):
+            interval = 300.0
+        next_rescan = None if interval is None else time.monotonic() + interval
+
+        while not self._stop.is_set():
+            timeout = 1.0 if next_rescan is None else max(min(next_rescan - time.monotonic(), 1.0), 0)
+            try:
+                event = self._events.get(timeout=timeout)
+            except queue.Empty:
+                if next_rescan is not None and time.monotonic() >= next_rescan:
+                    self._full_scan()
+                    next_rescan = time.monotonic() + interval
+                continue
+            if event is None:
+                continue  # Wake-up from close()
+            try:
+                self._apply(*event)
+            except Exception:
+                logger.exception("Failed to apply filesystem event %r", event)
+
+    def _full_scan(self) -> None:
+        """Crawl every root, then drop rows for paths that no longer exist."""
+        self._gen += 1
+        for root in self.roots:
+            if os.path.isdir(root):
+                self._crawl(root)
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM files_fts WHERE rowid IN (SELECT id FROM files WHERE gen < ?)",
+                (self._gen,),
+            )
+            self._db.execute("DELETE FROM files WHERE gen < ?", (self._gen,))
+
+    def _crawl(self, top: str) -> None:
+        batch: List[Tuple[str, os.stat_result, bool]] = []
+        stack = [top]
+        while stack and not self._stop.is_set():
+            directory = stack.pop()
+            # Watch before listing so entries created meanwhile raise events
+            if self._watcher is not None and not self._watcher.watch(directory):
+                self._watch_failed = True
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if self._skip(entry.name):
+                            continue
+                        try:
+                            is_dir = entry.is_dir(follow_symlinks=False)
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        batch.append((entry.path, st, is_dir))
+                        if is_dir:
+                            stack.append(entry.path)
+            except OSError:
+                continue
+            if len(batch) >= _BATCH:
+                self._upsert(batch)
+                batch = []
+        if batch:
+            self._upsert(batch)
+
+    def _read_content(self, path: str, st: os.stat_result) -> str:
+        if not self.index_contents or st.st_size > self.max_content_bytes:
+            return ""
+        try:
+            if looks_binary(path):
+                return ""
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                return f.read()
+        except OSError:
+            return ""
+
+    def _upsert(self, rows: List[Tuple[str, os.stat_result, bool]]) -> None:
+        """Insert or refresh rows; unchanged files only get their generation bumped."""
+        # Read contents outside the lock so queries are not held up by disk I/O
+        prepared = []
+        existing: Dict[str, Tuple[Any, ...]] = {}
+        with self._lock:
+            for path, _, _ in rows:
+                row = self._db.execute(
+                    "SELECT id, size, mtime FROM files WHERE path = ?", (path,)
+                ).fetchone()
+                existing[path] = row or (None, None, None)
+        for path, st, is_dir in rows:
+            row_id, size, mtime = existing[path]
+            size_now = None if is_dir else st.st_size
+            unchanged = row_id is not None and size == size_now and mtime == st.st_mtime
+            content = "" if is_dir or unchanged else self._read_content(path, st)
+            prepared.append((path, st, is_dir, row_id, size_now, unchanged, content))
+
+        with self._lock, self._db:
+            for path, st, is_dir, row_id, size_now, unchanged, content in prepared:
+                if unchanged:
+                    self._db.execute("UPDATE files SET gen = ? WHERE id = ?", (self._gen, row_id))
+                    continue
+                name = os.path.basename(path)
+                if row_id is None:
+                    row_id = self._db.execute(
+                        "INSERT INTO files (path, name, is_dir, size, mtime, gen) VALUES (?, ?, ?, ?, ?, ?)",
+                        (path, name, int(is_dir), size_now, st.st_mtime, self._gen),
+                    ).lastrowid
+                else:
+                    self._db.execute(
+                        "UPDATE files SET is_dir = ?, size = ?, mtime = ?, gen = ? WHERE id = ?",
+                        (int(is_dir), size_now, st.st_mtime, self._gen, row_id),
+                    )
+                    self._db.execute("DELETE FROM files_fts WHERE rowid = ?", (row_id,))
+                self._db.execute(
+                    "INSERT INTO files_fts (rowid, name, path, content) VALUES (?, ?, ?, ?)",
+                    (row_id, name, path, content),
+                )
+
+    def _remove(self, path: str) -> None:
+        """Remove a path and everything below it."""
+        prefix = path.rstrip(os.sep) + os.sep
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        where = "path = ? OR path LIKE ? ESCAPE '\\'"
+        with self._lock, self._db:
+            self._db.execute(
+                f"DELETE FROM files_fts WHERE rowid IN (SELECT id FROM files WHERE {where})",
+                (path, escaped + "%"),
+            )
+            self._db.execute(f"DELETE FROM files WHERE {where}", (path, escaped + "%"))
+
+    def _apply(self, directory: str, name: str, mask: int) -> None:
+        if not directory:
+            # inotify queue overflow: events were lost
+            self._full_scan()
+            return
+        if not name:
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                self._remove(directory)
+            return
+        if self._skip(name):
+            return
+
+        path = os.path.join(directory, name)
+        if mask & (IN_DELETE | IN_MOVED_FROM):
+            self._remove(path)
+            return
+        try:
+            st = os.lstat(path)
+        except OSError:
+            self._remove(path)
+            return
+        if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+            self._upsert([(path, st, True)])
+            self._crawl(path)
+        else:
+            self._upsert([(path, st, bool(mask & IN_ISDIR))])
+
+    # -- queries ------------------------------------------------------------
+
+    def count(self) -> int:
+        """Number of indexed paths."""
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Find paths matching all words of a query (prefix match).
+
+        Falls back to matching any word when no path matches all of them.
+        Basename matches rank above directory and content matches.
+
+        Args:
+            query: Free-text query, e.g. "resume pdf"
+            limit: Maximum number of results
+
+        Returns:
+            List of dicts with 'name', 'path', 'type', 'size' and 'mtime'
+        """
+        terms = ['"%s"*' % t for t in _TOKEN.findall(query)]
+        if not terms:
+            return []
+        rows = self._match(" AND ".join(terms), limit)
+        if not rows and len(terms) > 1:
+            rows = self._match(" OR ".join(terms), limit)
+        return [
+            {
+                "name": name,
+                "path": path,
+                "type": "directory" if is_dir else "file",
+                "size": size,
+                "mtime": mtime,
+            }
+            for name, path, is_dir, size, mtime in rows
+        ]
+
+    def _match(self, expression: str, limit: int) -> List[Tuple[Any, ...]]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT f.name, f.path, f.is_dir, f.size, f.mtime FROM files_fts"
+                " JOIN files f ON f.id = files_fts.rowid"
+                " WHERE files_fts MATCH ?"
+                " ORDER BY bm25(files_fts, 10.0, 1.0, 0.5) LIMIT ?",
+                (expression, limit),
+            ).fetchall()
+
+    def close(self) -> None:
+        """Stop the indexer and release its resources."""
+        self._stop.set()
+        self._events.put(None)
+        if self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,193 @@
+"""
+Minimal inotify binding (Linux) via ctypes.
+
+Delivers directory change notifications to callbacks on a background
+thread. A directory reached through several paths (e.g. a symlink and its
+target) has a single watch; its events are delivered for every watched
+path, and the watch is removed once the last of them is unwatched. On
+platforms without inotify, ``InotifyWatcher.available`` is False
+and callers fall back to stat-based validation.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+from typing import Callable, Dict, Optional, Set
+
+from ..logging_config import get_logger
+
+
+logger = get_logger("fs.inotify")
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0o2000000)
+
+# Any change to a directory's entries or to the metadata of its children
+DIR_CHANGES = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+)
+
+_EVENT = struct.Struct("iIII")
+
+# callback(directory, name, mask); name is "" for events on the directory itself
+Callback = Callable[[str, str, int], None]
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class InotifyWatcher:
+    """
+    Watches directories and dispatches change events.
+
+    Args:
+        callback: Called for every event; on queue overflow it is called
+            with an empty directory so callers can drop all cached state
+        mask: inotify event mask for new watches
+    """
+
+    def __init__(self, callback: Callback, mask: int = DIR_CHANGES | IN_ONLYDIR) -> None:
+        self.callback = callback
+        self.mask = mask
+        self._libc = _load_libc()
+        self._fd = -1
+        self._paths: Dict[int, Set[str]] = {}  # A watch serves every path to its directory
+        self._wds: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_r, self._stop_w = -1, -1
+
+        if self._libc is not None:
+            fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                self._fd = fd
+
+    @property
+    def available(self) -> bool:
+        return self._fd >= 0
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None:
+            self._stop_r, self._stop_w = os.pipe()
+            self._thread = threading.Thread(target=self._loop, name="inotify", daemon=True)
+            self._thread.start()
+
+    def watch(self, path: str) -> bool:
+        """
+        Start watching a directory.
+
+        Returns:
+            True if the directory is (now) watched
+        """
+        if not self.available:
+            return False
+        with self._lock:
+            if path in self._wds:
+                return True
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), self.mask)
+            if wd < 0:
+                err = ctypes.get_errno()
+                logger.debug("inotify_add_watch(%s) failed: %s", path, os.strerror(err))
+                return False
+            self._paths.setdefault(wd, set()).add(path)
+            self._wds[path] = wd
+            self._ensure_thread()
+        return True
+
+    def unwatch(self, path: str) -> None:
+        """Stop watching a directory."""
+        with self._lock:
+            wd = self._wds.pop(path, None)
+            if wd is None:
+                return
+            paths = self._paths.get(wd, set())
+            paths.discard(path)
+            if not paths:
+                self._paths.pop(wd, None)
+                self._libc.inotify_rm_watch(self._fd, wd)
+
+    def is_watched(self, path: str) -> bool:
+        return path in self._wds
+
+    def _loop(self) -> None:
+        while True:
+            ready, _, _ = select.select([self._fd, self._stop_r], [], [])
+            if self._stop_r in ready:
+                return
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError:
+                return
+            self._dispatch(data)
+
+    def _dispatch(self, data: bytes) -> None:
+        pos = 0
+        while pos + _EVENT.size <= len(data):
+            wd, mask, _cookie, length = _EVENT.unpack_from(data, pos)
+            raw_name = data[pos + _EVENT.size:pos + _EVENT.size + length]
+            pos += _EVENT.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                self.callback("", "", mask)
+                continue
+            with self._lock:
+                paths = sorted(self._paths.get(wd, ()))
+                if paths and mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                    # The watch no longer describes these paths; a directory
+                    # created there later must get a fresh watch
+                    self._paths.pop(wd, None)
+                    for path in paths:
+                        self._wds.pop(path, None)
+                    if not mask & IN_IGNORED:
+                        self._libc.inotify_rm_watch(self._fd, wd)
+            name = os.fsdecode(raw_name.rstrip(b"\0"))
+            for path in paths:
+                try:
+                    self.callback(path, name, mask)
+                except Exception:
+                    logger.exception("inotify callback failed for %s", path)
+
+    def close(self) -> None:
+        """Stop the thread and release the inotify descriptor."""
+        if self._thread is not None:
+            os.write(self._stop_w, b"x")
+            self._thread.join(timeout=2)
+            os.close(self._stop_r)
+            os.close(self._stop_w)
+            self._thread = None
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
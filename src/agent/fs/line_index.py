@@ -0,0 +1,136 @@
+"""
+Line-offset index for large files.
+
+Maps line numbers to byte offsets without holding every offset in memory:
+the file is split into fixed-size blocks and only the number of newlines
+before each block is stored. Building the index is one pass of C-level
+``bytes.count`` calls over a memory map; locating a line is a bisect over
+the block table plus a scan of at most one block.
+
+Indexes are cached per (path, mtime, size), so repeated ranged reads and
+greps of the same file skip the build.
+"""
+
+from __future__ import annotations
+
+import bisect
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from ..metrics import CACHE_REQUESTS
+
+
+BLOCK_SIZE = 64 * 1024
+
+
+class LineIndex:
+    """Sparse newline index of one file version."""
+
+    def __init__(self, path: str, block_size: int = BLOCK_SIZE) -> None:
+        """
+        Build the index.
+
+        Args:
+            path: File to index
+            block_size: Bytes per index block
+        """
+        self.path = path
+        self.block_size = block_size
+        # block_lines[i] = number of newlines before byte i * block_size
+        self.block_lines = array("Q", [0])
+
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self.size = st.st_size
+            self.mtime_ns = st.st_mtime_ns
+            newlines = 0
+            if self.size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for start in range(0, self.size, block_size):
+                        newlines += mm[start:start + block_size].count(b"\n")
+                        self.block_lines.append(newlines)
+                    last = mm[self.size - 1:self.size]
+            else:
+                last = b""
+
+        self.newlines = newlines
+        # A trailing line without "\n" still counts as a line
+        self.total_lines = newlines + (1 if self.size and last != b"\n" else 0)
+
+    def line_offset(self, line: int, mm) -> int:
+        """
+        Byte offset where a 0-based line starts.
+
+        Args:
+            line: 0-based line number (clamped to the end of the file)
+            mm: Memory map or bytes of the same file version
+
+        Returns:
+            Byte offset (file size if line is past the end)
+        """
+        if line <= 0:
+            return 0
+        if line > self.newlines:
+            return self.size
+        # Find the block containing the line'th newline
+        block = bisect.bisect_left(self.block_lines, line) - 1
+        pos = block * self.block_size
+        remaining = line - self.block_lines[block]
+        while remaining:
+            pos = mm.find(b"\n", pos) + 1
+            remaining -= 1
+        return pos
+
+    def line_at(self, offset: int, mm) -> int:
+        """0-based line number containing a byte offset."""
+        block = min(offset // self.block_size, len(self.block_lines) - 1)
+        start = block * self.block_size
+        return self.block_lines[block] + mm[start:offset].count(b"\n")
+
+    def byte_range(self, start_line: int, end_line: Optional[int], mm) -> Tuple[int, int]:
+        """
+        Byte range covering 1-based inclusive lines [start_line, end_line].
+
+        Args:
+            start_line: First line (1-based)
+            end_line: Last line (1-based, inclusive); None means end of file
+            mm: Memory map or bytes of the same file version
+        """
+        start = self.line_offset(max(start_line, 1) - 1, mm)
+        end = self.size if end_line is None else self.line_offset(end_line, mm)
+        return start, max(start, end)
+
+
+_cache: "OrderedDict[Tuple[str, int, int], LineIndex]" = OrderedDict()
+_cache_lock = threading.Lock()
+CACHE_SIZE = 16
+
+
+def get_line_index(path: str) -> LineIndex:
+    """
+    Return a cached index for the current version of a file.
+
+    The cache key includes mtime and size, so a modified file gets a fresh
+    index and stale entries age out of the LRU.
+    """
+    st = os.stat(path)
+    key = (os.path.realpath(path), st.st_mtime_ns, st.st_size)
+    with _cache_lock:
+        index = _cache.get(key)
+        if index is not None:
+            _cache.move_to_end(key)
+    if index is not None:
+        CACHE_REQUESTS.inc(cache="line_index", result="hit")
+        return index
+
+    CACHE_REQUESTS.inc(cache="line_index", result="miss")
+    index = LineIndex(path)
+    with _cache_lock:
+        _cache[(key[0], index.mtime_ns, index.size)] = index
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return index
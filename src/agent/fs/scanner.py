@@ -0,0 +1,225 @@
+"""
+Directory scanning with os.scandir and a metadata cache.
+
+``os.scandir`` returns the entry type with each name (d_type), so only
+regular files need a ``stat`` for their size. Listings are cached per
+directory; with inotify available an entry stays valid until the kernel
+reports a change in that directory, otherwise it is revalidated against the
+directory's mtime on each use.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..metrics import CACHE_REQUESTS
+from .inotify import InotifyWatcher
+
+
+# (name, path, type, size, is_symlink) per entry; tuples keep the cache small
+Entry = Tuple[str, str, str, Optional[int], bool]
+
+
+class _CachedListing:
+    __slots__ = ("entries", "identity", "mtime_ns")
+
+    def __init__(self, entries: List[Entry], identity: Tuple[int, int], mtime_ns: int) -> None:
+        self.entries = entries
+        self.identity = identity
+        self.mtime_ns = mtime_ns
+
+
+class DirectoryScanner:
+    """
+    Lists directories through a bounded, change-invalidated cache.
+
+    Args:
+        max_cached_dirs: Maximum number of directory listings kept
+        use_inotify: Invalidate through inotify when available
+    """
+
+    def __init__(self, max_cached_dirs: int = 1024, use_inotify: bool = True) -> None:
+        self.max_cached_dirs = max_cached_dirs
+        self._cache: "OrderedDict[str, _CachedListing]" = OrderedDict()
+        self._generation: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._watcher: Optional[InotifyWatcher] = None
+        if use_inotify:
+            watcher = InotifyWatcher(self._on_change)
+            if watcher.available:
+                self._watcher = watcher
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._watcher is not None
+
+    def _on_change(self, directory: str, name: str, mask: int) -> None:
+        with self._lock:
+            if not directory:
+                # Event queue overflow: nothing cached can be trusted
+                self._cache.clear()
+                self._generation.clear()
+                return
+            self._cache.pop(directory, None)
+            self._generation[directory] = self._generation.get(directory, 0) + 1
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """Drop one cached directory listing, or all of them."""
+        if path is None:
+            self._on_change("", "", 0)
+        else:
+            self._on_change(os.path.abspath(path), "", 0)
+
+    def list_dir(self, path: str) -> List[Entry]:
+        """
+        List one directory, sorted by name.
+
+        Args:
+            path: Absolute directory path
+
+        Returns:
+            List of (name, path, type, size, is_symlink) tuples
+        """
+        # One stat of the directory itself guards against the path now naming
+        # a different directory (renamed or recreated parent). With inotify a
+        # listing is then valid until an event drops it; without inotify the
+        # directory mtime has to match as well.
+        st = os.stat(path)
+        identity = (st.st_dev, st.st_ino)
+        with self._lock:
+            cached = self._cache.get(path)
+            if (
+                cached is not None
+                and cached.identity == identity
+                and (self._watcher is not None or cached.mtime_ns == st.st_mtime_ns)
+            ):
+                self._cache.move_to_end(path)
+                CACHE_REQUESTS.inc(cache="dir_listing", result="hit")
+                return cached.entries
+            generation = self._generation.get(path, 0)
+        CACHE_REQUESTS.inc(cache="dir_listing", result="miss")
+
+        # Watch before scanning so changes during the scan invalidate it
+        watched = self._watcher is not None and self._watcher.watch(path)
+        entries = self._scan(path)
+
+        with self._lock:
+            if self._generation.get(path, 0) == generation and (watched or self._watcher is None):
+                self._cache[path] = _CachedListing(entries, identity, st.st_mtime_ns)
+                self._cache.move_to_end(path)
+                while len(self._cache) > self.max_cached_dirs:
+                    evicted, _ = self._cache.popitem(last=False)
+                    self._generation.pop(evicted, None)
+                    if self._watcher is not None:
+                        self._watcher.unwatch(evicted)
+        return entries
+
+    @staticmethod
+    def _scan(path: str) -> List[Entry]:
+        entries: List[Entry] = []
+        with os.scandir(path) as it:
+            for entry in it:
+                # d_type answers is_dir/is_symlink without a syscall; only
+                # files (and symlinks) need a stat for their size
+                try:
+                    link = entry.is_symlink()
+                    if entry.is_dir():
+                        entries.append((entry.name, entry.path, "directory", None, link))
+                    elif entry.is_file():
+                        entries.append((entry.name, entry.path, "file", entry.stat().st_size, link))
+                    else:
+                        entries.append((entry.name, entry.path, "file", None, link))
+                except OSError:
+                    # Entry vanished or is a dangling symlink
+                    entries.append((entry.name, entry.path, "file", None, True))
+        entries.sort()
+        return entries
+
+    def scan(
+        self,
+        root: str,
+        depth: int = 0,
+        pattern: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        List a directory tree, one directory at a time.
+
+        Each directory's entries are returned in name order, followed by the
+        contents of its subdirectories (depth-first).
+
+        Args:
+            root: Absolute directory path
+            depth: How many levels below root to descend (0 = root only)
+            pattern: Only return entries whose name matches this glob
+                (directories are still descended into)
+            offset: Number of matching entries to skip
+            limit: Maximum number of entries to return
+
+        Returns:
+            Dict with 'entries', 'total' (matching entries seen; the full
+            count only when complete) and 'next_offset' (None when complete)
+        """
+        results: List[Dict[str, Any]] = []
+        seen = 0
+        end = None if limit is None else offset + limit
+        complete = True
+
+        stack: List[Tuple[str, int]] = [(root, 0)]
+        while stack:
+            directory, level = stack.pop()
+            try:
+                entries = self.list_dir(directory)
+            except (PermissionError, FileNotFoundError, NotADirectoryError):
+                if directory == root:
+                    raise
+                continue
+
+            subdirs: List[str] = []
+            for name, path, kind, size, link in entries:
+                if pattern is None or fnmatch.fnmatch(name, pattern):
+                    if end is not None and seen >= end:
+                        complete = False
+                        break
+                    if seen >= offset:
+                        entry = {"name": name, "path": path, "type": kind, "size": size}
+                        if depth:
+                            entry["depth"] = level
+                        results.append(entry)
+                    seen += 1
+                # Do not follow symlinked directories (avoids cycles)
+                if kind == "directory" and level < depth and not link:
+                    subdirs.append(path)
+            if not complete:
+                break
+            stack.extend((d, level + 1) for d in reversed(subdirs))
+
+        return {
+            "entries": results,
+            "total": seen,
+            "next_offset": None if complete else seen,
+        }
+
+    def close(self) -> None:
+        """Release the inotify watcher."""
+        if self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
+
+
+_default_scanner: Optional[DirectoryScanner] = None
+_default_lock = threading.Lock()
+
+
+def get_default_scanner() -> DirectoryScanner:
+    """Return the process-wide scanner (created on first use)."""
+    global _default_scanner
+    with _default_lock:
+        if _default_scanner is None:
+            _default_scanner = DirectoryScanner()
+        return _default_scanner
@@ -0,0 +1,324 @@
+"""
+Set-of-marks grounding.
+
+Guessing pixel coordinates for click(x, y) from a screenshot costs the model
+several retries. Grounding turns the screen into a numbered element list
+instead, so a target is picked by number in one step. Elements come from
+three sources, most reliable first:
+
+1. The accessibility tree (see agent.x11.tree): named controls with exact
+   bounds.
+2. OCR word boxes (pytesseract), grouped into phrases. Words separated by a
+   wide gap, like menu bar entries, stay separate targets.
+3. Connected components of edge-dense cells on the raw frame. Each is a
+   region with visible structure, such as a button, an icon or a text field.
+   A region takes the text inside it as its label.
+
+Candidates that duplicate an element already taken from a better source are
+dropped. The rest are numbered in reading order. Optionally they are drawn
+on a downscaled copy of the frame (the "marks").
+
+Detection is deliberately simple and dependency-free (PIL only): the frame
+is reduced to a grid of cells, long straight runs (window borders,
+separators) are removed, and 4-connected cells are grouped.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .imaging import connected_boxes
+
+try:
+    from PIL import Image, ImageDraw, ImageFilter, ImageFont
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+try:
+    import pytesseract
+    HAS_OCR = True
+except ImportError:
+    HAS_OCR = False
+
+
+Box = Tuple[int, int, int, int]  # x, y, width, height
+
+# Accessible roles worth a mark even without a name
+INTERACTIVE_ROLES = {
+    "push button", "toggle button", "check box", "radio button", "combo box", "text", "entry",
+    "password text", "spin button", "slider", "menu item", "check menu item", "radio menu item",
+    "page tab", "link", "list item", "table cell", "tree item", "icon",
+}
+
+# Regions taller than this are not treated as single controls
+MAX_CONTROL_HEIGHT = 64
+# Unlabeled regions larger than this in both dimensions are left out
+MAX_ICON_SIZE = 96
+
+
+@dataclass(frozen=True)
+class Mark:
+    """One numbered, clickable element."""
+
+    id: int
+    source: str  # "a11y", "ocr" or "detect"
+    role: str
+    label: str
+    bounds: Box
+
+    @property
+    def center(self) -> Tuple[int, int]:
+        x, y, width, height = self.bounds
+        return x + width // 2, y + height // 2
+
+    def line(self) -> str:
+        x, y, width, height = self.bounds
+        label = f' "{self.label}"' if self.label else ""
+        return f"[{self.id}] {self.role}{label} @{x},{y} {width}x{height}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "source": self.source,
+            "role": self.role,
+            "label": self.label,
+            "bounds": list(self.bounds),
+            "center": list(self.center),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Mark":
+        return cls(data["id"], data["source"], data["role"], data["label"], tuple(data["bounds"]))
+
+
+def _area(box: Box) -> int:
+    return box[2] * box[3]
+
+
+def _intersection(a: Box, b: Box) -> int:
+    width = min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0])
+    height = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+    return width * height if width > 0 and height > 0 else 0
+
+
+def _contains(box: Box, point: Tuple[int, int]) -> bool:
+    return box[0] <= point[0] < box[0] + box[2] and box[1] <= point[1] < box[1] + box[3]
+
+
+def _union(boxes: Sequence[Box]) -> Box:
+    x0 = min(b[0] for b in boxes)
+    y0 = min(b[1] for b in boxes)
+    x1 = max(b[0] + b[2] for b in boxes)
+    y1 = max(b[1] + b[3] for b in boxes)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def _center(box: Box) -> Tuple[int, int]:
+    return box[0] + box[2] // 2, box[1] + box[3] // 2
+
+
+def _duplicates(box: Box, taken: Sequence[Box]) -> bool:
+    """Whether box is the same element as one already taken."""
+    for other in taken:
+        overlap = _intersection(box, other)
+        if overlap and overlap / (_area(box) + _area(other) - overlap) > 0.5:
+            return True
+        # Text or a region inside a control of similar size is that control
+        if _contains(other, _center(box)) and _area(other) <= 4 * _area(box):
+            return True
+    return False
+
+
+def detect_regions(
+    image: "Image.Image",
+    cell: int = 8,
+    threshold: int = 24,
+    min_cells: int = 2,
+    max_run: float = 0.33,
+) -> List[Box]:
+    """
+    Find regions with visible structure.
+
+    Args:
+        image: Screen frame
+        cell: Cell size in pixels
+        threshold: Mean edge strength (0-255) from which a cell counts
+        min_cells: Smallest region in cells
+        max_run: Runs of set cells longer than this fraction of the width
+            (rows) or height (columns) are lines and are cleared
+
+    Returns:
+        Region bounds in image pixels
+    """
+    cols, rows = max(1, image.width // cell), max(1, image.height // cell)
+    edges = image.convert("L").filter(ImageFilter.FIND_EDGES)
+    grid = bytearray(edges.resize((cols, rows), Image.BOX).point(lambda v: 1 if v >= threshold else 0).tobytes())
+
+    # Clear long horizontal and vertical lines, which would join everything
+    lines = []
+    for y in range(rows):
+        lines.append(range(y * cols, (y + 1) * cols))
+    for x in range(cols):
+        lines.append(range(x, rows * cols, cols))
+    for line in lines:
+        limit = max_run * len(line)
+        run: List[int] = []
+        for i in list(line) + [-1]:
+            if i >= 0 and grid[i]:
+                run.append(i)
+                continue
+            if len(run) > limit:
+                for j in run:
+                    grid[j] = 2  # Cleared below; still part of runs in the other direction
+            run = []
+    for i, value in enumerate(grid):
+        if value == 2:
+            grid[i] = 0
+
+    return [
+        (x * cell, y * cell, width * cell, height * cell)
+        for x, y, width, height in connected_boxes(grid, cols, rows, min_cells)
+    ]
+
+
+def ocr_phrases(image: "Image.Image", min_confidence: float = 60.0, gap: float = 1.5) -> List[Tuple[str, Box]]:
+    """
+    Recognize text and group words into phrases.
+
+    Args:
+        image: Screen frame
+        min_confidence: Words below this tesseract confidence are ignored
+        gap: Words further apart than this many line heights start a new phrase
+
+    Returns:
+        (text, bounds) per phrase
+    """
+    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+    lines: Dict[Tuple[int, int, int], List[Tuple[str, Box]]] = {}
+    for i, word in enumerate(data["text"]):
+        word = word.strip()
+        if not word or float(data["conf"][i]) < min_confidence:
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        box = (data["left"][i], data["top"][i], data["width"][i], data["height"][i])
+        lines.setdefault(key, []).append((word, box))
+
+    phrases = []
+    for words in lines.values():
+        words.sort(key=lambda w: w[1][0])
+        height = max(box[3] for _, box in words)
+        current = [words[0]]
+        for word in words[1:]:
+            previous = current[-1][1]
+            if word[1][0] - (previous[0] + previous[2]) > gap * height:
+                phrases.append(current)
+                current = []
+            current.append(word)
+        phrases.append(current)
+    return [(" ".join(w for w, _ in phrase), _union([b for _, b in phrase])) for phrase in phrases]
+
+
+def merge(
+    accessible: Sequence[Dict[str, Any]],
+    phrases: Sequence[Tuple[str, Box]],
+    regions: Sequence[Box],
+    screen: Optional[Box] = None,
+) -> List[Mark]:
+    """
+    Combine the three sources into numbered marks.
+
+    Args:
+        accessible: Accessibility nodes (dicts with role, name and bounds)
+        phrases: OCR phrases
+        regions: Detected regions
+        screen: Screen bounds; elements outside are dropped
+
+    Returns:
+        Marks in reading order, numbered from 1
+    """
+    candidates: List[Tuple[str, str, str, Box]] = []  # source, role, label, bounds
+    taken: List[Box] = []
+
+    def add(source: str, role: str, label: str, box: Box) -> None:
+        if box[2] <= 0 or box[3] <= 0:
+            return
+        if screen is not None and not _contains(screen, _center(box)):
+            return
+        if _duplicates(box, taken):
+            return
+        taken.append(box)
+        candidates.append((source, role, label, box))
+
+    for node in accessible:
+        bounds, role, name = node.get("bounds"), node.get("role", ""), node.get("name") or ""
+        if bounds and role != "window" and (name or role in INTERACTIVE_ROLES):
+            add("a11y", role, name, tuple(bounds))
+
+    # Text inside a control-sized region labels it
+    used = set()
+    labeled = []
+    for region in regions:
+        inside = [i for i, (_, box) in enumerate(phrases) if i not in used and _contains(region, _center(box))]
+        if inside and region[3] <= MAX_CONTROL_HEIGHT:
+            used.update(inside)
+            labeled.append(("control", " ".join(phrases[i][0] for i in inside), region))
+        elif not inside and max(region[2], region[3]) <= MAX_ICON_SIZE:
+            labeled.append(("icon", "", region))
+    for role, label, region in labeled:
+        if role == "control":
+            add("detect", role, label, region)
+    for i, (text, box) in enumerate(phrases):
+        if i not in used:
+            add("ocr", "text", text, box)
+    for role, label, region in labeled:
+        if role == "icon":
+            add("detect", role, label, region)
+
+    # Reading order: rows of 10 pixels, then left to right
+    candidates.sort(key=lambda c: (c[3][1] // 10, c[3][0]))
+    return [Mark(i, source, role, label, box) for i, (source, role, label, box) in enumerate(candidates, 1)]
+
+
+def ground(
+    image: "Image.Image",
+    accessible: Sequence[Dict[str, Any]] = (),
+    ocr: bool = True,
+    detect: bool = True,
+) -> List[Mark]:
+    """
+    Ground a screen frame into numbered marks.
+
+    Args:
+        image: Screen frame (screen coordinates start at its top-left)
+        accessible: Accessibility nodes, e.g. from find_ui_element/get_ui_tree
+        ocr: Use OCR (if pytesseract is installed)
+        detect: Use region detection
+    """
+    phrases = ocr_phrases(image) if ocr and HAS_OCR else []
+    regions = detect_regions(image) if detect else []
+    return merge(accessible, phrases, regions, screen=(0, 0, image.width, image.height))
+
+
+def render(elements: Sequence[Dict[str, Any]]) -> str:
+    """One line per mark, from Mark.to_dict() dicts."""
+    return "\n".join(Mark.from_dict(element).line() for element in elements)
+
+
+def annotate(image: "Image.Image", marks: Sequence[Mark], max_width: int = 1280) -> "Image.Image":
+    """Draw numbered boxes on a copy of image, downscaled to max_width."""
+    scale = min(1.0, max_width / image.width)
+    out = image.convert("RGB")
+    if scale < 1.0:
+        out = out.resize((int(image.width * scale), int(image.height * scale)), Image.BILINEAR)
+    draw = ImageDraw.Draw(out)
+    font = ImageFont.load_default()
+    for mark in marks:
+        x, y, width, height = (int(v * scale) for v in mark.bounds)
+        draw.rectangle((x, y, x + width, y + height), outline=(255, 0, 64), width=2)
+        label = str(mark.id)
+        left, top, right, bottom = draw.textbbox((x, y), label, font=font)
+        draw.rectangle((left - 1, top - 1, right + 1, bottom + 1), fill=(255, 0, 64))
+        draw.text((x, y), label, fill=(255, 255, 255), font=font)
+    return out
@@ -0,0 +1,202 @@
+"""
+Screenshot encoding for model consumption.
+
+A full-resolution PNG of a 1080p desktop is several megabytes, far more than
+a vision model can use: its input is downscaled to a fixed size anyway.
+encode_image produces the smallest useful encoding instead:
+
+- Downscale to the vision model's input size (never upscale).
+- Encode with WebP (JPEG if Pillow lacks WebP), walking down a quality ladder
+  until the result fits ``max_bytes``; if even the lowest quality does not
+  fit, shrink further in 0.75x steps.
+- Optionally drop color (grayscale), which roughly halves the size of UI
+  screenshots and is enough for reading text.
+
+PNG stays available for lossless captures; it is only downscaled.
+
+diff_images compares two frames and reports the regions that changed, so
+the agent can tell whether an action had a visible effect without looking
+at either frame.
+"""
+
+from __future__ import annotations
+
+import io
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from PIL import Image, ImageChops, features
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+
+QUALITY_LADDER = (85, 70, 55, 40)
+# Extra 0.75x downscales when the lowest quality still exceeds max_bytes
+MAX_DOWNSCALES = 3
+
+FORMATS = ("auto", "webp", "jpeg", "jpg", "png")
+
+
+@dataclass
+class EncodedImage:
+    """An encoded frame and how it relates to the source image."""
+
+    data: bytes
+    format: str  # "webp", "jpeg" or "png"
+    width: int
+    height: int
+    quality: Optional[int]  # None for PNG
+    scale: float  # Encoded width / source width
+
+
+def pick_format(format: str) -> str:
+    """
+    Resolve a requested format to one Pillow can write.
+
+    Raises:
+        ValueError: If the format is unknown or unsupported
+    """
+    format = format.lower()
+    if format not in FORMATS:
+        raise ValueError(f"Unsupported image format: {format} (use {', '.join(FORMATS)})")
+    has_webp = features.check("webp")
+    if format == "auto":
+        return "webp" if has_webp else "jpeg"
+    if format == "webp" and not has_webp:
+        raise ValueError("Pillow was built without WebP support")
+    return "jpeg" if format == "jpg" else format
+
+
+def _save(image: "Image.Image", format: str, quality: Optional[int]) -> bytes:
+    buf = io.BytesIO()
+    if format == "webp":
+        image.save(buf, format="WEBP", quality=quality, method=4)
+    elif format == "jpeg":
+        image.save(buf, format="JPEG", quality=quality)
+    else:
+        image.save(buf, format="PNG", compress_level=6)
+    return buf.getvalue()
+
+
+def encode_image(
+    image: "Image.Image",
+    format: str = "auto",
+    max_size: Tuple[int, int] = (1280, 1280),
+    max_bytes: Optional[int] = None,
+    grayscale: bool = False,
+    qualities: Sequence[int] = QUALITY_LADDER,
+) -> EncodedImage:
+    """
+    Encode an image within a size target.
+
+    Args:
+        image: Source image
+        format: "auto" (WebP, else JPEG), "webp", "jpeg" or "png"
+        max_size: Largest (width, height); the aspect ratio is kept
+        max_bytes: Target encoded size (None: first quality on the ladder)
+        grayscale: Drop color
+        qualities: Quality ladder for lossy formats, best first
+
+    Returns:
+        The first encoding that fits, or the smallest one tried
+
+    Raises:
+        ValueError: If the format is unknown or unsupported
+    """
+    format = pick_format(format)
+    source = image.convert("L" if grayscale else "RGB")  # No alpha in JPEG
+    scale = min(1.0, max_size[0] / source.width, max_size[1] / source.height)
+    ladder: Sequence[Optional[int]] = (None,) if format == "png" else qualities
+
+    smallest: Optional[EncodedImage] = None
+    for _ in range(MAX_DOWNSCALES + 1):
+        size = (max(1, round(source.width * scale)), max(1, round(source.height * scale)))
+        resized = source if size == source.size else source.resize(size, Image.LANCZOS, reducing_gap=3.0)
+        for quality in ladder:
+            data = _save(resized, format, quality)
+            encoded = EncodedImage(data, format, size[0], size[1], quality, size[0] / source.width)
+            if max_bytes is None or len(data) <= max_bytes:
+                return encoded
+            if smallest is None or len(data) < len(smallest.data):
+                smallest = encoded
+        scale *= 0.75
+    return smallest
+
+
+def connected_boxes(grid: Sequence[int], cols: int, rows: int, min_cells: int = 1) -> List[Tuple[int, int, int, int]]:
+    """
+    Bounding boxes of 4-connected groups of set cells.
+
+    Args:
+        grid: Row-major cells, non-zero where set
+        cols, rows: Grid size
+        min_cells: Smallest group reported
+
+    Returns:
+        (x, y, width, height) per group, in cells
+    """
+    boxes = []
+    seen = bytearray(len(grid))
+    for start, value in enumerate(grid):
+        if not value or seen[start]:
+            continue
+        seen[start] = 1
+        stack = [start]
+        x0 = x1 = start % cols
+        y0 = y1 = start // cols
+        count = 0
+        while stack:
+            i = stack.pop()
+            count += 1
+            x, y = i % cols, i // cols
+            x0, x1, y0, y1 = min(x0, x), max(x1, x), min(y0, y), max(y1, y)
+            for j, ok in ((i - 1, x > 0), (i + 1, x < cols - 1), (i - cols, y > 0), (i + cols, y < rows - 1)):
+                if ok and grid[j] and not seen[j]:
+                    seen[j] = 1
+                    stack.append(j)
+        if count >= min_cells:
+            boxes.append((x0, y0, x1 - x0 + 1, y1 - y0 + 1))
+    return boxes
+
+
+def diff_images(
+    before: "Image.Image",
+    after: "Image.Image",
+    cell: int = 16,
+    threshold: int = 12,
+) -> Dict[str, Any]:
+    """
+    Find the regions that differ between two frames.
+
+    Both frames are compared in grayscale at the size of ``before``; small
+    differences from lossy encoding stay below the threshold.
+
+    Args:
+        before: Earlier frame
+        after: Later frame (resized to match before if needed)
+        cell: Cell size in pixels
+        threshold: Mean absolute difference (0-255) from which a cell changed
+
+    Returns:
+        Dict with 'changed', 'changed_fraction' (of cells) and 'regions'
+        ([x, y, width, height] in before's pixels)
+    """
+    before = before.convert("L")
+    after = after.convert("L")
+    if after.size != before.size:
+        after = after.resize(before.size, Image.BILINEAR)
+    cols, rows = max(1, before.width // cell), max(1, before.height // cell)
+    diff = ImageChops.difference(before, after).resize((cols, rows), Image.BOX)
+    grid = diff.point(lambda v: 1 if v >= threshold else 0).tobytes()
+    changed = sum(grid)
+    regions = [
+        [x * cell, y * cell, width * cell, height * cell]
+        for x, y, width, height in connected_boxes(grid, cols, rows)
+    ]
+    return {
+        "changed": changed > 0,
+        "changed_fraction": round(changed / (cols * rows), 4),
+        "regions": regions,
+    }
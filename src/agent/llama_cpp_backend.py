@@ -6,9 +6,12 @@ This provides a concrete LLM backend using llama.cpp via llama-cpp-python bindin
 
 from __future__ import annotations
 
+import time
 from typing import List, Optional
 
 from .llm_interface import LLMBackend
+from .metrics import LLM_GENERATE_SECONDS, LLM_TOKENS, LLM_TOKENS_PER_SECOND
+from .tracing import Tracer, get_tracer
 from .types import Message
 
 
@@ -107,7 +110,15 @@ class LlamaCppBackend(LLMBackend):
         if self._model is None:
             self._load_model()
 
-        prompt = self._format_messages(messages)
+        started = time.perf_counter()
+        tracer = get_tracer()
+        with tracer.span("llm.format_prompt") as span:
+            prompt = self._format_messages(messages)
+            span.set(prompt_bytes=len(prompt.encode("utf-8")))
+
+        if tracer.enabled:
+            content = self._generate_traced(prompt, max_tokens, tracer, started)
+            return Message(role="assistant", content=content)
 
         # Generate response
         result = self._model(
@@ -123,8 +134,86 @@ class LlamaCppBackend(LLMBackend):
         # Extract generated text
         generated_text = result["choices"][0]["text"].strip()
 
+        usage = result.get("usage") or {}
+        self._record_metrics(
+            started,
+            usage.get("prompt_tokens", 0),
+            usage.get("completion_tokens", 0),
+        )
+
         return Message(role="assistant", content=generated_text)
 
+    def _generate_traced(
+        self, prompt: str, max_tokens: int, tracer: Tracer, started: float
+    ) -> str:
+        """
+        Generate with per-phase spans.
+
+        Streams the completion so prompt evaluation (time to first token)
+        and decoding can be timed separately.
+        """
+        with tracer.span("llm.tokenize") as span:
+            prompt_tokens = len(self._model.tokenize(prompt.encode("utf-8")))
+            span.set(prompt_tokens=prompt_tokens)
+
+        start = time.perf_counter()
+        first_token_at: Optional[float] = None
+        pieces: List[str] = []
+        stream = self._model(
+            prompt,
+            max_tokens=max_tokens,
+            temperature=self.temperature,
+            top_p=self.top_p,
+            top_k=self.top_k,
+            stop=self.stop_sequences,
+            echo=False,
+            stream=True,
+        )
+        for chunk in stream:
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            pieces.append(chunk["choices"][0]["text"])
+        end = time.perf_counter()
+
+        if first_token_at is None:
+            first_token_at = end
+        eval_seconds = first_token_at - start
+        decode_seconds = end - first_token_at
+        # The first streamed token is produced by the prompt-eval pass
+        decoded_tokens = max(len(pieces) - 1, 0)
+        tracer.record(
+            "llm.prompt_eval",
+            start,
+            first_token_at,
+            prompt_tokens=prompt_tokens,
+            tokens_per_sec=prompt_tokens / eval_seconds if eval_seconds > 0 else None,
+        )
+        tracer.record(
+            "llm.decode",
+            first_token_at,
+            end,
+            completion_tokens=len(pieces),
+            tokens_per_sec=decoded_tokens / decode_seconds if decode_seconds > 0 else None,
+        )
+        self._record_metrics(started, prompt_tokens, len(pieces), decode_seconds)
+        return "".join(pieces).strip()
+
+    def _record_metrics(
+        self,
+        started: float,
+        prompt_tokens: int,
+        completion_tokens: int,
+        decode_seconds: Optional[float] = None,
+    ) -> None:
+        """Update the backend metrics after a generation."""
+        elapsed = time.perf_counter() - started
+        LLM_GENERATE_SECONDS.observe(elapsed, backend="llama_cpp")
+        LLM_TOKENS.inc(prompt_tokens, backend="llama_cpp", kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, backend="llama_cpp", kind="completion")
+        seconds = decode_seconds if decode_seconds else elapsed
+        if completion_tokens and seconds > 0:
+            LLM_TOKENS_PER_SECOND.set(completion_tokens / seconds, backend="llama_cpp")
+
     def count_tokens(self, text: str) -> int:
         """
         Count tokens in text using the model's tokenizer.
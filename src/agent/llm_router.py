@@ -0,0 +1,212 @@
+"""
+Routing LLM requests across several backends.
+
+RouterBackend holds a set of routes, e.g. a small fast model next to a
+larger one, or several llama.cpp instances of the same model, and sends
+each generate call to one of them:
+
+- Eligibility. A route can be limited to some task types and to prompts
+  up to a size. The task is classified from the messages:
+  "summarize" for tool output summaries, "tool" for steps that follow
+  tool results since the last user message (picking the next tool call),
+  "chat" for a new user turn.
+- Load. Each route runs at most ``concurrency`` requests at once (a
+  llama.cpp model is not thread-safe, so one per instance). Among
+  eligible routes the one expected to finish first wins: its observed
+  latency times the number of rounds it has queued. Routes that list the
+  task explicitly get it while they have a free slot, so short steps go to
+  the fast model. Once those are saturated, a general route takes the
+  request if it would finish ``spill_factor`` times sooner.
+- Failure. A route that raises is put in a cooldown that doubles with
+  each consecutive failure, and the request falls back to the next best
+  route. Only when every eligible route fails is the error raised.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Sequence
+
+from .llm_interface import LLMBackend
+from .logging_config import get_logger
+from .metrics import LLM_ROUTE_REQUESTS
+from .types import Message
+
+
+logger = get_logger("llm")
+
+
+def classify(messages: Sequence[Message]) -> str:
+    """Task type of a request: "summarize", "tool" or "chat"."""
+    if messages and messages[0].role == "system" and messages[0].content.startswith("Summarize"):
+        return "summarize"
+    # After tool results (the agent appends them before its own reply)
+    # the step picks the next tool call; a new user turn needs planning
+    for message in reversed(messages):
+        if message.role == "tool":
+            return "tool"
+        if message.role == "user":
+            break
+    return "chat"
+
+
+def estimate_tokens(messages: Sequence[Message]) -> int:
+    """Rough prompt size (4 characters per token); routing needs no tokenizer."""
+    return sum(len(m.content) for m in messages) // 4
+
+
+@dataclass(eq=False)
+class Route:
+    """
+    One backend and the requests it takes.
+
+    Args:
+        name: Label for logs, metrics and stats
+        backend: The backend
+        tasks: Task types this route is meant for (any if None)
+        max_prompt_tokens: Largest prompt it takes (any if None)
+        concurrency: Requests it runs at once
+    """
+
+    name: str
+    backend: LLMBackend
+    tasks: Optional[FrozenSet[str]] = None
+    max_prompt_tokens: Optional[int] = None
+    concurrency: int = 1
+    # Dispatch state, guarded by the router's lock
+    latency: float = 0.0  # Moving average of generate seconds
+    inflight: int = 0
+    waiting: int = 0
+    failures: int = 0  # Consecutive
+    down_until: float = 0.0
+    _slots: threading.Semaphore = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.tasks is not None:
+            self.tasks = frozenset(self.tasks)
+        self._slots = threading.Semaphore(self.concurrency)
+
+    def accepts(self, task: str, prompt_tokens: int) -> bool:
+        return (self.tasks is None or task in self.tasks) and (
+            self.max_prompt_tokens is None or prompt_tokens <= self.max_prompt_tokens
+        )
+
+    def expected_seconds(self) -> float:
+        """Time until a new request would finish here."""
+        rounds = (self.inflight + self.waiting) // self.concurrency + 1
+        return self.latency * rounds
+
+
+class RouterBackend(LLMBackend):
+    """
+    Dispatches each request to one of several backends.
+
+    Args:
+        routes: Routes in order of preference on ties
+        spill_factor: How much sooner a general route must finish to take a
+            request a dedicated route is meant for
+        cooldown: Seconds a failed route is skipped (doubled per consecutive failure)
+        classifier: Task type of a request (classify if None)
+    """
+
+    def __init__(
+        self,
+        routes: Sequence[Route],
+        spill_factor: float = 1.5,
+        cooldown: float = 5.0,
+        classifier: Optional[Callable[[Sequence[Message]], str]] = None,
+    ) -> None:
+        if not routes:
+            raise ValueError("RouterBackend needs at least one route")
+        self.routes: List[Route] = list(routes)
+        self.spill_factor = spill_factor
+        self.cooldown = cooldown
+        self.classifier = classifier or classify
+        self._lock = threading.Lock()
+
+    def generate(self, messages: List[Message], max_tokens: int = 256) -> Message:
+        task = self.classifier(messages)
+        prompt_tokens = estimate_tokens(messages)
+        tried: List[Route] = []
+        error: Optional[Exception] = None
+        while True:
+            route = self._pick(task, prompt_tokens, tried)
+            if route is None:
+                break
+            tried.append(route)
+            try:
+                response = self._call(route, messages, max_tokens)
+            except Exception as e:
+                error = e
+                LLM_ROUTE_REQUESTS.inc(route=route.name, task=task, status="error")
+                logger.warning("LLM route %s failed (%s); trying another", route.name, e)
+                continue
+            LLM_ROUTE_REQUESTS.inc(route=route.name, task=task, status="ok" if len(tried) == 1 else "fallback")
+            return response
+        if error is not None:
+            raise error
+        raise ValueError(f"No route accepts a {task} request of ~{prompt_tokens} tokens")
+
+    def _pick(self, task: str, prompt_tokens: int, tried: Sequence[Route]) -> Optional[Route]:
+        """Reserve the route expected to finish first (None if none is left)."""
+        with self._lock:
+            now = time.monotonic()
+            eligible = [r for r in self.routes if r not in tried and r.accepts(task, prompt_tokens)]
+            # Routes in cooldown are a last resort, not excluded
+            healthy = [r for r in eligible if r.down_until <= now] or eligible
+            if not healthy:
+                return None
+
+            def dedicated(route: Route) -> bool:
+                return route.tasks is not None and task in route.tasks
+
+            idle = [r for r in healthy if dedicated(r) and r.inflight + r.waiting < r.concurrency]
+            if idle:
+                route = min(idle, key=Route.expected_seconds)
+            else:
+                route = min(healthy, key=lambda r: (
+                    r.expected_seconds() * (1.0 if dedicated(r) else self.spill_factor), not dedicated(r)))
+            route.waiting += 1
+            return route
+
+    def _call(self, route: Route, messages: List[Message], max_tokens: int) -> Message:
+        route._slots.acquire()
+        with self._lock:
+            route.waiting -= 1
+            route.inflight += 1
+        started = time.perf_counter()
+        try:
+            response = route.backend.generate(messages, max_tokens=max_tokens)
+        except Exception:
+            with self._lock:
+                route.failures += 1
+                route.down_until = time.monotonic() + self.cooldown * 2 ** min(route.failures - 1, 6)
+            raise
+        finally:
+            with self._lock:
+                route.inflight -= 1
+            route._slots.release()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            route.failures = 0
+            route.down_until = 0.0
+            route.latency = elapsed if route.latency == 0.0 else 0.8 * route.latency + 0.2 * elapsed
+        return response
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-route load, latency and health."""
+        with self._lock:
+            now = time.monotonic()
+            return [
+                {
+                    "name": r.name,
+                    "tasks": sorted(r.tasks) if r.tasks is not None else None,
+                    "inflight": r.inflight,
+                    "waiting": r.waiting,
+                    "latency": round(r.latency, 3),
+                    "healthy": r.down_until <= now,
+                }
+                for r in self.routes
+            ]
@@ -7,6 +7,7 @@ import time
 import uuid
 from typing import List, Optional, Dict, Any
 
+from ..metrics import MEMORY_ENTRIES
 from ..types import MemoryEntry
 
 class MemoryManager:
@@ -23,6 +24,7 @@ class MemoryManager:
             metadata=metadata or {}
         )
         self.short_term.append(entry)
+        MEMORY_ENTRIES.set(len(self.short_term), store="short_term")
         # TODO: Asynchronously embed and add to long_term storage
         
     def search(self, query: str, limit: int = 5) -> List[MemoryEntry]:
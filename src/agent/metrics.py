@@ -0,0 +1,312 @@
+"""
+Prometheus-style metrics for the AI agent.
+
+A small in-process metrics registry (counters, gauges and histograms with
+labels) rendered in the Prometheus text exposition format and served from a
+localhost HTTP endpoint.
+
+Updating a metric is a dict lookup plus a lock-protected add, so the hot
+paths (token generation, tool dispatch, memory writes) can be instrumented
+unconditionally.
+"""
+
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Base class for labelled metrics."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        try:
+            key = tuple(str(labels[n]) for n in self.labelnames)
+        except KeyError:
+            key = None
+        if key is None or len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return key
+
+    def _label_str(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(f'{extra[0]}="{extra[1]}"')
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {_escape(self.help)}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Increase the counter by ``amount``."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels: str) -> float:
+        """Return the current value for a label set."""
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{self._label_str(key)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        """Set the gauge to ``value``."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        """Decrease the gauge by ``amount``."""
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., +Inf count], sum
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record one observation."""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    def count(self, **labels: str) -> int:
+        """Return the number of observations for a label set."""
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = [(k, list(c), self._sums[k]) for k, c in self._counts.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = _format_value(bound)
+                yield f"{self.name}_bucket{self._label_str(key, ('le', le))} {cumulative}"
+            yield f"{self.name}_sum{self._label_str(key)} {_format_value(total)}"
+            yield f"{self.name}_count{self._label_str(key)} {cumulative}"
+
+
+class MetricsRegistry:
+    """Holds named metrics and renders them in Prometheus text format."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif type(metric) is not cls:
+                raise ValueError(f"Metric {name} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Get or create a counter."""
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """Get or create a gauge."""
+        return self._get_or_create(Gauge, name, help, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """Get or create a histogram."""
+        return self._get_or_create(Histogram, name, help, labelnames, buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        """Look up a metric by name."""
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Serves a registry at ``/metrics`` over HTTP.
+
+    Binds to localhost by default; the server runs on a daemon thread.
+    """
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9464) -> None:
+        """
+        Initialize metrics server.
+
+        Args:
+            registry: Registry to expose
+            host: Bind address
+            port: Bind port (0 picks a free port)
+        """
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> int:
+        """
+        Start serving.
+
+        Returns:
+            The port actually bound
+        """
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802 (http.server API)
+                if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass  # Scrapes are too frequent to log
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="metrics-server", daemon=True
+        )
+        self._thread.start()
+        return self.port
+
+    def stop(self) -> None:
+        """Stop serving."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# Global registry instance
+metrics = MetricsRegistry()
+
+# Metrics updated by the agent subsystems
+LLM_TOKENS = metrics.counter(
+    "agent_llm_tokens_total", "Tokens processed by the LLM backend", ["backend", "kind"]
+)
+LLM_GENERATE_SECONDS = metrics.histogram(
+    "agent_llm_generate_seconds", "Wall time of LLMBackend.generate calls", ["backend"]
+)
+LLM_TOKENS_PER_SECOND = metrics.gauge(
+    "agent_llm_tokens_per_second", "Completion tokens per second of the last generation", ["backend"]
+)
+LLM_ROUTE_REQUESTS = metrics.counter(
+    "agent_llm_route_requests_total", "Routed LLM requests by route, task and outcome (ok, fallback, error)", ["route", "task", "status"]
+)
+TOOL_CALLS = metrics.counter(
+    "agent_tool_calls_total", "Tool executions by outcome (ok, error, not_found)", ["tool", "status"]
+)
+TOOL_SECONDS = metrics.histogram(
+    "agent_tool_duration_seconds", "Wall time of tool executions", ["tool"]
+)
+TOOL_WORKER_RESTARTS = metrics.counter(
+    "agent_tool_worker_restarts_total", "Tool worker processes replaced, by reason (crash, timeout, unresponsive)", ["reason"]
+)
+CACHE_REQUESTS = metrics.counter(
+    "agent_cache_requests_total", "Cache lookups by result (hit, miss)", ["cache", "result"]
+)
+MEMORY_ENTRIES = metrics.gauge(
+    "agent_memory_entries", "Entries held by the memory manager", ["store"]
+)
+SCREEN_CAPTURE_SECONDS = metrics.histogram(
+    "agent_screen_capture_seconds", "Wall time of screen capture and OCR operations", ["operation"]
+)
+SCREEN_CAPTURE_BYTES = metrics.counter(
+    "agent_screen_capture_bytes_total", "Encoded bytes produced by screen captures", ["operation"]
+)
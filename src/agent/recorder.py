@@ -0,0 +1,325 @@
+"""
+Low-rate background screen recording.
+
+When an automation is slow or goes wrong there is no visual history to look
+at. ScreenRecorder keeps one: a daemon thread grabs the screen at a low
+rate, downscales it and keeps the compressed frames in a ring buffer
+bounded by bytes.
+
+- Identical frames are not stored twice. Each grab is hashed after
+  downscaling and before encoding (the expensive step). A repeat only
+  extends how long the previous frame stayed on screen.
+- Recording stays within a CPU budget. The CPU time of each grab is
+  measured, and the interval is stretched so that capture uses at most
+  ``cpu_percent`` of one core, whatever ``fps`` asks for.
+- The grab itself is pluggable. The agent passes worker_grab() over a
+  worker of its own, so PIL grabs run in a supervised process like every
+  other capture, only downscaled pixels reach the agent process, and
+  grabs never queue behind (or hold up) tool calls. The worker reports the
+  CPU time it used; time spent waiting for it is not cost.
+- ``changes()`` answers "what changed in the last N seconds" from the
+  buffer, without a new capture. ``export()`` writes a time range as an
+  animated WebP (or GIF) clip.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from .imaging import diff_images, encode_image
+from .logging_config import get_logger
+
+try:
+    from PIL import Image, ImageGrab
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+
+logger = get_logger("recorder")
+
+CLIP_FORMATS = ("webp", "gif")
+
+
+# A grab takes max_size and returns the downscaled screen, its scale and the
+# CPU seconds it used outside the calling thread
+Grab = Callable[[Tuple[int, int]], Tuple["Image.Image", float, float]]
+
+
+def grab_scaled(max_size: Tuple[int, int]) -> Tuple["Image.Image", float, float]:
+    """Grab the screen in this thread, downscaled to fit max_size."""
+    screen = ImageGrab.grab()
+    scale = min(1.0, max_size[0] / screen.width, max_size[1] / screen.height)
+    size = (max(1, round(screen.width * scale)), max(1, round(screen.height * scale)))
+    return screen.convert("RGB").resize(size, Image.BILINEAR, reducing_gap=2.0), scale, 0.0
+
+
+def worker_grab(call: Callable[..., Dict[str, Any]]) -> Grab:
+    """
+    A grab function for ScreenRecorder backed by ScreenToolsEnhanced.grab_scaled.
+
+    Args:
+        call: Calls grab_scaled in a worker process with keyword arguments
+    """
+    def grab(max_size: Tuple[int, int]) -> Tuple["Image.Image", float, float]:
+        result = call(max_width=max_size[0], max_height=max_size[1])
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        image = Image.frombytes("RGB", (result["width"], result["height"]), result["pixels"])
+        return image, result["scale"], result["cpu_seconds"]
+    return grab
+
+
+@dataclass
+class RecordedFrame:
+    """A distinct screen state and how long it was shown."""
+
+    time: float  # Epoch time it first appeared
+    last_seen: float  # Epoch time of the last identical grab
+    digest: bytes
+    data: bytes
+    format: str
+    width: int
+    height: int
+    scale: float  # Frame pixels per screen pixel
+
+    def image(self) -> "Image.Image":
+        return Image.open(io.BytesIO(self.data))
+
+
+class ScreenRecorder:
+    """
+    Records downscaled screen frames on a background thread.
+
+    Args:
+        fps: Grabs per second asked for (lowered to meet cpu_percent)
+        max_bytes: Encoded bytes kept; the oldest frames are dropped beyond it
+        max_size: Largest frame (width, height)
+        cpu_percent: CPU of one core that grabbing may use on average
+        format: Frame format (see imaging.encode_image)
+        quality: Encoding quality
+        grab: Takes max_size and returns the screen downscaled to fit it,
+            the scale used and CPU seconds spent outside this thread (a
+            PIL grab in the recording thread if None)
+    """
+
+    def __init__(
+        self,
+        fps: float = 1.0,
+        max_bytes: int = 32 * 1024 * 1024,
+        max_size: Tuple[int, int] = (960, 960),
+        cpu_percent: float = 5.0,
+        format: str = "auto",
+        quality: int = 50,
+        grab: Optional[Grab] = None,
+    ) -> None:
+        self.fps = fps
+        self.max_bytes = max_bytes
+        self.max_size = max_size
+        self.cpu_percent = cpu_percent
+        self.format = format
+        self.quality = quality
+        self.grab = grab
+        self._frames: Deque[RecordedFrame] = deque()
+        self._bytes = 0
+        self._cost = 0.0  # Moving average of CPU seconds per grab
+        self._grabs = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def interval(self) -> float:
+        """Seconds between grabs: 1/fps, or longer to stay within the CPU budget."""
+        return max(1.0 / self.fps, self._cost * 100.0 / self.cpu_percent)
+
+    def start(self) -> "ScreenRecorder":
+        """
+        Start recording (no-op if already running).
+
+        Raises:
+            RuntimeError: If PIL is missing
+        """
+        if not HAS_PIL:
+            raise RuntimeError("PIL required for screen recording")
+        if not self.running:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="screen-recorder", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        next_tick = time.monotonic()
+        while not self._stop.wait(max(next_tick - time.monotonic(), 0)):
+            try:
+                self.record_now()
+            except Exception:
+                logger.exception("Screen recording grab failed")
+            next_tick += self.interval
+            # Skip missed ticks instead of grabbing in a burst
+            now = time.monotonic()
+            if next_tick < now:
+                next_tick = now + self.interval
+
+    def record_now(self) -> bool:
+        """
+        Grab one frame into the buffer.
+
+        Returns:
+            True if it was stored, False if it repeated the last frame
+        """
+        started = time.thread_time()
+        now = time.time()
+        small, scale, elsewhere = (self.grab or grab_scaled)(self.max_size)
+        started -= elsewhere
+        size = small.size
+        digest = hashlib.blake2b(small.tobytes(), digest_size=16).digest()
+
+        with self._lock:
+            last = self._frames[-1] if self._frames else None
+            if last is not None and last.digest == digest:
+                last.last_seen = now
+                self._account(time.thread_time() - started)
+                return False
+
+        encoded = encode_image(small, format=self.format, max_size=size, qualities=(self.quality,))
+        frame = RecordedFrame(now, now, digest, encoded.data, encoded.format, encoded.width, encoded.height, scale)
+        with self._lock:
+            self._frames.append(frame)
+            self._bytes += len(frame.data)
+            while self._bytes > self.max_bytes and len(self._frames) > 1:
+                self._bytes -= len(self._frames.popleft().data)
+            self._account(time.thread_time() - started)
+        return True
+
+    def _account(self, cost: float) -> None:
+        self._grabs += 1
+        self._cost = cost if self._grabs == 1 else 0.8 * self._cost + 0.2 * cost
+
+    # -- queries ------------------------------------------------------------------
+
+    def frames(self, start: Optional[float] = None, end: Optional[float] = None) -> List[RecordedFrame]:
+        """Frames on screen at any time between start and end (epoch seconds)."""
+        with self._lock:
+            frames = list(self._frames)
+        selected = []
+        for i, frame in enumerate(frames):
+            # A frame is shown until the next one appears
+            until = frames[i + 1].time if i + 1 < len(frames) else frame.last_seen
+            if (start is None or until >= start) and (end is None or frame.time <= end):
+                selected.append(frame)
+        return selected
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "running": self.running,
+                "frames": len(self._frames),
+                "bytes": self._bytes,
+                "grabs": self._grabs,
+                "interval": round(self.interval, 3),
+                "cpu_ms_per_grab": round(self._cost * 1000, 1),
+                "oldest": self._frames[0].time if self._frames else None,
+            }
+
+    def changes(self, seconds: float = 10.0, cell: int = 16, threshold: int = 12) -> Dict[str, Any]:
+        """
+        Describe what changed on screen in the last seconds, from the buffer.
+
+        Args:
+            seconds: How far back to look
+            cell, threshold: As imaging.diff_images
+
+        Returns:
+            Dict with 'changed', 'changes' (seconds ago each new frame
+            appeared) and 'regions' (screen coordinates that differ between
+            the first and last frame), or error
+        """
+        now = time.time()
+        frames = self.frames(now - seconds, now)
+        if not frames:
+            return {"error": "No recorded frames in that time range"}
+        first, last = frames[0], frames[-1]
+        result = {
+            "success": True,
+            "changed": len(frames) > 1,
+            "changes": [round(now - frame.time, 2) for frame in frames[1:]],
+            "regions": [],
+        }
+        if first.digest != last.digest:
+            diff = diff_images(first.image(), last.image(), cell=cell, threshold=threshold)
+            result["changed_fraction"] = diff["changed_fraction"]
+            result["regions"] = [[round(v / first.scale) for v in region] for region in diff["regions"]]
+        return result
+
+    def export(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        path: Optional[str] = None,
+        format: str = "webp",
+        speed: float = 1.0,
+    ) -> Dict[str, Any]:
+        """
+        Write the frames between start and end as an animated clip.
+
+        Args:
+            start, end: Epoch seconds (whole buffer if None)
+            path: Output file (a new temp file if None)
+            format: "webp" or "gif"
+            speed: Playback speed; each frame is held for its time on screen / speed
+
+        Returns:
+            Dict with 'path', 'frames', 'duration' (seconds recorded) and
+            'size_bytes', or error
+        """
+        if format not in CLIP_FORMATS:
+            return {"error": f"Unsupported clip format: {format} (use {', '.join(CLIP_FORMATS)})"}
+        frames = self.frames(start, end)
+        if not frames:
+            return {"error": "No recorded frames in that time range"}
+
+        end = end if end is not None else frames[-1].last_seen
+        durations = []
+        for i, frame in enumerate(frames):
+            until = frames[i + 1].time if i + 1 < len(frames) else end
+            shown = until - max(frame.time, start if start is not None else frame.time)
+            durations.append(max(20, int(shown * 1000 / speed)))  # Players clamp shorter delays
+        size = frames[-1].width, frames[-1].height
+        images = [frame.image().convert("RGB").resize(size) if (frame.width, frame.height) != size
+                  else frame.image().convert("RGB") for frame in frames]
+
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="agent-clip-", suffix=f".{format}")
+            os.close(fd)
+        try:
+            options = {"quality": self.quality} if format == "webp" else {"optimize": True}
+            images[0].save(path, format=format.upper(), save_all=True, append_images=images[1:],
+                           duration=durations, loop=0, **options)
+        except (OSError, ValueError) as e:
+            return {"error": f"Error writing clip: {e}"}
+        return {
+            "success": True,
+            "path": path,
+            "frames": len(images),
+            "duration": round(end - max(frames[0].time, start or frames[0].time), 2),
+            "size_bytes": os.path.getsize(path),
+        }
@@ -0,0 +1,273 @@
+"""
+Deterministic record/replay of LLM and tool I/O.
+
+A recording session captures every prompt, completion and tool result of a
+live agent run to a gzip-compressed JSONL file. Replaying the file serves the
+same completions and tool results back, either with the originally observed
+latency or with none, so a production session becomes a repeatable workload
+that needs neither a model nor an X display.
+
+Prompts are delta-encoded: each LLM record stores how many leading messages
+it shares with the previous prompt plus only the new messages, which keeps
+multi-step sessions compact.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import asdict
+from typing import Any, Deque, Dict, List, Optional
+
+from .llm_interface import LLMBackend
+from .tools.registry import ToolRegistry
+from .types import Message
+
+
+FORMAT_VERSION = 1
+
+
+class ReplayMismatch(RuntimeError):
+    """Raised in strict mode when a replayed call differs from the recording."""
+
+
+def _prompt_digest(messages: List[Message]) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for msg in messages:
+        h.update(f"{msg.role}\0{msg.name or ''}\0{msg.content}\0".encode("utf-8"))
+    return h.hexdigest()
+
+
+class SessionRecorder:
+    """
+    Writes LLM and tool records to a session file.
+
+    Safe to share between the recording backend and tool wrappers; each
+    record is written as one line as soon as it happens.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Initialize recorder.
+
+        Args:
+            path: Output file (gzip-compressed JSONL)
+        """
+        self.path = path
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._last_prompt: List[Message] = []
+        self._seq = 0
+        self._write({"type": "header", "version": FORMAT_VERSION, "created": time.time()})
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+
+    def record_llm(
+        self, messages: List[Message], max_tokens: int, response: Message, latency: float
+    ) -> None:
+        """Record one LLMBackend.generate call."""
+        with self._lock:
+            shared = 0
+            for prev, cur in zip(self._last_prompt, messages):
+                if prev != cur:
+                    break
+                shared += 1
+            self._last_prompt = list(messages)
+            self._seq += 1
+            self._write({
+                "type": "llm",
+                "seq": self._seq,
+                "shared": shared,
+                "new": [asdict(m) for m in messages[shared:]],
+                "digest": _prompt_digest(messages),
+                "max_tokens": max_tokens,
+                "response": asdict(response),
+                "latency": latency,
+            })
+
+    def record_tool(
+        self,
+        name: str,
+        arguments: Dict[str, Any],
+        result: Any = None,
+        error: Optional[str] = None,
+        latency: float = 0.0,
+    ) -> None:
+        """Record one tool execution (its return value or raised error)."""
+        with self._lock:
+            self._seq += 1
+            self._write({
+                "type": "tool",
+                "seq": self._seq,
+                "name": name,
+                "arguments": arguments,
+                "result": result,
+                "error": error,
+                "latency": latency,
+            })
+
+    def close(self) -> None:
+        """Flush and close the session file."""
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def __enter__(self) -> "SessionRecorder":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class SessionLog:
+    """A loaded session file."""
+
+    def __init__(self, path: str) -> None:
+        """
+        Load a session recorded by :class:`SessionRecorder`.
+
+        Args:
+            path: Session file path
+        """
+        self.path = path
+        self.llm_records: List[Dict[str, Any]] = []
+        self.tool_records: List[Dict[str, Any]] = []
+
+        prompt: List[Message] = []
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                kind = record.get("type")
+                if kind == "header":
+                    if record.get("version") != FORMAT_VERSION:
+                        raise ValueError(f"Unsupported session format: {record.get('version')}")
+                elif kind == "llm":
+                    prompt = prompt[: record["shared"]] + [Message(**m) for m in record["new"]]
+                    record["messages"] = prompt
+                    self.llm_records.append(record)
+                elif kind == "tool":
+                    self.tool_records.append(record)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Totals of recorded time, to separate inference from orchestration.
+
+        Returns:
+            Dict with call counts and recorded seconds for LLM and tools
+        """
+        return {
+            "llm_calls": len(self.llm_records),
+            "llm_seconds": sum(r["latency"] for r in self.llm_records),
+            "tool_calls": len(self.tool_records),
+            "tool_seconds": sum(r["latency"] for r in self.tool_records),
+        }
+
+
+class RecordingBackend(LLMBackend):
+    """Wraps a backend and records every generate call."""
+
+    def __init__(self, backend: LLMBackend, recorder: SessionRecorder) -> None:
+        self.backend = backend
+        self.recorder = recorder
+
+    def generate(self, messages: List[Message], max_tokens: int = 256) -> Message:
+        started = time.perf_counter()
+        response = self.backend.generate(messages, max_tokens=max_tokens)
+        self.recorder.record_llm(messages, max_tokens, response, time.perf_counter() - started)
+        return response
+
+
+class ReplayBackend(LLMBackend):
+    """
+    Serves recorded completions in order.
+
+    Args:
+        log: Loaded session
+        latency: "original" to sleep for the recorded duration, "zero" to return immediately
+        strict: Raise ReplayMismatch if the prompt differs from the recording
+    """
+
+    def __init__(self, log: SessionLog, latency: str = "zero", strict: bool = False) -> None:
+        if latency not in ("original", "zero"):
+            raise ValueError(f"Unknown latency mode: {latency}")
+        self.log = log
+        self.latency = latency
+        self.strict = strict
+        self._index = 0
+        self._lock = threading.Lock()
+
+    def generate(self, messages: List[Message], max_tokens: int = 256) -> Message:
+        with self._lock:
+            if self._index >= len(self.log.llm_records):
+                raise ReplayMismatch(
+                    f"Session exhausted after {len(self.log.llm_records)} LLM calls"
+                )
+            record = self.log.llm_records[self._index]
+            self._index += 1
+
+        if self.strict and _prompt_digest(messages) != record["digest"]:
+            raise ReplayMismatch(f"Prompt differs from recording at LLM call {record['seq']}")
+        if self.latency == "original":
+            time.sleep(record["latency"])
+        return Message(**record["response"])
+
+
+def record_tools(registry: ToolRegistry, recorder: SessionRecorder) -> None:
+    """
+    Wrap every registered tool so its results are recorded.
+
+    Args:
+        registry: Tool registry to instrument in place
+        recorder: Destination for tool records
+    """
+    for tool in list(registry.list_tools()):
+        def recording(_func=tool.func, _name=tool.name, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = _func(**kwargs)
+            except Exception as e:
+                recorder.record_tool(
+                    _name, kwargs, error=f"{type(e).__name__}: {e}",
+                    latency=time.perf_counter() - started,
+                )
+                raise
+            recorder.record_tool(_name, kwargs, result=result, latency=time.perf_counter() - started)
+            return result
+
+        tool.func = recording
+
+
+def replay_tools(registry: ToolRegistry, log: SessionLog, latency: str = "zero") -> None:
+    """
+    Replace every registered tool with one that serves recorded results.
+
+    Results are served per tool name in recorded order, so the replay does
+    not depend on how calls to different tools interleave.
+
+    Args:
+        registry: Tool registry to patch in place
+        log: Loaded session
+        latency: "original" or "zero", as for ReplayBackend
+    """
+    queues: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+    for record in log.tool_records:
+        queues[record["name"]].append(record)
+
+    for tool in list(registry.list_tools()):
+        def replaying(_name=tool.name, **kwargs):
+            queue = queues[_name]
+            if not queue:
+                raise ReplayMismatch(f"No recorded result left for tool '{_name}'")
+            record = queue.popleft()
+            if latency == "original":
+                time.sleep(record["latency"])
+            if record["error"] is not None:
+                raise RuntimeError(record["error"])
+            return record["result"]
+
+        tool.func = replaying
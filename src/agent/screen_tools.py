@@ -12,6 +12,8 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Dict, Optional, Tuple
 
+from .x11.display import get_display_info
+
 
 @dataclass
 class ScreenInfo:
@@ -43,8 +45,15 @@ class ScreenTools:
         Get screen/display information.
 
         Returns:
-            Dict with screen dimensions and display info, or error
+            Dict with screen dimensions and display info (plus 'dpi' and
+            'monitors' when RandR answers), or error
         """
+        try:
+            info = get_display_info(self.display)
+            return {**info.to_dict(), "display": self.display}
+        except RuntimeError:
+            pass  # No python-xlib or no connection; ask xdpyinfo
+
         try:
             # Use xdpyinfo to get screen info
             result = subprocess.run(
@@ -9,8 +9,16 @@ import base64
 import io
 import os
 import subprocess
+import tempfile
 import time
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from . import grounding, recorder
+from .config import settings
+from .imaging import diff_images, encode_image
+from .metrics import SCREEN_CAPTURE_BYTES, SCREEN_CAPTURE_SECONDS
+from .tools.frames import FrameStore, default_frame_store
+from .x11.display import get_display_info
 
 try:
     from PIL import Image, ImageGrab
@@ -30,215 +38,423 @@ class ScreenToolsEnhanced:
     Enhanced screen capture and vision tools.
     """
 
-    def __init__(self, display: Optional[str] = None):
+    def __init__(self, display: Optional[str] = None, frames: Optional[FrameStore] = None):
         """
         Initialize screen tools.
         
         Args:
             display: X11 display (e.g., ":0"). Auto-detects if None.
+            frames: Store for captured frames (the shared default if None)
         """
         self.display = display or os.environ.get("DISPLAY", ":0")
-        self.last_capture: Optional[bytes] = None
+        self.frames = frames or default_frame_store
+        self.last_frame: Optional[str] = None  # Handle of the last stored capture
 
-    def capture_screen(self, format: str = "png") -> Dict[str, Any]:
+    def capture_frame(self, format: str = "auto", grayscale: bool = False, active_window: bool = False,
+                      region: Optional[List[int]] = None, max_width: Optional[int] = None,
+                      max_height: Optional[int] = None, max_kb: Optional[int] = None,
+                      monitor: Optional[str] = None) -> Dict[str, Any]:
         """
-        Capture the entire screen.
+        Capture and encode a frame without storing it.
+        
+        This is the part of a capture that runs in a tool worker; the
+        encoded bytes come back to the agent, which stores them.
         
         Args:
-            format: Image format (png, jpeg)
+            format: Image format (auto, webp, jpeg, png)
+            grayscale: Drop color
+            active_window: Crop to the focused window
+            region: Crop to [x, y, width, height] instead
+            max_width, max_height: Largest encoded size (vision model input
+                size from settings if None)
+            max_kb: Encoded size target in KB (settings if None)
+            monitor: Crop to a monitor by name, index or "primary"
             
         Returns:
-            Dict with image data (base64) or error
+            Dict with 'frame' (encoded bytes), 'format', 'width', 'height',
+            'origin', 'scale' and 'quality', or error
         """
         try:
             if not HAS_PIL:
-                # Fallback to xwd + convert
-                return self._capture_via_xwd(format)
-            
-            # Use PIL for screen capture
-            screenshot = ImageGrab.grab()
+                # Fallback to xwd + convert (full screen, no scaling)
+                return self._capture_via_xwd("png" if format == "auto" else format)
             
-            # Convert to bytes
-            img_bytes = io.BytesIO()
-            screenshot.save(img_bytes, format=format.upper())
-            img_bytes.seek(0)
-            self.last_capture = img_bytes.read()
-            
-            # Encode to base64
-            img_base64 = base64.b64encode(self.last_capture).decode('utf-8')
+            started = time.perf_counter()
+            if active_window:
+                geometry = self._active_window_geometry()
+                if "error" in geometry:
+                    return geometry
+                region = geometry["bounds"]
+            elif monitor is not None:
+                geometry = self.monitor_region(monitor)
+                if "error" in geometry:
+                    return geometry
+                region = geometry["bounds"]
+            if region:
+                x, y, width, height = region
+                screenshot = ImageGrab.grab(bbox=(x, y, x + width, y + height))
+                origin = (x, y)
+            else:
+                screenshot = ImageGrab.grab()
+                origin = (0, 0)
             
+            encoded = encode_image(
+                screenshot,
+                format=format,
+                max_size=(max_width or settings.vision_max_width, max_height or settings.vision_max_height),
+                max_bytes=(max_kb or settings.screenshot_max_kb) * 1024,
+                grayscale=grayscale,
+            )
+            operation = "capture_region" if region else "capture_screen"
+            SCREEN_CAPTURE_SECONDS.observe(time.perf_counter() - started, operation=operation)
+            SCREEN_CAPTURE_BYTES.inc(len(encoded.data), operation=operation)
             return {
                 "success": True,
-                "format": format,
-                "width": screenshot.width,
-                "height": screenshot.height,
-                "data": img_base64,
-                "size_bytes": len(self.last_capture),
+                "frame": encoded.data,
+                "format": encoded.format,
+                "width": encoded.width,
+                "height": encoded.height,
+                "origin": origin,
+                "scale": encoded.scale,
+                "quality": encoded.quality,
             }
+        except ValueError as e:
+            return {"error": str(e)}
         except Exception as e:
             return {"error": f"Error capturing screen: {e}"}
 
-    def _capture_via_xwd(self, format: str) -> Dict[str, Any]:
-        """Fallback screen capture using xwd."""
+    def grab_scaled(self, max_width: int = 960, max_height: int = 960) -> Dict[str, Any]:
+        """
+        Grab the screen downscaled, as raw pixels (for the screen recorder).
+        
+        Returns:
+            Dict with 'pixels' (RGB bytes), 'width', 'height', 'scale' and
+            'cpu_seconds' (spent on the grab), or error
+        """
+        if not HAS_PIL:
+            return {"error": "PIL required for screen recording"}
+        started = time.thread_time()
         try:
-            # Use xwd to capture screen
-            xwd_process = subprocess.Popen(
-                ["xwd", "-root", "-out", "/tmp/screenshot.xwd"],
-                env={**os.environ, "DISPLAY": self.display},
-            )
-            xwd_process.wait()
-            
-            # Convert to PNG using ImageMagick or PIL
-            if HAS_PIL:
-                img = Image.open("/tmp/screenshot.xwd")
-                img_bytes = io.BytesIO()
-                img.save(img_bytes, format=format.upper())
-                img_bytes.seek(0)
-                self.last_capture = img_bytes.read()
-                img_base64 = base64.b64encode(self.last_capture).decode('utf-8')
-                
-                return {
-                    "success": True,
-                    "format": format,
-                    "width": img.width,
-                    "height": img.height,
-                    "data": img_base64,
-                }
-            else:
-                # Use convert command
-                subprocess.run(
-                    ["convert", "/tmp/screenshot.xwd", f"/tmp/screenshot.{format}"],
-                    check=True,
-                )
-                with open(f"/tmp/screenshot.{format}", "rb") as f:
-                    self.last_capture = f.read()
-                    img_base64 = base64.b64encode(self.last_capture).decode('utf-8')
-                
-                return {
-                    "success": True,
-                    "format": format,
-                    "data": img_base64,
-                }
+            image, scale, _ = recorder.grab_scaled((max_width, max_height))
+            pixels = image.tobytes()
         except Exception as e:
-            return {"error": f"Error capturing via xwd: {e}"}
+            return {"error": f"Error capturing screen: {e}"}
+        return {"success": True, "pixels": pixels, "width": image.width, "height": image.height,
+                "scale": scale, "cpu_seconds": time.thread_time() - started}
+
+    def store_frame(self, captured: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Put a frame from capture_frame into the frame store.
+        
+        Returns:
+            Dict with the frame's 'handle', size and scale (and base64 'data'
+            if it is small), or the capture's error
+        """
+        if "error" in captured:
+            return captured
+        data = captured["frame"]
+        handle = self.frames.put(data, captured["format"], captured["width"], captured["height"],
+                                 captured["origin"], captured["scale"])
+        self.last_frame = handle
+        result = {
+            "success": True,
+            **self.frames.get(handle).info(),
+            "quality": captured["quality"],
+        }
+        if len(data) <= settings.screenshot_inline_kb * 1024:
+            result["data"] = base64.b64encode(data).decode('utf-8')
+        return result
+
+    def capture_screen(self, format: str = "auto", grayscale: bool = False, active_window: bool = False,
+                       max_width: Optional[int] = None, max_height: Optional[int] = None,
+                       max_kb: Optional[int] = None, monitor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Capture the screen, encoded for a vision model, into the frame store.
+        
+        Args:
+            As capture_frame
+            
+        Returns:
+            Dict as store_frame: the frame's 'handle' (screen point =
+            origin + pixel / scale), or error
+        """
+        return self.store_frame(self.capture_frame(format, grayscale, active_window, None,
+                                                   max_width, max_height, max_kb, monitor))
 
-    def capture_region(self, x: int, y: int, width: int, height: int, format: str = "png") -> Dict[str, Any]:
+    def capture_region(self, x: int, y: int, width: int, height: int, format: str = "auto",
+                       grayscale: bool = False, max_kb: Optional[int] = None) -> Dict[str, Any]:
         """
-        Capture a specific region of the screen.
+        Capture a specific region of the screen into the frame store.
         
         Args:
             x: X coordinate
             y: Y coordinate
             width: Region width
             height: Region height
-            format: Image format
+            format: Image format (auto, webp, jpeg, png)
+            grayscale: Drop color
+            max_kb: Encoded size target in KB (settings if None)
             
         Returns:
-            Dict with image data or error
+            Dict as capture_screen, or error
         """
-        try:
-            if not HAS_PIL:
-                return {"error": "PIL required for region capture"}
-            
-            screenshot = ImageGrab.grab(bbox=(x, y, x + width, y + height))
-            
-            img_bytes = io.BytesIO()
-            screenshot.save(img_bytes, format=format.upper())
-            img_bytes.seek(0)
-            img_data = img_bytes.read()
+        if not HAS_PIL:
+            return {"error": "PIL required for region capture"}
+        return self.store_frame(self.capture_frame(format, grayscale, region=[x, y, width, height], max_kb=max_kb))
+
+    def monitor_region(self, monitor: str) -> Dict[str, Any]:
+        """
+        Bounds of a monitor from the cached display info.
+        
+        Args:
+            monitor: Output name (e.g. "HDMI-1"), index or "primary"
             
-            img_base64 = base64.b64encode(img_data).decode('utf-8')
+        Returns:
+            Dict with 'bounds' ([x, y, width, height]), or error
+        """
+        try:
+            info = get_display_info(self.display)
+        except RuntimeError as e:
+            return {"error": str(e)}
+        found = info.monitor(str(monitor))
+        if found is None:
+            names = ", ".join(m.name for m in info.monitors)
+            return {"error": f"Unknown monitor: {monitor} (available: {names})"}
+        return {"bounds": list(found.bounds)}
+
+    def _active_window_geometry(self) -> Dict[str, Any]:
+        """Bounds of the focused window via xdotool."""
+        try:
+            result = subprocess.run(
+                ["xdotool", "getactivewindow", "getwindowgeometry", "--shell"],
+                capture_output=True,
+                text=True,
+                timeout=5,
+                env={**os.environ, "DISPLAY": self.display},
+            )
+        except FileNotFoundError:
+            return {"error": "xdotool not found. Install: sudo apt install xdotool"}
+        except subprocess.TimeoutExpired:
+            return {"error": "Command timed out"}
+        if result.returncode != 0:
+            return {"error": f"Failed to get active window: {result.stderr}"}
+        
+        # Output: WINDOW=..., X=..., Y=..., WIDTH=..., HEIGHT=..., SCREEN=...
+        values = dict(line.split("=", 1) for line in result.stdout.split() if "=" in line)
+        try:
+            return {"bounds": [int(values[k]) for k in ("X", "Y", "WIDTH", "HEIGHT")]}
+        except (KeyError, ValueError):
+            return {"error": f"Failed to parse window geometry: {result.stdout}"}
+
+    def _capture_via_xwd(self, format: str) -> Dict[str, Any]:
+        """Fallback frame capture using xwd and ImageMagick."""
+        try:
+            # A private directory per capture, so concurrent captures cannot collide
+            with tempfile.TemporaryDirectory(prefix="agent-xwd-") as tmp:
+                xwd_path = os.path.join(tmp, "screen.xwd")
+                out_path = os.path.join(tmp, f"screen.{format}")
+                subprocess.run(
+                    ["xwd", "-root", "-silent", "-out", xwd_path],
+                    env={**os.environ, "DISPLAY": self.display},
+                    check=True,
+                    timeout=10,
+                )
+                size = subprocess.run(
+                    ["convert", xwd_path, "-print", "%w %h", out_path],
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                    timeout=30,
+                ).stdout.split()
+                with open(out_path, "rb") as f:
+                    data = f.read()
             
             return {
                 "success": True,
+                "frame": data,
                 "format": format,
-                "x": x,
-                "y": y,
-                "width": width,
-                "height": height,
-                "data": img_base64,
+                "width": int(size[0]),
+                "height": int(size[1]),
+                "origin": (0, 0),
+                "scale": 1.0,
+                "quality": None,
             }
         except Exception as e:
-            return {"error": f"Error capturing region: {e}"}
+            return {"error": f"Error capturing via xwd: {e}"}
+
+    def _open_frame(self, frame: Union[str, bytes], origin: Tuple[int, int], scale: float):
+        """Decode a frame given by handle or bytes; returns (image, origin, scale)."""
+        if isinstance(frame, str):
+            with self.frames.use(frame) as (info, data):
+                return Image.open(io.BytesIO(data)), info.origin, info.scale
+        return Image.open(io.BytesIO(frame)), tuple(origin), scale
+
+    def diff_frames(self, before: Union[str, bytes], after: Union[str, bytes],
+                    origin: Tuple[int, int] = (0, 0), scale: float = 1.0) -> Dict[str, Any]:
+        """
+        Find the screen regions that changed between two frames.
+        
+        Args:
+            before: Earlier frame (handle, or encoded bytes with origin and scale)
+            after: Later frame of the same area
+            origin, scale: Placement of before when it is given as bytes
+            
+        Returns:
+            Dict with 'changed', 'changed_fraction' and 'regions' as
+            [x, y, width, height] in screen coordinates, or error
+        """
+        if not HAS_PIL:
+            return {"error": "PIL required for frame diffs"}
+        try:
+            first, origin, scale = self._open_frame(before, origin, scale)
+            second, _, _ = self._open_frame(after, origin, scale)
+            result = diff_images(first, second)
+        except KeyError as e:
+            return {"error": e.args[0]}
+        except Exception as e:
+            return {"error": f"Error comparing frames: {e}"}
+        
+        result["regions"] = [
+            [origin[0] + round(x / scale), origin[1] + round(y / scale), round(w / scale), round(h / scale)]
+            for x, y, w, h in result["regions"]
+        ]
+        return {"success": True, **result}
 
     def extract_text_from_screen(self, x: Optional[int] = None, y: Optional[int] = None, 
-                                  width: Optional[int] = None, height: Optional[int] = None) -> Dict[str, Any]:
+                                  width: Optional[int] = None, height: Optional[int] = None,
+                                  frame: Optional[Union[str, bytes]] = None,
+                                  origin: Tuple[int, int] = (0, 0), scale: float = 1.0) -> Dict[str, Any]:
         """
         Extract text from screen using OCR.
         
         Args:
-            x, y, width, height: Optional region to OCR (if None, uses full screen)
+            x, y, width, height: Optional region to OCR in screen coordinates
+                (if None, uses the full screen or frame)
+            frame: OCR this stored frame (handle, or encoded bytes with
+                origin and scale) instead of capturing the screen
             
         Returns:
             Dict with extracted text or error
         """
         if not HAS_OCR:
             return {"error": "pytesseract not installed. Install: sudo apt install tesseract-ocr"}
+        if not HAS_PIL:
+            return {"error": "PIL required for OCR"}
         
+        region = x is not None and y is not None and width is not None and height is not None
         try:
-            # Capture screen or region
-            if x is not None and y is not None and width is not None and height is not None:
-                capture_result = self.capture_region(x, y, width, height)
+            if frame is not None:
+                img, origin, scale = self._open_frame(frame, origin, scale)
+                if region:
+                    left, top = (x - origin[0]) * scale, (y - origin[1]) * scale
+                    img = img.crop((round(left), round(top), round(left + width * scale), round(top + height * scale)))
+            elif region:
+                # Capture at full resolution (no encoding)
+                img = ImageGrab.grab(bbox=(x, y, x + width, y + height))
             else:
-                capture_result = self.capture_screen()
-            
-            if "error" in capture_result:
-                return capture_result
-            
-            # Decode image
-            img_data = base64.b64decode(capture_result["data"])
-            img = Image.open(io.BytesIO(img_data))
+                img = ImageGrab.grab()
             
             # Extract text
+            started = time.perf_counter()
             text = pytesseract.image_to_string(img)
+            SCREEN_CAPTURE_SECONDS.observe(time.perf_counter() - started, operation="ocr")
             
             return {
                 "success": True,
                 "text": text.strip(),
                 "confidence": "N/A",  # pytesseract can provide confidence with image_to_data
             }
+        except KeyError as e:
+            return {"error": e.args[0]}
         except Exception as e:
             return {"error": f"Error extracting text: {e}"}
 
-    def get_screen_resolution(self) -> Dict[str, Any]:
+    def ground_screen(self, accessible: Optional[List[Dict[str, Any]]] = None, annotate: bool = True,
+                      max_width: int = 1280) -> Dict[str, Any]:
         """
-        Get screen resolution.
+        Ground the screen into numbered, clickable elements (set-of-marks).
         
+        Args:
+            accessible: Accessibility nodes (dicts with role, name and bounds)
+                to merge with OCR and detected regions
+            annotate: Also encode a downscaled screenshot with the numbered
+                boxes drawn on it
+            max_width: Width of the annotated screenshot
+            
         Returns:
-            Dict with screen resolution
+            Dict with 'elements' (id, source, role, label, bounds, center)
+            and optionally 'annotated' (encoded frame as from capture_frame,
+            for the frame store), or error
         """
+        if not HAS_PIL:
+            return {"error": "PIL required for grounding"}
+        
         try:
-            if HAS_PIL:
-                screenshot = ImageGrab.grab()
-                return {
-                    "success": True,
-                    "width": screenshot.width,
-                    "height": screenshot.height,
+            started = time.perf_counter()
+            screenshot = ImageGrab.grab()
+            marks = grounding.ground(screenshot, accessible or ())
+            SCREEN_CAPTURE_SECONDS.observe(time.perf_counter() - started, operation="ground")
+            
+            result = {
+                "success": True,
+                "width": screenshot.width,
+                "height": screenshot.height,
+                "elements": [mark.to_dict() for mark in marks],
+                "ocr": HAS_OCR,
+            }
+            if annotate:
+                marked = grounding.annotate(screenshot, marks, max_width)
+                encoded = encode_image(marked, format="jpeg", max_size=marked.size, qualities=(80,))
+                result["annotated"] = {
+                    "frame": encoded.data,
+                    "format": encoded.format,
+                    "width": encoded.width,
+                    "height": encoded.height,
+                    "origin": (0, 0),
+                    "scale": encoded.width / screenshot.width,
                 }
-            else:
-                # Use xrandr
-                result = subprocess.run(
-                    ["xrandr"],
-                    capture_output=True,
-                    text=True,
-                    env={**os.environ, "DISPLAY": self.display},
-                )
-                
-                # Parse output
-                for line in result.stdout.split('\n'):
-                    if '*' in line:
-                        parts = line.split()
-                        for i, part in enumerate(parts):
-                            if '*' in part:
-                                resolution = parts[i-1]
-                                width, height = map(int, resolution.split('x'))
-                                return {
-                                    "success": True,
-                                    "width": width,
-                                    "height": height,
-                                }
-                
-                return {"error": "Could not determine screen resolution"}
+            return result
         except Exception as e:
-            return {"error": f"Error getting resolution: {e}"}
+            return {"error": f"Error grounding screen: {e}"}
 
+    def get_screen_resolution(self) -> Dict[str, Any]:
+        """
+        Get screen resolution, monitor layout and DPI.
+        
+        Served from the RandR display info cache; falls back to parsing
+        xrandr if the X display cannot be queried directly.
+        
+        Returns:
+            Dict with 'width', 'height', 'dpi' and 'monitors' (name, bounds,
+            primary, dpi), or error
+        """
+        try:
+            return {"success": True, **get_display_info(self.display).to_dict()}
+        except RuntimeError:
+            pass
+        
+        try:
+            result = subprocess.run(
+                ["xrandr"],
+                capture_output=True,
+                text=True,
+                env={**os.environ, "DISPLAY": self.display},
+            )
+            
+            # Parse output
+            for line in result.stdout.split('\n'):
+                if '*' in line:
+                    parts = line.split()
+                    for i, part in enumerate(parts):
+                        if '*' in part:
+                            resolution = parts[i-1]
+                            width, height = map(int, resolution.split('x'))
+                            return {
+                                "success": True,
+                                "width": width,
+                                "height": height,
+                            }
+            
+            return {"error": "Could not determine screen resolution"}
+        except Exception as e:
+            return {"error": f"Error getting resolution: {e}"}
@@ -0,0 +1,378 @@
+"""
+Resource limits for agent-run commands.
+
+Commands the model runs share the machine with local LLM inference, so they
+are started at low priority and boxed in:
+
+* With a delegated cgroup v2 subtree (``AGENT_CGROUP_ROOT``), every command
+  gets its own child cgroup with ``cpu.max`` (CPU quota), ``memory.max``
+  (swap disabled) and ``pids.max``. The limits cover the whole process tree,
+  ``cgroup.kill`` reaps everything on timeout, and peak memory, peak process
+  count and CPU time are read back from the cgroup.
+* Otherwise the command falls back to per-process ``setrlimit`` caps
+  (``RLIMIT_DATA`` for memory, ``RLIMIT_NPROC`` for processes,
+  ``RLIMIT_CPU`` for CPU seconds) and peak usage comes from the ``wait4``
+  rusage of the command and the children it waited for.
+
+Either way the command runs niced, in the idle I/O class (or SCHED_IDLE if
+configured) so it only gets CPU and disk time the model is not using, and
+with credentials scrubbed from its environment.
+"""
+
+from __future__ import annotations
+
+import os
+import resource
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import psutil
+
+from ..config import settings
+from ..logging_config import get_logger
+
+
+logger = get_logger("shell")
+
+# Environment variables whose names contain these are not passed to commands
+SENSITIVE_ENV = ("PASSWORD", "SECRET", "KEY", "TOKEN", "API")
+
+IO_CLASSES = {
+    "idle": psutil.IOPRIO_CLASS_IDLE,
+    "best-effort": psutil.IOPRIO_CLASS_BE,
+}
+
+CPU_PERIOD_US = 100_000
+
+
+def _write(path: str, value: str) -> None:
+    with open(path, "w") as f:
+        f.write(value)
+
+
+def _read_keyed(path: str) -> Dict[str, int]:
+    """Parse a flat-keyed cgroup file ("key value" per line)."""
+    values = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                key, _, value = line.partition(" ")
+                values[key] = int(value)
+    except (OSError, ValueError):
+        pass
+    return values
+
+
+def _read_int(path: str) -> Optional[int]:
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _read_int_lines(path: str) -> Optional[List[int]]:
+    try:
+        with open(path) as f:
+            return [int(line) for line in f if line.strip()]
+    except (OSError, ValueError):
+        return None
+
+
+def _user_task_count(uid: int) -> int:
+    # RLIMIT_NPROC counts threads, not processes
+    count = 0
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                if os.stat(f"/proc/{entry}").st_uid == uid:
+                    count += len(os.listdir(f"/proc/{entry}/task"))
+            except OSError:
+                pass
+    return count
+
+
+def cgroup_usable(root: Optional[str]) -> bool:
+    """Whether root is a cgroup v2 directory this process can create jobs in."""
+    return bool(root) and os.path.exists(os.path.join(root, "cgroup.controllers")) and os.access(root, os.W_OK)
+
+
+@dataclass
+class ResourceLimits:
+    """
+    Limits applied to every command the agent runs.
+
+    Args:
+        cpu_quota: CPUs the command may use (1.5 = one and a half cores;
+            cgroup only)
+        memory_bytes: Memory cap (whole tree with cgroups, per process otherwise)
+        max_processes: Process/thread cap (whole tree with cgroups; otherwise
+            on top of the user's current process count)
+        cpu_seconds: CPU time after which a process is killed (SIGXCPU)
+        nice: Minimum niceness (a more niced agent is never raised)
+        io_class: "idle", "best-effort" or None to leave I/O priority alone
+        sched_idle: Run under SCHED_IDLE, i.e. only on otherwise idle CPUs
+        scrub_env: Drop credential-like variables from the environment
+        cgroup_root: Delegated cgroup v2 directory to create job cgroups in
+    """
+
+    cpu_quota: Optional[float] = None
+    memory_bytes: Optional[int] = None
+    max_processes: Optional[int] = None
+    cpu_seconds: Optional[int] = None
+    nice: int = 10
+    io_class: Optional[str] = "idle"
+    sched_idle: bool = False
+    scrub_env: bool = True
+    cgroup_root: Optional[str] = None
+
+    def __post_init__(self) -> None:
+        if self.io_class is not None and self.io_class not in IO_CLASSES:
+            raise ValueError(f"io_class must be one of {', '.join(IO_CLASSES)} or None")
+
+    @classmethod
+    def from_settings(cls) -> "ResourceLimits":
+        """Limits configured through the AGENT_JOB_* environment variables."""
+        memory = settings.job_memory_mb
+        if memory is None:
+            memory = psutil.virtual_memory().total // 2 // (1024 * 1024)
+        return cls(
+            cpu_quota=settings.job_cpu_quota or None,
+            memory_bytes=memory * 1024 * 1024 if memory else None,
+            max_processes=settings.job_max_processes or None,
+            cpu_seconds=settings.job_cpu_seconds or None,
+            nice=settings.job_nice,
+            io_class=settings.job_io_class or None,
+            sched_idle=settings.job_sched_idle,
+            cgroup_root=settings.cgroup_root or None,
+        )
+
+    @property
+    def use_cgroup(self) -> bool:
+        return cgroup_usable(self.cgroup_root)
+
+    def environment(self) -> Dict[str, str]:
+        """Environment for a command."""
+        if not self.scrub_env:
+            return os.environ.copy()
+        return {k: v for k, v in os.environ.items() if not any(s in k.upper() for s in SENSITIVE_ENV)}
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "backend": "cgroup" if self.use_cgroup else "rlimit",
+            "cpu_quota": self.cpu_quota,
+            "memory_bytes": self.memory_bytes,
+            "max_processes": self.max_processes,
+            "cpu_seconds": self.cpu_seconds,
+            "nice": self.nice,
+            "io_class": self.io_class,
+            "sched_idle": self.sched_idle,
+        }
+
+    def preexec(self, cgroup: Optional["CgroupJob"] = None, then: Optional[Callable[[], None]] = None) -> Callable[[], None]:
+        """
+        Build a preexec_fn that applies the limits in the child.
+
+        Everything that needs lookups (current niceness, process counts) is
+        computed here, in the parent, so the child only makes syscalls. The
+        I/O class has no os wrapper and is set by after_spawn() instead.
+
+        Args:
+            cgroup: Job cgroup the child joins (rlimits are skipped for the
+                limits it enforces)
+            then: Further preexec work (runs last)
+        """
+        rlimits = []
+        if self.cpu_seconds:
+            rlimits.append((resource.RLIMIT_CPU, self.cpu_seconds))
+        if cgroup is None:
+            if self.memory_bytes:
+                # RLIMIT_DATA counts heap and writable private mappings but,
+                # unlike RLIMIT_AS, not PROT_NONE reservations (JITs, Go)
+                rlimits.append((resource.RLIMIT_DATA, self.memory_bytes))
+            if self.max_processes:
+                # RLIMIT_NPROC counts every thread of the user
+                used = _user_task_count(os.getuid())
+                rlimits.append((resource.RLIMIT_NPROC, used + self.max_processes))
+        rlimits = [(which, _capped(which, value)) for which, value in rlimits]
+
+        nice = self.nice if self.nice > os.getpriority(os.PRIO_PROCESS, 0) else None
+        sched_idle = self.sched_idle and hasattr(os, "SCHED_IDLE")
+        procs = cgroup.procs_file if cgroup is not None else None
+
+        def apply() -> None:
+            if procs is not None:
+                # Join first so every later fork is accounted to the job
+                _write(procs, str(os.getpid()))
+            for which, value in rlimits:
+                resource.setrlimit(which, value)
+            if nice is not None:
+                os.setpriority(os.PRIO_PROCESS, 0, nice)
+            if sched_idle:
+                try:
+                    os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+                except OSError:
+                    pass
+            if then is not None:
+                then()
+
+        return apply
+
+    def after_spawn(self, pid: int) -> None:
+        """
+        Apply the limits set from the parent once the child exists.
+
+        The I/O class goes through psutil, which is not safe to use between
+        fork and exec. It is inherited by everything the child forks later.
+        """
+        if self.io_class:
+            try:
+                psutil.Process(pid).ionice(IO_CLASSES[self.io_class])
+            except (OSError, psutil.Error):
+                pass
+
+
+def _capped(which: int, value: int) -> Tuple[int, int]:
+    # An unprivileged process cannot raise its hard limit
+    _, hard = resource.getrlimit(which)
+    if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    return value, value
+
+
+class CgroupJob:
+    """
+    A cgroup v2 child group holding one command (or one shell session).
+
+    Args:
+        root: Delegated parent cgroup directory
+        limits: Limits to write into the group
+        name: Group name (random if None)
+    """
+
+    def __init__(self, root: str, limits: ResourceLimits, name: Optional[str] = None) -> None:
+        self.path = os.path.join(root, name or f"job-{uuid.uuid4().hex[:12]}")
+        os.mkdir(self.path)
+        try:
+            self._configure(root, limits)
+        except OSError:
+            self.remove()
+            raise
+
+    @property
+    def procs_file(self) -> str:
+        return os.path.join(self.path, "cgroup.procs")
+
+    def _configure(self, root: str, limits: ResourceLimits) -> None:
+        wanted = {"cpu": limits.cpu_quota, "memory": limits.memory_bytes, "pids": limits.max_processes}
+        with open(os.path.join(root, "cgroup.subtree_control")) as f:
+            enabled = set(f.read().split())
+        missing = [c for c, value in wanted.items() if value and c not in enabled]
+        if missing:
+            # Only possible while the parent itself holds no processes
+            _write(os.path.join(root, "cgroup.subtree_control"), " ".join(f"+{c}" for c in missing))
+
+        if limits.cpu_quota:
+            quota = max(int(limits.cpu_quota * CPU_PERIOD_US), 1000)
+            _write(os.path.join(self.path, "cpu.max"), f"{quota} {CPU_PERIOD_US}")
+        if limits.memory_bytes:
+            _write(os.path.join(self.path, "memory.max"), str(limits.memory_bytes))
+            swap = os.path.join(self.path, "memory.swap.max")
+            if os.path.exists(swap):
+                # Swapping a runaway job out would page the model out with it
+                _write(swap, "0")
+        if limits.max_processes:
+            _write(os.path.join(self.path, "pids.max"), str(limits.max_processes))
+
+    def usage(self) -> Dict[str, Any]:
+        """Peak and cumulative usage of the group so far."""
+        cpu = _read_keyed(os.path.join(self.path, "cpu.stat"))
+        events = _read_keyed(os.path.join(self.path, "memory.events"))
+        usage: Dict[str, Any] = {"backend": "cgroup"}
+        if "usage_usec" in cpu:
+            usage["cpu_seconds"] = round(cpu["usage_usec"] / 1e6, 3)
+            usage["user_seconds"] = round(cpu.get("user_usec", 0) / 1e6, 3)
+            usage["system_seconds"] = round(cpu.get("system_usec", 0) / 1e6, 3)
+        if "nr_throttled" in cpu:
+            usage["cpu_throttled"] = cpu["nr_throttled"]
+        # memory.peak needs Linux 5.19 and pids.peak 6.1
+        peak = _read_int(os.path.join(self.path, "memory.peak"))
+        if peak is None:
+            peak = _read_int(os.path.join(self.path, "memory.current"))
+        if peak is not None:
+            usage["max_memory_bytes"] = peak
+        pids = _read_int(os.path.join(self.path, "pids.peak"))
+        if pids is not None:
+            usage["max_processes"] = pids
+        if events.get("oom_kill"):
+            usage["oom_killed"] = events["oom_kill"]
+        return usage
+
+    def kill(self) -> None:
+        """SIGKILL every process in the group, including escaped daemons."""
+        try:
+            _write(os.path.join(self.path, "cgroup.kill"), "1")
+            return
+        except OSError:
+            pass  # Before Linux 5.14
+        for pid in _read_int_lines(self.procs_file) or []:
+            try:
+                os.kill(pid, 9)
+            except OSError:
+                pass
+
+    def remove(self, timeout: float = 2.0) -> None:
+        """Delete the group once its processes are gone."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                os.rmdir(self.path)
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                if time.monotonic() >= deadline:
+                    logger.warning("Could not remove cgroup %s", self.path)
+                    return
+                self.kill()
+                time.sleep(0.01)
+
+
+def reap(pid: int, timeout: Optional[float]) -> Optional[Tuple[int, resource.struct_rusage]]:
+    """
+    Wait for a child and collect its resource usage.
+
+    Unlike Popen.wait(), wait4() returns the rusage of the child and of the
+    descendants it waited for.
+
+    Returns:
+        (exit code, rusage), or None if the child is still running at the
+        timeout or was already reaped elsewhere
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = 0.0005
+    while True:
+        try:
+            found, status, usage = os.wait4(pid, os.WNOHANG)
+        except ChildProcessError:
+            return None
+        if found:
+            return os.waitstatus_to_exitcode(status), usage
+        if deadline is not None and time.monotonic() >= deadline:
+            return None
+        time.sleep(delay)
+        delay = min(delay * 2, 0.05)
+
+
+def rusage_summary(usage: resource.struct_rusage) -> Dict[str, Any]:
+    """Resource usage of a reaped command (ru_maxrss is in KiB on Linux)."""
+    return {
+        "backend": "rlimit",
+        "cpu_seconds": round(usage.ru_utime + usage.ru_stime, 3),
+        "user_seconds": round(usage.ru_utime, 3),
+        "system_seconds": round(usage.ru_stime, 3),
+        "max_memory_bytes": usage.ru_maxrss * 1024,
+    }
+
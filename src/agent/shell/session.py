@@ -0,0 +1,438 @@
+"""
+Persistent shell sessions.
+
+A session is one long-lived bash on a pseudo-terminal. Commands are written
+to it one at a time, each followed by a sentinel line carrying the exit
+status, so the working directory, environment, shell variables and
+functions carry over between commands and no process is spawned per call
+for builtins.
+
+Framing: every command runs as ``{ <command><newline>} </dev/null 2>ERRFILE``
+followed by ``printf '\\n<sentinel>:%d\\n' $?``. Standard output is read from
+the pty up to the sentinel; stderr goes to a per-session file that is read
+back after the command. stdin is /dev/null, as with one-off commands, so a
+command cannot swallow the sentinel.
+
+Timeouts and cancellation send SIGINT to the terminal's foreground process
+group. Interactive bash then drops the rest of the command line, including
+the sentinel, so the session is resynchronised with a fresh sentinel; if
+that fails the job is killed and, as a last resort, the shell restarted.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import os
+import pty
+import re
+import select
+import shutil
+import signal
+import subprocess
+import tempfile
+import termios
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from ..logging_config import get_logger
+from ..tools.output import BoundedCapture, OutputLimits, OutputStore
+from .limits import CgroupJob, ResourceLimits
+
+
+logger = get_logger("shell")
+
+OutputCallback = Callable[[bytes], None]
+
+
+def _make_controlling_tty() -> None:
+    # Runs in the child after setsid(): make the pty (now stdin) the
+    # controlling terminal so ^C reaches the foreground job
+    fcntl.ioctl(0, termios.TIOCSCTTY, 0)
+
+
+class SessionDead(RuntimeError):
+    """The shell behind a session exited or stopped responding."""
+
+
+class ShellSession:
+    """
+    A long-lived bash process on a pty.
+
+    Args:
+        name: Session name
+        cwd: Initial working directory
+        env: Environment (a copy of os.environ, or the limits' scrubbed
+            environment, if None)
+        shell: Shell binary (bash-compatible)
+        limits: Resource limits for the shell and everything it runs (with
+            cgroups, the session gets one group for its lifetime)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        cwd: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None,
+        shell: str = "/bin/bash",
+        limits: Optional[ResourceLimits] = None,
+    ) -> None:
+        self.name = name
+        self.shell = shell
+        self.initial_cwd = cwd
+        self.limits = limits
+        if env is None:
+            env = limits.environment() if limits else os.environ
+        self.base_env = dict(env)
+        self.last_used = time.monotonic()
+        self.commands_run = 0
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._token = uuid.uuid4().hex
+        self._seq = 0
+        self._tmpdir = tempfile.mkdtemp(prefix="agent-shell-")
+        self._errfile = os.path.join(self._tmpdir, "stderr")
+        self._proc: Optional[subprocess.Popen] = None
+        self._job: Optional[CgroupJob] = None
+        self._master = -1
+        self._spawn()
+
+    # -- process management -------------------------------------------------
+
+    def _spawn(self) -> None:
+        master, slave = pty.openpty()
+        # No echo (the command text is not output) and no \n -> \r\n mapping
+        attrs = termios.tcgetattr(slave)
+        attrs[1] &= ~termios.ONLCR
+        attrs[3] &= ~termios.ECHO
+        termios.tcsetattr(slave, termios.TCSANOW, attrs)
+
+        env = dict(self.base_env)
+        env.update({"PS1": "", "PS2": "", "PROMPT_COMMAND": "", "HISTFILE": "/dev/null", "TERM": "dumb",
+                    # A pty makes git, man and systemctl page; nobody can press a key
+                    "PAGER": "cat", "GIT_PAGER": "cat", "MANPAGER": "cat", "SYSTEMD_PAGER": ""})
+        preexec = _make_controlling_tty
+        try:
+            if self.limits is not None:
+                if self.limits.use_cgroup:
+                    self._job = CgroupJob(self.limits.cgroup_root, self.limits)
+                preexec = self.limits.preexec(self._job, then=_make_controlling_tty)
+            self._proc = subprocess.Popen(
+                [self.shell, "--noprofile", "--norc", "--noediting", "-i"],
+                stdin=slave,
+                stdout=slave,
+                stderr=slave,
+                cwd=self.initial_cwd,
+                env=env,
+                start_new_session=True,
+                close_fds=True,
+                preexec_fn=preexec,
+            )
+            if self.limits is not None:
+                self.limits.after_spawn(self._proc.pid)
+        except Exception:
+            os.close(master)
+            self._remove_job()
+            raise
+        finally:
+            os.close(slave)
+        self._master = master
+        # Swallow start-up noise (job control notices) before the first command
+        self._sync(timeout=5)
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def _terminate(self) -> None:
+        if self._proc is not None:
+            try:
+                os.killpg(self._proc.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+            try:
+                self._proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                pass
+            self._proc = None
+        self._remove_job()
+        if self._master >= 0:
+            os.close(self._master)
+            self._master = -1
+
+    def _remove_job(self) -> None:
+        if self._job is not None:
+            self._job.kill()
+            self._job.remove()
+            self._job = None
+
+    def restart(self) -> None:
+        """Replace the shell with a fresh one (cwd and variables are lost)."""
+        self._terminate()
+        self._spawn()
+
+    def close(self) -> None:
+        """Terminate the shell and remove the session's temp files."""
+        with self._lock:
+            self._terminate()
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    # -- framing ------------------------------------------------------------
+
+    def _next_sentinel(self) -> bytes:
+        self._seq += 1
+        return f"__AGENT_{self._token}_{self._seq}__".encode()
+
+    def _send(self, text: str) -> None:
+        data = text.encode()
+        while data:
+            n = os.write(self._master, data)
+            data = data[n:]
+
+    def _read_until(
+        self,
+        sentinel: bytes,
+        deadline: Optional[float],
+        sink: Optional[Callable[[bytes], None]],
+        cancellable: bool,
+    ) -> Optional[int]:
+        """
+        Pump pty output into sink until the sentinel line arrives.
+
+        Returns:
+            The command's exit status, or None on timeout/cancel
+        """
+        marker = b"\n" + sentinel + b":"
+        pattern = re.compile(re.escape(marker) + rb"(-?\d+)\n")
+        held = b""  # Tail that might be the start of the marker
+        while True:
+            if cancellable and self._cancel.is_set():
+                return None
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            ready, _, _ = select.select([self._master], [], [], 0.1 if remaining is None else min(remaining, 0.1))
+            if not ready:
+                continue
+            try:
+                chunk = os.read(self._master, 65536)
+            except OSError:
+                chunk = b""
+            if not chunk:
+                raise SessionDead(f"Shell session '{self.name}' exited")
+            held += chunk
+            m = pattern.search(held)
+            if m:
+                if sink:
+                    sink(held[:m.start()])
+                return int(m.group(1))
+            # Keep back enough bytes to recognise a marker split across reads
+            keep = len(marker) + 12
+            if len(held) > keep:
+                if sink:
+                    sink(held[:-keep])
+                held = held[-keep:]
+
+    def _sync(self, timeout: float) -> bool:
+        """Discard pending output up to a fresh sentinel."""
+        sentinel = self._next_sentinel()
+        self._send(f"printf '\\n%s:%d\\n' {sentinel.decode()} 0\n")
+        try:
+            return self._read_until(sentinel, time.monotonic() + timeout, None, False) is not None
+        except SessionDead:
+            return False
+
+    def _interrupt(self) -> bool:
+        """Stop the running command; returns False if the shell had to be restarted."""
+        for sig in (signal.SIGINT, signal.SIGKILL):
+            try:
+                pgrp = os.tcgetpgrp(self._master)
+                if self._proc is not None and pgrp != self._proc.pid:
+                    os.killpg(pgrp, sig)
+                elif sig == signal.SIGINT:
+                    self._send("\x03")
+            except (OSError, ProcessLookupError):
+                pass
+            if self.alive and self._sync(timeout=2):
+                return True
+        logger.warning("Restarting unresponsive shell session %s", self.name)
+        self.restart()
+        return False
+
+    # -- commands -----------------------------------------------------------
+
+    def cancel(self) -> None:
+        """Interrupt the command currently running in this session."""
+        self._cancel.set()
+
+    def run(
+        self,
+        command: str,
+        timeout: Optional[float] = 30,
+        limits: Optional[OutputLimits] = None,
+        store: Optional[OutputStore] = None,
+        on_output: Optional[OutputCallback] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run a command in the session.
+
+        Args:
+            command: Shell command (may span lines)
+            timeout: Seconds before the command is interrupted (None waits forever)
+            limits: Output limits for the bounded capture
+            store: Store for spilled output
+            on_output: Called with stdout chunks as they arrive
+
+        Returns:
+            Dict like run_command's, plus 'session' and 'cwd'
+        """
+        with self._lock:
+            if not self.alive:
+                self.restart()
+            self._cancel.clear()
+            self.last_used = time.monotonic()
+            self.commands_run += 1
+
+            stdout = BoundedCapture(limits or OutputLimits(), store)
+            stderr = BoundedCapture(limits or OutputLimits(), store)
+
+            def sink(data: bytes) -> None:
+                stdout.write(data)
+                if on_output:
+                    on_output(data)
+
+            # The redirect below does not run if the command fails to parse
+            open(self._errfile, "wb").close()
+            sentinel = self._next_sentinel()
+            errfile = self._errfile.replace("'", "'\\''")
+            self._send(
+                f"{{ {command}\n}} </dev/null 2>'{errfile}'\n"
+                f"printf '\\n%s:%d\\n' {sentinel.decode()} $?\n"
+            )
+            deadline = None if timeout is None else time.monotonic() + timeout
+            try:
+                status = self._read_until(sentinel, deadline, sink, True)
+            except SessionDead as e:
+                stdout.close()
+                self.restart()
+                return {"error": f"{e}; a new session was started", "stdout": stdout.text(), "session": self.name}
+
+            interrupted = status is None
+            restarted = False
+            if interrupted:
+                restarted = not self._interrupt()
+
+            try:
+                with open(self._errfile, "rb") as f:
+                    for chunk in iter(lambda: f.read(65536), b""):
+                        stderr.write(chunk)
+            except OSError:
+                pass
+            stdout.close()
+            stderr.close()
+
+            result: Dict[str, Any] = {
+                "stdout": stdout.text(),
+                "stderr": stderr.text(),
+                "command": command,
+                "session": self.name,
+            }
+            for name, capture in (("stdout", stdout), ("stderr", stderr)):
+                if capture.truncated:
+                    result[f"{name}_bytes"] = capture.total
+                    result[f"{name}_handle"] = capture.handle
+
+            if interrupted:
+                reason = "cancelled" if self._cancel.is_set() else f"timed out after {timeout} seconds"
+                result["error"] = f"Command {reason}"
+                if restarted:
+                    result["error"] += "; the shell was restarted and its state lost"
+                return result
+
+            result["success"] = status == 0
+            result["returncode"] = status
+            result["cwd"] = self.cwd()
+            return result
+
+    def cwd(self) -> Optional[str]:
+        """Current working directory of the shell."""
+        try:
+            return os.readlink(f"/proc/{self._proc.pid}/cwd") if self._proc else None
+        except OSError:
+            return None
+
+
+class SessionManager:
+    """
+    Named shell sessions with a size cap and idle expiry.
+
+    Args:
+        max_sessions: Maximum number of live sessions (least recently used is closed)
+        idle_timeout: Seconds after which an unused session is closed
+        limits: Resource limits for new sessions
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 8,
+        idle_timeout: float = 1800,
+        limits: Optional[ResourceLimits] = None,
+    ) -> None:
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.limits = limits
+        self._sessions: Dict[str, ShellSession] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str, cwd: Optional[str] = None) -> ShellSession:
+        """Return the named session, starting it if needed."""
+        with self._lock:
+            self._reap()
+            session = self._sessions.get(name)
+            if session is None:
+                if len(self._sessions) >= self.max_sessions:
+                    oldest = min(self._sessions.values(), key=lambda s: s.last_used)
+                    self._close(oldest.name)
+                session = ShellSession(name, cwd=cwd, limits=self.limits)
+                self._sessions[name] = session
+            return session
+
+    def _reap(self) -> None:
+        now = time.monotonic()
+        for name, session in list(self._sessions.items()):
+            if now - session.last_used > self.idle_timeout and not session._lock.locked():
+                self._close(name)
+
+    def _close(self, name: str) -> bool:
+        session = self._sessions.pop(name, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    def close(self, name: str) -> bool:
+        """Close a session; returns False if it did not exist."""
+        with self._lock:
+            return self._close(name)
+
+    def cancel(self, name: str) -> bool:
+        """Interrupt the running command of a session."""
+        with self._lock:
+            session = self._sessions.get(name)
+        if session is None:
+            return False
+        session.cancel()
+        return True
+
+    def list(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                name: {"cwd": s.cwd(), "commands_run": s.commands_run, "alive": s.alive}
+                for name, s in self._sessions.items()
+            }
+
+    def close_all(self) -> None:
+        with self._lock:
+            for name in list(self._sessions):
+                self._close(name)
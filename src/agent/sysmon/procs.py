@@ -0,0 +1,237 @@
+"""
+Process table snapshots.
+
+On Linux the table is read straight from ``/proc``: one ``read`` of
+``/proc/<pid>/stat`` per process gives name, state, CPU ticks, start time,
+thread count and RSS. CPU percentages are deltas of the tick counters
+between consecutive snapshots, so they are exact for the interval between
+them rather than an average over the process lifetime. Expensive fields
+(user name, command line) are only looked up for the rows actually
+returned, and top-k selection uses ``heapq.nlargest`` instead of sorting the
+whole table.
+
+Other platforms fall back to psutil.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import heapq
+import os
+import pwd
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import psutil
+
+
+PROC = "/proc"
+
+STATES = {
+    "R": "running",
+    "S": "sleeping",
+    "D": "disk-sleep",
+    "Z": "zombie",
+    "T": "stopped",
+    "t": "tracing-stop",
+    "X": "dead",
+    "I": "idle",
+    "P": "parked",
+    "W": "waking",
+}
+
+SORT_KEYS = ("cpu", "memory", "pid")
+
+
+class ProcessRecord(NamedTuple):
+    """Minimal per-process row of a snapshot."""
+
+    pid: int
+    name: str
+    status: str
+    cpu_percent: float
+    rss: int
+    num_threads: int
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _mem_total() -> int:
+    for line in _read(f"{PROC}/meminfo").splitlines():
+        if line.startswith(b"MemTotal:"):
+            return int(line.split()[1]) * 1024
+    return 0
+
+
+class ProcessSnapshotter:
+    """
+    Produces process table snapshots with delta-based CPU accounting.
+
+    Args:
+        use_proc: Read /proc directly (defaults to whether /proc is usable)
+    """
+
+    def __init__(self, use_proc: Optional[bool] = None) -> None:
+        self.use_proc = os.path.exists(f"{PROC}/self/stat") if use_proc is None else use_proc
+        self._lock = threading.Lock()
+        # pid -> (start ticks, total cpu ticks) at the previous snapshot
+        self._prev: Dict[int, tuple] = {}
+        self._prev_time: Optional[float] = None
+        self._users: Dict[int, str] = {}
+        if self.use_proc:
+            self._clk_tck = os.sysconf("SC_CLK_TCK")
+            self._page_size = os.sysconf("SC_PAGE_SIZE")
+            self._mem_total = _mem_total()
+        else:
+            self._mem_total = psutil.virtual_memory().total
+
+    def snapshot(self) -> List[ProcessRecord]:
+        """Read the current process table."""
+        with self._lock:
+            return self._snapshot_proc() if self.use_proc else self._snapshot_psutil()
+
+    def _snapshot_proc(self) -> List[ProcessRecord]:
+        now = time.monotonic()
+        uptime = float(_read(f"{PROC}/uptime").split()[0])
+        elapsed = None if self._prev_time is None else now - self._prev_time
+        cpus = os.cpu_count() or 1
+        hz = self._clk_tck
+        prev = self._prev
+        current: Dict[int, tuple] = {}
+        records: List[ProcessRecord] = []
+
+        for entry in os.listdir(PROC):
+            if not entry.isdigit():
+                continue
+            try:
+                data = _read(f"{PROC}/{entry}/stat")
+            except OSError:
+                continue  # Exited since listdir
+            # comm may contain spaces and parentheses; it ends at the last ")"
+            close = data.rfind(b")")
+            name = data[data.find(b"(") + 1:close].decode("utf-8", "replace")
+            fields = data[close + 2:].split()
+            pid = int(entry)
+            ticks = int(fields[11]) + int(fields[12])  # utime + stime
+            start = int(fields[19])
+            current[pid] = (start, ticks)
+
+            before = prev.get(pid)
+            if elapsed and before is not None and before[0] == start:
+                cpu = (ticks - before[1]) / hz / elapsed * 100
+            else:
+                # First sight of this process: average since it started
+                alive = uptime - start / hz
+                cpu = ticks / hz / alive * 100 if alive > 0 else 0.0
+            records.append(ProcessRecord(
+                pid=pid,
+                name=name,
+                status=STATES.get(fields[0].decode(), fields[0].decode()),
+                cpu_percent=round(min(cpu, 100.0 * cpus), 1),
+                rss=int(fields[21]) * self._page_size,
+                num_threads=int(fields[17]),
+            ))
+
+        self._prev = current
+        self._prev_time = now
+        return records
+
+    def _snapshot_psutil(self) -> List[ProcessRecord]:
+        records = []
+        for proc in psutil.process_iter(["pid", "name", "status", "cpu_percent", "memory_info", "num_threads"]):
+            info = proc.info
+            mem = info.get("memory_info")
+            records.append(ProcessRecord(
+                pid=info["pid"],
+                name=info.get("name") or "",
+                status=info.get("status") or "",
+                cpu_percent=info.get("cpu_percent") or 0.0,
+                rss=mem.rss if mem else 0,
+                num_threads=info.get("num_threads") or 0,
+            ))
+        return records
+
+    def username(self, pid: int) -> Optional[str]:
+        """Owner of a process (cached uid -> name lookups)."""
+        try:
+            uid = os.stat(f"{PROC}/{pid}").st_uid if self.use_proc else psutil.Process(pid).uids().real
+        except (OSError, psutil.Error):
+            return None
+        name = self._users.get(uid)
+        if name is None:
+            try:
+                name = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                name = str(uid)
+            self._users[uid] = name
+        return name
+
+    def cmdline(self, pid: int) -> List[str]:
+        try:
+            if self.use_proc:
+                raw = _read(f"{PROC}/{pid}/cmdline")
+                return [a.decode("utf-8", "replace") for a in raw.split(b"\0") if a]
+            return psutil.Process(pid).cmdline()
+        except (OSError, psutil.Error):
+            return []
+
+    def top(
+        self,
+        records: List[ProcessRecord],
+        limit: int = 20,
+        sort_by: str = "cpu",
+        name: Optional[str] = None,
+        user: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Select the top processes of a snapshot.
+
+        Args:
+            records: Snapshot from snapshot()
+            limit: Number of rows to return
+            sort_by: "cpu", "memory" (RSS) or "pid"
+            name: Case-insensitive substring, or glob if it contains wildcards
+            user: Only processes owned by this user name
+
+        Returns:
+            List of dicts with pid, name, username, status, cpu_percent,
+            memory_percent, rss, num_threads and cmdline
+        """
+        if sort_by not in SORT_KEYS:
+            raise ValueError(f"sort_by must be one of {', '.join(SORT_KEYS)}")
+
+        selected = records
+        if name:
+            pattern = name.lower()
+            if any(c in pattern for c in "*?["):
+                selected = [r for r in selected if fnmatch.fnmatchcase(r.name.lower(), pattern)]
+            else:
+                selected = [r for r in selected if pattern in r.name.lower()]
+        if user:
+            selected = [r for r in selected if self.username(r.pid) == user]
+
+        if sort_by == "pid":
+            rows = heapq.nsmallest(limit, selected, key=lambda r: r.pid)
+        elif sort_by == "memory":
+            rows = heapq.nlargest(limit, selected, key=lambda r: r.rss)
+        else:
+            rows = heapq.nlargest(limit, selected, key=lambda r: (r.cpu_percent, r.rss))
+
+        return [
+            {
+                "pid": r.pid,
+                "name": r.name,
+                "username": self.username(r.pid),
+                "status": r.status,
+                "cpu_percent": r.cpu_percent,
+                "memory_percent": round(r.rss / self._mem_total * 100, 2) if self._mem_total else None,
+                "rss": r.rss,
+                "num_threads": r.num_threads,
+                "cmdline": self.cmdline(r.pid),
+            }
+            for r in rows
+        ]
@@ -0,0 +1,255 @@
+"""
+Background system metrics sampler.
+
+A daemon thread samples CPU, memory, disk, network and the process table at
+a fixed rate into a ring buffer, so tools read a ready snapshot instead of
+blocking (``psutil.cpu_percent(interval=1)`` sleeps for a second) and CPU
+percentages are always measured over a known interval. The history gives
+rolling averages and counter rates (bytes/sec) for free.
+"""
+
+from __future__ import annotations
+
+import platform
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+import psutil
+
+from ..config import settings
+from ..logging_config import get_logger
+from .procs import ProcessRecord, ProcessSnapshotter
+
+
+logger = get_logger("sysmon")
+
+
+@dataclass
+class Sample:
+    """One point-in-time reading of system state."""
+
+    monotonic: float
+    timestamp: float
+    cpu_percent: float
+    per_cpu_percent: List[float]
+    cpu_freq: Optional[Dict[str, float]]
+    load_avg: Optional[List[float]]
+    memory: Dict[str, Any]
+    swap_percent: float
+    disk: Dict[str, Any]
+    disk_io: Optional[Dict[str, int]]
+    net_io: Optional[Dict[str, int]]
+    process_count: int = 0
+
+
+@dataclass
+class _ProcessTable:
+    monotonic: float = 0.0
+    processes: List[ProcessRecord] = field(default_factory=list)
+
+
+class SystemSampler:
+    """
+    Samples system metrics on a background thread.
+
+    Args:
+        interval: Seconds between samples
+        history: Number of samples kept (ring buffer)
+        processes: Also snapshot the process table on every sample
+        disk_path: Filesystem whose usage is reported
+    """
+
+    def __init__(
+        self,
+        interval: float = 1.0,
+        history: int = 300,
+        processes: bool = True,
+        disk_path: str = "/",
+    ) -> None:
+        self.interval = interval
+        self.processes = processes
+        self.disk_path = disk_path
+        self._samples: Deque[Sample] = deque(maxlen=history)
+        self._table = _ProcessTable()
+        self._lock = threading.Lock()
+        self._first = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._static: Optional[Dict[str, Any]] = None
+        self.snapshotter = ProcessSnapshotter()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> "SystemSampler":
+        """Start sampling (no-op if already running)."""
+        if not self.running:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="system-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def static_info(self) -> Dict[str, Any]:
+        """Platform facts that never change while running (computed once)."""
+        if self._static is None:
+            self._static = {
+                "platform": platform.system(),
+                "platform_release": platform.release(),
+                "platform_version": platform.version(),
+                "architecture": platform.machine(),
+                "hostname": platform.node(),
+                "processor": platform.processor(),
+                "cpu_count": psutil.cpu_count(),
+            }
+        return self._static
+
+    def _run(self) -> None:
+        # cpu_percent(None) reports usage since the previous call, so prime
+        # the counters and take the first sample after a short warm-up
+        psutil.cpu_percent(interval=None)
+        psutil.cpu_percent(interval=None, percpu=True)
+        if self.processes:
+            self._sample_processes()
+        next_tick = time.monotonic() + min(self.interval, 0.1)
+        while not self._stop.wait(max(next_tick - time.monotonic(), 0)):
+            try:
+                self.sample_now()
+            except Exception:
+                logger.exception("System sample failed")
+            next_tick += self.interval
+            # Skip missed ticks instead of sampling in a burst
+            now = time.monotonic()
+            if next_tick < now:
+                next_tick = now + self.interval
+
+    def sample_now(self) -> Sample:
+        """Take a sample immediately and append it to the history."""
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage(self.disk_path)
+        freq = psutil.cpu_freq()
+        disk_io = psutil.disk_io_counters()
+        net_io = psutil.net_io_counters()
+        try:
+            load_avg = list(psutil.getloadavg())
+        except (AttributeError, OSError):
+            load_avg = None
+
+        processes = self._sample_processes() if self.processes else None
+        sample = Sample(
+            monotonic=time.monotonic(),
+            timestamp=time.time(),
+            cpu_percent=psutil.cpu_percent(interval=None),
+            per_cpu_percent=psutil.cpu_percent(interval=None, percpu=True),
+            cpu_freq=freq._asdict() if freq else None,
+            load_avg=load_avg,
+            memory={
+                "total": memory.total,
+                "available": memory.available,
+                "used": memory.used,
+                "percent": memory.percent,
+            },
+            swap_percent=psutil.swap_memory().percent,
+            disk={
+                "total": disk.total,
+                "used": disk.used,
+                "free": disk.free,
+                "percent": (disk.used / disk.total) * 100 if disk.total else 0.0,
+            },
+            disk_io={"read_bytes": disk_io.read_bytes, "write_bytes": disk_io.write_bytes} if disk_io else None,
+            net_io=net_io._asdict() if net_io else None,
+            process_count=len(processes) if processes is not None else len(psutil.pids()),
+        )
+        with self._lock:
+            self._samples.append(sample)
+        self._first.set()
+        return sample
+
+    def _sample_processes(self) -> List[ProcessRecord]:
+        # Consecutive snapshots give per-process CPU usage over the interval
+        processes = self.snapshotter.snapshot()
+        with self._lock:
+            self._table = _ProcessTable(time.monotonic(), processes)
+        return processes
+
+    def latest(self, wait: Optional[float] = None) -> Optional[Sample]:
+        """
+        Most recent sample.
+
+        Args:
+            wait: Seconds to wait for the first sample if none exists yet
+        """
+        if wait and not self._first.is_set():
+            self._first.wait(wait)
+        with self._lock:
+            return self._samples[-1] if self._samples else None
+
+    def process_table(self) -> List[ProcessRecord]:
+        """Process list from the most recent sample."""
+        with self._lock:
+            return self._table.processes
+
+    def history(self, seconds: Optional[float] = None) -> List[Sample]:
+        """Samples from the last ``seconds`` (all kept samples if None)."""
+        with self._lock:
+            samples = list(self._samples)
+        if seconds is None or not samples:
+            return samples
+        cutoff = samples[-1].monotonic - seconds
+        return [s for s in samples if s.monotonic >= cutoff]
+
+    def averages(self, seconds: float = 60.0) -> Dict[str, Any]:
+        """Mean CPU, memory and swap usage over a window."""
+        window = self.history(seconds)
+        if not window:
+            return {}
+        n = len(window)
+        return {
+            "window_seconds": seconds,
+            "samples": n,
+            "cpu_percent": sum(s.cpu_percent for s in window) / n,
+            "cpu_percent_max": max(s.cpu_percent for s in window),
+            "memory_percent": sum(s.memory["percent"] for s in window) / n,
+            "swap_percent": sum(s.swap_percent for s in window) / n,
+        }
+
+    def rates(self, seconds: float = 10.0) -> Dict[str, float]:
+        """Per-second rates of disk and network counters over a window."""
+        window = self.history(seconds)
+        if len(window) < 2:
+            return {}
+        first, last = window[0], window[-1]
+        elapsed = last.monotonic - first.monotonic
+        if elapsed <= 0:
+            return {}
+        rates: Dict[str, float] = {"window_seconds": elapsed}
+        for name, start, end in (("disk", first.disk_io, last.disk_io), ("net", first.net_io, last.net_io)):
+            if not start or not end:
+                continue
+            for key in ("read_bytes", "write_bytes", "bytes_sent", "bytes_recv", "packets_sent", "packets_recv"):
+                if key in start and key in end:
+                    # Counters can wrap or reset (e.g. interface re-created)
+                    rates[f"{name}_{key}_per_sec"] = max(end[key] - start[key], 0) / elapsed
+        return rates
+
+
+_default_sampler: Optional[SystemSampler] = None
+_default_lock = threading.Lock()
+
+
+def get_default_sampler() -> SystemSampler:
+    """Return the process-wide sampler (created and started on first use)."""
+    global _default_sampler
+    with _default_lock:
+        if _default_sampler is None:
+            _default_sampler = SystemSampler(interval=settings.sample_interval).start()
+        return _default_sampler
@@ -6,12 +6,24 @@ Provides privileged access to system operations.
 from __future__ import annotations
 
 import os
-import platform
 import psutil
+import signal
 import subprocess
 import time
 from typing import Any, Dict, List, Optional
 
+from .shell.limits import CgroupJob, ResourceLimits, SENSITIVE_ENV, reap, rusage_summary
+from .shell.session import SessionManager
+from .sysmon.procs import ProcessSnapshotter
+from .sysmon.sampler import SystemSampler, get_default_sampler
+from .tools.output import (
+    BoundedCapture,
+    OutputLimits,
+    OutputStore,
+    default_output_store,
+    stream_process,
+)
+
 
 class SystemTools:
     """
@@ -20,85 +32,119 @@ class SystemTools:
     Provides system information, process management, and system control.
     """
 
-    def __init__(self, allow_privileged: bool = True):
+    def __init__(
+        self,
+        allow_privileged: bool = True,
+        output_limits: Optional[OutputLimits] = None,
+        output_store: Optional[OutputStore] = None,
+        sampler: Optional[SystemSampler] = None,
+        shell_sessions: Optional[SessionManager] = None,
+        resource_limits: Optional[ResourceLimits] = None,
+    ):
         """
         Initialize system tools.
         
         Args:
             allow_privileged: Whether to allow privileged operations (default: True for AI-first OS)
+            output_limits: Caps for captured command output
+            output_store: Store for spilled output (shared default if None)
+            sampler: Background metrics sampler (shared default, started on first use, if None)
+            shell_sessions: Manager for persistent shell sessions (a private one if None)
+            resource_limits: CPU, memory, process and priority limits for
+                commands (from the AGENT_JOB_* settings if None)
         """
         self.allow_privileged = allow_privileged
+        self.output_limits = output_limits or OutputLimits()
+        self.output_store = output_store or default_output_store
+        self._sampler = sampler
+        self._snapshotter: Optional[ProcessSnapshotter] = None  # For one-off tables
+        self.resource_limits = resource_limits or ResourceLimits.from_settings()
+        self.shell_sessions = shell_sessions or SessionManager(limits=self.resource_limits)
+
+    @property
+    def sampler(self) -> SystemSampler:
+        if self._sampler is None:
+            self._sampler = get_default_sampler()
+        return self._sampler.start()
 
     def get_system_info(self) -> Dict[str, Any]:
         """
         Get comprehensive system information.
-        
+
+        Reads the sampler's latest snapshot instead of measuring inline, and
+        adds rolling averages and disk/network rates.
+
         Returns:
             Dict with system information
         """
         try:
-            cpu_count = psutil.cpu_count()
-            cpu_percent = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            disk = psutil.disk_usage('/')
-            
+            sampler = self.sampler
+            sample = sampler.latest(wait=2 * sampler.interval + 1) or sampler.sample_now()
+            static = sampler.static_info()
+
             return {
                 "success": True,
-                "system": {
-                    "platform": platform.system(),
-                    "platform_release": platform.release(),
-                    "platform_version": platform.version(),
-                    "architecture": platform.machine(),
-                    "hostname": platform.node(),
-                    "processor": platform.processor(),
-                },
+                "system": {k: v for k, v in static.items() if k != "cpu_count"},
                 "cpu": {
-                    "count": cpu_count,
-                    "percent": cpu_percent,
-                    "freq": psutil.cpu_freq()._asdict() if psutil.cpu_freq() else None,
-                },
-                "memory": {
-                    "total": memory.total,
-                    "available": memory.available,
-                    "used": memory.used,
-                    "percent": memory.percent,
+                    "count": static["cpu_count"],
+                    "percent": sample.cpu_percent,
+                    "per_cpu": sample.per_cpu_percent,
+                    "freq": sample.cpu_freq,
+                    "load_avg": sample.load_avg,
                 },
-                "disk": {
-                    "total": disk.total,
-                    "used": disk.used,
-                    "free": disk.free,
-                    "percent": (disk.used / disk.total) * 100,
+                "memory": sample.memory,
+                "disk": sample.disk,
+                "averages": {
+                    "1m": sampler.averages(60),
+                    "5m": sampler.averages(300),
                 },
+                "rates": sampler.rates(10),
+                "sample_age": round(time.monotonic() - sample.monotonic, 3),
             }
         except Exception as e:
             return {"error": f"Error getting system info: {e}"}
 
-    def list_processes(self, limit: int = 20) -> Dict[str, Any]:
+    def list_processes(
+        self,
+        limit: int = 20,
+        sort_by: str = "cpu",
+        name: Optional[str] = None,
+        user: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """
         List running processes.
-        
+
         Args:
             limit: Maximum number of processes to return
-            
+            sort_by: "cpu", "memory" or "pid"
+            name: Only processes whose name contains this (or matches this glob)
+            user: Only processes owned by this user
+
         Returns:
             Dict with process list
         """
         try:
-            processes = []
-            for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent', 'status']):
-                try:
-                    processes.append(proc.info)
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
-                    
-            # Sort by CPU usage
-            processes.sort(key=lambda x: x.get('cpu_percent', 0) or 0, reverse=True)
-            
+            sampler = self.sampler
+            sampler.latest(wait=2 * sampler.interval + 1)
+            # CPU usage is measured over the last sampling interval
+            records = sampler.process_table()
+            snapshotter = sampler.snapshotter
+            if not records:
+                # Not the sampler's snapshotter: a snapshot moves its CPU
+                # baseline and would skew the next background sample
+                if self._snapshotter is None:
+                    self._snapshotter = ProcessSnapshotter()
+                snapshotter = self._snapshotter
+                records = snapshotter.snapshot()
+            processes = snapshotter.top(records, limit, sort_by, name, user)
+
             return {
                 "success": True,
-                "processes": processes[:limit],
-                "total": len(processes),
+                "processes": processes,
+                "total": len(records),
             }
+        except ValueError as e:
+            return {"error": str(e)}
         except Exception as e:
             return {"error": f"Error listing processes: {e}"}
 
@@ -131,17 +177,30 @@ class SystemTools:
         except Exception as e:
             return {"error": f"Error getting process info: {e}"}
 
-    def run_command(self, command: str, timeout: int = 30, shell: bool = True) -> Dict[str, Any]:
+    def run_command(
+        self,
+        command: str,
+        timeout: int = 30,
+        shell: bool = True,
+        session: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """
         Run a system command.
         
+        The command runs under the configured resource limits (CPU quota,
+        memory cap, process count, low CPU and I/O priority) with credentials
+        removed from its environment.
+        
         Args:
             command: Command to run
             timeout: Timeout in seconds
             shell: Whether to run in shell
+            session: Run in this named persistent shell, keeping cwd and
+                environment between calls (created on first use)
             
         Returns:
-            Dict with command output
+            Dict with command output and 'resources' (CPU seconds, peak
+            memory and, with cgroups, peak process count)
         """
         if not self.allow_privileged:
             # Safety check: prevent dangerous commands
@@ -149,27 +208,117 @@ class SystemTools:
             if any(cmd in command.lower() for cmd in dangerous):
                 return {"error": "Dangerous command blocked"}
         
+        if session:
+            try:
+                return self.shell_sessions.get(session).run(
+                    command, timeout, self.output_limits, self.output_store
+                )
+            except Exception as e:
+                return {"error": f"Error running command in session '{session}': {e}"}
+        
+        limits = self.resource_limits
+        job = None
         try:
-            result = subprocess.run(
+            if limits.use_cgroup:
+                job = CgroupJob(limits.cgroup_root, limits)
+            started = time.monotonic()
+            proc = subprocess.Popen(
                 command if shell else command.split(),
                 shell=shell,
-                capture_output=True,
-                text=True,
-                timeout=timeout,
-                env=os.environ.copy(),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                env=limits.environment(),
+                start_new_session=True,
+                preexec_fn=limits.preexec(job),
             )
-            
+            limits.after_spawn(proc.pid)
+        except Exception as e:
+            if job is not None:
+                job.remove()
+            return {"error": f"Error running command: {e}"}
+        
+        # Stream both pipes into bounded buffers instead of buffering everything
+        stdout = BoundedCapture(self.output_limits, self.output_store)
+        stderr = BoundedCapture(self.output_limits, self.output_store)
+        usage = None
+        try:
+            timed_out = stream_process(proc, {proc.stdout: stdout, proc.stderr: stderr}, timeout, reap=False)
+            if not timed_out:
+                # wait4() instead of Popen.wait() to get the rusage
+                remaining = None if timeout is None else max(started + timeout - time.monotonic(), 0)
+                reaped = reap(proc.pid, remaining)
+                if reaped is None:
+                    timed_out = proc.poll() is None
+                else:
+                    proc.returncode, usage = reaped
+        except Exception as e:
+            self._kill_process_group(proc, job)
+            return {"error": f"Error running command: {e}"}
+        finally:
+            stdout.close()
+            stderr.close()
+            proc.stdout.close()
+            proc.stderr.close()
+        
+        if timed_out:
+            self._kill_process_group(proc, job)
+        resources = job.usage() if job is not None else rusage_summary(usage) if usage is not None else {}
+        if resources:
+            resources["wall_seconds"] = round(time.monotonic() - started, 3)
+        if job is not None:
+            job.remove()
+        
+        if timed_out:
             return {
-                "success": result.returncode == 0,
-                "returncode": result.returncode,
-                "stdout": result.stdout,
-                "stderr": result.stderr,
-                "command": command,
+                "error": f"Command timed out after {timeout} seconds",
+                "stdout": stdout.text(),
+                "stderr": stderr.text(),
+                "resources": resources,
             }
+        
+        result = {
+            "success": proc.returncode == 0,
+            "returncode": proc.returncode,
+            "stdout": stdout.text(),
+            "stderr": stderr.text(),
+            "command": command,
+            "resources": resources,
+        }
+        for name, capture in (("stdout", stdout), ("stderr", stderr)):
+            if capture.truncated:
+                result[f"{name}_bytes"] = capture.total
+                result[f"{name}_handle"] = capture.handle
+        if resources.get("oom_killed"):
+            result["error"] = f"Command killed: memory limit of {limits.memory_bytes} bytes exceeded"
+        return result
+
+    def cancel_command(self, session: str) -> Dict[str, Any]:
+        """Interrupt the command running in a shell session."""
+        if not self.shell_sessions.cancel(session):
+            return {"error": f"No shell session named '{session}'"}
+        return {"success": True, "session": session}
+
+    def close_shell_session(self, session: str) -> Dict[str, Any]:
+        """Terminate a persistent shell session."""
+        if not self.shell_sessions.close(session):
+            return {"error": f"No shell session named '{session}'"}
+        return {"success": True, "session": session}
+
+    @staticmethod
+    def _kill_process_group(proc: subprocess.Popen, job: Optional[CgroupJob] = None) -> None:
+        """Kill a command started in its own session, including its children."""
+        if job is not None:
+            # Also catches children that left the process group
+            job.kill()
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        try:
+            proc.wait(timeout=5)
         except subprocess.TimeoutExpired:
-            return {"error": f"Command timed out after {timeout} seconds"}
-        except Exception as e:
-            return {"error": f"Error running command: {e}"}
+            pass
 
     def get_network_info(self) -> Dict[str, Any]:
         """
@@ -217,9 +366,8 @@ class SystemTools:
         """
         try:
             # Filter out sensitive variables
-            sensitive = ['PASSWORD', 'SECRET', 'KEY', 'TOKEN', 'API']
             env_vars = {
-                k: v if not any(s in k.upper() for s in sensitive) else "***REDACTED***"
+                k: v if not any(s in k.upper() for s in SENSITIVE_ENV) else "***REDACTED***"
                 for k, v in os.environ.items()
             }
             
@@ -0,0 +1,306 @@
+"""
+Frame store.
+
+Screenshots used to be re-captured and re-encoded by every tool that looked
+at the screen, and returned inline as base64. FrameStore keeps encoded
+frames in memory instead and hands out short handles, so capture, OCR,
+vision and diff tools pass frame ids around:
+
+- Memory is bounded (``max_bytes``). When it is exceeded, the least
+  recently used unpinned frames are spilled to a per-user directory on
+  tmpfs (/dev/shm), or dropped if spilling is off or the spill budget is
+  used up. The per-user path is predictable, so it is only used if it is
+  a real directory of this user with mode 0700; otherwise frames spill to
+  a fresh private temp directory.
+- Frames are reference counted. ``use()`` and ``acquire()`` pin a frame
+  so it is not evicted while a tool works on it or while a caller keeps it
+  as a baseline.
+- ``path()`` materializes a frame as a file for consumers that take image
+  paths (vision backends).
+
+All methods are thread-safe.
+"""
+
+from __future__ import annotations
+
+import base64
+import os
+import re
+import stat
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from ..config import settings
+
+
+HANDLE_RE = re.compile(r"^[0-9a-f]{12}$")
+
+
+def default_frame_dir() -> str:
+    base = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else tempfile.gettempdir()
+    return os.path.join(base, f"agent-frames-{os.getuid()}")
+
+
+def _private_dir(path: str) -> str:
+    """
+    Create path as a directory only this user can access, and return it.
+
+    A path another user created first (possibly as a symlink or with a
+    looser mode) is not used; a new temp directory is returned instead.
+    """
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    st = os.lstat(path)
+    if stat.S_ISDIR(st.st_mode) and st.st_uid == os.getuid() and stat.S_IMODE(st.st_mode) == 0o700:
+        return path
+    return tempfile.mkdtemp(prefix=f"{os.path.basename(path)}-")
+
+
+@dataclass
+class Frame:
+    """An encoded frame and where it came from."""
+
+    handle: str
+    format: str  # "webp", "jpeg" or "png"
+    width: int
+    height: int
+    size: int
+    origin: Tuple[int, int] = (0, 0)  # Screen position of the frame's top-left
+    scale: float = 1.0  # Frame pixels per screen pixel
+    created: float = 0.0
+    data: Optional[bytes] = None  # None while spilled
+    path: Optional[str] = None  # Spill file
+    refs: int = 0
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "handle": self.handle,
+            "format": self.format,
+            "width": self.width,
+            "height": self.height,
+            "origin": list(self.origin),
+            "scale": round(self.scale, 4),
+            "size_bytes": self.size,
+        }
+
+
+class FrameStore:
+    """
+    Reference-counted, memory-bounded store of encoded frames.
+
+    Args:
+        max_bytes: Memory for frame data before frames are spilled or dropped
+        spill: Spill evicted frames to spill_dir instead of dropping them
+        spill_dir: Spill directory (default_frame_dir() if None)
+        max_spill_bytes: Spilled bytes before the oldest spilled frames are dropped
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        spill: bool = True,
+        spill_dir: Optional[str] = None,
+        max_spill_bytes: int = 256 * 1024 * 1024,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.spill = spill
+        self.spill_dir = spill_dir or default_frame_dir()
+        self._spill_dir_checked = spill_dir is not None  # The caller's directory is used as is
+        self.max_spill_bytes = max_spill_bytes
+        self._frames: "OrderedDict[str, Frame]" = OrderedDict()  # LRU order, oldest first
+        self._memory = 0
+        self._spilled = 0
+        self._lock = threading.RLock()
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._memory
+
+    @property
+    def spilled_bytes(self) -> int:
+        return self._spilled
+
+    def put(
+        self,
+        data: bytes,
+        format: str,
+        width: int,
+        height: int,
+        origin: Tuple[int, int] = (0, 0),
+        scale: float = 1.0,
+        pin: bool = False,
+    ) -> str:
+        """
+        Store an encoded frame.
+
+        Args:
+            pin: Hold one reference for the caller (release() it when done)
+
+        Returns:
+            The frame's handle
+        """
+        handle = uuid.uuid4().hex[:12]
+        frame = Frame(handle, format, width, height, len(data), tuple(origin), scale, time.time(), data,
+                      refs=1 if pin else 0)
+        with self._lock:
+            self._frames[handle] = frame
+            self._memory += frame.size
+            self._evict()
+        return handle
+
+    def get(self, handle: str) -> Optional[Frame]:
+        """A frame's metadata (data may be spilled), or None if unknown or evicted."""
+        with self._lock:
+            frame = self._frames.get(handle)
+            if frame is not None:
+                self._frames.move_to_end(handle)
+            return frame
+
+    def data(self, handle: str) -> Optional[bytes]:
+        """A frame's encoded bytes, or None if unknown or evicted."""
+        with self._lock:
+            frame = self.get(handle)
+            if frame is None:
+                return None
+            if frame.data is not None:
+                return frame.data
+            path = frame.path
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def acquire(self, handle: str) -> bool:
+        """Pin a frame; False if it is unknown or evicted."""
+        with self._lock:
+            frame = self.get(handle)
+            if frame is None:
+                return False
+            frame.refs += 1
+            return True
+
+    def release(self, handle: str) -> None:
+        """Drop a reference taken with acquire() or put(pin=True)."""
+        with self._lock:
+            frame = self._frames.get(handle)
+            if frame is not None and frame.refs > 0:
+                frame.refs -= 1
+                self._evict()
+
+    @contextmanager
+    def use(self, handle: str) -> Iterator[Tuple[Frame, bytes]]:
+        """
+        Pin a frame for the duration of a block.
+
+        Raises:
+            KeyError: If the handle is unknown or evicted
+        """
+        if not self.acquire(handle):
+            raise KeyError(f"Unknown or expired frame handle: {handle}")
+        try:
+            data = self.data(handle)
+            if data is None:
+                raise KeyError(f"Frame data lost: {handle}")
+            yield self._frames[handle], data
+        finally:
+            self.release(handle)
+
+    def path(self, handle: str) -> Optional[str]:
+        """A file holding the frame (spilled on demand), or None if unknown or evicted."""
+        with self._lock:
+            frame = self.get(handle)
+            if frame is None:
+                return None
+            if frame.path is None:
+                self._write_spill(frame)
+            return frame.path
+
+    def read(self, handle: str) -> Dict[str, Any]:
+        """
+        Return a frame as base64.
+
+        Returns:
+            Dict with frame info and 'data', or 'error'
+        """
+        frame = self.get(handle) if HANDLE_RE.match(handle) else None
+        data = self.data(handle) if frame is not None else None
+        if data is None:
+            return {"error": f"Unknown or expired frame handle: {handle}"}
+        return {"success": True, **frame.info(), "data": base64.b64encode(data).decode("ascii")}
+
+    def clear(self) -> None:
+        """Drop all frames and delete spill files."""
+        with self._lock:
+            for frame in self._frames.values():
+                self._unlink(frame)
+            self._frames.clear()
+            self._memory = 0
+            self._spilled = 0
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    # -- eviction ----------------------------------------------------------------
+
+    def _write_spill(self, frame: Frame) -> None:
+        if not self._spill_dir_checked:
+            self.spill_dir = _private_dir(self.spill_dir)
+            self._spill_dir_checked = True
+        else:
+            os.makedirs(self.spill_dir, mode=0o700, exist_ok=True)
+        path = os.path.join(self.spill_dir, f"{frame.handle}.{frame.format}")
+        with open(path, "wb") as f:
+            f.write(frame.data)
+        frame.path = path
+        self._spilled += frame.size
+
+    def _unlink(self, frame: Frame) -> None:
+        if frame.path is not None:
+            try:
+                os.unlink(frame.path)
+            except OSError:
+                pass
+            self._spilled -= frame.size
+            frame.path = None
+
+    def _evict(self) -> None:
+        """Spill or drop least recently used unpinned frames until within budget."""
+        for frame in list(self._frames.values()):
+            if self._memory <= self.max_bytes:
+                break
+            if frame.refs or frame.data is None:
+                continue
+            if self.spill and frame.path is None:
+                try:
+                    self._write_spill(frame)
+                except OSError:
+                    pass  # No tmpfs room; the frame is dropped below
+            self._memory -= frame.size
+            frame.data = None
+            if frame.path is None:
+                del self._frames[frame.handle]
+
+        for frame in list(self._frames.values()):
+            if self._spilled <= self.max_spill_bytes:
+                break
+            if frame.refs or frame.data is not None:
+                continue
+            self._unlink(frame)
+            del self._frames[frame.handle]
+
+
+# Shared store used by the tools unless one is injected
+default_frame_store = FrameStore(
+    max_bytes=settings.frame_store_mb * 1024 * 1024,
+    spill=settings.frame_spill_mb > 0,
+    max_spill_bytes=settings.frame_spill_mb * 1024 * 1024,
+)
@@ -0,0 +1,315 @@
+"""
+Bounded tool output.
+
+Tool results end up in the conversation history, so a single large command
+output or file read can blow the model's context and the agent's memory.
+This module keeps captured output bounded:
+
+- BoundedCapture keeps a head and a tail window of a byte stream in memory
+  and spills the full stream (up to a cap) to a temporary file
+- OutputStore hands out handles for spilled outputs and files so the model
+  can page through them with offset-based follow-up calls
+- fit_to_budget trims text to a token budget with a head/tail window
+"""
+
+from __future__ import annotations
+
+import os
+import selectors
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import IO, Any, Callable, Dict, Optional, Tuple
+
+
+@dataclass
+class OutputLimits:
+    """Size limits for captured tool output."""
+
+    max_bytes: int = 64 * 1024  # Bytes kept in memory per stream (head + tail)
+    head_fraction: float = 0.5  # Share of max_bytes given to the head window
+    spill_bytes: int = 64 * 1024 * 1024  # Bytes kept on disk for paging
+
+
+def omission_marker(omitted: int, handle: Optional[str], offset: int) -> str:
+    """Text inserted where output was dropped, with a paging hint if possible."""
+    marker = f"\n... [{omitted} bytes omitted"
+    if handle:
+        marker += f"; page with read_tool_output(handle='{handle}', offset={offset})"
+    return marker + "] ...\n"
+
+
+class BoundedCapture:
+    """
+    Accumulates a byte stream with bounded memory.
+
+    The first ``head`` bytes and the last ``tail`` bytes are kept in memory.
+    Once the stream outgrows ``max_bytes`` it is also written to a spill file
+    registered with the output store, so nothing within ``spill_bytes`` is
+    lost.
+    """
+
+    def __init__(self, limits: OutputLimits, store: Optional["OutputStore"] = None) -> None:
+        self.limits = limits
+        self.store = store
+        self.head_limit = int(limits.max_bytes * limits.head_fraction)
+        self.tail_limit = limits.max_bytes - self.head_limit
+        self.total = 0
+        self.handle: Optional[str] = None
+        self._head = bytearray()
+        self._tail = bytearray()
+        self._spill: Optional[IO[bytes]] = None
+        self._spilled = 0
+
+    @property
+    def truncated(self) -> bool:
+        return self.total > self.limits.max_bytes
+
+    def write(self, data: bytes) -> None:
+        """Append a chunk of the stream."""
+        if not data:
+            return
+        self.total += len(data)
+
+        if self._spill is None and self.total > self.limits.max_bytes and self.store is not None:
+            self.handle, self._spill = self.store.open_spill()
+            self._spill_write(bytes(self._head) + bytes(self._tail))
+        if self._spill is not None:
+            self._spill_write(data)
+
+        room = self.head_limit - len(self._head)
+        if room > 0:
+            self._head += data[:room]
+            data = data[room:]
+        if data:
+            self._tail += data
+            if len(self._tail) > self.tail_limit:
+                del self._tail[: len(self._tail) - self.tail_limit]
+
+    def _spill_write(self, data: bytes) -> None:
+        room = self.limits.spill_bytes - self._spilled
+        if room <= 0:
+            return
+        chunk = data[:room]
+        self._spill.write(chunk)
+        self._spilled += len(chunk)
+
+    def close(self) -> None:
+        """Finish the stream and flush any spill file."""
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def text(self) -> str:
+        """Decode the kept windows, with a marker where bytes were dropped."""
+        head = self._head.decode("utf-8", errors="replace")
+        if not self.truncated:
+            return head + self._tail.decode("utf-8", errors="replace")
+        omitted = self.total - len(self._head) - len(self._tail)
+        marker = omission_marker(omitted, self.handle, len(self._head))
+        return head + marker + self._tail.decode("utf-8", errors="replace")
+
+
+class OutputStore:
+    """
+    Handles for outputs too large to return inline.
+
+    Each handle refers either to a spill file owned by the store or to an
+    existing file on disk. The store keeps at most ``max_handles`` entries
+    and deletes the oldest spill files first.
+    """
+
+    def __init__(self, max_handles: int = 32, spill_dir: Optional[str] = None) -> None:
+        """
+        Initialize output store.
+
+        Args:
+            max_handles: Maximum number of live handles
+            spill_dir: Directory for spill files (a private temp dir if None)
+        """
+        self.max_handles = max_handles
+        self._spill_dir = spill_dir
+        self._entries: "OrderedDict[str, Tuple[str, bool]]" = OrderedDict()  # handle -> (path, owned)
+        self._lock = threading.Lock()
+
+    def _dir(self) -> str:
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="agent-output-")
+        return self._spill_dir
+
+    def _add(self, path: str, owned: bool) -> str:
+        handle = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._entries[handle] = (path, owned)
+            while len(self._entries) > self.max_handles:
+                _, (old_path, old_owned) = self._entries.popitem(last=False)
+                if old_owned:
+                    try:
+                        os.unlink(old_path)
+                    except OSError:
+                        pass
+        return handle
+
+    def open_spill(self) -> Tuple[str, IO[bytes]]:
+        """
+        Create a spill file.
+
+        Returns:
+            (handle, binary file opened for writing)
+        """
+        fd, path = tempfile.mkstemp(dir=self._dir(), suffix=".out")
+        return self._add(path, owned=True), os.fdopen(fd, "wb")
+
+    def put_text(self, text: str) -> str:
+        """Store a string and return its handle."""
+        handle, f = self.open_spill()
+        with f:
+            f.write(text.encode("utf-8"))
+        return handle
+
+    def register_file(self, path: str) -> str:
+        """Return a handle that pages through an existing file."""
+        return self._add(path, owned=False)
+
+    def read(self, handle: str, offset: int = 0, length: int = 16 * 1024) -> Dict[str, Any]:
+        """
+        Read one page of a stored output.
+
+        Args:
+            handle: Handle returned with a truncated output
+            offset: Byte offset to start at
+            length: Maximum number of bytes to return
+
+        Returns:
+            Dict with 'content', 'offset', 'next_offset', 'total_bytes', 'eof', or 'error'
+        """
+        with self._lock:
+            entry = self._entries.get(handle)
+            if entry is not None:
+                self._entries.move_to_end(handle)
+        if entry is None:
+            return {"error": f"Unknown or expired output handle: {handle}"}
+
+        path = entry[0]
+        try:
+            with open(path, "rb") as f:
+                total = os.fstat(f.fileno()).st_size
+                f.seek(max(offset, 0))
+                data = f.read(max(length, 0))
+        except OSError as e:
+            return {"error": f"Error reading output: {e}"}
+
+        next_offset = max(offset, 0) + len(data)
+        return {
+            "success": True,
+            "handle": handle,
+            "content": data.decode("utf-8", errors="replace"),
+            "offset": offset,
+            "next_offset": next_offset,
+            "total_bytes": total,
+            "eof": next_offset >= total,
+        }
+
+    def clear(self) -> None:
+        """Drop all handles and delete spill files."""
+        with self._lock:
+            self._entries.clear()
+            spill_dir, self._spill_dir = self._spill_dir, None
+        if spill_dir:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+# Shared store used by the tools unless one is injected
+default_output_store = OutputStore()
+
+
+def stream_process(
+    proc: subprocess.Popen,
+    captures: Dict[IO[bytes], BoundedCapture],
+    timeout: Optional[float],
+    reap: bool = True,
+) -> bool:
+    """
+    Pump a process's pipes into bounded captures until it exits.
+
+    Args:
+        proc: Process started with stdout/stderr pipes
+        captures: Mapping of pipe -> capture
+        timeout: Seconds before giving up (None waits forever)
+        reap: Wait for the process once its pipes close; if False, return as
+            soon as they do and leave reaping to the caller
+
+    Returns:
+        True if the timeout expired (the process is left running)
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with selectors.DefaultSelector() as selector:
+        for pipe, capture in captures.items():
+            selector.register(pipe, selectors.EVENT_READ, capture)
+        while selector.get_map():
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return True
+            for key, _ in selector.select(remaining):
+                data = os.read(key.fd, 65536)
+                if data:
+                    key.data.write(data)
+                else:
+                    selector.unregister(key.fileobj)
+
+    if not reap:
+        return False
+    remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+    try:
+        proc.wait(remaining)
+    except subprocess.TimeoutExpired:
+        return True
+    return False
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (4 characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def fit_to_budget(
+    text: str,
+    max_tokens: int,
+    count_tokens: Optional[Callable[[str], int]] = None,
+    handle: Optional[str] = None,
+) -> Tuple[str, bool]:
+    """
+    Trim text to a token budget, keeping its head and tail.
+
+    Args:
+        text: Text to trim
+        max_tokens: Token budget
+        count_tokens: Tokenizer (falls back to a 4-chars-per-token estimate)
+        handle: Output handle to mention in the omission marker
+
+    Returns:
+        (text, truncated)
+    """
+    count = count_tokens or estimate_tokens
+    tokens = count(text)
+    if tokens <= max_tokens:
+        return text, False
+
+    chars_per_token = len(text) / max(tokens, 1)
+    keep = int(max_tokens * chars_per_token * 0.9)
+    for _ in range(4):
+        head_chars = keep // 2
+        tail_chars = keep - head_chars
+        omitted = len(text) - head_chars - tail_chars
+        marker = omission_marker(omitted, handle, len(text[:head_chars].encode("utf-8")))
+        marker = marker.replace("bytes", "characters", 1)
+        trimmed = text[:head_chars] + marker + (text[-tail_chars:] if tail_chars else "")
+        if count(trimmed) <= max_tokens:
+            return trimmed, True
+        keep = int(keep * 0.8)
+    return trimmed, True
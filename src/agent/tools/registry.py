@@ -5,8 +5,10 @@ Manages available tools and their permissions.
 
 import inspect
 import json
+import time
 from typing import Any, Callable, Dict, List, Optional, get_type_hints
 
+from ..metrics import TOOL_SECONDS
 from ..types import ToolDefinition
 
 
@@ -63,7 +65,11 @@ class Tool:
         }
 
     def __call__(self, **kwargs) -> Any:
-        return self.func(**kwargs)
+        started = time.perf_counter()
+        try:
+            return self.func(**kwargs)
+        finally:
+            TOOL_SECONDS.observe(time.perf_counter() - started, tool=self.name)
 
 
 class ToolRegistry:
@@ -84,6 +90,10 @@ class ToolRegistry:
         
     def get_tool(self, name: str) -> Optional[Tool]:
         return self._tools.get(name)
+
+    def list_tools(self) -> List[Tool]:
+        """Get all registered tools."""
+        return list(self._tools.values())
         
     def get_definitions(self) -> List[ToolDefinition]:
         """Get list of tool definitions for the LLM."""
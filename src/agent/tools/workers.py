@@ -0,0 +1,281 @@
+"""
+Isolated tool execution.
+
+Tools that call into native code (OCR, PIL screen grabs) or spawn helper
+processes can hang or crash the interpreter, which would take the loaded
+model down with the agent. ToolWorkerPool runs such tools in a small pool of
+supervised worker processes instead:
+
+- Workers are forked from a forkserver, not from the agent, so they never
+  inherit the model's memory or its inference threads.
+- Each worker bumps a heartbeat timestamp in shared memory from a
+  background thread. A call fails fast if the worker dies, stops beating
+  (native code holding the GIL) or exceeds its hard timeout; the worker is
+  then killed and replaced.
+- Small results come back over the worker's pipe. Results whose pickle
+  exceeds ``shm_threshold`` are written once into a shared memory segment
+  and unpickled straight from it, instead of being streamed through the
+  pipe in chunks.
+
+Targets are named ``"module:function"`` or ``"module:Class.method"``; for
+methods the worker creates one instance of the class (no arguments) and
+reuses it for later calls.
+"""
+
+from __future__ import annotations
+
+import importlib
+import itertools
+import multiprocessing
+import pickle
+import queue
+import signal
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import wait
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from ..logging_config import get_logger
+from ..metrics import TOOL_WORKER_RESTARTS
+
+
+logger = get_logger("tools")
+
+
+class WorkerError(RuntimeError):
+    """A tool worker crashed, stopped responding or timed out."""
+
+
+def _resolve(target: str, instances: Dict[str, Any]) -> Callable[..., Any]:
+    module_name, _, attr = target.partition(":")
+    module = importlib.import_module(module_name)
+    if "." not in attr:
+        return getattr(module, attr)
+    class_name, method = attr.rsplit(".", 1)
+    key = f"{module_name}:{class_name}"
+    instance = instances.get(key)
+    if instance is None:
+        instance = instances[key] = getattr(module, class_name)()
+    return getattr(instance, method)
+
+
+def _beat(heartbeat, interval: float) -> None:
+    while True:
+        # CLOCK_MONOTONIC is system-wide, so the parent can compare it
+        heartbeat.value = time.monotonic()
+        time.sleep(interval)
+
+
+def _worker_main(conn, heartbeat, interval: float, shm_threshold: int) -> None:
+    """Worker loop: receive (task, target, kwargs), send back the result."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # ^C is for the agent
+    threading.Thread(target=_beat, args=(heartbeat, interval), name="heartbeat", daemon=True).start()
+    instances: Dict[str, Any] = {}
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message is None:
+            return
+        task, target, kwargs = message
+        try:
+            data = pickle.dumps(_resolve(target, instances)(**kwargs), protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            conn.send((task, "error", f"{type(e).__name__}: {e}"))
+            continue
+        if len(data) < shm_threshold:
+            conn.send((task, "pickle", data))
+            continue
+        shm = shared_memory.SharedMemory(create=True, size=len(data))
+        shm.buf[:len(data)] = data
+        shm.close()
+        # The agent unlinks the segment, so this process must not track it
+        resource_tracker.unregister(shm._name, "shared_memory")
+        conn.send((task, "shm", (shm.name, len(data))))
+
+
+def _load_shared(name: str, size: int) -> Any:
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        view = shm.buf[:size]
+        try:
+            return pickle.loads(view)
+        finally:
+            view.release()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+class _Worker:
+    def __init__(self, ctx, index: int, heartbeat_interval: float, shm_threshold: int) -> None:
+        self.conn, child = ctx.Pipe()
+        self.heartbeat = ctx.Value("d", time.monotonic(), lock=False)
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child, self.heartbeat, heartbeat_interval, shm_threshold),
+            name=f"tool-worker-{index}",
+            daemon=True,
+        )
+        self.process.start()
+        child.close()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class ToolWorkerPool:
+    """
+    Supervised worker processes for blocking or crash-prone tools.
+
+    Workers start on the first call.
+
+    Args:
+        workers: Number of worker processes
+        timeout: Default hard timeout per call in seconds
+        heartbeat_interval: Seconds between worker heartbeats
+        heartbeat_timeout: Seconds without a heartbeat before a worker is
+            considered hung
+        shm_threshold: Pickled result size from which shared memory is used
+        preload: Modules the forkserver imports once, so workers start warm
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        timeout: float = 60.0,
+        heartbeat_interval: float = 0.5,
+        heartbeat_timeout: float = 10.0,
+        shm_threshold: int = 256 * 1024,
+        preload: Sequence[str] = (),
+    ) -> None:
+        self.size = workers
+        self.timeout = timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.shm_threshold = shm_threshold
+        self._ctx = multiprocessing.get_context("forkserver")
+        if preload:
+            self._ctx.set_forkserver_preload(list(preload))
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._all: Dict[int, _Worker] = {}
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = False
+        self._index = itertools.count()
+        self._tasks = itertools.count()
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._ctx, next(self._index), self.heartbeat_interval, self.shm_threshold)
+        with self._lock:
+            self._all[worker.process.pid] = worker
+        return worker
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._closed:
+                raise WorkerError("Tool worker pool is closed")
+            if self._started:
+                return
+            self._started = True
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+
+    def _replace(self, worker: _Worker, reason: str) -> None:
+        TOOL_WORKER_RESTARTS.inc(reason=reason)
+        with self._lock:
+            self._all.pop(worker.process.pid, None)
+        worker.kill()
+        if not self._closed:
+            self._idle.put(self._spawn())
+
+    def _acquire(self) -> _Worker:
+        self._start()
+        while True:
+            worker = self._idle.get()
+            if worker.process.is_alive():
+                return worker
+            # Died while idle (e.g. OOM-killed)
+            logger.warning("Tool worker %s exited while idle", worker.process.name)
+            self._replace(worker, "crash")
+
+    def call(self, target: str, kwargs: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Any:
+        """
+        Run a function in a worker and return its result.
+
+        Args:
+            target: "module:function" or "module:Class.method"
+            kwargs: Keyword arguments (must be picklable)
+            timeout: Hard timeout in seconds (the pool default if None)
+
+        Returns:
+            The function's return value
+
+        Raises:
+            WorkerError: If the function raised, the worker crashed or hung,
+                or the timeout expired
+        """
+        worker = self._acquire()
+        # A fresh worker may still be importing; give it a full grace period
+        worker.heartbeat.value = time.monotonic()
+        task = next(self._tasks)
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        try:
+            worker.conn.send((task, target, kwargs or {}))
+        except (OSError, ValueError) as e:
+            self._replace(worker, "crash")
+            raise WorkerError(f"Tool worker unavailable: {e}")
+
+        while True:
+            now = time.monotonic()
+            remaining = deadline - now
+            if remaining <= 0:
+                self._replace(worker, "timeout")
+                raise WorkerError(f"{target} timed out after {timeout} seconds; worker restarted")
+            if now - worker.heartbeat.value > self.heartbeat_timeout:
+                self._replace(worker, "unresponsive")
+                raise WorkerError(f"{target} stopped responding (no heartbeat); worker restarted")
+
+            ready = wait([worker.conn, worker.process.sentinel], min(remaining, self.heartbeat_interval))
+            if worker.conn in ready:
+                try:
+                    reply_task, kind, payload = worker.conn.recv()
+                except (EOFError, OSError):
+                    ready = [worker.process.sentinel]
+                else:
+                    if reply_task == task:
+                        break
+                    continue  # Stale reply; cannot happen with one task per worker
+            if worker.process.sentinel in ready:
+                worker.process.join(timeout=1)
+                code = worker.process.exitcode
+                self._replace(worker, "crash")
+                detail = f"signal {-code}" if code is not None and code < 0 else f"exit code {code}"
+                raise WorkerError(f"{target} crashed the tool worker ({detail}); worker restarted")
+
+        self._idle.put(worker)
+        if kind == "error":
+            raise WorkerError(payload)
+        if kind == "shm":
+            return _load_shared(*payload)
+        return pickle.loads(payload)
+
+    def close(self) -> None:
+        """Stop all workers."""
+        with self._lock:
+            self._closed = True
+            workers = list(self._all.values())
+            self._all.clear()
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+            worker.process.join(timeout=1)
+            worker.kill()
@@ -0,0 +1,293 @@
+"""
+Span-based tracing for the AI agent.
+
+Records nested timing spans around the agent loop (prompt building,
+tokenization, prompt evaluation, decoding, tool parsing and tool execution)
+and exports them as JSONL or in the Chrome trace event format, which can be
+opened in chrome://tracing or https://ui.perfetto.dev.
+
+Tracing is disabled by default; a disabled tracer hands out a shared no-op
+span so instrumented code pays only an attribute lookup.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+
+@dataclass
+class Span:
+    """A single timed operation."""
+
+    name: str
+    trace_id: str
+    span_id: int
+    parent_id: Optional[int]
+    thread_id: int
+    start: float  # perf_counter() seconds
+    end: Optional[float] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration_ms(self) -> float:
+        """Span duration in milliseconds (0 while the span is open)."""
+        if self.end is None:
+            return 0.0
+        return (self.end - self.start) * 1000.0
+
+    def set(self, **attributes: Any) -> None:
+        """Attach attributes (token counts, byte sizes, ...) to the span."""
+        self.attributes.update(attributes)
+
+
+class _NullSpan:
+    """Span stand-in used when tracing is disabled."""
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    Collects spans for one or more agent requests.
+
+    Each call to :meth:`start_trace` begins a new trace id; spans opened
+    afterwards are tagged with it so a single request can be summarized or
+    exported on its own.
+    """
+
+    def __init__(self, enabled: bool = False, max_spans: int = 100_000) -> None:
+        """
+        Initialize tracer.
+
+        Args:
+            enabled: Whether spans are recorded
+            max_spans: Maximum number of finished spans kept in memory
+        """
+        self.enabled = enabled
+        self.max_spans = max_spans
+        self.trace_id = uuid.uuid4().hex
+        self._spans: List[Span] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._next_id = 0
+        # Anchor perf_counter() to wall-clock time for exports
+        self._epoch_perf = time.perf_counter()
+        self._epoch_wall = time.time()
+
+    def start_trace(self) -> str:
+        """Begin a new trace (one per agent request) and return its id."""
+        self.trace_id = uuid.uuid4().hex
+        return self.trace_id
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _new_span(self, name: str, start: float, attributes: Dict[str, Any]) -> Span:
+        stack = self._stack()
+        with self._lock:
+            self._next_id += 1
+            span_id = self._next_id
+        return Span(
+            name=name,
+            trace_id=self.trace_id,
+            span_id=span_id,
+            parent_id=stack[-1].span_id if stack else None,
+            thread_id=threading.get_ident(),
+            start=start,
+            attributes=attributes,
+        )
+
+    def _finish(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+            if len(self._spans) > self.max_spans:
+                del self._spans[: len(self._spans) - self.max_spans]
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Any]:
+        """
+        Time a block of code.
+
+        Args:
+            name: Span name (e.g. "llm.generate", "tool.execute")
+            **attributes: Initial span attributes
+
+        Yields:
+            The open span; call ``span.set(...)`` to add attributes
+        """
+        if not self.enabled:
+            yield _NULL_SPAN
+            return
+
+        span = self._new_span(name, time.perf_counter(), attributes)
+        stack = self._stack()
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            span.end = time.perf_counter()
+            stack.pop()
+            self._finish(span)
+
+    def record(self, name: str, start: float, end: float, **attributes: Any) -> None:
+        """
+        Record a span whose boundaries were measured by the caller.
+
+        Used for phases that cannot be wrapped in a ``with`` block, such as
+        prompt evaluation measured as time-to-first-token of a stream.
+
+        Args:
+            name: Span name
+            start: Start time from time.perf_counter()
+            end: End time from time.perf_counter()
+            **attributes: Span attributes
+        """
+        if not self.enabled:
+            return
+        span = self._new_span(name, start, attributes)
+        span.end = end
+        self._finish(span)
+
+    def spans(self, trace_id: Optional[str] = None) -> List[Span]:
+        """Return finished spans, optionally only those of one trace."""
+        with self._lock:
+            spans = list(self._spans)
+        if trace_id is not None:
+            spans = [s for s in spans if s.trace_id == trace_id]
+        return sorted(spans, key=lambda s: s.start)
+
+    def clear(self) -> None:
+        """Drop all recorded spans."""
+        with self._lock:
+            self._spans.clear()
+
+    def summary(self, trace_id: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Aggregate span durations by name.
+
+        Returns:
+            Dict mapping span name to 'count', 'total_ms', 'mean_ms', 'max_ms'
+        """
+        stats: Dict[str, Dict[str, float]] = {}
+        for span in self.spans(trace_id):
+            entry = stats.setdefault(span.name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] += span.duration_ms
+            entry["max_ms"] = max(entry["max_ms"], span.duration_ms)
+        for entry in stats.values():
+            entry["mean_ms"] = entry["total_ms"] / entry["count"]
+        return stats
+
+    def format_summary(self, trace_id: Optional[str] = None) -> str:
+        """Render :meth:`summary` as a table sorted by total time."""
+        stats = self.summary(trace_id)
+        lines = [f"{'span':<24} {'count':>6} {'total ms':>10} {'mean ms':>10} {'max ms':>10}"]
+        for name, entry in sorted(stats.items(), key=lambda kv: kv[1]["total_ms"], reverse=True):
+            lines.append(
+                f"{name:<24} {int(entry['count']):>6} {entry['total_ms']:>10.2f} "
+                f"{entry['mean_ms']:>10.2f} {entry['max_ms']:>10.2f}"
+            )
+        return "\n".join(lines)
+
+    def _wall_time(self, perf: float) -> float:
+        return self._epoch_wall + (perf - self._epoch_perf)
+
+    def export_jsonl(self, path: str, trace_id: Optional[str] = None) -> int:
+        """
+        Write spans as one JSON object per line.
+
+        Args:
+            path: Output file path
+            trace_id: Only export this trace (all traces if None)
+
+        Returns:
+            Number of spans written
+        """
+        spans = self.spans(trace_id)
+        out = Path(path)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        with open(out, "w", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps({
+                    "trace_id": span.trace_id,
+                    "span_id": span.span_id,
+                    "parent_id": span.parent_id,
+                    "name": span.name,
+                    "thread_id": span.thread_id,
+                    "start": self._wall_time(span.start),
+                    "duration_ms": span.duration_ms,
+                    "attributes": span.attributes,
+                }, default=str) + "\n")
+        return len(spans)
+
+    def export_chrome(self, path: str, trace_id: Optional[str] = None) -> int:
+        """
+        Write spans in the Chrome trace event format.
+
+        Args:
+            path: Output file path
+            trace_id: Only export this trace (all traces if None)
+
+        Returns:
+            Number of spans written
+        """
+        spans = self.spans(trace_id)
+        pid = os.getpid()
+        events = [
+            {
+                "name": span.name,
+                "cat": span.name.split(".", 1)[0],
+                "ph": "X",
+                "ts": (span.start - self._epoch_perf) * 1e6,
+                "dur": span.duration_ms * 1000.0,
+                "pid": pid,
+                "tid": span.thread_id,
+                "args": {"trace_id": span.trace_id, **span.attributes},
+            }
+            for span in spans
+        ]
+        out = Path(path)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+        return len(spans)
+
+
+# Global tracer instance (disabled until main.py or a test enables it)
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    """Return the process-wide tracer."""
+    return _tracer
+
+
+def set_tracer(tracer: Tracer) -> Tracer:
+    """
+    Replace the process-wide tracer.
+
+    Returns:
+        The previous tracer
+    """
+    global _tracer
+    previous = _tracer
+    _tracer = tracer
+    return previous
@@ -0,0 +1,264 @@
+"""
+In-process X selection owner for bulk text entry.
+
+Typing text through xdotool costs a synthetic key press per character, so a
+few kilobytes take tens of seconds. Pasting is near-instant: the agent
+takes ownership of the CLIPBOARD and PRIMARY selections with a window of
+its own on the shared X connection (see agent.x11.connection), answers the
+target application's SelectionRequest with the text, and sends the paste
+key.
+
+Whether the target actually pasted is observable: an application that
+pastes must request the selection contents from us. Only requests that
+arrive after the paste key is sent (see arm()) count, and none from the
+clipboard manager, which fetches every new clipboard as soon as its owner
+changes. If no request arrives shortly after the paste key, the target does
+not accept paste, and the caller falls back to typing.
+
+Taking the selections replaces what the user had copied. offer() reads the
+previous contents as text first and restore() puts them back; contents
+that are not text (images, files) or too large for one transfer are lost.
+Restored contents are served by this owner, so they are lost as well when
+its process exits; the agent keeps it in its own process rather than in a
+tool worker, which the pool may replace at any time.
+
+Selections are served in one piece (no INCR transfers), which limits the
+text to MAX_PASTE_BYTES.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Optional, Sequence
+
+from ..logging_config import get_logger
+from .connection import get_connection
+
+try:
+    from Xlib import X, Xatom, error as xerror
+    from Xlib.protocol import event as xevent, request as xrequest
+except ImportError:
+    pass  # get_connection raises first
+
+
+logger = get_logger("x11")
+
+# Well below the core protocol's 256 KiB request limit
+MAX_PASTE_BYTES = 200 * 1024
+
+# Seconds to wait for the previous owner to hand over the old contents
+SNAPSHOT_TIMEOUT = 0.3
+
+# WM_CLASS names of terminals, which paste with shift+Insert rather than ctrl+v
+TERMINALS = {
+    "xterm", "uxterm", "urxvt", "rxvt", "gnome-terminal", "gnome-terminal-server", "konsole",
+    "xfce4-terminal", "alacritty", "kitty", "terminator", "tilix", "st", "lxterminal", "mate-terminal",
+}
+
+
+class SelectionOwner:
+    """
+    Serves text on the CLIPBOARD and PRIMARY selections.
+
+    Args:
+        display: X display name ($DISPLAY if None)
+
+    Raises:
+        RuntimeError: If python-xlib is missing or the display cannot be opened
+    """
+
+    def __init__(self, display: Optional[str] = None) -> None:
+        self._connection = get_connection(display)
+        self._display = self._connection.display
+        self._window = self._connection.root.create_window(0, 0, 1, 1, 0, X.CopyFromParent)
+        atom = self._display.intern_atom
+        self._selections = [atom("CLIPBOARD"), Xatom.PRIMARY]
+        self._targets = atom("TARGETS")
+        self._utf8 = atom("UTF8_STRING")
+        self._text_targets = {self._utf8: "utf-8", atom("TEXT"): "utf-8", Xatom.STRING: "latin-1"}
+        self._active = atom("_NET_ACTIVE_WINDOW")
+        self._manager_selection = atom("CLIPBOARD_MANAGER")
+        self._incr = atom("INCR")
+        self._fetch_property = atom("_AGENT_SELECTION")
+        self._client_mask = ~self._display.display.info.resource_id_mask
+        self._data: Dict[int, bytes] = {}
+        self._saved: Dict[int, Optional[bytes]] = {}
+        self._owned = set()
+        self._armed = False
+        self._manager: Optional[int] = None
+        self._lock = threading.Lock()
+        self._pasted = threading.Event()
+        self._fetched = threading.Event()
+        self._fetch_result: Optional[bytes] = None
+        self._fetching: Optional[int] = None
+        self._connection.subscribe(self._handle)
+
+    def offer(self, text: str) -> bool:
+        """
+        Own both selections with text as their content.
+
+        Returns:
+            False if the text is too large or ownership could not be taken
+        """
+        data = text.encode("utf-8")
+        if len(data) > MAX_PASTE_BYTES:
+            return False
+        saved = self._snapshot()
+        with self._lock:
+            self._saved = saved
+            self._data = {selection: data for selection in self._selections}
+            self._armed = False
+            self._pasted.clear()
+            for selection in self._selections:
+                self._window.set_selection_owner(selection, X.CurrentTime)
+            self._owned = {
+                s for s in self._selections
+                if self._display.get_selection_owner(s).id == self._window.id
+            }
+        return bool(self._owned)
+
+    def arm(self) -> None:
+        """Count requests from now on; call right before sending the paste key."""
+        manager = self._display.get_selection_owner(self._manager_selection)
+        with self._lock:
+            self._manager = manager.id if manager.id != X.NONE else None
+            self._pasted.clear()
+            self._armed = True
+
+    def wait_for_paste(self, timeout: float) -> bool:
+        """Wait until an application has fetched the offered text since arm()."""
+        return self._pasted.wait(timeout)
+
+    def restore(self) -> None:
+        """Put back the contents the selections had before offer()."""
+        with self._lock:
+            saved, self._saved = self._saved, {}
+            self._armed = False
+            for selection, data in saved.items():
+                if data is None:
+                    continue
+                self._data[selection] = data
+                # Take it back after release(), unless someone copied meanwhile
+                if selection not in self._owned and self._display.get_selection_owner(selection).id == X.NONE:
+                    self._window.set_selection_owner(selection, X.CurrentTime)
+                    self._owned.add(selection)
+        # Selections that were empty or held something other than text
+        # cannot be served; give them up instead of serving the pasted text
+        self.release([selection for selection, data in saved.items() if data is None])
+
+    def release(self, selections=None) -> None:
+        """Give up the selections (all if None) so a late paste cannot insert the text twice."""
+        with self._lock:
+            for selection in list(self._owned if selections is None else selections):
+                if selection not in self._owned:
+                    continue
+                xrequest.SetSelectionOwner(
+                    display=self._display.display, window=X.NONE, selection=selection, time=X.CurrentTime
+                )
+                self._owned.discard(selection)
+            self._display.flush()
+
+    def _snapshot(self) -> Dict[int, Optional[bytes]]:
+        """Current text contents of each selection (None if empty or not text)."""
+        saved: Dict[int, Optional[bytes]] = {}
+        for selection in self._selections:
+            owner = self._display.get_selection_owner(selection)
+            if owner.id == X.NONE:
+                saved[selection] = None
+            elif owner.id == self._window.id:
+                with self._lock:
+                    saved[selection] = self._saved.get(selection, self._data.get(selection))
+            else:
+                self._fetched.clear()
+                self._fetch_result = None
+                self._fetching = selection
+                self._window.convert_selection(selection, self._utf8, self._fetch_property, X.CurrentTime)
+                self._display.flush()
+                self._fetched.wait(SNAPSHOT_TIMEOUT)
+                saved[selection] = self._fetch_result
+        return saved
+
+    def active_is_terminal(self) -> bool:
+        """Whether the focused window is a terminal emulator (by WM_CLASS)."""
+        try:
+            root = self._display.screen().root
+            prop = root.get_full_property(self._active, X.AnyPropertyType)
+            if prop is None or not len(prop.value) or not prop.value[0]:
+                return False
+            window = self._display.create_resource_object("window", int(prop.value[0]))
+            wm_class = window.get_wm_class() or ()
+        except xerror.XError:
+            return False
+        return any(name.lower() in TERMINALS for name in wm_class)
+
+    def close(self) -> None:
+        self._connection.unsubscribe(self._handle)
+        self.release()
+        self._window.destroy()
+        self._display.flush()
+
+    # -- events ---------------------------------------------------------------
+
+    def _handle(self, events: Sequence[Any]) -> None:
+        window = self._window.id
+        for event in events:
+            try:
+                if event.type == X.SelectionRequest and event.owner.id == window:
+                    self._serve(event)
+                elif event.type == X.SelectionNotify and event.requestor.id == window:
+                    self._receive(event)
+                elif event.type == X.SelectionClear and event.window.id == window:
+                    with self._lock:
+                        self._owned.discard(event.atom)  # Someone else copied
+            except xerror.ConnectionClosedError:
+                raise
+            except Exception:
+                logger.exception("Error serving X selection")
+
+    def _receive(self, notify) -> None:
+        """Store the contents fetched by _snapshot."""
+        if notify.selection != self._fetching:
+            return  # Answer to a fetch that already timed out
+        if notify.property != X.NONE:
+            prop = self._window.get_full_property(notify.property, X.AnyPropertyType)
+            self._window.delete_property(notify.property)
+            if prop is not None and prop.property_type != self._incr and prop.format == 8:
+                value = prop.value
+                self._fetch_result = value if isinstance(value, bytes) else value.encode("utf-8")
+        self._fetched.set()
+
+    def _counts_as_paste(self, requestor: int) -> bool:
+        """Whether a request is the target pasting (not an early or manager fetch)."""
+        if not self._armed:
+            return False
+        return self._manager is None or (requestor & self._client_mask) != (self._manager & self._client_mask)
+
+    def _serve(self, request) -> None:
+        # Obsolete clients pass no property and expect the target name
+        prop = request.property or request.target
+        with self._lock:
+            data = self._data.get(request.selection) if request.selection in self._owned else None
+            counts = self._counts_as_paste(request.requestor.id)
+        if data is None:
+            prop = X.NONE
+        elif request.target == self._targets:
+            targets = [self._targets] + list(self._text_targets)
+            request.requestor.change_property(prop, Xatom.ATOM, 32, targets)
+        elif request.target in self._text_targets:
+            encoding = self._text_targets[request.target]
+            value = data if encoding == "utf-8" else data.decode("utf-8").encode("latin-1", "replace")
+            kind = self._utf8 if encoding == "utf-8" else Xatom.STRING
+            request.requestor.change_property(prop, kind, 8, value)
+            if counts:
+                self._pasted.set()
+        else:
+            prop = X.NONE
+        notify = xevent.SelectionNotify(
+            time=request.time,
+            requestor=request.requestor,
+            selection=request.selection,
+            target=request.target,
+            property=prop,
+        )
+        request.requestor.send_event(notify)
+        self._display.flush()
@@ -0,0 +1,152 @@
+"""
+Shared X connections.
+
+The X11 helpers in this package (window events, display geometry, the
+selection owner, UI tree snapshots) each used to open a connection and run
+their own event loop. XConnection is one connection per display that they
+all share:
+
+- python-xlib runs in threaded mode (real locks), since helpers send
+  requests from tool threads while the event thread reads.
+- X errors are ignored: windows vanish all the time, and requests on them
+  are expected to fail.
+- One daemon thread reads events and hands every drained burst to each
+  listener, so a listener can coalesce a burst (a mode switch, a window
+  opening) into one query. Listeners pick the events they care about.
+- select_input() merges event masks per window. A client has a single
+  mask per window, so two helpers selecting on the root window must not
+  overwrite each other's.
+"""
+
+from __future__ import annotations
+
+import select
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from ..logging_config import get_logger
+
+try:
+    import Xlib.threaded  # noqa: F401  (must precede any Display)
+    from Xlib import display as xdisplay, error as xerror
+    HAS_XLIB = True
+except ImportError:
+    HAS_XLIB = False
+
+
+logger = get_logger("x11")
+
+# Called from the event thread with each drained burst of events
+Listener = Callable[[Sequence[Any]], None]
+
+
+class XConnection:
+    """
+    One X connection and the thread that reads its events.
+
+    Args:
+        display: X display name ($DISPLAY if None)
+
+    Raises:
+        RuntimeError: If python-xlib is missing or the display cannot be opened
+    """
+
+    def __init__(self, display: Optional[str] = None) -> None:
+        if not HAS_XLIB:
+            raise RuntimeError("python-xlib not installed. Install: pip install python-xlib")
+        self.name = display
+        try:
+            self.display = xdisplay.Display(display)
+        except Exception as e:
+            raise RuntimeError(f"Cannot open X display {display or ''}: {e}")
+        self.display.set_error_handler(lambda *args: None)
+        self.root = self.display.screen().root
+        self._masks: Dict[int, int] = {}
+        self._listeners: List[Listener] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def closed(self) -> bool:
+        """Whether the connection was closed or lost; a new one is needed then."""
+        return self._closed
+
+    def select_input(self, window, mask: int) -> None:
+        """Add mask to the events selected on window."""
+        with self._lock:
+            mask |= self._masks.get(window.id, 0)
+            self._masks[window.id] = mask
+        window.change_attributes(event_mask=mask)
+        self.display.flush()
+
+    def forget(self, window_id: int) -> None:
+        """Drop the mask kept for a window that is gone."""
+        with self._lock:
+            self._masks.pop(window_id, None)
+
+    def subscribe(self, listener: Listener) -> None:
+        """Start passing events to listener (and start the event thread)."""
+        with self._lock:
+            self._listeners.append(listener)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="x11-events", daemon=True)
+                self._thread.start()
+
+    def unsubscribe(self, listener: Listener) -> None:
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        if not self._closed:
+            self._closed = True
+            self.display.close()
+
+    def _run(self) -> None:
+        fd = self.display.fileno()
+        while not self._stop.is_set():
+            try:
+                if not self.display.pending_events():
+                    select.select([fd], [], [], 0.25)
+                    continue
+                events = []
+                while self.display.pending_events():
+                    events.append(self.display.next_event())
+                with self._lock:
+                    listeners = list(self._listeners)
+                for listener in listeners:
+                    try:
+                        listener(events)
+                    except xerror.ConnectionClosedError:
+                        raise
+                    except Exception:
+                        logger.exception("Error handling X events")
+            except xerror.ConnectionClosedError:
+                logger.warning("X connection to %s closed; X11 helpers stopped", self.name or "$DISPLAY")
+                self._closed = True
+                return
+            except Exception:
+                logger.exception("Error reading X events")
+
+
+_connections: Dict[Optional[str], XConnection] = {}
+_connections_lock = threading.Lock()
+
+
+def get_connection(display: Optional[str] = None) -> XConnection:
+    """
+    The shared connection to a display (opened again if it was lost).
+
+    Raises:
+        RuntimeError: If python-xlib is missing or the display cannot be opened
+    """
+    with _connections_lock:
+        connection = _connections.get(display)
+        if connection is None or connection.closed:
+            connection = _connections[display] = XConnection(display)
+        return connection
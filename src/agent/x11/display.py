@@ -0,0 +1,262 @@
+"""
+Display geometry from RandR.
+
+Screen tools used to learn the resolution by grabbing a full screenshot or
+by running and parsing xdpyinfo/xrandr on every call. DisplayInfoService
+queries RandR once over the shared X connection (see agent.x11.connection)
+and keeps the result in memory: the root window size, each active monitor's
+geometry and physical size, and the primary monitor. It subscribes to RandR
+screen, CRTC and output change events (and root ConfigureNotify, for
+servers without RandR events in python-xlib) and re-queries only when the
+layout changes.
+
+Monitors come from RRGetMonitors where the server speaks RandR 1.5, else
+(or if that request fails) from the connected outputs' CRTCs, else the
+whole root window is one monitor.
+"""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from ..logging_config import get_logger
+from .connection import XConnection, get_connection
+
+try:
+    from Xlib import X, error as xerror
+    from Xlib.ext import randr
+except ImportError:
+    pass  # get_connection raises first
+
+
+logger = get_logger("x11")
+
+MM_PER_INCH = 25.4
+
+
+@dataclass(frozen=True)
+class Monitor:
+    """One active monitor in root window coordinates."""
+
+    name: str
+    x: int
+    y: int
+    width: int
+    height: int
+    width_mm: int = 0
+    height_mm: int = 0
+    primary: bool = False
+
+    @property
+    def bounds(self) -> Tuple[int, int, int, int]:
+        return self.x, self.y, self.width, self.height
+
+    @property
+    def dpi(self) -> Optional[float]:
+        if not self.width_mm:
+            return None
+        return round(self.width / (self.width_mm / MM_PER_INCH), 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "bounds": list(self.bounds),
+            "primary": self.primary,
+            "dpi": self.dpi,
+        }
+
+
+@dataclass(frozen=True)
+class DisplayInfo:
+    """Root window size and monitors, as of one RandR query."""
+
+    width: int
+    height: int
+    width_mm: int
+    height_mm: int
+    monitors: Tuple[Monitor, ...]
+    version: int = 0  # Bumped on every layout change
+
+    @property
+    def primary(self) -> Optional[Monitor]:
+        for monitor in self.monitors:
+            if monitor.primary:
+                return monitor
+        return self.monitors[0] if self.monitors else None
+
+    @property
+    def dpi(self) -> Optional[float]:
+        primary = self.primary
+        if primary is not None and primary.dpi:
+            return primary.dpi
+        if not self.width_mm:
+            return None
+        return round(self.width / (self.width_mm / MM_PER_INCH), 1)
+
+    def monitor(self, key: str) -> Optional[Monitor]:
+        """A monitor by name (e.g. "HDMI-1"), "primary", or index."""
+        if key == "primary":
+            return self.primary
+        for monitor in self.monitors:
+            if monitor.name == key:
+                return monitor
+        if key.isdigit() and int(key) < len(self.monitors):
+            return self.monitors[int(key)]
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "width": self.width,
+            "height": self.height,
+            "dpi": self.dpi,
+            "monitors": [monitor.to_dict() for monitor in self.monitors],
+        }
+
+
+class DisplayInfoService:
+    """
+    Serves display geometry from memory, refreshed on RandR events.
+
+    Args:
+        display: X display name ($DISPLAY if None)
+    """
+
+    def __init__(self, display: Optional[str] = None) -> None:
+        self.display_name = display
+        self._connection: Optional[XConnection] = None
+        self._display = None
+        self._root = None
+        self._randr = False
+        self._randr_monitors = False  # RandR 1.5: RRGetMonitors
+        self._info: Optional[DisplayInfo] = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()  # One subscription, however many callers
+
+    @property
+    def running(self) -> bool:
+        return self._connection is not None and not self._connection.closed
+
+    def info(self) -> DisplayInfo:
+        """
+        Current display geometry (queried on first use).
+
+        Raises:
+            RuntimeError: If python-xlib is missing or the display cannot be opened
+        """
+        if not self.running:
+            self.start()
+        with self._lock:
+            return self._info
+
+    def start(self) -> "DisplayInfoService":
+        """
+        Connect, query and start listening for changes (no-op if running).
+
+        Raises:
+            RuntimeError: If python-xlib is missing or the display cannot be opened
+        """
+        with self._start_lock:
+            if not self.running:
+                self._start()
+        return self
+
+    def _start(self) -> None:
+        # A lost connection is replaced by get_connection
+        connection = get_connection(self.display_name)
+        self._display, self._root = connection.display, connection.root
+        self._randr = self._display.has_extension("RANDR")
+        if self._randr:
+            version = self._display.xrandr_query_version()
+            self._randr_monitors = (version.major_version, version.minor_version) >= (1, 5)
+            self._root.xrandr_select_input(
+                randr.RRScreenChangeNotifyMask | randr.RRCrtcChangeNotifyMask | randr.RROutputChangeNotifyMask
+            )
+        connection.select_input(self._root, X.StructureNotifyMask)
+        self._refresh()
+        connection.subscribe(self._handle)
+        self._connection = connection
+
+    def stop(self) -> None:
+        with self._start_lock:
+            if self._connection is not None:
+                self._connection.unsubscribe(self._handle)
+                self._connection = None
+
+    # -- queries ------------------------------------------------------------------
+
+    def _refresh(self) -> None:
+        geometry = self._root.get_geometry()
+        screen = self._display.screen()
+        monitors: Tuple[Monitor, ...] = ()
+        if self._randr:
+            try:
+                monitors = self._query_monitors()
+            except xerror.XError as e:
+                logger.debug("RandR query failed: %s", e)
+        if not monitors:
+            monitors = (Monitor("screen", 0, 0, geometry.width, geometry.height,
+                                screen.width_in_mms, screen.height_in_mms, True),)
+        with self._lock:
+            version = self._info.version + 1 if self._info is not None else 0
+            self._info = DisplayInfo(geometry.width, geometry.height, screen.width_in_mms,
+                                     screen.height_in_mms, monitors, version)
+
+    def _query_monitors(self) -> Tuple[Monitor, ...]:
+        if self._randr_monitors:
+            try:
+                reply = self._root.xrandr_get_monitors(is_active=True)
+                return tuple(
+                    Monitor(self._display.get_atom_name(m.name), m.x, m.y, m.width_in_pixels, m.height_in_pixels,
+                            m.width_in_millimeters, m.height_in_millimeters, bool(m.primary))
+                    for m in reply.monitors
+                )
+            except xerror.XError as e:
+                logger.debug("RRGetMonitors failed, using CRTCs: %s", e)
+
+        resources = self._root.xrandr_get_screen_resources_current()
+        primary = self._root.xrandr_get_output_primary().output
+        monitors = []
+        for output in resources.outputs:
+            info = self._display.xrandr_get_output_info(output, resources.config_timestamp)
+            if info.connection != 0 or not info.crtc:  # 0 is RR_Connected
+                continue
+            crtc = self._display.xrandr_get_crtc_info(info.crtc, resources.config_timestamp)
+            if not crtc.mode:
+                continue
+            name = info.name.decode() if isinstance(info.name, bytes) else info.name
+            monitors.append(Monitor(name, crtc.x, crtc.y, crtc.width, crtc.height,
+                                    info.mm_width, info.mm_height, output == primary))
+        return tuple(monitors)
+
+    # -- events -------------------------------------------------------------------
+
+    def _handle(self, events: Sequence[Any]) -> None:
+        # A mode switch produces a burst of events; query once for all of them
+        changed = False
+        for event in events:
+            if event.type == X.ConfigureNotify:
+                changed |= event.window.id == self._root.id
+            else:
+                changed |= event.type >= 64  # Extension events; only RandR ones are selected
+        if changed:
+            self._refresh()
+
+
+_services: Dict[Optional[str], DisplayInfoService] = {}
+_services_lock = threading.Lock()
+
+
+def get_display_info(display: Optional[str] = None) -> DisplayInfo:
+    """
+    Display geometry from the display's shared service (started on first use).
+
+    Raises:
+        RuntimeError: If python-xlib is missing or the display cannot be opened
+    """
+    with _services_lock:
+        service = _services.get(display)
+        if service is None:
+            service = _services[display] = DisplayInfoService(display)
+    return service.info()
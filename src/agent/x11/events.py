@@ -0,0 +1,299 @@
+"""
+X11 window events.
+
+UI automation used to sleep for fixed delays and re-capture the screen to
+learn whether an action had any effect. WindowEventMonitor listens on the
+shared X connection (see agent.x11.connection) for the events that matter
+for that instead:
+
+- PropertyNotify on the root window for ``_NET_ACTIVE_WINDOW`` (focus) and
+  ``_NET_CLIENT_LIST`` (top-level windows appearing and disappearing), as
+  maintained by EWMH window managers
+- SubstructureNotify on the root window (map, unmap, destroy) when no EWMH
+  window manager is running
+- PropertyNotify on every top-level window for ``_NET_WM_NAME``/``WM_NAME``
+  (title changes)
+
+Events land in an EventLog: the current window list and focus plus a
+bounded, time-stamped history. Callers block on the log with a timeout, so
+a UI flow waits exactly until a window shows up or focus moves.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Pattern, Sequence, Tuple, TypeVar
+
+from ..logging_config import get_logger
+from .connection import XConnection, get_connection
+
+try:
+    from Xlib import X, error as xerror
+except ImportError:
+    pass  # get_connection raises first
+
+
+logger = get_logger("x11")
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class WindowEvent:
+    """One change to the window list, a title or the focus."""
+
+    seq: int
+    kind: str  # "map", "unmap", "title" or "focus"
+    window: int
+    title: Optional[str]
+    time: float  # time.time() when received
+
+
+class EventLog:
+    """
+    Current window state plus a bounded history of changes.
+
+    Args:
+        maxlen: Number of events kept
+    """
+
+    def __init__(self, maxlen: int = 512) -> None:
+        self.windows: Dict[int, Optional[str]] = {}  # Top-level window -> title
+        self.active: Optional[int] = None
+        self._events: Deque[WindowEvent] = deque(maxlen=maxlen)
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    @property
+    def seq(self) -> int:
+        """Number of events recorded so far; changes whenever the state does."""
+        return self._seq
+
+    def seed(self, windows: Dict[int, Optional[str]], active: Optional[int]) -> None:
+        """Set the initial state without recording events."""
+        with self._cond:
+            self.windows = dict(windows)
+            self.active = active
+            self._seq += 1
+            self._cond.notify_all()
+
+    def record(self, kind: str, window: int, title: Optional[str] = None) -> WindowEvent:
+        with self._cond:
+            if kind in ("map", "title"):
+                self.windows[window] = title
+            elif kind == "unmap":
+                self.windows.pop(window, None)
+            elif kind == "focus":
+                self.active = window
+            self._seq += 1
+            event = WindowEvent(self._seq, kind, window, title, time.time())
+            self._events.append(event)
+            self._cond.notify_all()
+        return event
+
+    def events(self, since: float = 0.0) -> List[WindowEvent]:
+        """Events received after ``since`` (epoch seconds)."""
+        with self._cond:
+            return [e for e in self._events if e.time > since]
+
+    def _wait(self, check: Callable[[], Optional[T]], timeout: float) -> Optional[T]:
+        # check() runs under the lock, so no event can slip in between a
+        # failed check and the wait
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                result = check()
+                if result is not None:
+                    return result
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def wait_for_window(self, pattern: Pattern[str], timeout: float) -> Optional[Tuple[int, str]]:
+        """
+        Wait until a top-level window's title matches pattern.
+
+        Returns:
+            (window, title), or None on timeout
+        """
+        def check() -> Optional[Tuple[int, str]]:
+            for window, title in self.windows.items():
+                if title and pattern.search(title):
+                    return window, title
+            return None
+        return self._wait(check, timeout)
+
+    def wait_for_focus(self, since: float, timeout: float) -> Optional[WindowEvent]:
+        """
+        Wait for the first focus change after ``since`` (epoch seconds).
+
+        Returns:
+            The focus event, or None on timeout
+        """
+        def check() -> Optional[WindowEvent]:
+            for event in self._events:
+                if event.kind == "focus" and event.time > since:
+                    return event
+            return None
+        return self._wait(check, timeout)
+
+
+class WindowEventMonitor:
+    """
+    Feeds X11 window events into an EventLog from the connection's event thread.
+
+    Args:
+        display: X display name (e.g. ":0"; $DISPLAY if None)
+        log: Log to feed (a new one if None)
+    """
+
+    def __init__(self, display: Optional[str] = None, log: Optional[EventLog] = None) -> None:
+        self.display_name = display
+        self.log = log or EventLog()
+        self._connection: Optional[XConnection] = None
+        self._display = None
+        self._root = None
+        self._atoms: Dict[str, int] = {}
+        self._ewmh = False
+        self._clients: set = set()
+
+    @property
+    def running(self) -> bool:
+        return self._connection is not None and not self._connection.closed
+
+    def start(self) -> "WindowEventMonitor":
+        """
+        Connect and start listening (no-op if already running).
+
+        Raises:
+            RuntimeError: If python-xlib is missing or the display cannot be opened
+        """
+        if self.running:
+            return self
+        connection = get_connection(self.display_name)
+        self._display, self._root = connection.display, connection.root
+        self._connection = connection
+        for name in ("_NET_ACTIVE_WINDOW", "_NET_CLIENT_LIST", "_NET_WM_NAME", "WM_NAME", "UTF8_STRING"):
+            self._atoms[name] = self._display.intern_atom(name)
+
+        clients = self._client_list()
+        self._ewmh = clients is not None
+        mask = X.PropertyChangeMask if self._ewmh else X.PropertyChangeMask | X.SubstructureNotifyMask
+        connection.select_input(self._root, mask)
+        if clients is None:
+            clients = [w.id for w in self._root.query_tree().children if self._viewable(w)]
+        self._clients = set(clients)
+        self.log.seed({w: self._watch(w) for w in clients}, self._active_window())
+        self._display.flush()
+        connection.subscribe(self._handle_all)
+        return self
+
+    def stop(self) -> None:
+        if self._connection is not None:
+            self._connection.unsubscribe(self._handle_all)
+            self._connection = None
+
+    # -- X helpers ------------------------------------------------------------
+
+    def _window(self, wid: int):
+        return self._display.create_resource_object("window", wid)
+
+    @staticmethod
+    def _viewable(window) -> bool:
+        try:
+            attrs = window.get_attributes()
+            return attrs.map_state == X.IsViewable and not attrs.override_redirect
+        except xerror.XError:
+            return False
+
+    def _client_list(self) -> Optional[List[int]]:
+        prop = self._root.get_full_property(self._atoms["_NET_CLIENT_LIST"], X.AnyPropertyType)
+        return list(prop.value) if prop is not None else None
+
+    def _active_window(self) -> Optional[int]:
+        prop = self._root.get_full_property(self._atoms["_NET_ACTIVE_WINDOW"], X.AnyPropertyType)
+        return int(prop.value[0]) if prop is not None and len(prop.value) and prop.value[0] else None
+
+    def _title(self, wid: int) -> Optional[str]:
+        try:
+            window = self._window(wid)
+            prop = window.get_full_property(self._atoms["_NET_WM_NAME"], self._atoms["UTF8_STRING"])
+            if prop is not None and prop.value:
+                value = prop.value
+                return value.decode("utf-8", "replace") if isinstance(value, bytes) else str(value)
+            name = window.get_wm_name()
+            return name.decode("latin-1") if isinstance(name, bytes) else name
+        except xerror.XError:
+            return None
+
+    def _watch(self, wid: int) -> Optional[str]:
+        """Subscribe to a top-level window's title changes and return its title."""
+        try:
+            self._connection.select_input(self._window(wid), X.PropertyChangeMask)
+        except xerror.XError:
+            pass
+        return self._title(wid)
+
+    # -- events -----------------------------------------------------------------
+
+    def _handle_all(self, events: Sequence[Any]) -> None:
+        for event in events:
+            try:
+                self._handle(event)
+            except xerror.ConnectionClosedError:
+                raise
+            except Exception:
+                logger.exception("Error handling X event")
+
+    def _handle(self, event) -> None:
+        atoms = self._atoms
+        if event.type == X.PropertyNotify:
+            if event.window.id == self._root.id:
+                if event.atom == atoms["_NET_ACTIVE_WINDOW"]:
+                    active = self._active_window()
+                    if active is not None and active != self.log.active:
+                        self.log.record("focus", active, self._title(active))
+                elif event.atom == atoms["_NET_CLIENT_LIST"]:
+                    self._update_clients(self._client_list() or [])
+            elif event.atom in (atoms["_NET_WM_NAME"], atoms["WM_NAME"]) and event.window.id in self._clients:
+                title = self._title(event.window.id)
+                if title != self.log.windows.get(event.window.id):
+                    self.log.record("title", event.window.id, title)
+        elif not self._ewmh:
+            if event.type == X.MapNotify and not event.override:
+                self._update_clients(self._clients | {event.window.id})
+            elif event.type in (X.UnmapNotify, X.DestroyNotify):
+                self._update_clients(self._clients - {event.window.id})
+
+    def _update_clients(self, clients) -> None:
+        clients = set(clients)
+        for wid in clients - self._clients:
+            self.log.record("map", wid, self._watch(wid))
+        for wid in self._clients - clients:
+            self.log.record("unmap", wid, self.log.windows.get(wid))
+            self._connection.forget(wid)
+        self._clients = clients
+
+
+_monitors: Dict[Optional[str], WindowEventMonitor] = {}
+_monitors_lock = threading.Lock()
+
+
+def get_monitor(display: Optional[str] = None) -> WindowEventMonitor:
+    """
+    Return the running monitor for a display (started on first use).
+
+    Raises:
+        RuntimeError: If python-xlib is missing or the display cannot be opened
+    """
+    with _monitors_lock:
+        monitor = _monitors.get(display)
+        if monitor is None or not monitor.running:
+            monitor = WindowEventMonitor(display).start()
+            _monitors[display] = monitor
+        return monitor
+
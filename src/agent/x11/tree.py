@@ -0,0 +1,373 @@
+"""
+Window and accessibility tree snapshots.
+
+Full-screen OCR is slow and costs many tokens for what is usually a
+question like "where is the Save button". UITree answers it from
+structure instead:
+
+- The X window tree: top-level windows with their titles, screen bounds
+  and focus.
+- The AT-SPI accessibility tree, where python3-pyatspi is installed and
+  applications expose it (GTK, Qt, Firefox, LibreOffice): named controls
+  with roles, bounds and states, attached under their window.
+
+A snapshot renders as one short line per element::
+
+    [0x3a00007] window "Save As" @420,180 640x480 focused
+      [0x3a00007.1.0] text "File name" @440,220 300x24 focused editable
+      [0x3a00007.2] push button "Save" @960,620 80x28
+
+Unnamed layout containers are skipped and their children promoted. Node ids
+are paths, so they stay the same between snapshots of an unchanged UI and
+snapshots can be diffed.
+
+Walking AT-SPI costs a D-Bus round trip per property, so snapshots are
+cached. The budget covers the whole walk, from enumerating applications
+on, and each call times out after ATSPI_TIMEOUT_MS, so an application that
+does not answer cannot hold a snapshot up for long. A cached snapshot is
+reused until a window event arrives (see agent.x11.events), the caller
+reports input since it was taken, or it is max_age seconds old (changes
+inside a window raise no X events).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Pattern, Set, Tuple
+
+from ..logging_config import get_logger
+from .connection import get_connection
+from .events import EventLog
+
+try:
+    from Xlib import X, error as xerror
+except ImportError:
+    pass  # get_connection raises first
+
+try:
+    import pyatspi
+    HAS_ATSPI = True
+except ImportError:
+    HAS_ATSPI = False
+
+
+logger = get_logger("x11")
+
+# Per-call AT-SPI timeout (libatspi waits 800 ms by default)
+ATSPI_TIMEOUT_MS = 250
+
+# Unnamed elements with these roles are layout only and left out
+LAYOUT_ROLES = {
+    "filler", "panel", "section", "unknown", "layered pane", "scroll pane", "viewport",
+    "redundant object", "grouping", "invalid",
+}
+
+MAX_NAME_CHARS = 80
+
+
+@dataclass(frozen=True)
+class UINode:
+    """One window or accessible element."""
+
+    id: str
+    role: str
+    name: str
+    bounds: Optional[Tuple[int, int, int, int]]  # x, y, width, height on screen
+    states: Tuple[str, ...] = ()
+    depth: int = 0
+
+    @property
+    def center(self) -> Optional[Tuple[int, int]]:
+        if self.bounds is None:
+            return None
+        x, y, width, height = self.bounds
+        return x + width // 2, y + height // 2
+
+    def line(self) -> str:
+        parts = [f"[{self.id}]", self.role]
+        if self.name:
+            name = self.name if len(self.name) <= MAX_NAME_CHARS else self.name[:MAX_NAME_CHARS - 3] + "..."
+            parts.append('"' + name.replace("\n", " ") + '"')
+        if self.bounds is not None:
+            x, y, width, height = self.bounds
+            parts.append(f"@{x},{y} {width}x{height}")
+        parts.extend(self.states)
+        return "  " * self.depth + " ".join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "role": self.role,
+            "name": self.name,
+            "bounds": list(self.bounds) if self.bounds is not None else None,
+            "center": list(self.center) if self.center is not None else None,
+            "states": list(self.states),
+        }
+
+
+@dataclass
+class UISnapshot:
+    """Elements in tree order, keyed by id."""
+
+    nodes: Dict[str, UINode]
+    seq: int  # EventLog.seq when taken
+    time: float  # time.time() when taken
+    truncated: bool = False
+
+    def render(self) -> str:
+        return "\n".join(node.line() for node in self.nodes.values())
+
+    def find(self, pattern: Pattern[str], role: Optional[str] = None) -> List[UINode]:
+        """Elements whose name matches pattern (and whose role is role)."""
+        return [
+            node for node in self.nodes.values()
+            if pattern.search(node.name) and (role is None or node.role == role)
+        ]
+
+    def diff(self, old: "UISnapshot") -> Dict[str, List[str]]:
+        """
+        Changes from old to this snapshot.
+
+        Returns:
+            Dict with 'added' and 'changed' (rendered lines) and 'removed' (ids)
+        """
+        added, changed = [], []
+        for node_id, node in self.nodes.items():
+            before = old.nodes.get(node_id)
+            if before is None:
+                added.append(node.line().strip())
+            elif before != node:
+                changed.append(node.line().strip())
+        removed = [node_id for node_id in old.nodes if node_id not in self.nodes]
+        return {"added": added, "removed": removed, "changed": changed}
+
+
+class UITree:
+    """
+    Cached snapshots of the window and accessibility trees.
+
+    Args:
+        display: X display name ($DISPLAY if None)
+        log: Window event log whose changes invalidate the cache
+        max_age: Seconds after which a cached snapshot is retaken anyway
+        max_nodes: Elements per snapshot before it is truncated
+        budget: Seconds spent walking AT-SPI before a snapshot is truncated
+    """
+
+    def __init__(
+        self,
+        display: Optional[str] = None,
+        log: Optional[EventLog] = None,
+        max_age: float = 2.0,
+        max_nodes: int = 400,
+        budget: float = 3.0,
+    ) -> None:
+        self.display_name = display
+        self.log = log
+        self.max_age = max_age
+        self.max_nodes = max_nodes
+        self.budget = budget
+        self._connection = None
+        self._display = None
+        self._atoms: Dict[str, int] = {}
+        self._cache: Dict[Tuple[Optional[int], int], UISnapshot] = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self, window: Optional[int] = None, max_depth: int = 12, newer_than: float = 0.0) -> UISnapshot:
+        """
+        Return a snapshot, from the cache if it is still current.
+
+        Args:
+            window: Only this top-level window (all windows if None)
+            max_depth: Levels below each window
+            newer_than: Epoch time a cached snapshot must be newer than,
+                e.g. of the last input sent to the UI
+
+        Raises:
+            RuntimeError: If python-xlib is missing or the display cannot be opened
+        """
+        seq = self.log.seq if self.log is not None else 0
+        key = (window, max_depth)
+        with self._lock:
+            cached = self._cache.get(key)
+            if (
+                cached is not None
+                and cached.seq == seq
+                and cached.time > newer_than
+                and time.time() - cached.time < self.max_age
+            ):
+                return cached
+            taken = time.time()
+            nodes, truncated = self._collect(window, max_depth)
+            snapshot = UISnapshot({node.id: node for node in nodes}, seq, taken, truncated)
+            self._cache[key] = snapshot
+            return snapshot
+
+    def close(self) -> None:
+        with self._lock:
+            self._display = None  # The connection is shared; it stays open
+            self._cache.clear()
+
+    # -- X windows -------------------------------------------------------------
+
+    def _connect(self):
+        if self._display is None or self._connection.closed:
+            self._connection = get_connection(self.display_name)
+            self._display = self._connection.display
+            for name in ("_NET_CLIENT_LIST", "_NET_ACTIVE_WINDOW", "_NET_WM_NAME", "_NET_WM_PID"):
+                self._atoms[name] = self._display.intern_atom(name)
+        return self._display
+
+    def _property(self, window, name: str):
+        prop = window.get_full_property(self._atoms[name], X.AnyPropertyType)
+        return prop.value if prop is not None and len(prop.value) else None
+
+    def _windows(self) -> Tuple[Dict[int, Optional[str]], Optional[int]]:
+        """Top-level windows with titles, and the active window."""
+        if self.log is not None and self.log.windows:
+            return dict(self.log.windows), self.log.active
+        root = self._display.screen().root
+        clients = self._property(root, "_NET_CLIENT_LIST")
+        if clients is None:
+            clients = [w.id for w in root.query_tree().children if w.get_attributes().map_state == X.IsViewable]
+        active = self._property(root, "_NET_ACTIVE_WINDOW")
+        windows = {}
+        for wid in clients:
+            title = self._property(self._display.create_resource_object("window", wid), "_NET_WM_NAME")
+            windows[int(wid)] = title.decode("utf-8", "replace") if isinstance(title, bytes) else title
+        return windows, int(active[0]) if active is not None and active[0] else None
+
+    def _window_node(self, wid: int, title: Optional[str], active: Optional[int]) -> Optional[UINode]:
+        root = self._display.screen().root
+        window = self._display.create_resource_object("window", wid)
+        try:
+            geometry = window.get_geometry()
+            origin = root.translate_coords(window, 0, 0)
+        except xerror.XError:
+            return None  # Closed meanwhile
+        bounds = (origin.x, origin.y, geometry.width, geometry.height)
+        states = ("focused",) if wid == active else ()
+        return UINode(hex(wid), "window", title or "", bounds, states)
+
+    def _window_pid(self, wid: int) -> Optional[int]:
+        try:
+            value = self._property(self._display.create_resource_object("window", wid), "_NET_WM_PID")
+        except xerror.XError:
+            return None
+        return int(value[0]) if value is not None else None
+
+    def _collect(self, window: Optional[int], max_depth: int) -> Tuple[List[UINode], bool]:
+        self._connect()
+        windows, active = self._windows()
+        if window is not None:
+            windows = {window: windows.get(window)} if window in windows else {}
+        deadline = time.monotonic() + self.budget
+        pids = {wid: self._window_pid(wid) for wid in windows}
+        frames, truncated = self._accessible_frames(set(pids.values()), deadline) if HAS_ATSPI else ({}, False)
+        nodes: List[UINode] = []
+        for wid, title in windows.items():
+            node = self._window_node(wid, title, active)
+            if node is None:
+                continue
+            nodes.append(node)
+            frame = self._match_frame(frames, pids[wid], title)
+            if frame is not None:
+                truncated |= self._walk(frame, node.id, 1, max_depth, nodes, deadline)
+            if len(nodes) >= self.max_nodes:
+                return nodes[:self.max_nodes], True
+        return nodes, truncated
+
+    # -- AT-SPI ----------------------------------------------------------------
+
+    @staticmethod
+    def _accessible_frames(pids: Set[Optional[int]], deadline: float) -> Tuple[Dict[int, List[Any]], bool]:
+        """
+        Showing top-level accessibles by pid, for the applications with these
+        pids, and whether the deadline passed before all were seen.
+        """
+        frames: Dict[int, List[Any]] = {}
+        try:
+            pyatspi.setTimeout(ATSPI_TIMEOUT_MS, ATSPI_TIMEOUT_MS)
+        except AttributeError:
+            pass  # Older pyatspi keeps the default timeout
+        try:
+            desktop = pyatspi.Registry.getDesktop(0)
+            for app in desktop:
+                if time.monotonic() > deadline:
+                    return frames, True
+                if app is None:
+                    continue
+                try:
+                    pid = app.get_process_id()
+                    if pid in pids:
+                        frames[pid] = [f for f in app if f is not None and f.getState().contains(pyatspi.STATE_SHOWING)]
+                except Exception:
+                    continue  # Application exited or does not answer
+        except Exception as e:
+            logger.debug("AT-SPI unavailable: %s", e)
+        return frames, False
+
+    @staticmethod
+    def _match_frame(frames: Dict[int, List[Any]], pid: Optional[int], title: Optional[str]):
+        candidates = frames.get(pid) if pid is not None else None
+        if not candidates:
+            return None
+        for frame in candidates:
+            if frame.name == title:
+                return frame
+        return candidates[0] if len(candidates) == 1 else None
+
+    @staticmethod
+    def _states(state_set) -> Tuple[str, ...]:
+        states = [
+            name for name, state in (
+                ("focused", pyatspi.STATE_FOCUSED),
+                ("selected", pyatspi.STATE_SELECTED),
+                ("checked", pyatspi.STATE_CHECKED),
+                ("pressed", pyatspi.STATE_PRESSED),
+                ("expanded", pyatspi.STATE_EXPANDED),
+                ("editable", pyatspi.STATE_EDITABLE),
+            )
+            if state_set.contains(state)
+        ]
+        if not state_set.contains(pyatspi.STATE_SENSITIVE):
+            states.append("disabled")
+        return tuple(states)
+
+    def _walk(self, accessible, parent_id: str, depth: int, max_depth: int,
+              nodes: List[UINode], deadline: float) -> bool:
+        """Append the children of accessible; True if the walk was cut short."""
+        if depth > max_depth:
+            return False
+        for index in range(accessible.childCount):
+            if len(nodes) >= self.max_nodes or time.monotonic() > deadline:
+                return True
+            try:
+                child = accessible.getChildAtIndex(index)
+                if child is None:
+                    continue
+                state_set = child.getState()
+                if not state_set.contains(pyatspi.STATE_SHOWING):
+                    continue
+                role, name = child.getRoleName(), child.name or ""
+                try:
+                    box = child.queryComponent().getExtents(pyatspi.DESKTOP_COORDS)
+                    bounds = (box.x, box.y, box.width, box.height)
+                except NotImplementedError:
+                    bounds = None
+                states = self._states(state_set)
+            except Exception:
+                continue  # Element went away mid-walk
+            node_id = f"{parent_id}.{index}"
+            if not name and role in LAYOUT_ROLES:
+                # Keep the path in the id but not the level in the output
+                if self._walk(child, node_id, depth, max_depth, nodes, deadline):
+                    return True
+                continue
+            nodes.append(UINode(node_id, role, name, bounds, states, depth))
+            if self._walk(child, node_id, depth + 1, max_depth, nodes, deadline):
+                return True
+        return False
+
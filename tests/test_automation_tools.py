@@ -0,0 +1,315 @@
+"""
+Tests for event-driven UI waits, text entry and UI tree snapshots.
+"""
+
+import os
+import re
+import threading
+import time
+import types
+
+import pytest
+
+from agent.automation_tools import AutomationTools
+from agent.x11 import connection as connection_module, tree as tree_module
+from agent.x11.clipboard import SelectionOwner
+from agent.x11.events import EventLog, WindowEventMonitor
+from agent.x11.tree import UINode, UITree
+
+
+def later(delay, func, *args):
+    timer = threading.Timer(delay, func, args=args)
+    timer.start()
+    return timer
+
+
+def test_event_log_tracks_windows_and_focus():
+    """Test window state updates and focus waits with a since time."""
+    log = EventLog()
+    log.seed({1: "Terminal"}, active=1)
+    before = time.time()
+    log.record("map", 2, "Firefox")
+    log.record("title", 2, "Firefox - Docs")
+    log.record("focus", 2, "Firefox - Docs")
+    log.record("unmap", 1, "Terminal")
+
+    assert log.windows == {2: "Firefox - Docs"}
+    assert log.active == 2
+    assert [e.kind for e in log.events(before)] == ["map", "title", "focus", "unmap"]
+
+    # A change that already happened after `since` is returned at once
+    assert log.wait_for_focus(before, timeout=0).window == 2
+    assert log.wait_for_focus(time.time(), timeout=0.05) is None
+    assert log.wait_for_window(re.compile("docs", re.I), timeout=0) == (2, "Firefox - Docs")
+
+
+def test_wait_for_window_wakes_on_event():
+    """Test that a wait returns as soon as the window maps, not after polling."""
+    monitor = WindowEventMonitor(log=EventLog())
+    tools = AutomationTools(display=":99", events=monitor)
+
+    later(0.1, monitor.log.record, "map", 0x400001, "Save As")
+    start = time.monotonic()
+    result = tools.wait_for_window("save as", timeout=5)
+    assert result["success"]
+    assert result["window_id"] == str(0x400001)
+    assert result["title"] == "Save As"
+    assert time.monotonic() - start < 1
+
+    # Already open: no wait at all
+    assert tools.wait_for_window("^Save")["waited"] < 0.05
+
+    assert "error" in tools.wait_for_window("Nothing", timeout=0.05)
+    assert "error" in tools.wait_for_window("(", timeout=0.05)
+
+
+def test_wait_for_focus_change_sees_earlier_change():
+    """Test that a focus change between an action and the wait is not missed."""
+    monitor = WindowEventMonitor(log=EventLog())
+    tools = AutomationTools(display=":99", events=monitor)
+
+    action = time.time()
+    monitor.log.record("focus", 7, "Dialog")
+    result = tools.wait_for_focus_change(timeout=1, since=action)
+    assert result["window_id"] == "7"
+
+    later(0.1, monitor.log.record, "focus", 8, "Editor")
+    result = tools.wait_for_focus_change(timeout=5)
+    assert result["title"] == "Editor"
+
+    assert "error" in tools.wait_for_focus_change(timeout=0.05)
+
+
+class FakeClipboard:
+    def __init__(self, accepts, terminal=False):
+        self.accepts = accepts
+        self.terminal = terminal
+        self.offered = []
+        self.armed = False
+        self.released = False
+        self.restored = False
+
+    def offer(self, text):
+        self.offered.append(text)
+        return True
+
+    def active_is_terminal(self):
+        return self.terminal
+
+    def arm(self):
+        self.armed = True
+
+    def wait_for_paste(self, timeout):
+        return self.accepts and self.armed
+
+    def release(self):
+        self.released = True
+
+    def restore(self):
+        self.restored = True
+
+
+def fake_xdotool(tools):
+    calls = []
+
+    def run(args, timeout=10):
+        calls.append(args)
+        return {"success": True, "output": ""}
+    tools._run_xdotool = run
+    return calls
+
+
+def test_type_text_pastes_long_text():
+    """Test that long text goes through the clipboard with the right paste key."""
+    tools = AutomationTools(display=":99")
+    tools._clipboard = FakeClipboard(accepts=True)
+    calls = fake_xdotool(tools)
+
+    text = "def main():\n    return 42\n" * 20
+    assert tools.type_text(text) == {"success": True, "method": "paste"}
+    assert tools._clipboard.offered == [text]
+    assert calls == [["key", "--clearmodifiers", "ctrl+v"]]
+    assert tools._clipboard.restored
+
+    tools._clipboard = FakeClipboard(accepts=True, terminal=True)
+    calls.clear()
+    tools.type_text(text)
+    assert calls == [["key", "--clearmodifiers", "shift+Insert"]]
+
+    # Short text is typed with the requested delay
+    calls.clear()
+    assert tools.type_text("hi")["method"] == "type"
+    assert calls == [["type", "--delay", "12", "--", "hi"]]
+
+
+def test_type_text_keeps_clipboard_and_runs_xdotool_through_runner():
+    """Test that only the xdotool input goes to the runner (e.g. a tool worker)."""
+    calls = []
+
+    def runner(args, timeout):
+        calls.append(args)
+        return {"success": True, "output": ""}
+
+    tools = AutomationTools(display=":99", runner=runner)
+    tools._clipboard = FakeClipboard(accepts=True)
+    assert tools.type_text("x" * 100) == {"success": True, "method": "paste"}
+    assert calls == [["key", "--clearmodifiers", "ctrl+v"]]
+    assert tools._clipboard.restored
+
+
+def test_type_text_falls_back_when_paste_is_ignored():
+    """Test that an unfetched paste is withdrawn and the text typed without delay."""
+    tools = AutomationTools(display=":99")
+    tools._clipboard = FakeClipboard(accepts=False)
+    calls = fake_xdotool(tools)
+
+    text = "x" * 100
+    assert tools.type_text(text) == {"success": True, "method": "type"}
+    assert tools._clipboard.released and tools._clipboard.restored
+    assert calls[-1] == ["type", "--delay", "0", "--", text]
+
+    assert "error" in tools.type_text(text, method="paste")
+
+
+def test_selection_requests_count_only_after_paste_key():
+    """Test that clipboard manager and early fetches are not taken as a paste."""
+    owner = SelectionOwner.__new__(SelectionOwner)
+    owner._client_mask = ~0x1FFFFF
+    owner._armed = False
+    owner._manager = 0x1600001
+    assert not owner._counts_as_paste(0x3a00007)  # Before the paste key
+    owner._armed = True
+    assert not owner._counts_as_paste(0x1600002)  # Another window of the manager
+    assert owner._counts_as_paste(0x3a00007)
+    owner._manager = None
+    assert owner._counts_as_paste(0x1600002)
+
+
+def test_shared_connection_merges_masks_and_batches_events(monkeypatch):
+    """Test that helpers sharing a connection keep each other's event masks."""
+    pytest.importorskip("Xlib")
+    masks = []
+    queue = ["map", "title"]
+    read_end, write_end = os.pipe()
+    root = types.SimpleNamespace(id=1, change_attributes=lambda event_mask: masks.append(event_mask))
+    fake = types.SimpleNamespace(
+        screen=lambda: types.SimpleNamespace(root=root),
+        set_error_handler=lambda handler: None,
+        flush=lambda: None,
+        fileno=lambda: read_end,
+        pending_events=lambda: len(queue),
+        next_event=lambda: queue.pop(0),
+        close=lambda: None,
+    )
+    monkeypatch.setattr(connection_module.xdisplay, "Display", lambda name=None: fake)
+
+    connection = connection_module.XConnection(":98")
+    try:
+        connection.select_input(root, 0x1)
+        connection.select_input(root, 0x4)
+        assert masks == [0x1, 0x5]
+
+        batches = []
+        connection.subscribe(batches.append)
+        deadline = time.monotonic() + 2
+        while not batches and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert batches == [["map", "title"]]
+    finally:
+        connection.close()
+        os.close(read_end)
+        os.close(write_end)
+
+
+class FakeTree(UITree):
+    def __init__(self, log, nodes):
+        super().__init__(log=log)
+        self.nodes = nodes
+        self.collects = 0
+
+    def _collect(self, window, max_depth):
+        self.collects += 1
+        return [n for n in self.nodes if window is None or n.id.startswith(hex(window))], False
+
+
+def test_ui_tree_is_cached_until_events_or_input():
+    """Test snapshot caching, invalidation and diffs."""
+    log = EventLog()
+    tree = FakeTree(log, [
+        UINode("0x10", "window", "Save As", (100, 100, 400, 300), ("focused",)),
+        UINode("0x10.1", "text", "File name", (120, 140, 200, 24), ("editable",), 1),
+        UINode("0x10.2", "push button", "Save", (400, 360, 80, 28), (), 1),
+    ])
+    tools = AutomationTools(display=":99")
+    tools._tree = tree
+
+    result = tools.get_ui_tree()
+    assert result["elements"] == 3
+    assert result["tree"].splitlines()[2] == '  [0x10.2] push button "Save" @400,360 80x28'
+    tools.get_ui_tree()
+    assert tree.collects == 1
+
+    # Input after the snapshot, or a window event, forces a new one
+    tools.get_ui_tree(newer_than=time.time())
+    assert tree.collects == 2
+    log.record("map", 0x20, "Confirm")
+    tree.nodes = tree.nodes[:2] + [
+        UINode("0x10.2", "push button", "Save", (400, 360, 80, 28), ("disabled",), 1),
+        UINode("0x20", "window", "Confirm", (200, 200, 200, 100)),
+    ]
+    changes = tools.get_ui_tree(diff=True)
+    assert tree.collects == 3
+    assert changes["added"] == ['[0x20] window "Confirm" @200,200 200x100']
+    assert changes["changed"] == ['[0x10.2] push button "Save" @400,360 80x28 disabled']
+    assert changes["removed"] == []
+
+    assert tools.get_ui_tree(window_id=str(0x10))["elements"] == 3
+    assert "error" in tools.get_ui_tree(window_id="0x99")
+    assert "error" in tools.get_ui_tree(window_id="bogus")
+
+    # Elements of covered windows are left out for grounding
+    tree.nodes.append(UINode("0x20.0", "push button", "OK", (220, 260, 60, 24), (), 1))
+    active = tools.get_ui_elements(newer_than=time.time(), active_only=True)["elements"]
+    assert [e["id"] for e in active] == ["0x10", "0x10.1", "0x10.2"]
+
+
+def test_accessible_frames_stay_within_budget(monkeypatch):
+    """Test that enumerating AT-SPI applications counts against the budget."""
+    clock = [0.0]
+    timeouts = []
+
+    class App(list):
+        def __init__(self, pid):
+            super().__init__()
+            self.pid = pid
+
+        def get_process_id(self):
+            clock[0] += 1.0  # A slow application
+            return self.pid
+
+    registry = types.SimpleNamespace(getDesktop=lambda index: [App(pid) for pid in range(10)])
+    fake = types.SimpleNamespace(Registry=registry, setTimeout=lambda *args: timeouts.append(args))
+    monkeypatch.setattr(tree_module, "pyatspi", fake, raising=False)
+    monkeypatch.setattr(tree_module, "time", types.SimpleNamespace(monotonic=lambda: clock[0]))
+
+    frames, truncated = UITree._accessible_frames({2, 7}, deadline=3.5)
+    assert truncated and list(frames) == [2]
+    assert timeouts == [(tree_module.ATSPI_TIMEOUT_MS, tree_module.ATSPI_TIMEOUT_MS)]
+
+
+def test_find_ui_element_returns_click_target():
+    """Test element lookup by name and role."""
+    tools = AutomationTools(display=":99")
+    tools._tree = FakeTree(EventLog(), [
+        UINode("0x10", "window", "Save As", (100, 100, 400, 300)),
+        UINode("0x10.2", "push button", "Save", (400, 360, 80, 28), (), 1),
+    ])
+
+    result = tools.find_ui_element("^save$")
+    assert result["elements"] == [{
+        "id": "0x10.2", "role": "push button", "name": "Save",
+        "bounds": [400, 360, 80, 28], "center": [440, 374], "states": [],
+    }]
+    assert tools.find_ui_element("save", role="window")["elements"][0]["id"] == "0x10"
+    assert "error" in tools.find_ui_element("Cancel")
+    assert "error" in tools.find_ui_element("(")
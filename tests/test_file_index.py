@@ -0,0 +1,97 @@
+"""
+Tests for the background filesystem index.
+"""
+
+import time
+
+import pytest
+
+from agent.file_tools import FileTools
+from agent.fs.index import FileIndex
+
+
+def _eventually(check, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return True
+        time.sleep(0.02)
+    return check()
+
+
+@pytest.fixture
+def tree(tmp_path):
+    (tmp_path / "Documents" / "jobs").mkdir(parents=True)
+    (tmp_path / "Documents" / "jobs" / "My_Resume-2024.pdf").write_bytes(b"%PDF")
+    (tmp_path / "Documents" / "notes.txt").write_text("meeting about the quarterly budget")
+    (tmp_path / ".cache").mkdir()
+    (tmp_path / ".cache" / "resume.tmp").write_text("hidden")
+    return tmp_path
+
+
+@pytest.fixture
+def index(tree):
+    index = FileIndex([str(tree)], index_contents=True).start()
+    assert index.wait_ready(5)
+    yield index
+    index.close()
+
+
+def test_search_by_name_and_path(index, tree):
+    """Test basename, path-word and prefix matching."""
+    names = [r["name"] for r in index.search("resume")]
+    assert names == ["My_Resume-2024.pdf"]  # dot-directories are skipped
+
+    assert index.search("jobs pdf")[0]["path"] == str(tree / "Documents" / "jobs" / "My_Resume-2024.pdf")
+    assert index.search("docu")[0]["type"] == "directory"
+    assert index.search("!!!") == []
+
+
+def test_search_contents_and_fallback(index):
+    """Test content matching and the any-word fallback."""
+    assert [r["name"] for r in index.search("quarterly budget")] == ["notes.txt"]
+    assert [r["name"] for r in index.search("budget nonexistentword")] == ["notes.txt"]
+
+
+def test_index_follows_changes(index, tree):
+    """Test incremental updates for new, moved and deleted files."""
+    if index._watcher is None:
+        pytest.skip("inotify not available")
+
+    (tree / "Documents" / "invoice.odt").write_text("x")
+    assert _eventually(lambda: index.search("invoice"))
+
+    new_dir = tree / "Projects"
+    new_dir.mkdir()
+    (new_dir / "roadmap.md").write_text("x")
+    assert _eventually(lambda: index.search("roadmap"))
+
+    (tree / "Documents" / "jobs").rename(tree / "Archive")
+    assert _eventually(lambda: index.search("resume") and "Archive" in index.search("resume")[0]["path"])
+
+    (tree / "Documents" / "invoice.odt").unlink()
+    assert _eventually(lambda: not index.search("invoice"))
+
+
+def test_rescan_removes_stale_entries(tree):
+    """Test that a full rescan drops deleted paths without inotify."""
+    index = FileIndex([str(tree)], use_inotify=False).start()
+    try:
+        assert index.wait_ready(5)
+        (tree / "Documents" / "notes.txt").unlink()
+        index._full_scan()
+        assert index.search("notes") == []
+        assert index.search("resume")
+    finally:
+        index.close()
+
+
+def test_find_files_tool(tree):
+    """Test the find_files tool on FileTools."""
+    tools = FileTools(allowed_paths=[str(tree)], home_dir=str(tree))
+    try:
+        result = tools.find_files("resume")
+        assert result["indexing"] is False
+        assert result["results"][0]["name"] == "My_Resume-2024.pdf"
+    finally:
+        tools.file_index.close()
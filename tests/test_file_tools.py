@@ -4,11 +4,15 @@ Tests for file management tools.
 
 import os
 import tempfile
+import time
 from pathlib import Path
 
 import pytest
 
 from agent.file_tools import FileTools
+from agent.fs import batch
+from agent.fs.grep import compile_pattern, grep_mapped
+from agent.fs.scanner import DirectoryScanner
 
 
 @pytest.fixture
@@ -150,3 +154,354 @@ def test_safety_check_prevents_outside_access(file_tools):
     assert "error" in result
     assert "not in allowed" in result["error"].lower()
 
+
+
+def test_read_file_byte_range(file_tools, temp_dir):
+    """Test reading a byte range."""
+    test_file = Path(temp_dir) / "range.txt"
+    test_file.write_text("0123456789")
+
+    result = file_tools.read_file(str(test_file), offset=2, length=4)
+
+    assert result["content"] == "2345"
+    assert result["next_offset"] == 6
+    assert result["eof"] is False
+
+
+@pytest.mark.parametrize("mmap_threshold", [0, 1024 * 1024])
+def test_read_file_line_range(temp_dir, mmap_threshold):
+    """Test reading a line range with and without mmap."""
+    tools = FileTools(allowed_paths=[temp_dir], home_dir=temp_dir, mmap_threshold=mmap_threshold)
+    test_file = Path(temp_dir) / "lines.txt"
+    test_file.write_text("".join(f"line {i}\n" for i in range(1, 200_001)))
+
+    result = tools.read_file(str(test_file), start_line=150_000, end_line=150_002)
+
+    assert result["content"] == "line 150000\nline 150001\nline 150002\n"
+    assert result["total_lines"] == 200_000
+
+
+def test_line_index_follows_file_changes(file_tools, temp_dir):
+    """Test that a modified file is re-indexed."""
+    test_file = Path(temp_dir) / "grow.txt"
+    test_file.write_text("a\nb\n")
+    assert file_tools.read_file(str(test_file), start_line=2)["content"] == "b\n"
+
+    test_file.write_text("a\nb\nc\nd\n")
+    os.utime(test_file, ns=(0, 10**9))
+    result = file_tools.read_file(str(test_file), start_line=3, end_line=3)
+    assert result["content"] == "c\n"
+    assert result["total_lines"] == 4
+
+
+def test_grep_file(file_tools, temp_dir):
+    """Test regex search within a file."""
+    test_file = Path(temp_dir) / "app.log"
+    test_file.write_text("ok\nERROR disk full\nok\nerror again\n")
+
+    result = file_tools.grep_file(str(test_file), r"error", ignore_case=True)
+
+    assert [m["line"] for m in result["matches"]] == [2, 4]
+    assert result["matches"][0]["text"] == "ERROR disk full"
+
+
+def test_grep_anchors_match_at_lines(temp_dir):
+    """Test that ^ and $ anchor to lines and no match is reported after EOF."""
+    test_file = Path(temp_dir) / "app.log"
+    test_file.write_text("INFO a\nERROR b\nINFO c\nERROR d\n")
+
+    assert [m["line"] for m in grep_mapped(str(test_file), compile_pattern("^ERROR"))] == [2, 4]
+    assert [m["line"] for m in grep_mapped(str(test_file), compile_pattern("c$"))] == [3]
+    assert [m["line"] for m in grep_mapped(str(test_file), compile_pattern("x*"))] == [1, 2, 3, 4]
+
+
+def test_search_files(file_tools, temp_dir):
+    """Test recursive regex search."""
+    (Path(temp_dir) / "a.txt").write_text("needle here\n")
+    (Path(temp_dir) / "sub").mkdir()
+    (Path(temp_dir) / "sub" / "b.txt").write_text("hay\nneedle there\n")
+    (Path(temp_dir) / "sub" / "c.bin").write_bytes(b"\0needle")
+
+    result = file_tools.search_files(temp_dir, "needle")
+
+    found = {(Path(m["path"]).name, m["line"]) for m in result["matches"]}
+    assert found == {("a.txt", 1), ("b.txt", 2)}
+
+
+def test_search_files_path_not_allowed(file_tools):
+    """Test that searching outside allowed paths fails."""
+    result = file_tools.search_files("/etc", "root")
+
+    assert "not in allowed" in result["error"].lower()
+
+
+def test_list_directory_depth_pattern_and_paging(file_tools, temp_dir):
+    """Test recursive listing with a glob filter and pagination."""
+    root = Path(temp_dir)
+    (root / "a.py").write_text("a")
+    (root / "pkg" / "sub").mkdir(parents=True)
+    (root / "pkg" / "b.py").write_text("b")
+    (root / "pkg" / "sub" / "c.py").write_text("c")
+    (root / "pkg" / "notes.txt").write_text("n")
+
+    shallow = file_tools.list_directory(temp_dir, depth=1, pattern="*.py")
+    assert [e["name"] for e in shallow["entries"]] == ["a.py", "b.py"]
+
+    deep = file_tools.list_directory(temp_dir, depth=2, pattern="*.py")
+    assert [(e["name"], e["depth"]) for e in deep["entries"]] == [("a.py", 0), ("b.py", 1), ("c.py", 2)]
+
+    first = file_tools.list_directory(temp_dir, depth=2, limit=2)
+    assert len(first["entries"]) == 2
+    rest = file_tools.list_directory(temp_dir, depth=2, offset=first["next_offset"], limit=100)
+    assert "next_offset" not in rest
+    names = [e["path"] for e in first["entries"] + rest["entries"]]
+    assert len(names) == len(set(names)) == 6
+
+
+def test_list_directory_cache_sees_changes(file_tools, temp_dir):
+    """Test that cached listings are invalidated by file changes."""
+    assert file_tools.list_directory(temp_dir)["entries"] == []
+
+    file_tools.write_file(str(Path(temp_dir) / "new.txt"), "x")
+    assert [e["name"] for e in file_tools.list_directory(temp_dir)["entries"]] == ["new.txt"]
+
+    # Changes made outside the tools are picked up as well
+    (Path(temp_dir) / "external.txt").write_text("y")
+    for _ in range(50):
+        names = [e["name"] for e in file_tools.list_directory(temp_dir)["entries"]]
+        if "external.txt" in names:
+            break
+        time.sleep(0.02)
+    assert names == ["external.txt", "new.txt"]
+
+
+def test_directory_cache_through_symlinks(temp_dir):
+    """Test that a symlinked directory and its target are both invalidated."""
+    real = Path(temp_dir) / "real"
+    real.mkdir()
+    link = Path(temp_dir) / "link"
+    os.symlink(real, link)
+
+    def names(scanner, path):
+        for _ in range(50):
+            listed = [entry[0] for entry in scanner.list_dir(str(path))]
+            if listed:
+                break
+            time.sleep(0.02)
+        return listed
+
+    scanner = DirectoryScanner()
+    try:
+        assert scanner.list_dir(str(link)) == scanner.list_dir(str(real)) == []
+        (real / "new.txt").write_text("x")
+        assert names(scanner, link) == names(scanner, real) == ["new.txt"]
+    finally:
+        scanner.close()
+
+    # Evicting one path keeps the watch the other still uses
+    scanner = DirectoryScanner(max_cached_dirs=1)
+    try:
+        scanner.list_dir(str(link))
+        assert scanner.list_dir(str(real)) == [("new.txt", str(real / "new.txt"), "file", 1, False)]
+        (real / "other.txt").write_text("y")
+        for _ in range(50):
+            if len(scanner.list_dir(str(real))) == 2:
+                break
+            time.sleep(0.02)
+        assert [entry[0] for entry in scanner.list_dir(str(real))] == ["new.txt", "other.txt"]
+    finally:
+        scanner.close()
+
+
+def test_path_checks_follow_symlinks(file_tools, temp_dir):
+    """Test that symlinks out of the allowed roots are rejected."""
+    with tempfile.TemporaryDirectory() as outside:
+        (Path(outside) / "secret.txt").write_text("secret")
+        (Path(temp_dir) / "inside.txt").write_text("ok")
+        os.symlink(outside, Path(temp_dir) / "out_dir")
+        os.symlink(Path(outside) / "secret.txt", Path(temp_dir) / "out_file")
+        os.symlink(Path(temp_dir) / "inside.txt", Path(temp_dir) / "in_file")
+        (Path(temp_dir) / "sub").mkdir()
+        os.symlink(outside, Path(temp_dir) / "sub" / "link")
+
+        assert "error" in file_tools.read_file(str(Path(temp_dir) / "out_dir" / "secret.txt"))
+        assert "error" in file_tools.read_file(str(Path(temp_dir) / "out_file"))
+        assert file_tools.read_file(str(Path(temp_dir) / "in_file"))["content"] == "ok"
+        # ".." applies to the link target, not lexically
+        escaped = Path(temp_dir) / "sub" / "link" / ".." / Path(outside).name / "secret.txt"
+        assert "error" in file_tools.read_file(str(escaped))
+
+        result = file_tools.search_files(temp_dir, "secret|ok")
+        assert [m["path"] for m in result["matches"]] == [
+            str(Path(temp_dir) / "in_file"),
+            str(Path(temp_dir) / "inside.txt"),
+        ]
+
+
+def test_path_check_cache_sees_swapped_directory(file_tools, temp_dir):
+    """Test that a cached directory replaced by a symlink is re-resolved."""
+    with tempfile.TemporaryDirectory() as outside:
+        (Path(outside) / "data.txt").write_text("outside")
+        work = Path(temp_dir) / "work"
+        work.mkdir()
+        (work / "data.txt").write_text("inside")
+        assert file_tools.read_file(str(work / "data.txt"))["content"] == "inside"
+
+        (work / "data.txt").unlink()
+        work.rmdir()
+        os.symlink(outside, work)
+        assert "error" in file_tools.read_file(str(work / "data.txt"))
+
+
+def test_batch_file_ops(file_tools, temp_dir):
+    """Test a mixed batch, including ops that depend on earlier ones."""
+    root = Path(temp_dir)
+    for i in range(20):
+        (root / f"log{i}.txt").write_text(str(i))
+    (root / "keep.txt").write_text("keep")
+
+    ops = [{"op": "mkdir", "path": "archive/2024"}]
+    ops += [{"op": "move", "src": f"log{i}.txt", "dst": f"archive/2024/log{i}.txt"} for i in range(10)]
+    ops += [{"op": "delete", "path": f"log{i}.txt"} for i in range(10, 20)]
+    ops += [{"op": "copy", "src": "keep.txt", "dst": "archive/keep.txt"}]
+
+    plan = file_tools.batch_file_ops(ops, dry_run=True)
+    assert plan["dry_run"] and all(r["status"] == "planned" for r in plan["results"])
+    assert (root / "log0.txt").exists()
+
+    result = file_tools.batch_file_ops(ops)
+    assert result["success"] is True
+    assert len(result["results"]) == len(ops)
+    assert sorted(p.name for p in root.iterdir()) == ["archive", "keep.txt"]
+    assert len(list((root / "archive" / "2024").iterdir())) == 10
+    assert (root / "archive" / "keep.txt").read_text() == "keep"
+
+
+def test_batch_file_ops_validates_up_front(file_tools, temp_dir):
+    """Test that one invalid operation stops the whole batch."""
+    (Path(temp_dir) / "a.txt").write_text("a")
+    result = file_tools.batch_file_ops([
+        {"op": "delete", "path": "a.txt"},
+        {"op": "delete", "path": "/etc/passwd"},
+        {"op": "move", "src": "missing.txt", "dst": "b.txt"},
+        {"op": "chmod", "path": "a.txt"},
+    ])
+
+    assert "error" in result
+    assert [e["index"] for e in result["errors"]] == [1, 2, 3]
+    assert (Path(temp_dir) / "a.txt").exists()
+
+
+def test_batch_file_ops_rollback(file_tools, temp_dir, monkeypatch):
+    """Test that a failing batch is undone when rollback is requested."""
+    root = Path(temp_dir)
+    (root / "a.txt").write_text("a")
+    (root / "b.txt").write_text("b")
+    (root / "old.txt").write_text("old")
+    (root / "dir").mkdir()
+
+    ops = [
+        {"op": "move", "src": "a.txt", "dst": "dir/a.txt"},
+        {"op": "delete", "path": "b.txt"},
+        {"op": "copy", "src": "dir/a.txt", "dst": "old.txt", "overwrite": True},
+        {"op": "mkdir", "path": "new/deeper"},
+        {"op": "delete", "path": "dir"},
+    ]
+    # Make the last step fail after validation has passed
+    real_aside = batch._aside
+
+    def failing_aside(path, tag):
+        if path.endswith("dir"):
+            raise OSError("device busy")
+        return real_aside(path, tag)
+
+    monkeypatch.setattr(batch, "_aside", failing_aside)
+    result = file_tools.batch_file_ops(ops, rollback=True)
+
+    assert result["success"] is False
+    assert result["rolled_back"] is True
+    assert sorted(p.name for p in root.iterdir()) == ["a.txt", "b.txt", "dir", "old.txt"]
+    assert (root / "old.txt").read_text() == "old"
+    assert list((root / "dir").iterdir()) == []
+
+
+def test_write_file_is_atomic_and_streams(file_tools, temp_dir):
+    """Test streamed overwrites, preserved mode and no temp files left over."""
+    target = Path(temp_dir) / "config.ini"
+    target.write_text("old")
+    os.chmod(target, 0o640)
+
+    result = file_tools.write_file(str(target), (f"key{i}=value\n" for i in range(1000)))
+
+    assert result["success"] is True
+    assert result["bytes_written"] == target.stat().st_size
+    assert target.read_text().count("\n") == 1000
+    assert target.stat().st_mode & 0o777 == 0o640
+    assert os.listdir(temp_dir) == ["config.ini"]
+
+
+def test_write_file_failed_stream_keeps_old_content(file_tools, temp_dir):
+    """Test that an error mid-write leaves the original file intact."""
+    target = Path(temp_dir) / "data.txt"
+    target.write_text("original")
+
+    def chunks():
+        yield "partial"
+        raise RuntimeError("source went away")
+
+    result = file_tools.write_file(str(target), chunks())
+
+    assert "error" in result
+    assert target.read_text() == "original"
+    assert os.listdir(temp_dir) == ["data.txt"]
+
+
+def test_write_file_append(file_tools, temp_dir):
+    """Test append mode."""
+    target = Path(temp_dir) / "log.txt"
+    file_tools.write_file(str(target), "one\n", mode="append")
+    file_tools.write_file(str(target), "two\n", mode="append")
+    assert target.read_text() == "one\ntwo\n"
+
+
+def test_write_file_patch(file_tools, temp_dir):
+    """Test applying a unified diff to a large file."""
+    target = Path(temp_dir) / "big.conf"
+    lines = [f"option_{i} = {i}" for i in range(20000)]
+    target.write_text("\n".join(lines) + "\n")
+    diff = (
+        "--- a/big.conf\n"
+        "+++ b/big.conf\n"
+        "@@ -10,3 +10,3 @@\n"
+        " option_9 = 9\n"
+        "-option_10 = 10\n"
+        "+option_10 = changed\n"
+        " option_11 = 11\n"
+        "@@ -15000,0 +15001,2 @@\n"
+        "+# inserted\n"
+        "+extra = 1\n"
+    )
+
+    result = file_tools.write_file(str(target), diff, mode="patch")
+
+    assert result["success"] is True
+    assert (result["hunks"], result["lines_added"], result["lines_removed"]) == (2, 3, 1)
+    assert result["bytes_copied"] > 0.9 * target.stat().st_size
+    new_lines = target.read_text().split("\n")
+    assert new_lines[9:12] == ["option_9 = 9", "option_10 = changed", "option_11 = 11"]
+    assert new_lines[15000:15002] == ["# inserted", "extra = 1"]
+    assert new_lines[15002] == "option_15000 = 15000"
+    assert len(new_lines) == 20000 + 2 + 1
+
+
+def test_write_file_patch_mismatch(file_tools, temp_dir):
+    """Test that a diff that does not apply leaves the file untouched."""
+    target = Path(temp_dir) / "a.txt"
+    target.write_text("alpha\nbeta\n")
+    diff = "@@ -1,2 +1,2 @@\n alpha\n-gamma\n+delta\n"
+
+    result = file_tools.write_file(str(target), diff, mode="patch")
+
+    assert "does not match" in result["error"]
+    assert target.read_text() == "alpha\nbeta\n"
+    assert os.listdir(temp_dir) == ["a.txt"]
@@ -0,0 +1,100 @@
+"""
+Tests for set-of-marks grounding.
+"""
+
+import json
+
+from PIL import Image, ImageDraw
+
+from agent.agent_core_enhanced import AgentEnhanced, AgentConfig
+from agent.automation_tools import AutomationTools
+from agent.grounding import Mark, annotate, detect_regions, merge, render
+from agent.llm_interface import EchoBackend
+from agent import screen_tools_enhanced
+from agent.screen_tools_enhanced import ScreenToolsEnhanced
+from agent.tools.frames import default_frame_store
+from agent.types import ToolCall
+
+
+def make_frame():
+    image = Image.new("RGB", (1280, 720), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((10, 10, 1270, 710), outline="black")  # Window border
+    draw.line((10, 60, 1270, 60), fill="black")  # Toolbar separator
+    draw.rectangle((400, 360, 480, 388), outline="black", fill=(220, 220, 220))
+    draw.rectangle((100, 100, 132, 132), fill="blue")
+    return image
+
+
+def test_detect_regions_finds_controls_not_borders():
+    """Test that controls are found and window borders do not join them."""
+    regions = detect_regions(make_frame())
+    assert len(regions) == 2
+    icon, button = sorted(regions)
+    assert icon[0] <= 100 and icon[0] + icon[2] >= 132
+    assert button[0] <= 400 and button[0] + button[2] >= 480 and button[3] < 64
+
+
+def test_merge_prefers_accessibility_and_labels_regions():
+    """Test source priority, deduplication and reading order."""
+    accessible = [
+        {"role": "window", "name": "Editor", "bounds": [0, 0, 1280, 720]},
+        {"role": "push button", "name": "Save", "bounds": [400, 360, 81, 29]},
+        {"role": "filler", "name": "", "bounds": [0, 0, 10, 10]},
+    ]
+    phrases = [
+        ("Save", (420, 366, 30, 14)),  # The button's own text
+        ("Search", (610, 608, 50, 14)),
+        ("File", (20, 20, 30, 14)),
+    ]
+    regions = [(392, 352, 96, 40), (600, 600, 300, 32), (96, 96, 40, 40), (0, 200, 400, 400)]
+    marks = merge(accessible, phrases, regions, screen=(0, 0, 1280, 720))
+
+    assert [m.line() for m in marks] == [
+        '[1] text "File" @20,20 30x14',
+        "[2] icon @96,96 40x40",
+        '[3] push button "Save" @400,360 81x29',
+        '[4] control "Search" @600,600 300x32',
+    ]
+    assert marks[2].source == "a11y" and marks[3].source == "detect"
+    assert render([m.to_dict() for m in marks]).splitlines()[3] == marks[3].line()
+
+    thumbnail = annotate(make_frame(), marks, max_width=640)
+    assert thumbnail.size == (640, 360)
+
+
+def test_click_element_clicks_mark_center(monkeypatch):
+    """Test that click_element resolves ids from the last grounding."""
+    marks = [Mark(1, "a11y", "push button", "Save", (400, 360, 80, 28))]
+    monkeypatch.setattr(ScreenToolsEnhanced, "ground_screen",
+                        lambda self, accessible=None, annotate=True: {
+                            "success": True, "elements": [m.to_dict() for m in marks]})
+    clicks = []
+    monkeypatch.setattr(AutomationTools, "click",
+                        lambda self, x, y, button=1: clicks.append((x, y, button)) or {"success": True})
+    agent = AgentEnhanced(EchoBackend(), AgentConfig(isolate_tools=False))
+    try:
+        call = agent._execute_tool
+        assert "ground_screen" in call(ToolCall(id="1", name="click_element", arguments={"id": 1})).error
+        grounded = json.loads(call(ToolCall(id="2", name="ground_screen", arguments={"annotate": False})).output)
+        assert grounded["elements"] == '[1] push button "Save" @400,360 80x28'
+        clicked = json.loads(call(ToolCall(id="3", name="click_element", arguments={"id": 1})).output)
+        assert clicks == [(440, 374, 1)]
+        assert clicked["clicked"]["label"] == "Save"
+    finally:
+        agent.close()
+
+
+def test_ground_screen_stores_annotated_frame(monkeypatch):
+    """Test that the marked-up screenshot goes to the frame store, not a fixed file."""
+    monkeypatch.setattr(screen_tools_enhanced.ImageGrab, "grab", lambda bbox=None: make_frame())
+    agent = AgentEnhanced(EchoBackend(), AgentConfig(isolate_tools=False))
+    try:
+        grounded = json.loads(agent._execute_tool(
+            ToolCall(id="1", name="ground_screen", arguments={"annotate": True})).output)
+        assert "annotated" not in grounded and "image_path" not in grounded
+        image = grounded["image"]
+        assert (image["width"], image["format"]) == (1280, "jpeg")
+        assert default_frame_store.data(image["handle"])[:2] == b"\xff\xd8"
+    finally:
+        agent.close()
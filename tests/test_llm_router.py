@@ -0,0 +1,87 @@
+"""
+Tests for the multi-backend LLM router.
+"""
+
+import threading
+
+import pytest
+
+from agent.llm_interface import LLMBackend
+from agent.llm_router import Route, RouterBackend, classify
+from agent.types import Message
+
+
+class NamedBackend(LLMBackend):
+    """Answers with its name; can block until released or fail."""
+
+    def __init__(self, name, fail=False):
+        self.name = name
+        self.fail = fail
+        self.gate = None
+        self.started = threading.Event()
+
+    def generate(self, messages, max_tokens=256):
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.fail:
+            raise RuntimeError(f"{self.name} is down")
+        return Message(role="assistant", content=self.name)
+
+
+USER = [Message(role="system", content="You are an agent"), Message(role="user", content="Open the browser")]
+# As AgentEnhanced.run builds it: tool results, then the reply that called them
+TOOL = USER + [Message(role="tool", content="{}", name="list_windows"), Message(role="assistant", content="...")]
+
+
+def test_routes_by_task_and_prompt_length():
+    """Test that tool steps go to the fast route unless the prompt is too long."""
+    router = RouterBackend([
+        Route("fast", NamedBackend("fast"), tasks={"tool", "summarize"}, max_prompt_tokens=100),
+        Route("main", NamedBackend("main")),
+    ])
+    assert classify(TOOL) == "tool" and classify(USER) == "chat"
+    assert classify(TOOL + [Message(role="user", content="Now close it")]) == "chat"
+    assert router.generate(TOOL).content == "fast"
+    assert router.generate(USER).content == "main"
+    summary = [Message(role="system", content="Summarize the output"), Message(role="user", content="x")]
+    assert router.generate(summary).content == "fast"
+    long_tool = TOOL + [Message(role="tool", content="x" * 1000, name="read_file"),
+                        Message(role="assistant", content="...")]
+    assert router.generate(long_tool).content == "main"
+
+
+def test_spills_to_general_route_when_fast_route_is_busy():
+    """Test load-aware dispatch: a saturated route's work goes elsewhere."""
+    fast, main = NamedBackend("fast"), NamedBackend("main")
+    router = RouterBackend([Route("fast", fast, tasks={"tool"}), Route("main", main)])
+    router.routes[0].latency = router.routes[1].latency = 1.0
+
+    fast.gate = threading.Event()
+    results = []
+    worker = threading.Thread(target=lambda: results.append(router.generate(TOOL).content))
+    worker.start()
+    assert fast.started.wait(5)
+    # fast would need two rounds (2s) against 1.5s on main with the spill factor
+    assert router.generate(TOOL).content == "main"
+    fast.gate.set()
+    worker.join(5)
+    assert results == ["fast"]
+    assert all(route["inflight"] == 0 and route["waiting"] == 0 for route in router.stats())
+
+
+def test_falls_back_and_cools_down_failed_route():
+    """Test fallback on failure, the cooldown and the error when all fail."""
+    broken, main = NamedBackend("fast", fail=True), NamedBackend("main")
+    router = RouterBackend([Route("fast", broken, tasks={"tool"}), Route("main", main)], cooldown=60)
+    assert router.generate(TOOL).content == "main"
+    assert not router.stats()[0]["healthy"]
+    broken.started.clear()
+    assert router.generate(TOOL).content == "main"
+    assert not broken.started.is_set()  # Skipped while cooling down
+
+    main.fail = True
+    with pytest.raises(RuntimeError):
+        router.generate(TOOL)
+    with pytest.raises(ValueError):
+        RouterBackend([])
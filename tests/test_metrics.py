@@ -0,0 +1,99 @@
+"""
+Tests for the Prometheus-style metrics registry.
+"""
+
+import urllib.request
+
+import pytest
+
+from agent.agent_core_enhanced import AgentEnhanced
+from agent.llm_interface import EchoBackend
+from agent.metrics import (
+    MEMORY_ENTRIES,
+    TOOL_CALLS,
+    TOOL_SECONDS,
+    MetricsRegistry,
+    MetricsServer,
+)
+from agent.types import ToolCall
+
+
+def test_counter_and_gauge_render():
+    """Test text exposition of counters and gauges."""
+    registry = MetricsRegistry()
+    calls = registry.counter("calls_total", "Calls", ["tool"])
+    size = registry.gauge("store_size", "Size")
+
+    calls.inc(tool="read_file")
+    calls.inc(2, tool="read_file")
+    size.set(7)
+
+    text = registry.render()
+    assert "# TYPE calls_total counter" in text
+    assert 'calls_total{tool="read_file"} 3' in text
+    assert "store_size 7" in text
+
+
+def test_histogram_buckets_are_cumulative():
+    """Test histogram bucket, sum and count samples."""
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5.0)
+
+    text = registry.render()
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "latency_seconds_count 3" in text
+
+
+def test_label_mismatch_raises():
+    """Test that label sets are validated."""
+    registry = MetricsRegistry()
+    calls = registry.counter("calls_total", "Calls", ["tool"])
+
+    with pytest.raises(ValueError):
+        calls.inc(status="ok")
+
+
+def test_registry_rejects_kind_change():
+    """Test that a name cannot be reused with another metric type."""
+    registry = MetricsRegistry()
+    registry.counter("things", "Things")
+
+    with pytest.raises(ValueError):
+        registry.gauge("things", "Things")
+
+
+def test_metrics_server_serves_text():
+    """Test the localhost HTTP endpoint."""
+    registry = MetricsRegistry()
+    registry.counter("up_total", "Up").inc()
+    server = MetricsServer(registry, port=0)
+    port = server.start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as resp:
+            body = resp.read().decode()
+            assert resp.headers["Content-Type"].startswith("text/plain")
+    finally:
+        server.stop()
+
+    assert "up_total 1" in body
+
+
+def test_agent_updates_tool_and_memory_metrics():
+    """Test that agent subsystems feed the global registry."""
+    agent = AgentEnhanced(backend=EchoBackend())
+    before_missing = TOOL_CALLS.get(tool="no_such_tool", status="not_found")
+    before_latency = TOOL_SECONDS.count(tool="get_system_info")
+
+    agent._execute_tool(ToolCall(id="1", name="no_such_tool", arguments={}))
+    agent.tools.get_tool("get_system_info")()
+    agent.memory.add("remember this")
+
+    assert TOOL_CALLS.get(tool="no_such_tool", status="not_found") == before_missing + 1
+    assert TOOL_SECONDS.count(tool="get_system_info") == before_latency + 1
+    assert MEMORY_ENTRIES.get(store="short_term") >= 1
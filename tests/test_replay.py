@@ -0,0 +1,115 @@
+"""
+Tests for LLM/tool record and replay.
+"""
+
+import time
+
+import pytest
+
+from agent.llm_interface import EchoBackend
+from agent.replay import (
+    RecordingBackend,
+    ReplayBackend,
+    ReplayMismatch,
+    SessionLog,
+    SessionRecorder,
+    record_tools,
+    replay_tools,
+)
+from agent.tools.registry import Tool, ToolRegistry
+from agent.types import Message
+
+
+@pytest.fixture
+def session_path(tmp_path):
+    return str(tmp_path / "session.jsonl.gz")
+
+
+def _conversation():
+    first = [Message(role="system", content="sys"), Message(role="user", content="hello")]
+    second = first + [
+        Message(role="assistant", content="echo: hello"),
+        Message(role="user", content="again"),
+    ]
+    return first, second
+
+
+def test_record_and_replay_llm(session_path):
+    """Test that completions are served back in order."""
+    first, second = _conversation()
+    with SessionRecorder(session_path) as recorder:
+        backend = RecordingBackend(EchoBackend(), recorder)
+        backend.generate(first)
+        backend.generate(second)
+
+    log = SessionLog(session_path)
+    assert log.llm_records[1]["shared"] == 2  # delta-encoded prompt
+    assert log.llm_records[1]["messages"] == second
+
+    replay = ReplayBackend(log, strict=True)
+    assert replay.generate(first).content == "echo: hello"
+    assert replay.generate(second).content == "echo: again"
+    with pytest.raises(ReplayMismatch):
+        replay.generate(second)
+
+
+def test_strict_replay_detects_prompt_change(session_path):
+    """Test strict mode prompt verification."""
+    first, _ = _conversation()
+    with SessionRecorder(session_path) as recorder:
+        RecordingBackend(EchoBackend(), recorder).generate(first)
+
+    replay = ReplayBackend(SessionLog(session_path), strict=True)
+    with pytest.raises(ReplayMismatch):
+        replay.generate([Message(role="user", content="different")])
+
+
+def test_record_and_replay_tools(session_path):
+    """Test tool results and errors round-trip without running the tool."""
+    calls = []
+
+    def add(a: int, b: int):
+        calls.append((a, b))
+        return {"sum": a + b}
+
+    def broken():
+        raise OSError("no display")
+
+    registry = ToolRegistry()
+    registry.register(Tool("add", add, "Add numbers"))
+    registry.register(Tool("broken", broken, "Always fails"))
+
+    with SessionRecorder(session_path) as recorder:
+        record_tools(registry, recorder)
+        assert registry.get_tool("add")(a=1, b=2) == {"sum": 3}
+        with pytest.raises(OSError):
+            registry.get_tool("broken")()
+
+    fresh = ToolRegistry()
+    fresh.register(Tool("add", add, "Add numbers"))
+    fresh.register(Tool("broken", broken, "Always fails"))
+    replay_tools(fresh, SessionLog(session_path))
+
+    assert fresh.get_tool("add")(a=1, b=2) == {"sum": 3}
+    with pytest.raises(RuntimeError, match="no display"):
+        fresh.get_tool("broken")()
+    assert calls == [(1, 2)]  # only the recorded run executed the tool
+
+
+def test_replay_original_latency(session_path):
+    """Test that original latency mode sleeps for the recorded duration."""
+    class SlowBackend(EchoBackend):
+        def generate(self, messages, max_tokens=256):
+            time.sleep(0.05)
+            return super().generate(messages, max_tokens)
+
+    first, _ = _conversation()
+    with SessionRecorder(session_path) as recorder:
+        RecordingBackend(SlowBackend(), recorder).generate(first)
+
+    log = SessionLog(session_path)
+    assert log.summary()["llm_seconds"] >= 0.05
+
+    start = time.perf_counter()
+    ReplayBackend(log, latency="original").generate(first)
+    assert time.perf_counter() - start >= 0.05
@@ -0,0 +1,356 @@
+"""
+Tests for screenshot encoding, the frame store, frame diffs, display info
+and screen recording.
+"""
+
+import base64
+import io
+import json
+import os
+import random
+import threading
+import time
+import types
+
+import pytest
+from PIL import Image, ImageDraw
+
+from agent import recorder as recorder_module, screen_tools_enhanced
+from agent.agent_core_enhanced import AgentEnhanced, AgentConfig
+from agent.config import settings
+from agent.imaging import encode_image
+from agent.llm_interface import EchoBackend
+from agent.recorder import ScreenRecorder, worker_grab
+from agent.screen_tools_enhanced import ScreenToolsEnhanced
+from agent.tools import frames as frames_module
+from agent.tools.frames import FrameStore, default_frame_store
+from agent.types import ToolCall
+from agent.x11 import connection as connection_module, display as display_module
+from agent.x11.display import DisplayInfo, Monitor
+
+
+def make_desktop(width=1920, height=1080):
+    rng = random.Random(0)
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    for _ in range(400):
+        x, y = rng.randrange(width), rng.randrange(height)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.rectangle((x, y, x + rng.randrange(200), y + rng.randrange(60)), fill=color)
+        draw.text((x + 4, y + 4), "Lorem ipsum dolor", fill="black")
+    return image
+
+
+def test_encode_image_meets_size_targets():
+    """Test downscaling to the model size and the quality ladder."""
+    image = make_desktop()
+    full = encode_image(image, format="jpeg", max_size=(1280, 1280))
+    assert (full.width, full.height) == (1280, 720)
+    assert full.quality == 85
+    assert full.scale == pytest.approx(1280 / 1920)
+
+    small = encode_image(image, format="jpeg", max_size=(1280, 1280), max_bytes=len(full.data) // 3)
+    assert len(small.data) <= len(full.data) // 3
+    assert small.quality < 85 or small.width < 1280
+
+    gray = encode_image(image, format="webp", max_size=(640, 640), grayscale=True)
+    decoded = Image.open(io.BytesIO(gray.data))
+    assert decoded.format == "WEBP" and decoded.size == (640, 360)
+    assert encode_image(image, format="png", max_size=(320, 320)).quality is None
+
+    with pytest.raises(ValueError):
+        encode_image(image, format="bmp")
+
+
+def test_frame_store_spills_and_pins(tmp_path):
+    """Test LRU eviction to the spill directory, pinning and dropping."""
+    store = FrameStore(max_bytes=12, spill_dir=str(tmp_path), max_spill_bytes=10)
+    pinned = store.put(b"1" * 6, "jpeg", 4, 3, pin=True)
+    first = store.put(b"2" * 6, "jpeg", 4, 3)
+    second = store.put(b"3" * 6, "webp", 4, 3)
+
+    # The pinned frame is older but stays; the least recently used other one spills
+    assert store.memory_bytes == 12
+    assert store.get(pinned).data is not None
+    assert store.get(first).data is None
+    assert store.data(first) == b"2" * 6
+    assert sorted(p.name for p in tmp_path.iterdir()) == [f"{first}.jpeg"]
+
+    # Reading first made second the least recently used: it is spilled, and
+    # dropped because the spill budget is used up
+    third = store.put(b"4" * 6, "webp", 4, 3)
+    assert store.get(second) is None
+    assert store.data(first) == b"2" * 6
+    assert store.spilled_bytes == 6
+
+    with store.use(first) as (frame, data):
+        assert frame.refs == 1 and data == b"2" * 6
+    assert store.get(first).refs == 0
+    store.release(pinned)
+    assert store.get(pinned).refs == 0
+
+    assert base64.b64decode(store.read(third)["data"]) == b"4" * 6
+    assert "error" in store.read("../../etc/passwd")
+    store.clear()
+    assert len(store) == 0 and not list(tmp_path.iterdir())
+
+
+@pytest.mark.parametrize("prepare", ["loose", "symlink"])
+def test_frame_store_refuses_planted_spill_dir(tmp_path, monkeypatch, prepare):
+    """Test that a predictable spill path set up in advance is not written to."""
+    planted = tmp_path / "agent-frames"
+    if prepare == "loose":
+        planted.mkdir(mode=0o777)
+        planted.chmod(0o777)
+    else:
+        (tmp_path / "elsewhere").mkdir()
+        planted.symlink_to(tmp_path / "elsewhere")
+    monkeypatch.setattr(frames_module, "default_frame_dir", lambda: str(planted))
+
+    store = FrameStore(max_bytes=4)
+    first = store.put(b"1" * 6, "jpeg", 4, 3)
+    store.put(b"2" * 6, "jpeg", 4, 3)
+    try:
+        spilled = store.get(first).path
+        assert spilled is not None and not spilled.startswith(str(tmp_path))
+        assert os.stat(os.path.dirname(spilled)).st_mode & 0o777 == 0o700
+        assert not list(planted.iterdir())
+    finally:
+        store.clear()
+        os.rmdir(store.spill_dir)
+
+
+def test_capture_diff_and_ocr_by_handle(tmp_path, monkeypatch):
+    """Test that frames are stored once and reused by handle."""
+    screen = make_desktop()
+    monkeypatch.setattr(screen_tools_enhanced.ImageGrab, "grab",
+                        lambda bbox=None: screen.crop(bbox) if bbox else screen.copy())
+    tools = ScreenToolsEnhanced(frames=FrameStore(spill_dir=str(tmp_path)))
+
+    result = tools.capture_screen(format="jpeg")
+    assert "data" not in result
+    assert result["size_bytes"] <= settings.screenshot_max_kb * 1024
+    assert result["width"] == settings.vision_max_width
+    assert tools.last_frame == result["handle"]
+    with open(tools.frames.path(result["handle"]), "rb") as f:
+        assert len(f.read()) == result["size_bytes"]
+
+    small = tools.capture_screen(format="jpeg", grayscale=True, max_width=160, max_height=160)
+    assert base64.b64decode(small["data"]) == tools.frames.data(small["handle"])
+    assert "error" in tools.capture_screen(format="tiff")
+
+    # A change on screen shows up in screen coordinates
+    ImageDraw.Draw(screen).rectangle((900, 500, 1000, 540), fill="black")
+    after = tools.capture_screen(format="jpeg")
+    diff = tools.diff_frames(result["handle"], after["handle"])
+    assert diff["changed"]
+    (x, y, width, height), = diff["regions"]
+    # Within one diff cell (16 frame pixels, 24 screen pixels)
+    assert abs(x - 900) <= 24 and abs(y - 500) <= 24
+    assert abs(x + width - 1000) <= 24 and abs(y + height - 540) <= 24
+    assert not tools.diff_frames(after["handle"], after["handle"])["changed"]
+    assert "error" in tools.diff_frames("0" * 12, after["handle"])
+
+    if not screen_tools_enhanced.HAS_OCR:
+        assert "error" in tools.extract_text_from_screen(frame=after["handle"])
+
+
+def test_agent_diff_frames_recaptures_same_area(monkeypatch):
+    """Test that diff_frames without after compares against a fresh capture."""
+    screen = make_desktop()
+    monkeypatch.setattr(screen_tools_enhanced.ImageGrab, "grab",
+                        lambda bbox=None: screen.crop(bbox) if bbox else screen.copy())
+    agent = AgentEnhanced(EchoBackend(), AgentConfig(isolate_tools=False))
+    try:
+        call = agent._execute_tool
+        before = json.loads(call(ToolCall(id="1", name="capture_screen", arguments={})).output)
+        assert not json.loads(call(ToolCall(id="2", name="diff_frames",
+                                            arguments={"before": before["handle"]})).output)["changed"]
+        ImageDraw.Draw(screen).rectangle((100, 100, 300, 200), fill="black")
+        diff = json.loads(call(ToolCall(id="3", name="diff_frames", arguments={"before": before["handle"]})).output)
+        assert diff["changed"] and diff["after"] != before["handle"]
+        assert call(ToolCall(id="4", name="diff_frames", arguments={"before": "0" * 12})).error
+
+        # Frames too large to inline are fetched by handle
+        assert "data" not in before
+        frame = json.loads(call(ToolCall(id="5", name="read_frame", arguments={"handle": before["handle"]})).output)
+        with open(frame["path"], "rb") as f:
+            assert f.read() == default_frame_store.data(before["handle"])
+        assert frame["size_bytes"] == before["size_bytes"]
+        assert call(ToolCall(id="6", name="read_frame", arguments={"handle": "../x"})).error
+    finally:
+        agent.close()
+
+
+def test_display_info_and_monitor_capture(monkeypatch):
+    """Test resolution from the display info cache and per-monitor capture."""
+    screen = make_desktop(3840, 1080)
+    monkeypatch.setattr(screen_tools_enhanced.ImageGrab, "grab",
+                        lambda bbox=None: screen.crop(bbox) if bbox else screen.copy())
+    info = DisplayInfo(3840, 1080, 1016, 286, (
+        Monitor("eDP-1", 0, 0, 1920, 1080, 344, 194),
+        Monitor("HDMI-1", 1920, 0, 1920, 1080, 527, 296, primary=True),
+    ))
+    monkeypatch.setattr(screen_tools_enhanced, "get_display_info", lambda display=None: info)
+    tools = ScreenToolsEnhanced(frames=FrameStore())
+
+    resolution = tools.get_screen_resolution()
+    assert (resolution["width"], resolution["height"]) == (3840, 1080)
+    assert resolution["dpi"] == 92.5  # The primary monitor's
+    assert [m["bounds"] for m in resolution["monitors"]] == [[0, 0, 1920, 1080], [1920, 0, 1920, 1080]]
+    assert info.monitor("primary").name == "HDMI-1" and info.monitor("0").name == "eDP-1"
+
+    frame = tools.capture_screen(format="jpeg", monitor="primary")
+    assert frame["origin"] == [1920, 0] and frame["width"] == settings.vision_max_width
+    assert "error" in tools.capture_screen(monitor="DP-3")
+
+    agent = AgentEnhanced(EchoBackend(), AgentConfig(isolate_tools=False))
+    try:
+        call = agent._execute_tool
+        assert json.loads(call(ToolCall(id="1", name="get_display_info", arguments={})).output)["monitors"]
+        captured = json.loads(call(ToolCall(id="2", name="capture_screen", arguments={"monitor": "eDP-1"})).output)
+        assert captured["origin"] == [0, 0] and captured["width"] == settings.vision_max_width
+        assert call(ToolCall(id="3", name="capture_screen", arguments={"monitor": "DP-3"})).error
+    finally:
+        agent.close()
+
+
+class FakeRandrDisplay:
+    """Just enough of an X display for DisplayInfoService, with two CRTC outputs."""
+
+    opened = 0
+
+    def __init__(self, name=None, minor=4, monitors_fail=False):
+        type(self).opened += 1
+        self.minor = minor
+        self.monitors_fail = monitors_fail
+        self._r, self._w = os.pipe()
+        root = types.SimpleNamespace(
+            id=1,
+            get_geometry=lambda: types.SimpleNamespace(width=3840, height=1080),
+            xrandr_select_input=lambda mask: None,
+            change_attributes=lambda **kwargs: None,
+            xrandr_get_monitors=self._get_monitors,
+            xrandr_get_screen_resources_current=lambda: types.SimpleNamespace(outputs=[10, 11], config_timestamp=0),
+            xrandr_get_output_primary=lambda: types.SimpleNamespace(output=11),
+        )
+        self._screen = types.SimpleNamespace(root=root, width_in_mms=1016, height_in_mms=286)
+
+    def _get_monitors(self, is_active=True):
+        if self.monitors_fail or self.minor < 5:
+            raise connection_module.xerror.XError(self, b"\0" * 32)
+        raise AssertionError("fake only has CRTCs")
+
+    def screen(self):
+        return self._screen
+
+    def set_error_handler(self, handler):
+        pass
+
+    def flush(self):
+        pass
+
+    def has_extension(self, name):
+        return name == "RANDR"
+
+    def xrandr_query_version(self):
+        time.sleep(0.05)  # Lets concurrent starters pile up
+        return types.SimpleNamespace(major_version=1, minor_version=self.minor)
+
+    def xrandr_get_output_info(self, output, timestamp):
+        return types.SimpleNamespace(connection=0, crtc=output + 100, name=f"OUT-{output}".encode(),
+                                     mm_width=527, mm_height=296)
+
+    def xrandr_get_crtc_info(self, crtc, timestamp):
+        return types.SimpleNamespace(mode=1, x=(crtc - 110) * 1920, y=0, width=1920, height=1080)
+
+    def fileno(self):
+        return self._r
+
+    def pending_events(self):
+        return 0
+
+    def close(self):
+        os.close(self._r)
+        os.close(self._w)
+
+
+@pytest.mark.parametrize("minor, monitors_fail", [(4, False), (5, True)])
+def test_display_service_falls_back_to_crtcs(monkeypatch, minor, monitors_fail):
+    """Test CRTC monitors on old RandR servers and a single connection for concurrent callers."""
+    pytest.importorskip("Xlib")
+    FakeRandrDisplay.opened = 0
+    monkeypatch.setattr(connection_module.xdisplay, "Display",
+                        lambda name=None: FakeRandrDisplay(name, minor, monitors_fail))
+    service = display_module.DisplayInfoService(":99")
+    try:
+        threads = [threading.Thread(target=service.info) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert FakeRandrDisplay.opened == 1
+        assert len(connection_module.get_connection(":99")._listeners) == 1
+        info = service.info()
+        assert [m.name for m in info.monitors] == ["OUT-10", "OUT-11"]
+        assert info.primary.name == "OUT-11" and info.monitors[1].x == 1920
+    finally:
+        service.stop()
+        connection_module.get_connection(":99").close()
+
+
+def test_recorder_dedupes_and_reports_changes(tmp_path, monkeypatch):
+    """Test the recording ring buffer: dedupe, byte bound, changes and clips."""
+    screen = make_desktop()
+    monkeypatch.setattr(recorder_module.ImageGrab, "grab", lambda: screen.copy())
+    # Grabs go through the worker method, as the agent wires them
+    tools = ScreenToolsEnhanced()
+    recorder = ScreenRecorder(max_size=(480, 480), max_bytes=10**6, grab=worker_grab(tools.grab_scaled))
+
+    assert recorder.record_now()
+    assert not recorder.record_now()  # Unchanged: only extends the last frame
+    ImageDraw.Draw(screen).rectangle((960, 540, 1200, 700), fill="black")
+    assert recorder.record_now()
+    assert recorder.stats()["frames"] == 2 and recorder.stats()["grabs"] == 3
+    assert recorder.interval >= 1.0
+
+    changes = recorder.changes(seconds=60)
+    assert changes["changed"] and len(changes["changes"]) == 1
+    (x, y, width, height), = changes["regions"]
+    # Within one diff cell (16 frame pixels, 64 screen pixels)
+    assert abs(x - 960) <= 64 and abs(y - 540) <= 64
+    assert abs(x + width - 1200) <= 64 and abs(y + height - 700) <= 64
+
+    clip = recorder.export(path=str(tmp_path / "clip.webp"))
+    assert clip["frames"] == 2
+    with Image.open(clip["path"]) as image:
+        assert image.n_frames == 2 and image.size == (480, 270)
+    assert "error" in recorder.export(format="mp4")
+    # Default paths are unique per export
+    first, second = recorder.export(), recorder.export()
+    try:
+        assert first["path"] != second["path"] and first["size_bytes"] > 0
+    finally:
+        os.unlink(first["path"])
+        os.unlink(second["path"])
+
+    # Oldest frames go once the buffer is over its byte budget
+    recorder.max_bytes = 1
+    ImageDraw.Draw(screen).rectangle((0, 0, 300, 300), fill="red")
+    recorder.record_now()
+    assert recorder.stats()["frames"] == 1
+    assert not recorder.changes(seconds=60)["regions"]
+
+
+def test_recorder_cost_excludes_waiting():
+    """Test that time spent waiting for a grab worker does not stretch the interval."""
+    frame = Image.new("RGB", (64, 36), "white")
+
+    def slow_worker(max_size):
+        time.sleep(0.3)  # Queued behind other work, not CPU
+        return frame, 1.0, 0.002
+
+    recorder = ScreenRecorder(fps=1.0, cpu_percent=5.0, grab=slow_worker)
+    recorder.record_now()
+    assert recorder.stats()["cpu_ms_per_grab"] < 100
+    assert recorder.interval == 1.0
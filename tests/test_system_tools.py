@@ -2,8 +2,18 @@
 Tests for system tools.
 """
 
+import os
+import subprocess
+import threading
+import time
+
+import psutil
 import pytest
+from agent.shell.limits import CgroupJob, ResourceLimits
+from agent.shell.session import ShellSession
 from agent.system_tools import SystemTools
+from agent.sysmon.procs import ProcessSnapshotter
+from agent.sysmon.sampler import SystemSampler
 
 
 def test_system_tools_get_system_info():
@@ -59,3 +69,261 @@ def test_system_tools_dangerous_command_blocked():
     # Should be blocked
     assert "error" in result or "Dangerous" in str(result)
 
+
+
+@pytest.fixture
+def sampler():
+    sampler = SystemSampler(interval=0.05).start()
+    assert sampler.latest(wait=5) is not None
+    yield sampler
+    sampler.stop()
+
+
+def test_system_info_reads_snapshots(sampler):
+    """Test that get_system_info no longer blocks for a CPU measurement."""
+    tools = SystemTools(sampler=sampler)
+    tools.get_system_info()
+
+    start = time.perf_counter()
+    result = tools.get_system_info()
+    assert time.perf_counter() - start < 0.2
+
+    assert result["success"] is True
+    assert 0.0 <= result["cpu"]["percent"] <= 100.0
+    assert result["sample_age"] < 1.0
+
+
+def test_sampler_history_averages_and_rates(sampler):
+    """Test the ring buffer, rolling averages and counter rates."""
+    time.sleep(0.3)
+    history = sampler.history()
+    assert len(history) >= 3
+    assert history == sorted(history, key=lambda s: s.monotonic)
+
+    averages = sampler.averages(60)
+    assert averages["samples"] == len(history)
+    assert 0.0 <= averages["cpu_percent"] <= averages["cpu_percent_max"] <= 100.0
+
+    rates = sampler.rates(60)
+    assert rates["window_seconds"] > 0
+    assert all(v >= 0 for v in rates.values())
+
+    small = SystemSampler(history=2, processes=False)
+    for _ in range(5):
+        small.sample_now()
+    assert len(small.history()) == 2
+
+
+def test_list_processes_uses_primed_cpu(sampler):
+    """Test that process CPU usage is measured between samples."""
+    tools = SystemTools(sampler=sampler)
+    result = tools.list_processes(limit=5)
+
+    assert result["success"] is True
+    assert len(result["processes"]) == 5
+    assert result["total"] >= 5
+    assert any(p.pid == os.getpid() for p in sampler.process_table())
+
+
+def test_list_processes_keeps_sampler_baseline():
+    """Test that a one-off process table leaves the sampler's CPU baseline alone."""
+    sampler = SystemSampler(interval=0.05, processes=False)
+    tools = SystemTools(sampler=sampler)
+    try:
+        baseline = dict(sampler.snapshotter._prev), sampler.snapshotter._prev_time
+        result = tools.list_processes(limit=5)
+        assert result["success"] is True and len(result["processes"]) == 5
+        assert (dict(sampler.snapshotter._prev), sampler.snapshotter._prev_time) == baseline
+    finally:
+        sampler.stop()
+
+
+def _spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/stat"), reason="needs /proc")
+def test_process_snapshot_cpu_is_delta_based():
+    """Test that CPU usage reflects the interval between snapshots."""
+    snapshotter = ProcessSnapshotter()
+    snapshotter.snapshot()
+    _spin(0.3)
+    busy = next(r for r in snapshotter.snapshot() if r.pid == os.getpid())
+    time.sleep(0.3)
+    idle = next(r for r in snapshotter.snapshot() if r.pid == os.getpid())
+
+    assert busy.cpu_percent > 50
+    assert idle.cpu_percent < busy.cpu_percent
+    assert busy.rss > 0 and busy.num_threads >= 1
+
+
+@pytest.mark.parametrize("use_proc", [True, False])
+def test_process_top_k_and_filters(use_proc):
+    """Test top-k selection and name/user filters on both backends."""
+    if use_proc and not os.path.exists("/proc/self/stat"):
+        pytest.skip("needs /proc")
+    snapshotter = ProcessSnapshotter(use_proc=use_proc)
+    records = snapshotter.snapshot()
+
+    top = snapshotter.top(records, limit=3, sort_by="memory")
+    expected = sorted(records, key=lambda r: r.rss, reverse=True)[:3]
+    assert [p["rss"] for p in top] == [r.rss for r in expected]
+
+    me = snapshotter.top(records, limit=1000, name="pyth*", user=snapshotter.username(os.getpid()))
+    assert os.getpid() in [p["pid"] for p in me]
+    assert all(p["name"].lower().startswith("pyth") for p in me)
+    assert all(p["cmdline"] for p in me if p["pid"] == os.getpid())
+
+    with pytest.raises(ValueError):
+        snapshotter.top(records, sort_by="bogus")
+
+
+@pytest.fixture
+def shell_tools(tmp_path):
+    tools = SystemTools()
+    yield tools
+    tools.shell_sessions.close_all()
+
+
+def test_shell_session_keeps_state(shell_tools, tmp_path):
+    """Test that cwd, variables and exit codes carry across calls."""
+    assert shell_tools.run_command(f"cd {tmp_path} && export GREETING=hi", session="work")["success"]
+
+    result = shell_tools.run_command("pwd; echo $GREETING; echo oops >&2; exit_code() { return 3; }; exit_code",
+                                     session="work")
+    assert result["stdout"] == f"{tmp_path}\nhi\n"
+    assert result["stderr"] == "oops\n"
+    assert result["returncode"] == 3
+    assert result["cwd"] == str(tmp_path)
+
+    # Other sessions and one-off commands are unaffected
+    assert shell_tools.run_command("echo ${GREETING:-unset}", session="other")["stdout"] == "unset\n"
+    assert shell_tools.close_shell_session("other")["success"]
+    assert "error" in shell_tools.close_shell_session("other")
+
+
+def test_shell_session_timeout_and_cancel(shell_tools):
+    """Test that timed out or cancelled commands leave the session usable."""
+    shell_tools.run_command("X=kept", session="s")
+
+    result = shell_tools.run_command("sleep 30", timeout=1, session="s")
+    assert "timed out" in result["error"]
+
+    timer = threading.Timer(0.3, shell_tools.cancel_command, args=("s",))
+    timer.start()
+    start = time.monotonic()
+    result = shell_tools.run_command("while true; do :; done", timeout=30, session="s")
+    assert "cancelled" in result["error"]
+    assert time.monotonic() - start < 5
+
+    assert shell_tools.run_command("echo $X", session="s")["stdout"] == "kept\n"
+
+
+def test_shell_session_streams_and_survives_exit(tmp_path):
+    """Test streaming output and automatic restart after the shell exits."""
+    session = ShellSession("stream", cwd=str(tmp_path))
+    try:
+        chunks = []
+        result = session.run("for i in 1 2 3; do echo line$i; done", on_output=chunks.append)
+        assert b"".join(chunks) == b"line1\nline2\nline3\n"
+        assert result["stdout"] == "line1\nline2\nline3\n"
+
+        assert "error" in session.run("exit")
+        assert session.run("echo back")["stdout"] == "back\n"
+    finally:
+        session.close()
+
+
+def test_shell_session_pagers_and_stale_stderr(tmp_path):
+    """Test that pagers do not block and stderr never carries over."""
+    session = ShellSession("pager", cwd=str(tmp_path))
+    try:
+        session.run("git init -q && git -c user.name=a -c user.email=a@b commit -q --allow-empty -m first")
+        result = session.run("git log --oneline -3", timeout=10)
+        assert result["success"] and result["stdout"].strip().endswith("first")
+
+        assert session.run("echo err >&2")["stderr"] == "err\n"
+        result = session.run("if then fi", timeout=10)
+        assert not result["success"] and result["stderr"] == ""
+    finally:
+        session.close()
+
+
+def test_run_command_applies_limits(monkeypatch):
+    """Test niceness, memory cap, scrubbed environment and usage reporting."""
+    monkeypatch.setenv("AGENT_TEST_TOKEN", "hunter2")
+    tools = SystemTools(resource_limits=ResourceLimits(memory_bytes=64 * 1024 * 1024, nice=15))
+
+    result = tools.run_command("nice; echo ${AGENT_TEST_TOKEN:-unset}", timeout=10)
+    assert result["stdout"] == "15\nunset\n"
+    assert result["resources"]["backend"] == "rlimit"
+    assert result["resources"]["max_memory_bytes"] > 0
+
+    result = tools.run_command("python -c 'bytearray(256 * 1024 * 1024)'", timeout=10)
+    assert result["returncode"] != 0
+    assert "MemoryError" in result["stderr"]
+
+    result = tools.run_command("python -c 'bytearray(32 * 1024 * 1024)'", timeout=10)
+    assert result["success"]
+    assert result["resources"]["max_memory_bytes"] >= 32 * 1024 * 1024
+
+
+@pytest.mark.skipif(os.getuid() != 0, reason="needs root to switch to an unprivileged user")
+def test_process_limit_counts_threads():
+    """Test that RLIMIT_NPROC leaves room for the user's threads, not only processes."""
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            os.setgid(65534)
+            os.setuid(65534)
+            stop = threading.Event()
+            threads = [threading.Thread(target=stop.wait) for _ in range(40)]
+            for thread in threads:
+                thread.start()
+            limits = ResourceLimits(max_processes=10)
+            result = subprocess.run(["sh", "-c", "(true); echo ok"], capture_output=True,
+                                    preexec_fn=limits.preexec(), timeout=10)
+            stop.set()
+            status = 0 if result.stdout == b"ok\n" else 2
+        finally:
+            os._exit(status)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+
+def test_io_class_is_set_from_the_parent(tmp_path):
+    """Test that the I/O class reaches a session's shell and what it runs."""
+    session = ShellSession("ionice", cwd=str(tmp_path), limits=ResourceLimits(io_class="idle"))
+    try:
+        result = session.run("python -c 'import psutil; print(int(psutil.Process().ionice().ioclass))'", timeout=10)
+        assert result["stdout"] == f"{int(psutil.IOPRIO_CLASS_IDLE)}\n"
+    finally:
+        session.close()
+
+
+def test_cgroup_job_configures_group(tmp_path):
+    """Test the cgroup files written for a job and the usage read back."""
+    (tmp_path / "cgroup.controllers").write_text("cpu memory pids\n")
+    (tmp_path / "cgroup.subtree_control").write_text("memory\n")
+    limits = ResourceLimits(cpu_quota=1.5, memory_bytes=1 << 30, max_processes=64, cgroup_root=str(tmp_path))
+    assert limits.use_cgroup
+
+    job = CgroupJob(str(tmp_path), limits, name="job")
+    group = tmp_path / "job"
+    assert (tmp_path / "cgroup.subtree_control").read_text() == "+cpu +pids"
+    assert (group / "cpu.max").read_text() == "150000 100000"
+    assert (group / "memory.max").read_text() == str(1 << 30)
+    assert (group / "pids.max").read_text() == "64"
+
+    (group / "cpu.stat").write_text("usage_usec 2500000\nuser_usec 2000000\nsystem_usec 500000\n")
+    (group / "memory.peak").write_text("1048576\n")
+    (group / "pids.peak").write_text("7\n")
+    (group / "memory.events").write_text("oom 1\noom_kill 1\n")
+    usage = job.usage()
+    assert usage["cpu_seconds"] == 2.5
+    assert usage["max_memory_bytes"] == 1048576
+    assert usage["max_processes"] == 7
+    assert usage["oom_killed"] == 1
@@ -0,0 +1,106 @@
+"""
+Tests for bounded tool output.
+"""
+
+import pytest
+
+from agent.agent_core_enhanced import AgentEnhanced, AgentConfig
+from agent.file_tools import FileTools
+from agent.llm_interface import EchoBackend
+from agent.system_tools import SystemTools
+from agent.tools.output import BoundedCapture, OutputLimits, OutputStore, fit_to_budget
+from agent.tools.registry import Tool
+from agent.types import ToolCall
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = OutputStore(spill_dir=str(tmp_path / "spill"))
+    (tmp_path / "spill").mkdir()
+    yield store
+    store.clear()
+
+
+def test_bounded_capture_keeps_head_tail_and_spills(store):
+    """Test head/tail windows and spilling of a large stream."""
+    capture = BoundedCapture(OutputLimits(max_bytes=100), store)
+    for i in range(100):
+        capture.write(f"line {i:03d}\n".encode())
+    capture.close()
+
+    text = capture.text()
+    assert capture.truncated
+    assert text.startswith("line 000")
+    assert text.rstrip().endswith("line 099")
+    assert "bytes omitted" in text
+
+    page = store.read(capture.handle, offset=0, length=10_000)
+    assert page["total_bytes"] == capture.total
+    assert page["content"].count("\n") == 100
+    assert page["eof"]
+
+
+def test_run_command_output_is_bounded(store):
+    """Test that a huge command output is truncated and pageable."""
+    tools = SystemTools(output_limits=OutputLimits(max_bytes=1024), output_store=store)
+    result = tools.run_command("seq 1 100000", timeout=10)
+
+    assert result["success"] is True
+    assert len(result["stdout"]) < 2048
+    assert result["stdout_bytes"] > 500_000
+    page = store.read(result["stdout_handle"], offset=0, length=6)
+    assert page["content"] == "1\n2\n3\n"
+
+
+def test_run_command_timeout_kills_process(store):
+    """Test that timeouts still return and include partial output."""
+    tools = SystemTools(output_store=store)
+    result = tools.run_command("echo started; sleep 30", timeout=1)
+
+    assert "timed out" in result["error"]
+    assert "started" in result["stdout"]
+
+
+def test_read_file_large_file_is_truncated(tmp_path, store):
+    """Test that read_file returns head/tail windows for large files."""
+    big = tmp_path / "big.log"
+    big.write_text("".join(f"entry {i}\n" for i in range(10_000)))
+    tools = FileTools(
+        allowed_paths=[str(tmp_path)],
+        home_dir=str(tmp_path),
+        output_limits=OutputLimits(max_bytes=256),
+        output_store=store,
+    )
+
+    result = tools.read_file(str(big))
+
+    assert result["truncated"] is True
+    assert result["size"] == big.stat().st_size
+    assert result["content"].startswith("entry 0\n")
+    assert store.read(result["handle"], offset=0, length=8)["content"] == "entry 0\n"
+
+
+def test_fit_to_budget():
+    """Test token budget trimming."""
+    text = "x" * 10_000
+    trimmed, truncated = fit_to_budget(text, 100)
+    assert truncated
+    assert len(trimmed) <= 400
+
+    same, truncated = fit_to_budget("short", 100)
+    assert same == "short"
+    assert not truncated
+
+
+def test_agent_bounds_tool_messages():
+    """Test that the agent keeps tool messages within its token budget."""
+    agent = AgentEnhanced(backend=EchoBackend(), config=AgentConfig(max_tool_output_tokens=50))
+    agent.tools.register(Tool("flood", lambda: "y" * 50_000, "Large output"))
+
+    result = agent._execute_tool(ToolCall(id="1", name="flood", arguments={}))
+
+    assert len(result.output) <= 50 * 4
+    assert "read_tool_output" in result.output
+    handle = result.output.split("handle='")[1].split("'")[0]
+    page = agent.tools.get_tool("read_tool_output")(handle=handle, offset=0, length=10)
+    assert page["content"] == "y" * 10
@@ -0,0 +1,77 @@
+"""
+Tests for isolated tool execution in worker processes.
+"""
+
+import os
+import time
+
+import pytest
+
+from agent.agent_core_enhanced import AgentEnhanced, AgentConfig
+from agent.llm_interface import EchoBackend
+from agent.metrics import TOOL_WORKER_RESTARTS
+from agent.tools.workers import ToolWorkerPool, WorkerError
+from agent.types import ToolCall
+
+
+@pytest.fixture
+def pool():
+    pool = ToolWorkerPool(workers=1, timeout=10, heartbeat_interval=0.1, heartbeat_timeout=1.0,
+                          shm_threshold=64 * 1024)
+    yield pool
+    pool.close()
+
+
+def test_pool_runs_functions_and_methods(pool):
+    """Test calls run in another process and method instances are reused."""
+    assert pool.call("os:getpid") != os.getpid()
+    assert pool.call("collections:Counter.most_common", {"n": 1}) == []
+
+    with pytest.raises(WorkerError, match="FileNotFoundError"):
+        pool.call("os:listdir", {"path": "/nonexistent-dir"})
+
+
+def test_pool_returns_large_results_through_shared_memory(pool):
+    """Test results over the threshold come back intact and are unlinked."""
+    before = set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") else set()
+    data = pool.call("random:randbytes", {"n": 4 * 1024 * 1024})
+    assert len(data) == 4 * 1024 * 1024
+    if os.path.isdir("/dev/shm"):
+        assert set(os.listdir("/dev/shm")) <= before
+
+
+def test_pool_survives_crash_hang_and_timeout(pool):
+    """Test a crashed, hung or slow worker is replaced and the pool keeps working."""
+    crashes = TOOL_WORKER_RESTARTS.get(reason="crash")
+    with pytest.raises(WorkerError, match="signal 6"):
+        pool.call("os:abort")
+    assert TOOL_WORKER_RESTARTS.get(reason="crash") == crashes + 1
+    assert pool.call("os:getpid") > 0
+
+    # Catastrophic backtracking holds the GIL, so the heartbeat stops
+    start = time.monotonic()
+    with pytest.raises(WorkerError, match="stopped responding"):
+        pool.call("re:match", {"pattern": "(a*)*b", "string": "a" * 40})
+    assert time.monotonic() - start < 5
+
+    with pytest.raises(WorkerError, match="timed out"):
+        pool.call("subprocess:run", {"args": ["sleep", "5"]}, timeout=0.5)
+    assert pool.call("os:getpid") > 0
+
+
+def test_agent_isolated_tool_errors_become_results(monkeypatch):
+    """Test that isolated tool failures come back as tool errors."""
+    agent = AgentEnhanced(EchoBackend(), AgentConfig(tool_workers=1, tool_timeout=10))
+    try:
+        result = agent._execute_tool(ToolCall(id="1", name="press_key", arguments={"key": "Return"}))
+        # Without xdotool the worker's error dict comes back like any other
+        assert result.error is None or "xdotool" in result.error
+        assert agent.tool_workers._started
+
+        def crash(*args, **kwargs):
+            raise WorkerError("worker crashed")
+        monkeypatch.setattr(agent.tool_workers, "call", crash)
+        result = agent._execute_tool(ToolCall(id="2", name="capture_screen", arguments={}))
+        assert result.error == "worker crashed"
+    finally:
+        agent.close()
@@ -0,0 +1,106 @@
+"""
+Tests for span-based tracing.
+"""
+
+import json
+from unittest.mock import Mock, patch
+
+import pytest
+
+from agent.agent_core_enhanced import AgentEnhanced, AgentConfig
+from agent.llama_cpp_backend import LlamaCppBackend
+from agent.llm_interface import EchoBackend
+from agent.tracing import Tracer, get_tracer, set_tracer
+from agent.types import Message
+
+
+@pytest.fixture
+def tracer():
+    """Install an enabled tracer for the duration of a test."""
+    tracer = Tracer(enabled=True)
+    previous = set_tracer(tracer)
+    yield tracer
+    set_tracer(previous)
+
+
+def test_disabled_tracer_records_nothing():
+    """Test that a disabled tracer is a no-op."""
+    tracer = Tracer(enabled=False)
+    with tracer.span("work") as span:
+        span.set(bytes=10)
+
+    assert tracer.spans() == []
+
+
+def test_spans_nest_and_carry_attributes():
+    """Test parent/child relationships and attributes."""
+    tracer = Tracer(enabled=True)
+    with tracer.span("outer"):
+        with tracer.span("inner", tool_name="read_file") as span:
+            span.set(output_bytes=42)
+
+    spans = {s.name: s for s in tracer.spans()}
+    assert spans["inner"].parent_id == spans["outer"].span_id
+    assert spans["inner"].attributes == {"tool_name": "read_file", "output_bytes": 42}
+    assert spans["outer"].duration_ms >= spans["inner"].duration_ms
+
+
+def test_exports(tmp_path):
+    """Test JSONL and Chrome trace exports."""
+    tracer = Tracer(enabled=True)
+    with tracer.span("llm.generate"):
+        pass
+
+    tracer.export_jsonl(str(tmp_path / "trace.jsonl"))
+    tracer.export_chrome(str(tmp_path / "trace.json"))
+
+    line = json.loads((tmp_path / "trace.jsonl").read_text().splitlines()[0])
+    assert line["name"] == "llm.generate"
+    chrome = json.loads((tmp_path / "trace.json").read_text())
+    assert chrome["traceEvents"][0]["ph"] == "X"
+    assert chrome["traceEvents"][0]["cat"] == "llm"
+
+
+def test_agent_run_is_traced(tracer):
+    """Test that the agent loop emits step spans."""
+    agent = AgentEnhanced(backend=EchoBackend(), config=AgentConfig(max_iterations=1))
+    agent.run("hello")
+
+    names = {s.name for s in tracer.spans(tracer.trace_id)}
+    assert {"agent.run", "agent.step", "prompt.build", "llm.generate", "tool.parse"} <= names
+    assert "llm.generate" in tracer.summary()
+
+
+def test_prompt_size_is_counted_in_utf8_bytes(tracer):
+    """Test that prompt_bytes counts encoded bytes, not characters."""
+    sizes = []
+    for text in ("hello", "h\u00e9llo \u2713\u2713"):
+        agent = AgentEnhanced(backend=EchoBackend(), config=AgentConfig(max_iterations=1, isolate_tools=False))
+        agent.run(text)
+        agent.close()
+        build = [span for span in tracer.spans(tracer.trace_id) if span.name == "prompt.build"][0]
+        sizes.append(build.attributes["prompt_bytes"])
+    # "\u00e9" takes 2 bytes and each "\u2713" 3, plus the space
+    assert sizes[1] - sizes[0] == 8
+
+
+@patch("agent.llama_cpp_backend.Llama")
+def test_llama_cpp_traced_phases(mock_llama_class, tracer):
+    """Test prompt-eval/decode spans when tracing is enabled."""
+    mock_model = Mock()
+    mock_model.tokenize.return_value = [1, 2, 3]
+    mock_model.return_value = iter([
+        {"choices": [{"text": "Hel"}]},
+        {"choices": [{"text": "lo"}]},
+    ])
+    mock_llama_class.return_value = mock_model
+
+    backend = LlamaCppBackend(model_path="/fake/model.gguf")
+    result = backend.generate([Message(role="user", content="Hi")])
+
+    assert result.content == "Hello"
+    spans = {s.name: s for s in tracer.spans()}
+    assert spans["llm.tokenize"].attributes["prompt_tokens"] == 3
+    assert spans["llm.decode"].attributes["completion_tokens"] == 2
+    assert "llm.prompt_eval" in spans
+    assert get_tracer() is tracer